@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 import os
 import json
 
@@ -12,10 +12,97 @@ class Settings(BaseSettings):
     # OpenAI
     openai_api_key: str
     
+    # OpenAI request scheduling: concurrent requests per worker and the account's RPM/TPM
+    # until the API reports them; set openai_scheduler_db to share the budgets between workers
+    openai_max_concurrency: int = 8
+    openai_rpm_limit: int = 500
+    openai_tpm_limit: int = 30000
+    openai_scheduler_db: Optional[str] = None
+    
+    # Shared HTTP connection pools for OpenAI and ChromaDB (HTTP/2 needs the h2 package),
+    # and the timeout in seconds of each kind of call
+    http_max_connections: int = 50
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    http2_enabled: bool = True
+    http_connect_timeout: float = 5.0
+    http_timeout_chat: float = 180.0
+    http_timeout_vision: float = 120.0
+    http_timeout_embeddings: float = 30.0
+    http_timeout_chromadb: float = 30.0
+    
+    # Meal-plan response cache (disk tier is disabled when llm_cache_dir is empty)
+    llm_cache_enabled: bool = True
+    llm_cache_max_entries: int = 256
+    llm_cache_ttl_seconds: int = 604800
+    llm_cache_dir: Optional[str] = None
+    llm_cache_max_disk_mb: int = 200
+    
+    # Validate Motor 1 completions while streaming and retry as soon as one fails
+    llm_early_abort: bool = True
+    
+    # Motor 1 plans generated concurrently (with and without corrective reminders), keeping
+    # the first one that passes local validation; 1 keeps the serial retries, at most 3
+    llm_candidates: int = 1
+    
+    # LLM output: "text" (free-text plan) or "json" (plan validated against a schema, then
+    # scaled, checked and rendered from typed objects; llm_early_abort and llm_candidates
+    # apply to "text" only)
+    llm_output_format: str = "text"
+    
+    # Recompute portions and macros from the recipe catalog instead of trusting the LLM's arithmetic
+    macro_scaling_enabled: bool = True
+    
+    # Motor 1 plan builder: "llm", "local" (no OpenAI call unless the local plan breaks
+    # the plan rules) or "fallback" (local when OpenAI fails, with the broken rules reported)
+    motor1_solver: str = "llm"
+    
+    # Recipe catalog layout in prompts: "full" or "compact" (one-line rows, each recipe once)
+    prompt_catalog_format: str = "full"
+    prompt_catalog_include_preparation: bool = False
+    
+    # Prompt tokens (estimated) spent on the Motor 2 recipe catalog
+    motor2_catalog_token_budget: int = 4000
+    
+    # Recipe vector search: "chroma" (server), "local" (in-process index built by
+    # scripts/build_local_vector_index.py) or "auto" (local when ChromaDB is unreachable)
+    vector_backend: str = "chroma"
+    local_vector_index_dir: str = "./data/vector_index"
+    
     # ChromaDB
     chromadb_host: str = "chromadb"  # Docker service name
     chromadb_port: int = 8001
     
+    # Catalog sync into ChromaDB: only new or changed recipes are embedded (also scripts/load_recipes.py)
+    recipe_sync_on_startup: bool = True
+    recipe_sync_batch_size: int = 50
+    recipe_sync_concurrency: int = 4
+    recipe_sync_requests_per_minute: int = 300
+    
+    # Query-embedding cache (disk tier, shared by workers, is disabled when embedding_cache_dir is empty)
+    embedding_cache_enabled: bool = True
+    embedding_cache_max_entries: int = 2048
+    embedding_cache_dir: Optional[str] = None
+    embedding_cache_max_disk_entries: int = 100000
+    
+    # Worker pools for blocking pipeline stages
+    executor_search_workers: int = 4
+    executor_cpu_workers: int = 4
+    executor_pdf_workers: int = 2
+    executor_pdf_use_processes: bool = False
+    
+    # Background generation jobs
+    job_store: str = "memory"  # "memory" or "sqlite"
+    job_store_path: str = "./data/jobs.sqlite3"
+    job_workers: int = 4
+    job_queue_size: int = 100
+    job_ttl_seconds: int = 86400
+    
+    # Per-stage latency, token and cost metrics at /metrics (Prometheus text format);
+    # server_timing_enabled adds each request's stage durations as a Server-Timing header
+    metrics_enabled: bool = True
+    server_timing_enabled: bool = False
+    
     # CORS - will be loaded from environment
     backend_cors_origins: List[str] = ["http://localhost:3000", "http://localhost:5173"]
     
@@ -2,7 +2,9 @@
 Estructura de datos para patologías y condiciones médicas
 """
 
-from typing import Dict, List, Optional, Any
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Optional, Any, Tuple
 from enum import Enum
 
 
@@ -1301,130 +1303,244 @@ def get_recipe_tags_to_prefer(pathology_types: List[PathologyType]) -> List[str]
     return list(tags)
 
 
+# Palabras clave de los casos especiales, cuya patología depende de la fase
+PREGNANCY_KEYWORDS = ("embarazada", "gestación", "gestante", "embarazo")
+CANCER_KEYWORDS = ("cáncer", "cancer", "oncológico", "tumor")
+PREGNANCY_TRIMESTER_KEYWORDS = (
+    (("primer", "1er", "1°"), PathologyType.EMBARAZO_PRIMER_TRIMESTRE),
+    (("segundo", "2do", "2°"), PathologyType.EMBARAZO_SEGUNDO_TRIMESTRE),
+    (("tercer", "3er", "3°"), PathologyType.EMBARAZO_TERCER_TRIMESTRE)
+)
+CANCER_PHASE_KEYWORDS = (
+    (("prequimio", "pre quimio", "antes de quimio"), PathologyType.CANCER_PREQUIMIO),
+    (("posquimio", "post quimio", "después de quimio"), PathologyType.CANCER_POSQUIMIO),
+    (("radioterapia", "radiación"), PathologyType.CANCER_RADIOTERAPIA)
+)
+
+# Mapeo de palabras clave a patologías, en el orden en que se reportan
+PATHOLOGY_KEYWORDS = (
+    # Diabetes
+    (("diabetes tipo 1", "diabetes insulinodependiente", "dbt1"), PathologyType.DIABETES_TIPO_1),
+    (("diabetes tipo 2", "diabetes no insulinodependiente", "dbt2", "diabetes"), PathologyType.DIABETES_TIPO_2),
+    (("diabetes gestacional", "diabetes embarazo"), PathologyType.DIABETES_GESTACIONAL),
+
+    # Tiroides
+    (("hipotiroidismo", "tiroides baja", "hashimoto"), PathologyType.HIPOTIROIDISMO),
+    (("hipertiroidismo", "tiroides alta", "graves"), PathologyType.HIPERTIROIDISMO),
+
+    # Cardiovascular
+    (("hipertensión", "hipertenso", "presión alta", "hta"), PathologyType.HIPERTENSION),
+    (("colesterol alto", "hipercolesterolemia", "dislipidemia"), PathologyType.COLESTEROL_ALTO),
+    (("triglicéridos", "trigliceridos altos"), PathologyType.TRIGLICERIDOS_ALTOS),
+
+    # Digestivo
+    (("celiaquía", "celíaco", "celiaco", "intolerancia gluten"), PathologyType.CELIAQUIA),
+    (("hígado graso", "higado graso", "esteatosis", "nafld"), PathologyType.HIGADO_GRASO),
+
+    # Metabólico
+    (("resistencia insulina", "prediabetes", "síndrome metabólico"), PathologyType.RESISTENCIA_INSULINA),
+    (("síndrome ovario poliquístico", "sop", "ovario poliquistico"), PathologyType.SINDROME_OVARIO_POLIQUISTICO),
+    (("gota", "ácido úrico", "hiperuricemia"), PathologyType.GOTA),
+
+    # Otros
+    (("anemia", "ferropenia", "déficit hierro"), PathologyType.ANEMIA),
+    (("osteoporosis", "densidad ósea baja"), PathologyType.OSTEOPOROSIS),
+    (("osteopenia", "densidad osea disminuida", "densitometria no salio bien"), PathologyType.OSTEOPENIA),
+    (("esofagitis", "reflujo", "erge", "reflujo gastroesofágico"), PathologyType.ESOFAGITIS_REFLUJO),
+    (("menopausia", "climaterio"), PathologyType.MENOPAUSIA),
+
+    # Oncológicas
+    (CANCER_KEYWORDS, None),  # Procesamiento especial
+    (("prequimio", "pre quimio", "antes de quimioterapia"), PathologyType.CANCER_PREQUIMIO),
+    (("posquimio", "post quimio", "después de quimioterapia"), PathologyType.CANCER_POSQUIMIO),
+    (("radioterapia", "radiación", "rayos"), PathologyType.CANCER_RADIOTERAPIA),
+    (("anticancer prequimio", "anticáncer prequimio"), PathologyType.ANTICANCER_PREQUIMIO),
+    (("anticancer postquimio", "anticáncer postquimio"), PathologyType.ANTICANCER_POSTQUIMIO),
+    (("anticancer posrayos", "anticáncer posrayos", "post radioterapia"), PathologyType.ANTICANCER_POSRAYOS),
+    (("anticancer postcirugia", "anticáncer postcirugía", "post cirugía oncológica"), PathologyType.ANTICANCER_POSTCIRUGIA),
+    (("desnutrición", "desnutrido", "bajo peso severo"), PathologyType.DESNUTRICION),
+    (("sarcopenia", "pérdida muscular", "pérdida de masa muscular"), PathologyType.SARCOPENIA),
+    (("hiporexia", "falta de apetito", "pérdida de apetito", "inapetencia"), PathologyType.HIPOREXIA),
+
+    # Condiciones digestivas y quirúrgicas
+    (("bariátrico", "bariatrico", "cirugía bariátrica", "sleeve", "bypass gástrico"), PathologyType.BARIATRICO),
+    (("balón gástrico", "balon gastrico", "balón intragástrico"), PathologyType.BALON_GASTRICO),
+    (("postoperatorio", "post operatorio", "post cirugía", "postcirugía"), PathologyType.POSTOPERATORIO),
+    (("dieta blanda", "textura blanda", "alimentos blandos"), PathologyType.BLANDA),
+    (("digestiva", "fácil digestión", "dieta digestiva"), PathologyType.DIGESTIVA),
+    (("malabsorción", "mala absorción", "síndrome malabsorción"), PathologyType.MALA_ABSORCION),
+    (("colonoscopía", "colonoscopia", "preparación colonoscopía"), PathologyType.COLONOSCOPIA),
+    (("hipoglucemia", "hipoglicemia", "glucemia baja"), PathologyType.HIPOGLUCEMIA),
+
+    # Nuevas condiciones
+    (("constipación", "estreñimiento", "tránsito lento"), PathologyType.CONSTIPACION),
+    (("gastritis", "dolor estomacal", "acidez"), PathologyType.GASTRITIS),
+    (("déficit calcio", "osteoporosis", "densidad ósea baja", "falta de calcio"), PathologyType.DEFICIT_CALCIO),
+    (("intestino corto", "síndrome intestino corto", "malabsorción severa"), PathologyType.SINDROME_INTESTINO_CORTO),
+    (("ovolactovegetariano", "ovo lacto vegetariano", "vegetariano con huevo y lácteos"), PathologyType.OVOLACTOVEGETARIANO),
+
+    # Embarazo
+    (PREGNANCY_KEYWORDS, None),  # Procesamiento especial
+    (("primer trimestre", "1er trimestre", "semana 1-13"), PathologyType.EMBARAZO_PRIMER_TRIMESTRE),
+    (("segundo trimestre", "2do trimestre", "semana 14-27"), PathologyType.EMBARAZO_SEGUNDO_TRIMESTRE),
+    (("tercer trimestre", "3er trimestre", "semana 28-40"), PathologyType.EMBARAZO_TERCER_TRIMESTRE),
+    (("hipertensión gestacional", "hipertension embarazo"), PathologyType.HIPERTENSION_GESTACIONAL),
+    (("preeclampsia", "pre-eclampsia"), PathologyType.PREECLAMPSIA)
+)
+
+
+def normalize_pathology_text(text: str) -> str:
+    """Minúsculas y sin acentos, la forma en que se buscan las palabras clave"""
+    text = text.lower()
+    if text.isascii():
+        return text
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+class KeywordAutomaton:
+    """Autómata Aho-Corasick: encuentra todas las palabras clave en una pasada
+
+    Cada estado guarda las palabras clave que terminan en él (incluidas las
+    de sus enlaces de falla), así que las coincidencias superpuestas o
+    contenidas en otras también se reportan.
+    """
+
+    def __init__(self, keywords):
+        self.transitions: List[Dict[str, int]] = [{}]
+        outputs: List[set] = [set()]
+        for keyword in keywords:
+            state = 0
+            for char in keyword:
+                if char not in self.transitions[state]:
+                    self.transitions.append({})
+                    outputs.append(set())
+                    self.transitions[state][char] = len(self.transitions) - 1
+                state = self.transitions[state][char]
+            outputs[state].add(keyword)
+
+        # Enlaces de falla por niveles (BFS)
+        self.fail = [0] * len(self.transitions)
+        queue = list(self.transitions[0].values())
+        for state in queue:
+            for char, child in self.transitions[state].items():
+                fallback = self.fail[state]
+                while fallback and char not in self.transitions[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.transitions[fallback].get(char, 0)
+                self.fail[child] = target if target != child else 0
+                outputs[child] |= outputs[self.fail[child]]
+                queue.append(child)
+        self.outputs = [frozenset(output) for output in outputs]
+
+    def find(self, text: str, whole_words: bool = False) -> frozenset:
+        """Palabras clave que aparecen en text (como palabras completas si whole_words)"""
+        found = set()
+        state = 0
+        transitions, fail, outputs = self.transitions, self.fail, self.outputs
+        for end, char in enumerate(text, 1):
+            while state and char not in transitions[state]:
+                state = fail[state]
+            state = transitions[state].get(char, 0)
+            if not outputs[state]:
+                continue
+            if not whole_words:
+                found |= outputs[state]
+                continue
+            if end < len(text) and text[end].isalnum():
+                continue
+            for keyword in outputs[state]:
+                start = end - len(keyword)
+                if start == 0 or not text[start - 1].isalnum():
+                    found.add(keyword)
+        return frozenset(found)
+
+
+def _all_keywords():
+    keywords = {keyword for group, _ in PATHOLOGY_KEYWORDS for keyword in group}
+    for groups in (PREGNANCY_TRIMESTER_KEYWORDS, CANCER_PHASE_KEYWORDS):
+        keywords.update(keyword for group, _ in groups for keyword in group)
+    return {keyword.lower() for keyword in keywords}
+
+
+_KEYWORDS = _all_keywords()
+# Palabras clave tal como se escriben, buscadas como subcadenas
+_KEYWORD_AUTOMATON = KeywordAutomaton(_KEYWORDS)
+# Palabras clave sin acentos, buscadas solo como palabras completas
+_FOLDED_KEYWORDS: Dict[str, frozenset] = {}
+for _keyword in _KEYWORDS:
+    _folded = normalize_pathology_text(_keyword)
+    _FOLDED_KEYWORDS[_folded] = _FOLDED_KEYWORDS.get(_folded, frozenset()) | {_keyword}
+_FOLDED_AUTOMATON = KeywordAutomaton(_FOLDED_KEYWORDS)
+
+
+def _lowercase_groups(groups):
+    return tuple(
+        (frozenset(keyword.lower() for keyword in keywords), pathology)
+        for keywords, pathology in groups
+    )
+
+
+_PATHOLOGY_GROUPS = _lowercase_groups(PATHOLOGY_KEYWORDS)
+_PREGNANCY_GROUP = frozenset(keyword.lower() for keyword in PREGNANCY_KEYWORDS)
+_TRIMESTER_GROUPS = _lowercase_groups(PREGNANCY_TRIMESTER_KEYWORDS)
+_CANCER_PHASE_GROUPS = _lowercase_groups(CANCER_PHASE_KEYWORDS)
+
+
+def _first_match(found: frozenset, groups, default: PathologyType) -> PathologyType:
+    for keywords, pathology in groups:
+        if not found.isdisjoint(keywords):
+            return pathology
+    return default
+
+
+def find_pathology_keywords(text_lower: str) -> frozenset:
+    """Palabras clave presentes en un texto en minúsculas
+
+    Una palabra clave coincide como subcadena tal como está escrita, o sin
+    acentos si aparece como palabra completa ("hipertension" encuentra
+    "hipertensión", pero "gestacional" no encuentra "gestación").
+    """
+    found = set(_KEYWORD_AUTOMATON.find(text_lower))
+    for folded in _FOLDED_AUTOMATON.find(normalize_pathology_text(text_lower), whole_words=True):
+        found |= _FOLDED_KEYWORDS[folded]
+    return frozenset(found)
+
+
+@lru_cache(maxsize=1024)
+def _detect_lowercase(text_lower: str) -> Tuple[PathologyType, ...]:
+    found = find_pathology_keywords(text_lower)
+
+    detected = []
+    for group, pathology in _PATHOLOGY_GROUPS:
+        if found.isdisjoint(group):
+            continue
+        if pathology is not None:
+            detected.append(pathology)
+        elif group == _PREGNANCY_GROUP:
+            # Si no se especifica trimestre, asumir segundo
+            detected.append(_first_match(found, _TRIMESTER_GROUPS, PathologyType.EMBARAZO_SEGUNDO_TRIMESTRE))
+        else:
+            # Cáncer: si no se especifica fase, asumir prequimio
+            detected.append(_first_match(found, _CANCER_PHASE_GROUPS, PathologyType.CANCER_PREQUIMIO))
+
+    # Eliminar duplicados manteniendo orden
+    return tuple(dict.fromkeys(detected))
+
+
 def detect_pathologies_from_text(text: str) -> List[PathologyType]:
     """
     Detecta patologías a partir de texto libre
     Usado para mantener compatibilidad con el sistema actual
+    
+    Las palabras clave se buscan sin distinguir mayúsculas; sin acentos solo
+    como palabras completas (ver find_pathology_keywords). El resultado se
+    memoiza por texto en minúsculas.
     """
     if not text:
         return []
     
-    text_lower = text.lower()
-    detected = []
-    
-    # Mapeo de palabras clave a patologías
-    keyword_mapping = {
-        # Diabetes
-        ("diabetes tipo 1", "diabetes insulinodependiente", "dbt1"): PathologyType.DIABETES_TIPO_1,
-        ("diabetes tipo 2", "diabetes no insulinodependiente", "dbt2", "diabetes"): PathologyType.DIABETES_TIPO_2,
-        ("diabetes gestacional", "diabetes embarazo"): PathologyType.DIABETES_GESTACIONAL,
-        
-        # Tiroides
-        ("hipotiroidismo", "tiroides baja", "hashimoto"): PathologyType.HIPOTIROIDISMO,
-        ("hipertiroidismo", "tiroides alta", "graves"): PathologyType.HIPERTIROIDISMO,
-        
-        # Cardiovascular
-        ("hipertensión", "hipertenso", "presión alta", "hta"): PathologyType.HIPERTENSION,
-        ("colesterol alto", "hipercolesterolemia", "dislipidemia"): PathologyType.COLESTEROL_ALTO,
-        ("triglicéridos", "trigliceridos altos"): PathologyType.TRIGLICERIDOS_ALTOS,
-        
-        # Digestivo
-        ("celiaquía", "celíaco", "celiaco", "intolerancia gluten"): PathologyType.CELIAQUIA,
-        ("hígado graso", "higado graso", "esteatosis", "nafld"): PathologyType.HIGADO_GRASO,
-        
-        # Metabólico
-        ("resistencia insulina", "prediabetes", "síndrome metabólico"): PathologyType.RESISTENCIA_INSULINA,
-        ("síndrome ovario poliquístico", "sop", "ovario poliquistico"): PathologyType.SINDROME_OVARIO_POLIQUISTICO,
-        ("gota", "ácido úrico", "hiperuricemia"): PathologyType.GOTA,
-        
-        # Otros
-        ("anemia", "ferropenia", "déficit hierro"): PathologyType.ANEMIA,
-        ("osteoporosis", "densidad ósea baja"): PathologyType.OSTEOPOROSIS,
-        ("osteopenia", "densidad osea disminuida", "densitometria no salio bien"): PathologyType.OSTEOPENIA,
-        ("esofagitis", "reflujo", "erge", "reflujo gastroesofágico"): PathologyType.ESOFAGITIS_REFLUJO,
-        ("menopausia", "climaterio"): PathologyType.MENOPAUSIA,
-        
-        # Oncológicas
-        ("cáncer", "cancer", "oncológico", "tumor"): None,  # Procesamiento especial
-        ("prequimio", "pre quimio", "antes de quimioterapia"): PathologyType.CANCER_PREQUIMIO,
-        ("posquimio", "post quimio", "después de quimioterapia"): PathologyType.CANCER_POSQUIMIO,
-        ("radioterapia", "radiación", "rayos"): PathologyType.CANCER_RADIOTERAPIA,
-        ("anticancer prequimio", "anticáncer prequimio"): PathologyType.ANTICANCER_PREQUIMIO,
-        ("anticancer postquimio", "anticáncer postquimio"): PathologyType.ANTICANCER_POSTQUIMIO,
-        ("anticancer posrayos", "anticáncer posrayos", "post radioterapia"): PathologyType.ANTICANCER_POSRAYOS,
-        ("anticancer postcirugia", "anticáncer postcirugía", "post cirugía oncológica"): PathologyType.ANTICANCER_POSTCIRUGIA,
-        ("desnutrición", "desnutrido", "bajo peso severo"): PathologyType.DESNUTRICION,
-        ("sarcopenia", "pérdida muscular", "pérdida de masa muscular"): PathologyType.SARCOPENIA,
-        ("hiporexia", "falta de apetito", "pérdida de apetito", "inapetencia"): PathologyType.HIPOREXIA,
-        
-        # Condiciones digestivas y quirúrgicas
-        ("bariátrico", "bariatrico", "cirugía bariátrica", "sleeve", "bypass gástrico"): PathologyType.BARIATRICO,
-        ("balón gástrico", "balon gastrico", "balón intragástrico"): PathologyType.BALON_GASTRICO,
-        ("postoperatorio", "post operatorio", "post cirugía", "postcirugía"): PathologyType.POSTOPERATORIO,
-        ("dieta blanda", "textura blanda", "alimentos blandos"): PathologyType.BLANDA,
-        ("digestiva", "fácil digestión", "dieta digestiva"): PathologyType.DIGESTIVA,
-        ("malabsorción", "mala absorción", "síndrome malabsorción"): PathologyType.MALA_ABSORCION,
-        ("colonoscopía", "colonoscopia", "preparación colonoscopía"): PathologyType.COLONOSCOPIA,
-        ("hipoglucemia", "hipoglicemia", "glucemia baja"): PathologyType.HIPOGLUCEMIA,
-        
-        # Nuevas condiciones
-        ("constipación", "estreñimiento", "tránsito lento"): PathologyType.CONSTIPACION,
-        ("gastritis", "dolor estomacal", "acidez"): PathologyType.GASTRITIS,
-        ("déficit calcio", "osteoporosis", "densidad ósea baja", "falta de calcio"): PathologyType.DEFICIT_CALCIO,
-        ("intestino corto", "síndrome intestino corto", "malabsorción severa"): PathologyType.SINDROME_INTESTINO_CORTO,
-        ("ovolactovegetariano", "ovo lacto vegetariano", "vegetariano con huevo y lácteos"): PathologyType.OVOLACTOVEGETARIANO,
-        
-        # Embarazo
-        ("embarazada", "gestación", "gestante", "embarazo"): None,  # Procesamiento especial
-        ("primer trimestre", "1er trimestre", "semana 1-13"): PathologyType.EMBARAZO_PRIMER_TRIMESTRE,
-        ("segundo trimestre", "2do trimestre", "semana 14-27"): PathologyType.EMBARAZO_SEGUNDO_TRIMESTRE,
-        ("tercer trimestre", "3er trimestre", "semana 28-40"): PathologyType.EMBARAZO_TERCER_TRIMESTRE,
-        ("hipertensión gestacional", "hipertension embarazo"): PathologyType.HIPERTENSION_GESTACIONAL,
-        ("preeclampsia", "pre-eclampsia"): PathologyType.PREECLAMPSIA
-    }
-    
-    # Detectar patologías por palabras clave
-    for keywords, pathology in keyword_mapping.items():
-        if pathology is None:  # Casos especiales
-            if any(keyword in text_lower for keyword in keywords):
-                # Caso especial para embarazo
-                if keywords[0] in ["embarazada", "gestación", "gestante", "embarazo"]:
-                    # Buscar trimestre específico
-                    if "primer" in text_lower or "1er" in text_lower or "1°" in text_lower:
-                        detected.append(PathologyType.EMBARAZO_PRIMER_TRIMESTRE)
-                    elif "segundo" in text_lower or "2do" in text_lower or "2°" in text_lower:
-                        detected.append(PathologyType.EMBARAZO_SEGUNDO_TRIMESTRE)
-                    elif "tercer" in text_lower or "3er" in text_lower or "3°" in text_lower:
-                        detected.append(PathologyType.EMBARAZO_TERCER_TRIMESTRE)
-                    else:
-                        # Si no se especifica trimestre, asumir segundo
-                        detected.append(PathologyType.EMBARAZO_SEGUNDO_TRIMESTRE)
-                
-                # Caso especial para cáncer
-                elif keywords[0] in ["cáncer", "cancer", "oncológico", "tumor"]:
-                    # Buscar fase específica
-                    if "prequimio" in text_lower or "pre quimio" in text_lower or "antes de quimio" in text_lower:
-                        detected.append(PathologyType.CANCER_PREQUIMIO)
-                    elif "posquimio" in text_lower or "post quimio" in text_lower or "después de quimio" in text_lower:
-                        detected.append(PathologyType.CANCER_POSQUIMIO)
-                    elif "radioterapia" in text_lower or "radiación" in text_lower:
-                        detected.append(PathologyType.CANCER_RADIOTERAPIA)
-                    else:
-                        # Si no se especifica fase, asumir prequimio
-                        detected.append(PathologyType.CANCER_PREQUIMIO)
-        else:
-            if any(keyword in text_lower for keyword in keywords):
-                detected.append(pathology)
-    
-    # Eliminar duplicados manteniendo orden
-    seen = set()
-    unique_detected = []
-    for item in detected:
-        if item not in seen:
-            seen.add(item)
-            unique_detected.append(item)
-    
-    return unique_detected
+    return list(_detect_lowercase(text.lower()))
 
 
 def is_pregnancy_pathology(pathology: PathologyType) -> bool:
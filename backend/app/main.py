@@ -1,7 +1,10 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+import asyncio
 import os
+import json
+import time
 import logging
 import aiofiles
 from typing import Dict, Optional
@@ -13,12 +16,22 @@ from .schemas.meal_plan import (
     MealPlanResponse
 )
 from .services.chromadb_service import ChromaDBService
-from .services.prompt_generator import PromptGenerator
+from .services.prompt_generator import PromptGenerator, register_compact_fragments
 from .services.openai_service import OpenAIService
 from .services.pdf_generator import PDFGenerator
 from .services.recipe_manager import RecipeManager
 from .services.meal_plan_processor import MealPlanProcessor
+from .services.macro_scaler import MacroScaler
+from .services.plan_solver import LocalPlanSolver
+from .services.catalog_builder import CatalogBuilder
 from .services.file_parser import FileParser
+from .services.executor import StageExecutor
+from .services.http_clients import HTTPClients
+from .services.meal_plan_pipeline import MealPlanPipeline
+from .services.job_store import create_job_store
+from .services.job_manager import JobManager, JobQueueFullError
+from .services.tracing import CONTENT_TYPE, REGISTRY, StageTimings, activate
+from .schemas.jobs import JobType, JobRecord, JobCreatedResponse
 
 logger = logging.getLogger(__name__)
 
@@ -37,22 +50,101 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+async def add_server_timing(request: Request, call_next):
+    """Trace the request and report its stage durations in a Server-Timing header"""
+    timings = StageTimings()
+    start = time.perf_counter()
+    with activate(timings):
+        response = await call_next(request)
+    # Streamed responses send their headers before any stage has run
+    if timings.durations:
+        response.headers["Server-Timing"] = timings.server_timing(time.perf_counter() - start)
+    return response
+
+if settings.server_timing_enabled:
+    app.middleware("http")(add_server_timing)
+
 # Initialize services
-chromadb_service = ChromaDBService()
-prompt_generator = PromptGenerator()
-openai_service = OpenAIService()
-pdf_generator = PDFGenerator()
+http_clients = HTTPClients(
+    timeouts={
+        "chat": settings.http_timeout_chat,
+        "vision": settings.http_timeout_vision,
+        "embeddings": settings.http_timeout_embeddings,
+        "chromadb": settings.http_timeout_chromadb
+    },
+    connect_timeout=settings.http_connect_timeout,
+    max_connections=settings.http_max_connections,
+    max_keepalive_connections=settings.http_max_keepalive_connections,
+    keepalive_expiry=settings.http_keepalive_expiry,
+    http2=settings.http2_enabled
+)
 recipe_manager = RecipeManager()
+register_compact_fragments(recipe_manager.fragments)
+chromadb_service = ChromaDBService(recipe_manager, http_clients=http_clients)
+prompt_generator = PromptGenerator(
+    catalog_format=settings.prompt_catalog_format,
+    include_preparation=settings.prompt_catalog_include_preparation,
+    fragments=recipe_manager.fragments,
+    macro_scaling=settings.macro_scaling_enabled
+)
+openai_service = OpenAIService(http_clients=http_clients)
+pdf_generator = PDFGenerator()
 meal_plan_processor = MealPlanProcessor(recipe_manager)
+macro_scaler = MacroScaler(recipe_manager)
 file_parser = FileParser(openai_service=openai_service)
+stage_executor = StageExecutor(
+    pool_sizes={
+        "search": settings.executor_search_workers,
+        "cpu": settings.executor_cpu_workers,
+        "pdf": settings.executor_pdf_workers
+    },
+    process_stages=["pdf"] if settings.executor_pdf_use_processes else None
+)
+meal_plan_pipeline = MealPlanPipeline(
+    chromadb_service=chromadb_service,
+    recipe_manager=recipe_manager,
+    prompt_generator=prompt_generator,
+    openai_service=openai_service,
+    meal_plan_processor=meal_plan_processor,
+    pdf_generator=pdf_generator,
+    stage_executor=stage_executor,
+    early_abort=settings.llm_early_abort,
+    macro_scaler=macro_scaler if settings.macro_scaling_enabled else None,
+    local_solver=LocalPlanSolver(macro_scaler),
+    solver_mode=settings.motor1_solver,
+    candidates=settings.llm_candidates,
+    output_format=settings.llm_output_format,
+    catalog_builder=CatalogBuilder(
+        recipe_manager,
+        prompt_generator,
+        token_budget=settings.motor2_catalog_token_budget
+    )
+)
+job_manager = JobManager(
+    store=create_job_store(settings.job_store, settings.job_store_path),
+    pipeline=meal_plan_pipeline,
+    workers=settings.job_workers,
+    queue_size=settings.job_queue_size,
+    ttl_seconds=settings.job_ttl_seconds
+)
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize ChromaDB with recipes on startup"""
     try:
-        chromadb_service.initialize()
+        # The catalog sync sleeps for rate limits and retries; keep it off the event loop
+        await asyncio.to_thread(chromadb_service.initialize)
     except Exception as e:
         logger.warning(f"Could not initialize ChromaDB: {e}")
+    
+    await job_manager.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop job workers and release worker pools and connections"""
+    await job_manager.stop()
+    stage_executor.shutdown(wait=False)
+    await http_clients.aclose()
 
 @app.get("/")
 async def root():
@@ -62,101 +154,29 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/api/stats")
+async def get_stats():
+    """Runtime statistics for worker pools, generation jobs, caches and the OpenAI queue"""
+    return {
+        "executor": stage_executor.get_stats(),
+        "jobs": job_manager.get_stats(),
+        "llm_cache": openai_service.get_cache_stats(),
+        "openai_scheduler": await openai_service.get_scheduler_stats(),
+        "embedding_cache": chromadb_service.get_embedding_cache_stats()
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Per-stage latency histograms and OpenAI token and cost counters, for Prometheus"""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
 @app.post("/api/meal-plans/new-patient", response_model=MealPlanResponse)
 async def generate_new_patient_plan(request: NewPatientRequest):
     """Generate meal plan for new patient (Motor 1)"""
     try:
-        # Define meal types based on patient configuration
-        meal_types = ["desayuno", "almuerzo", "merienda", "cena"]
-        
-        # Calculate daily macros for recipe filtering
-        from .utils.calculations import NutritionalCalculator
-        daily_calories = NutritionalCalculator.calculate_daily_calories(request)
-        macro_distribution = NutritionalCalculator.calculate_macro_distribution(request)
-        
-        daily_macros = {
-            'protein': round((daily_calories * macro_distribution["proteinas"]) / 4),
-            'carbs': round((daily_calories * macro_distribution["carbohidratos"]) / 4),
-            'fats': round((daily_calories * macro_distribution["grasas"]) / 9)
-        }
-        
-        # Option 1: Use ChromaDB if available for better semantic search
-        recipes_by_meal = None
-        if chromadb_service.collection:
-            recipes_by_meal = chromadb_service.search_recipes_by_meal_type(
-                meal_types=meal_types,
-                patient_restrictions=request.no_consume,
-                preferences=request.le_gusta,
-                economic_level=request.nivel_economico.value,
-                patologias=request.patologias,
-                n_results_per_type=10
-            )
-        
-        # Option 2: Use Recipe Manager as fallback or primary
-        if not recipes_by_meal or all(len(recipes) == 0 for recipes in recipes_by_meal.values()):
-            recipes_by_meal = recipe_manager.get_recipes_for_meal_plan(
-                meal_types=meal_types,
-                restrictions=request.no_consume,
-                preferences=request.le_gusta,
-                economic_level=request.nivel_economico.value,
-                daily_macros=daily_macros
-            )
-        
-        # Format recipes for prompt
-        recipes_formatted = prompt_generator.format_recipes_by_meal_type(recipes_by_meal)
-        
-        # Collect all recipe IDs for validation
-        all_recipe_ids = []
-        for recipes in recipes_by_meal.values():
-            all_recipe_ids.extend([r['id'] for r in recipes])
-        
-        # Generate prompt with recipe IDs
-        prompt = prompt_generator.generate_motor1_prompt(
-            patient_data=request,
-            recipes_json=recipes_formatted
-        )
-        
-        # Generate plan with OpenAI
-        meal_plan = await openai_service.generate_meal_plan(prompt)
-        
-        # Validate recipe usage
-        if not prompt_generator.validate_recipe_usage(meal_plan, all_recipe_ids):
-            # If validation fails, retry with stronger prompt
-            enhanced_prompt = prompt + "\n\nRECORDATORIO IMPORTANTE: Debes usar ÚNICAMENTE los IDs de recetas proporcionados [REC_XXXX]. NO inventes recetas nuevas."
-            meal_plan = await openai_service.generate_meal_plan(enhanced_prompt)
-        
-        # Extract used recipe IDs for potential post-processing
-        used_recipe_ids = prompt_generator.extract_used_recipes(meal_plan)
-        
-        # Check for zero macros
-        zero_macro_warnings = meal_plan_processor.check_for_zero_macros(meal_plan)
-        if zero_macro_warnings:
-            logger.warning(f"Found {len(zero_macro_warnings)} instances of zero macros")
-            for warning in zero_macro_warnings:
-                logger.warning(warning)
-            
-            # Retry with enhanced prompt about macros
-            enhanced_prompt = prompt + "\n\n⚠️ RECORDATORIO CRÍTICO SOBRE MACROS:\n- NUNCA dejes macros en cero\n- Si ajustás cantidades, recalculá los macros proporcionalmente\n- Cada opción debe tener valores nutricionales reales basados en la receta"
-            meal_plan = await openai_service.generate_meal_plan(enhanced_prompt)
-        
-        # Post-process meal plan to ensure recipe details are complete
-        processed_meal_plan = meal_plan_processor.process_meal_plan(meal_plan)
-        
-        # Add recipe appendix with full details
-        processed_meal_plan = meal_plan_processor.add_recipe_appendix(processed_meal_plan)
-        
-        # Generate PDF
-        pdf_path = pdf_generator.generate_pdf(
-            meal_plan=processed_meal_plan,
-            patient_name=request.nombre,
-            plan_type="nuevo"
-        )
-        
-        return MealPlanResponse(
-            meal_plan=processed_meal_plan,
-            pdf_path=pdf_path
-        )
-        
+        return await meal_plan_pipeline.generate_new_patient_plan(request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -164,46 +184,7 @@ async def generate_new_patient_plan(request: NewPatientRequest):
 async def generate_control_plan(request: ControlPatientRequest):
     """Generate meal plan for patient control (Motor 2)"""
     try:
-        # Try to get recipes from ChromaDB first
-        recipes_formatted = None
-        if chromadb_service.collection:
-            recipes_formatted = chromadb_service.get_all_recipes()
-        
-        # If ChromaDB is not available or returns empty, use RecipeManager
-        if not recipes_formatted or recipes_formatted == "No hay recetas disponibles en ChromaDB":
-            # Get all recipes from RecipeManager
-            all_recipes = recipe_manager.get_all_recipes()
-            # Format them for the prompt
-            recipes_formatted = prompt_generator.format_recipes_by_meal_type({
-                "general": all_recipes[:50]  # Limit to 50 recipes to avoid token limits
-            })
-        
-        # Generate prompt
-        prompt = prompt_generator.generate_motor2_prompt(
-            control_data=request,
-            previous_plan=request.plan_anterior,
-            recipes_json=recipes_formatted
-        )
-        
-        # Generate plan with OpenAI
-        meal_plan = await openai_service.generate_meal_plan(prompt)
-        
-        # Post-process meal plan
-        processed_meal_plan = meal_plan_processor.process_meal_plan(meal_plan)
-        processed_meal_plan = meal_plan_processor.add_recipe_appendix(processed_meal_plan)
-        
-        # Generate PDF
-        pdf_path = pdf_generator.generate_pdf(
-            meal_plan=processed_meal_plan,
-            patient_name=request.nombre,
-            plan_type="control"
-        )
-        
-        return MealPlanResponse(
-            meal_plan=processed_meal_plan,
-            pdf_path=pdf_path
-        )
-        
+        return await meal_plan_pipeline.generate_control_plan(request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -211,74 +192,70 @@ async def generate_control_plan(request: ControlPatientRequest):
 async def replace_meal(request: MealReplacementRequest):
     """Replace specific meal maintaining macros (Motor 3)"""
     try:
-        # Search for replacement options
-        replacement_options = None
-        
-        # Try ChromaDB first if available
-        if chromadb_service.collection:
-            replacement_options = chromadb_service.search_similar_meals(
-                meal_type=request.comida_reemplazar,
-                new_meal_description=request.nueva_comida,
-                target_macros={
-                    "proteinas": request.proteinas,
-                    "carbohidratos": request.carbohidratos,
-                    "grasas": request.grasas,
-                    "calorias": request.calorias
-                }
-            )
-        
-        # If ChromaDB is not available, use RecipeManager
-        if not replacement_options:
-            # Get recipes for the specific meal type
-            meal_type_recipes = recipe_manager.get_recipes_by_meal_type(request.comida_reemplazar)
-            # Filter by macros similarity
-            filtered_recipes = []
-            for recipe in meal_type_recipes:
-                # Simple macro similarity check
-                protein_diff = abs(recipe.get('proteinas_aprox', 0) - request.proteinas)
-                carb_diff = abs(recipe.get('carbohidratos_aprox', 0) - request.carbohidratos)
-                fat_diff = abs(recipe.get('grasas_aprox', 0) - request.grasas)
-                
-                # Allow 20% tolerance
-                if (protein_diff <= request.proteinas * 0.2 and
-                    carb_diff <= request.carbohidratos * 0.2 and
-                    fat_diff <= request.grasas * 0.2):
-                    filtered_recipes.append(recipe)
-            
-            # Format for prompt
-            replacement_options = prompt_generator.format_recipes_by_meal_type({
-                request.comida_reemplazar: filtered_recipes[:10]
-            })
-        
-        # Generate prompt
-        prompt = prompt_generator.generate_motor3_prompt(
-            meal_data=request,
-            current_meal=request.comida_actual,
-            recipes_json=replacement_options
-        )
-        
-        # Generate replacement with OpenAI
-        meal_plan = await openai_service.generate_meal_plan(prompt)
-        
-        # Post-process meal plan
-        processed_meal_plan = meal_plan_processor.process_meal_plan(meal_plan)
-        processed_meal_plan = meal_plan_processor.add_recipe_appendix(processed_meal_plan)
-        
-        # Generate PDF
-        pdf_path = pdf_generator.generate_pdf(
-            meal_plan=processed_meal_plan,
-            patient_name=request.paciente,
-            plan_type="reemplazo"
-        )
-        
-        return MealPlanResponse(
-            meal_plan=processed_meal_plan,
-            pdf_path=pdf_path
-        )
-        
+        return await meal_plan_pipeline.replace_meal(request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _format_sse(event: str, data: Dict) -> str:
+    """Serialize one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/api/meal-plans/new-patient/stream")
+async def stream_new_patient_plan(request: NewPatientRequest):
+    """Generate meal plan for new patient (Motor 1) streamed as Server-Sent Events"""
+    async def event_stream():
+        try:
+            async for event, data in meal_plan_pipeline.stream_new_patient_plan(request):
+                yield _format_sse(event, data)
+        except Exception as e:
+            logger.error(f"Error streaming meal plan: {e}")
+            yield _format_sse("error", {"detail": str(e)})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Keep nginx from buffering the stream
+        }
+    )
+
+async def _submit_job(job_type: JobType, request) -> JobCreatedResponse:
+    """Queue a generation job and build the 202 response body"""
+    try:
+        job = await job_manager.submit(job_type, request)
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    return JobCreatedResponse(
+        job_id=job.job_id,
+        status=job.status,
+        status_url=f"/api/jobs/{job.job_id}"
+    )
+
+@app.post("/api/jobs/new-patient", response_model=JobCreatedResponse, status_code=202)
+async def submit_new_patient_job(request: NewPatientRequest):
+    """Queue a Motor 1 generation job"""
+    return await _submit_job(JobType.new_patient, request)
+
+@app.post("/api/jobs/control", response_model=JobCreatedResponse, status_code=202)
+async def submit_control_job(request: ControlPatientRequest):
+    """Queue a Motor 2 generation job"""
+    return await _submit_job(JobType.control, request)
+
+@app.post("/api/jobs/replace-meal", response_model=JobCreatedResponse, status_code=202)
+async def submit_replace_meal_job(request: MealReplacementRequest):
+    """Queue a Motor 3 generation job"""
+    return await _submit_job(JobType.replace_meal, request)
+
+@app.get("/api/jobs/{job_id}", response_model=JobRecord)
+async def get_job(job_id: str):
+    """Get status, stage timings and result of a generation job"""
+    job = await job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @app.get("/api/meal-plans/download/{filename}")
 async def download_pdf(filename: str):
     """Download generated PDF"""
@@ -0,0 +1,31 @@
+from pydantic import BaseModel, Field
+from typing import Dict, Optional
+from enum import Enum
+from .meal_plan import MealPlanResponse
+
+class JobType(str, Enum):
+    new_patient = "new_patient"      # Motor 1
+    control = "control"              # Motor 2
+    replace_meal = "replace_meal"    # Motor 3
+
+class JobStatus(str, Enum):
+    pending = "pending"
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+
+class JobRecord(BaseModel):
+    job_id: str
+    job_type: JobType
+    status: JobStatus = JobStatus.pending
+    created_at: float = Field(..., description="Epoch seconds when the job was queued")
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    stage_timings: Dict[str, float] = Field(default_factory=dict, description="Duración de cada etapa en segundos")
+    result: Optional[MealPlanResponse] = None
+    error: Optional[str] = None
+
+class JobCreatedResponse(BaseModel):
+    job_id: str
+    status: JobStatus
+    status_url: str = Field(..., description="URL para consultar el estado del job")
@@ -248,6 +248,48 @@ class MealReplacementRequest(BaseModel):
     
     tipo_peso: TipoPeso = TipoPeso.crudo
 
+# Plan estructurado (respuesta JSON del LLM)
+class PlanIngredient(BaseModel):
+    item: str
+    cantidad: str = Field(..., description="Cantidad ajustada, ej: 120g")
+
+class PlanMacros(BaseModel):
+    proteinas: float = Field(..., ge=0)
+    carbohidratos: float = Field(..., ge=0)
+    grasas: float = Field(..., ge=0)
+    calorias: float = Field(..., ge=0)
+    
+    @property
+    def all_zero(self) -> bool:
+        return not (self.proteinas or self.carbohidratos or self.grasas or self.calorias)
+
+class PlanOption(BaseModel):
+    receta_id: str = Field(..., pattern=r'^REC_\d{4}$', description="ID de la receta del catálogo")
+    nombre: str
+    ingredientes: List[PlanIngredient] = Field(..., min_length=1)
+    preparacion: Optional[str] = None
+    macros: PlanMacros
+
+class PlanMeal(BaseModel):
+    comida: str = Field(..., description="DESAYUNO, ALMUERZO, MERIENDA, CENA, COLACIÓN...")
+    nota: Optional[str] = Field(None, description="Aclaración de la comida, ej: 2 hs post medicación")
+    opciones: List[PlanOption] = Field(..., min_length=1)
+
+class StructuredMealPlan(BaseModel):
+    titulo: str = "PLAN ALIMENTARIO - 3 DÍAS IGUALES"
+    comidas: List[PlanMeal] = Field(..., min_length=1)
+    suplementacion: List[str] = Field(default_factory=list)
+    recomendaciones: List[str] = Field(default_factory=list)
+    cambios: List[str] = Field(default_factory=list, description="Cambios implementados (Motor 2)")
+    
+    def recipe_ids(self) -> List[str]:
+        """IDs de receta usados, en orden de aparición y sin repetir"""
+        return list(dict.fromkeys(
+            option.receta_id for meal in self.comidas for option in meal.opciones
+        ))
+
 class MealPlanResponse(BaseModel):
     meal_plan: str = Field(..., description="Plan generado en formato texto")
-    pdf_path: str = Field(..., description="Ruta al PDF generado")
\ No newline at end of file
+    plan: Optional[StructuredMealPlan] = Field(None, description="Plan estructurado (salida JSON del LLM)")
+    pdf_path: str = Field(..., description="Ruta al PDF generado")
+    validation_errors: List[str] = Field(default_factory=list, description="Reglas que el plan armado localmente no cumple")
\ No newline at end of file
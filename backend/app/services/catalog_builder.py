@@ -0,0 +1,108 @@
+import logging
+import re
+from typing import Dict, List, Optional, Set
+from ..schemas.meal_plan import ControlPatientRequest
+from .prompt_generator import PromptGenerator, estimate_tokens
+from .recipe_manager import RecipeManager
+
+logger = logging.getLogger(__name__)
+
+# Recipes already in the previous plan rank above new ones matching AGREGAR/DEJAR
+PREVIOUS_PLAN_BONUS = 8.0
+PREVIOUS_PLAN_ID_PATTERN = re.compile(r'\b(REC_\d{4})\b')
+
+
+class CatalogBuilder:
+    """Selects the Motor 2 recipe catalog within a prompt token budget.
+
+    Recipes are ranked per meal type for the control request: those the
+    patient asked to remove (SACAR) are dropped, recipes from the previous
+    plan come first, then the ones matching AGREGAR/DEJAR. Meal types take
+    turns adding their next best recipe while it fits in the budget, so every
+    meal type keeps options however small the budget is.
+    """
+
+    def __init__(
+        self,
+        recipe_manager: RecipeManager,
+        prompt_generator: PromptGenerator,
+        token_budget: int = 6000
+    ):
+        self.recipe_manager = recipe_manager
+        self.prompt_generator = prompt_generator
+        self.token_budget = token_budget
+        self._entry_tokens: Dict[str, int] = {}
+
+    def build(self, request: ControlPatientRequest) -> str:
+        """Recipe catalog for a control prompt, formatted by meal type"""
+        ranked = self.rank_recipes(request)
+        selected = self.pack(ranked)
+
+        catalog = self.prompt_generator.format_recipe_catalog(selected)
+        logger.info(
+            f"Motor 2 catalog: {sum(len(recipes) for recipes in selected.values())} recipes, "
+            f"~{estimate_tokens(catalog)} tokens (budget {self.token_budget})"
+        )
+        return catalog
+
+    def rank_recipes(self, request: ControlPatientRequest) -> Dict[str, List[Dict]]:
+        """Recipes of each meal type, best first, without the ones to remove"""
+        previous_ids = set(PREVIOUS_PLAN_ID_PATTERN.findall(request.plan_anterior or ""))
+        preferences = ", ".join(text for text in (request.agregar, request.dejar) if text)
+
+        ranked = {}
+        for meal_type, recipes in self.recipe_manager.recipes_by_meal_type.items():
+            if not recipes:
+                continue
+            scores = self.recipe_manager.score_recipes(
+                recipes,
+                restrictions=request.sacar,
+                preferences=preferences
+            )
+            for position, recipe in enumerate(scores.recipes):
+                if recipe['id'] in previous_ids:
+                    scores.total[position] += PREVIOUS_PLAN_BONUS
+            ranked[meal_type] = scores.ranked()
+        return ranked
+
+    def pack(self, ranked: Dict[str, List[Dict]], token_budget: Optional[int] = None) -> Dict[str, List[Dict]]:
+        """Take the best recipes of each meal type in turns until the budget is spent"""
+        remaining = self.token_budget if token_budget is None else token_budget
+        selected: Dict[str, List[Dict]] = {meal_type: [] for meal_type in ranked}
+        used: Set[str] = set()
+        positions = {meal_type: 0 for meal_type in ranked}
+
+        while any(positions[meal_type] < len(recipes) for meal_type, recipes in ranked.items()):
+            for meal_type, recipes in ranked.items():
+                # Next recipe of this meal type not already offered elsewhere
+                while positions[meal_type] < len(recipes) and recipes[positions[meal_type]]['id'] in used:
+                    positions[meal_type] += 1
+                if positions[meal_type] == len(recipes):
+                    continue
+
+                recipe = recipes[positions[meal_type]]
+                positions[meal_type] += 1
+                cost = self._recipe_tokens(recipe)
+                if not selected[meal_type]:
+                    cost += self._section_tokens(meal_type)
+                if cost > remaining:
+                    continue
+
+                selected[meal_type].append(recipe)
+                used.add(recipe['id'])
+                remaining -= cost
+
+        return {meal_type: recipes for meal_type, recipes in selected.items() if recipes}
+
+    def _recipe_tokens(self, recipe: Dict) -> int:
+        tokens = self._entry_tokens.get(recipe['id'])
+        if tokens is None:
+            tokens = self.prompt_generator.recipe_entry_tokens(recipe)
+            self._entry_tokens[recipe['id']] = tokens
+        return tokens
+
+    def _section_tokens(self, meal_type: str) -> int:
+        # Header text the catalog adds with a meal type's first recipe
+        placeholder = {"id": "", "nombre": ""}
+        section = self.prompt_generator.format_recipe_catalog({meal_type: [placeholder]})
+        return max(estimate_tokens(section) - self.prompt_generator.recipe_entry_tokens(placeholder), 0)
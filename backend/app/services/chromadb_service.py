@@ -1,28 +1,125 @@
 import chromadb
-from chromadb.utils import embedding_functions
+import openai
 import json
-import os
 import logging
 from typing import List, Dict, Optional, Set
 from ..config import settings
 from ..schemas.meal_plan import NivelEconomico
 from ..data.pathologies import (
     detect_pathologies_from_text,
-    get_all_dietary_restrictions,
-    get_recipe_tags_to_avoid,
     get_recipe_tags_to_prefer,
     get_pregnancy_info
 )
 from ..utils.pregnancy import PregnancyManager
+from .recipe_manager import RecipeManager
+from .pathology_filter import RecipeFilter, compile_recipe_filter
+from .embedding_cache import CachedEmbeddingFunction
+from .http_clients import HTTPClients
+from .local_vector_index import LocalCollection
+from .recipe_sync import SyncReport, sync_recipes
+from .prompt_generator import format_recipes_compact
+from .tracing import record_llm_usage
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+VECTOR_BACKENDS = ("chroma", "local", "auto")
+
+
+def build_recipe_document(recipe: Dict) -> str:
+    """Searchable text embedded for a recipe"""
+    ingredients_text = ", ".join([
+        f"{ing['cantidad']} de {ing['item']}"
+        for ing in recipe.get('ingredientes', [])
+    ])
+    
+    return f"""
+            Receta: {recipe['nombre']}
+            Tipo de comida: {', '.join(recipe.get('tipo_comida', []))}
+            Ingredientes: {ingredients_text}
+            Preparación: {recipe.get('preparacion', '')}
+            Información nutricional: {recipe.get('calorias_aprox', 0)} calorías,
+            {recipe.get('proteinas_aprox', 0)}g proteínas,
+            {recipe.get('carbohidratos_aprox', 0)}g carbohidratos,
+            {recipe.get('grasas_aprox', 0)}g grasas
+            Apto para: {', '.join(recipe.get('apto_para', []))}
+            Tags: {', '.join(recipe.get('tags', []))}
+            """
+
+
+def build_recipe_metadata(recipe: Dict) -> Dict:
+    """Metadata stored next to a recipe's embedding"""
+    return {
+        "recipe_id": recipe['id'],
+        "nombre": recipe['nombre'],
+        "tipo_comida": ",".join(recipe.get('tipo_comida', [])),
+        "calorias": recipe.get('calorias_aprox', 0),
+        "proteinas": recipe.get('proteinas_aprox', 0),
+        "carbohidratos": recipe.get('carbohidratos_aprox', 0),
+        "grasas": recipe.get('grasas_aprox', 0),
+        "tiempo_preparacion": recipe.get('tiempo_preparacion', 0),
+        "apto_para": ",".join(recipe.get('apto_para', [])),
+        "tags": ",".join(recipe.get('tags', []))
+    }
+
+
+class OpenAIEmbeddings:
+    """ChromaDB embedding function calling the OpenAI embeddings API
+
+    Same requests as chromadb's OpenAIEmbeddingFunction, but on a client
+    that can share the pooled HTTP connections of the rest of the app.
+    """
+
+    def __init__(self, client: openai.OpenAI, model_name: str = EMBEDDING_MODEL):
+        self.client = client
+        self.model_name = model_name
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        # Newlines degrade embedding quality
+        texts = [text.replace("\n", " ") for text in input]
+        response = self.client.embeddings.create(input=texts, model=self.model_name)
+        if response.usage:
+            record_llm_usage(self.model_name, response.usage.prompt_tokens, 0)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+def create_embedding_function(http_clients: Optional[HTTPClients] = None):
+    """OpenAI embedding function, behind the query-embedding cache when enabled"""
+    if http_clients:
+        client = openai.OpenAI(
+            api_key=settings.openai_api_key,
+            http_client=http_clients.sync_client(),
+            timeout=http_clients.timeout("embeddings")
+        )
+    else:
+        client = openai.OpenAI(api_key=settings.openai_api_key)
+    embedding_function = OpenAIEmbeddings(client, EMBEDDING_MODEL)
+    if settings.embedding_cache_enabled:
+        embedding_function = CachedEmbeddingFunction(
+            embedding_function,
+            model_name=EMBEDDING_MODEL,
+            max_entries=settings.embedding_cache_max_entries,
+            disk_dir=settings.embedding_cache_dir,
+            max_disk_entries=settings.embedding_cache_max_disk_entries
+        )
+    return embedding_function
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 class ChromaDBService:
-    def __init__(self):
+    def __init__(
+        self,
+        recipe_manager: Optional[RecipeManager] = None,
+        http_clients: Optional[HTTPClients] = None
+    ):
         self.client = None
         self.collection = None
         self.embedding_function = None
+        # Catalog that search results are resolved against by recipe ID,
+        # also used to check their macros in one pass
+        self.recipe_manager = recipe_manager or RecipeManager()
+        self.recipe_manager.fragments.register("search_result", self._render_recipe)
+        # Shared connection pools (the default clients are used without them)
+        self.http_clients = http_clients
         
         # Ingredientes caros por categoría (del proyecto anterior)
         self.expensive_ingredients = {
@@ -49,6 +146,40 @@ class ChromaDBService:
         }
         
     def initialize(self):
+        """Initialize the recipe vector search backend selected in settings"""
+        backend = settings.vector_backend
+        if backend not in VECTOR_BACKENDS:
+            logger.warning(f"Unknown vector backend '{backend}', using 'chroma'")
+            backend = "chroma"
+        
+        if backend == "local":
+            self._initialize_local()
+            return
+        
+        self._initialize_chroma()
+        if not self.collection and backend == "auto":
+            logger.info("ChromaDB unavailable, falling back to the local vector index")
+            self._initialize_local()
+    
+    def _initialize_local(self):
+        """Open the precomputed in-process vector index"""
+        try:
+            self.embedding_function = create_embedding_function(self.http_clients)
+            self.collection = LocalCollection(
+                settings.local_vector_index_dir,
+                embedding_function=self.embedding_function,
+                model_name=EMBEDDING_MODEL
+            )
+            logger.info(
+                f"Local vector index loaded from {settings.local_vector_index_dir} "
+                f"({self.collection.count()} recipes)"
+            )
+        except Exception as e:
+            logger.error(f"Error loading local vector index: {e}")
+            logger.warning("App will continue without semantic recipe search")
+            self.collection = None
+    
+    def _initialize_chroma(self):
         """Initialize ChromaDB client and collection"""
         try:
             # Try different connection methods for ChromaDB compatibility
@@ -76,11 +207,13 @@ class ChromaDBService:
                     self.client = chromadb.HttpClient()
                     logger.info("Connected to ChromaDB with default settings")
             
+            # Reuse ChromaDB connections (and time out hung requests)
+            session = getattr(getattr(self.client, "_server", None), "_session", None)
+            if self.http_clients and session is not None:
+                self.http_clients.configure_session(session)
+            
             # Setup embedding function
-            self.embedding_function = embedding_functions.OpenAIEmbeddingFunction(
-                api_key=settings.openai_api_key,
-                model_name="text-embedding-ada-002"
-            )
+            self.embedding_function = create_embedding_function(self.http_clients)
             
             # Get or create collection
             self.collection = self.client.get_or_create_collection(
@@ -88,9 +221,9 @@ class ChromaDBService:
                 embedding_function=self.embedding_function
             )
             
-            # Check if collection is empty and load recipes if needed
-            if self.collection.count() == 0:
-                self._load_recipes_from_json()
+            # Embed new or changed catalog recipes; always load an empty collection
+            if settings.recipe_sync_on_startup or self.collection.count() == 0:
+                self.sync_catalog()
                 
             logger.info("ChromaDB initialized successfully")
                 
@@ -101,64 +234,28 @@ class ChromaDBService:
             self.client = None
             self.collection = None
     
-    def _load_recipes_from_json(self):
-        """Load recipes from JSON file into ChromaDB"""
-        json_path = os.path.join(os.path.dirname(__file__), "../../data/recipes_structured.json")
-        
-        if not os.path.exists(json_path):
-            logger.warning(f"Recipes file not found at {json_path}")
-            return
-            
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            
-        documents = []
-        metadatas = []
-        ids = []
-        
-        for recipe in data.get('recipes', []):
-            # Create searchable text
-            ingredients_text = ", ".join([
-                f"{ing['cantidad']} de {ing['item']}"
-                for ing in recipe.get('ingredientes', [])
-            ])
-            
-            document = f"""
-            Receta: {recipe['nombre']}
-            Tipo de comida: {', '.join(recipe.get('tipo_comida', []))}
-            Ingredientes: {ingredients_text}
-            Preparación: {recipe.get('preparacion', '')}
-            Información nutricional: {recipe.get('calorias_aprox', 0)} calorías,
-            {recipe.get('proteinas_aprox', 0)}g proteínas,
-            {recipe.get('carbohidratos_aprox', 0)}g carbohidratos,
-            {recipe.get('grasas_aprox', 0)}g grasas
-            Apto para: {', '.join(recipe.get('apto_para', []))}
-            Tags: {', '.join(recipe.get('tags', []))}
-            """
-            
-            documents.append(document)
-            ids.append(recipe['id'])
-            metadatas.append({
-                "recipe_id": recipe['id'],
-                "nombre": recipe['nombre'],
-                "tipo_comida": ",".join(recipe.get('tipo_comida', [])),
-                "calorias": recipe.get('calorias_aprox', 0),
-                "proteinas": recipe.get('proteinas_aprox', 0),
-                "carbohidratos": recipe.get('carbohidratos_aprox', 0),
-                "grasas": recipe.get('grasas_aprox', 0),
-                "tiempo_preparacion": recipe.get('tiempo_preparacion', 0),
-                "apto_para": ",".join(recipe.get('apto_para', [])),
-                "tags": ",".join(recipe.get('tags', [])),
-                "recipe_json": json.dumps(recipe, ensure_ascii=False)
-            })
-        
-        if documents:
-            self.collection.add(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
-            logger.info(f"Loaded {len(documents)} recipes into ChromaDB")
+    def sync_catalog(self, dry_run: bool = False) -> SyncReport:
+        """Upsert new or changed catalog recipes into ChromaDB and delete removed ones"""
+        report = sync_recipes(
+            self.collection,
+            self.recipe_manager.recipes_by_id.values(),
+            build_document=build_recipe_document,
+            build_metadata=build_recipe_metadata,
+            embedding_function=self.embedding_function,
+            batch_size=settings.recipe_sync_batch_size,
+            max_concurrency=settings.recipe_sync_concurrency,
+            requests_per_minute=settings.recipe_sync_requests_per_minute,
+            dry_run=dry_run
+        )
+        if report.changed or report.failed:
+            logger.info(f"Recipe catalog synced to ChromaDB: {report.summary()}")
+        return report
+    
+    def get_embedding_cache_stats(self) -> Dict:
+        """Hit/miss counters of the query-embedding cache"""
+        if not isinstance(self.embedding_function, CachedEmbeddingFunction):
+            return {"enabled": False}
+        return {"enabled": True, **self.embedding_function.get_stats()}
     
     def search_recipes(
         self,
@@ -220,18 +317,17 @@ class ChromaDBService:
         # Search recipes
         results = self.collection.query(
             query_texts=[query_text] if query_text else ["recetas saludables"],
-            n_results=n_results
+            n_results=n_results,
+            include=["metadatas"]
         )
         
         # Filter results based on restrictions
+        recipe_filter = self._compile_filter(patient_restrictions, economic_level, patologias)
         filtered_recipes = []
         
-        for i, metadata in enumerate(results['metadatas'][0]):
-            recipe_json = json.loads(metadata['recipe_json'])
-            
+        for recipe_json in self._resolve_recipes(results['metadatas'][0]):
             # Skip recipe if doesn't pass filters
-            if not self._passes_filters(recipe_json, patient_restrictions, 
-                                      economic_level, patologias):
+            if not recipe_filter.passes(recipe_json):
                 continue
             
             filtered_recipes.append(recipe_json)
@@ -256,30 +352,41 @@ class ChromaDBService:
         # Search based on meal type and description
         query = f"Receta para {meal_type} similar a {new_meal_description}"
         
+        where = self._meal_type_filter(meal_type)
+        if where is None:
+            return self._format_recipes_for_prompt([], meal_type)
         results = self.collection.query(
             query_texts=[query],
-            n_results=30,
-            where={"tipo_comida": {"$contains": meal_type}}
+            n_results=min(30, len(where["recipe_id"]["$in"])),
+            where=where,
+            include=["metadatas"]
         )
         
-        # Filter by macro similarity
+        # Filter by macro similarity, keeping the search's relevance order
+        within = self.recipe_manager.index.within_tolerance(target_macros, tolerance)
+        
         similar_recipes = []
         
-        for i, metadata in enumerate(results['metadatas'][0]):
-            recipe_json = json.loads(metadata['recipe_json'])
-            
-            # Check if macros are within tolerance
-            protein_diff = abs(recipe_json.get('proteinas_aprox', 0) - target_macros['proteinas'])
-            carb_diff = abs(recipe_json.get('carbohidratos_aprox', 0) - target_macros['carbohidratos'])
-            fat_diff = abs(recipe_json.get('grasas_aprox', 0) - target_macros['grasas'])
-            
-            # Allow 20% tolerance
-            if (protein_diff <= target_macros['proteinas'] * tolerance and
-                carb_diff <= target_macros['carbohidratos'] * tolerance and
-                fat_diff <= target_macros['grasas'] * tolerance):
+        for recipe_json in self._resolve_recipes(results['metadatas'][0]):
+            row = self.recipe_manager.index.row_of_id(recipe_json['id'])
+            if row is not None:
+                if within[row]:
+                    similar_recipes.append(recipe_json)
+            elif self._within_tolerance(recipe_json, target_macros, tolerance):
                 similar_recipes.append(recipe_json)
+            
+            if len(similar_recipes) == 10:
+                break
         
-        return self._format_recipes_for_prompt(similar_recipes[:10])
+        return self._format_recipes_for_prompt(similar_recipes, meal_type)
+    
+    @staticmethod
+    def _within_tolerance(recipe: Dict, target_macros: Dict[str, float], tolerance: float) -> bool:
+        """Check a recipe outside the catalog index against the target macros"""
+        return all(
+            abs(recipe.get(f'{macro}_aprox', 0) - target_macros[macro]) <= target_macros[macro] * tolerance
+            for macro in ('proteinas', 'carbohidratos', 'grasas')
+        )
     
     def search_recipes_by_meal_type(
         self,
@@ -298,40 +405,30 @@ class ChromaDBService:
             return {}
         
         result = {}
+        recipe_filter = self._compile_filter(patient_restrictions, economic_level, patologias)
         
+        # One query per meal type, embedded together
+        query_texts = []
         for meal_type in meal_types:
-            # Build query for this meal type
             query_text = f"Recetas para {meal_type}"
             if preferences:
                 query_text += f" con {preferences}"
-            
-            # Search with meal type filter
-            try:
-                results = self.collection.query(
-                    query_texts=[query_text],
-                    n_results=n_results_per_type * 2,  # Get extra to account for filtering
-                    where={"tipo_comida": {"$contains": meal_type}}
-                )
-            except:
-                # Fallback if where clause not supported
-                results = self.collection.query(
-                    query_texts=[query_text],
-                    n_results=n_results_per_type * 2
-                )
-            
+            query_texts.append(query_text)
+        
+        # Get extra to account for filtering
+        metadatas_by_type = self._query_by_meal_type(meal_types, query_texts, n_results_per_type * 2)
+        
+        for meal_type in meal_types:
             # Filter results
             filtered_recipes = []
             
-            for i, metadata in enumerate(results['metadatas'][0]):
-                recipe_json = json.loads(metadata['recipe_json'])
-                
+            for recipe_json in self._resolve_recipes(metadatas_by_type[meal_type]):
                 # Check if recipe is actually for this meal type
                 if meal_type not in recipe_json.get('tipo_comida', []):
                     continue
                 
                 # Skip if doesn't pass filters
-                if not self._passes_filters(recipe_json, patient_restrictions, 
-                                          economic_level, patologias):
+                if not recipe_filter.passes(recipe_json):
                     continue
                 
                 filtered_recipes.append(recipe_json)
@@ -346,6 +443,56 @@ class ChromaDBService:
         
         return result
     
+    def _query_by_meal_type(
+        self,
+        meal_types: List[str],
+        query_texts: List[str],
+        n_results: int
+    ) -> Dict[str, List[Dict]]:
+        """Run one query per meal type, returning the metadatas of each
+        
+        The query texts are embedded in a single request, and each meal type
+        is queried with its embedding, restricted to the catalog's recipes of
+        that type. If a filtered query fails, that type is queried over the
+        whole collection with the same embedding and its recipes are picked
+        out by the caller.
+        """
+        embeddings = self.embedding_function(query_texts)
+        
+        metadatas_by_type = {}
+        for meal_type, embedding in zip(meal_types, embeddings):
+            where = self._meal_type_filter(meal_type)
+            if where is None:
+                metadatas_by_type[meal_type] = []
+                continue
+            try:
+                results = self.collection.query(
+                    query_embeddings=[embedding],
+                    n_results=min(n_results, len(where["recipe_id"]["$in"])),
+                    where=where,
+                    include=["metadatas"]
+                )
+            except Exception as e:
+                logger.warning(f"Filtered query for {meal_type} failed, searching the whole collection: {e}")
+                results = self.collection.query(
+                    query_embeddings=[embedding],
+                    n_results=self.collection.count(),
+                    include=["metadatas"]
+                )
+            metadatas_by_type[meal_type] = results['metadatas'][0]
+        return metadatas_by_type
+    
+    def _meal_type_filter(self, meal_type: str) -> Optional[Dict]:
+        """Chroma where clause matching the catalog's recipes of a meal type
+        
+        Metadata only holds the meal types as a joined string, which Chroma
+        can't filter by substring, so the filter lists the recipe IDs.
+        """
+        recipe_ids = [recipe['id'] for recipe in self.recipe_manager.get_recipes_by_meal_type(meal_type)]
+        if not recipe_ids:
+            return None
+        return {"recipe_id": {"$in": recipe_ids}}
+    
     def get_all_recipes(self) -> str:
         """Get all recipes formatted for prompt"""
         # If ChromaDB is not available, return empty string
@@ -353,111 +500,37 @@ class ChromaDBService:
             logger.warning("ChromaDB not available, returning empty recipes")
             return "No hay recetas disponibles en ChromaDB"
         
-        results = self.collection.get()
-        
-        recipes = []
-        for metadata in results['metadatas']:
-            recipe_json = json.loads(metadata['recipe_json'])
-            recipes.append(recipe_json)
+        results = self.collection.get(include=["metadatas"])
+        recipes = self._resolve_recipes(results['metadatas'])
         
         return self._format_recipes_for_prompt(recipes)
     
-    def _passes_filters(
-        self, 
-        recipe: Dict,
+    def _resolve_recipes(self, metadatas: List[Dict]) -> List[Dict]:
+        """Full recipes for search results, looked up by recipe ID in the catalog
+        
+        Collections loaded before recipes were stored by ID alone still carry
+        a recipe_json copy, used for IDs the catalog does not know.
+        """
+        recipes = []
+        for metadata in metadatas:
+            recipe = self.recipe_manager.get_recipe_by_id(metadata['recipe_id'])
+            if recipe is None and 'recipe_json' in metadata:
+                recipe = json.loads(metadata['recipe_json'])
+            if recipe is None:
+                logger.debug(f"Recipe {metadata['recipe_id']} not in the catalog, skipping")
+                continue
+            recipes.append(recipe)
+        return recipes
+    
+    def _compile_filter(
+        self,
         restrictions: Optional[str],
         economic_level: str,
         patologias: Optional[str]
-    ) -> bool:
-        """Check if recipe passes all filters"""
-        
-        ingredients = recipe.get('ingredientes', [])
-        ingredients_text = " ".join([ing['item'].lower() for ing in ingredients])
-        
-        # Check dietary restrictions
-        if restrictions:
-            restriction_list = [r.strip().lower() for r in restrictions.split(',')]
-            for restriction in restriction_list:
-                if restriction in ingredients_text:
-                    return False
-        
-        # Check economic level
-        if economic_level in [NivelEconomico.bajo_recursos.value, NivelEconomico.limitado.value]:
-            # Check if contains expensive ingredients
-            all_expensive = []
-            for category_items in self.expensive_ingredients.values():
-                all_expensive.extend(category_items)
-            
-            for expensive_item in all_expensive:
-                if expensive_item.lower() in ingredients_text:
-                    return False
-        
-        # Check pathology-specific restrictions using new structure
-        if patologias:
-            detected_pathologies = detect_pathologies_from_text(patologias)
-            
-            # Obtener todas las restricciones dietéticas
-            all_restrictions = get_all_dietary_restrictions(detected_pathologies)
-            
-            # Verificar cada restricción
-            for restriction in all_restrictions:
-                restriction_lower = restriction.lower()
-                
-                # Mapeo de restricciones a ingredientes específicos
-                restriction_ingredients = {
-                    'azúcar refinada': ['azúcar', 'azucar'],
-                    'miel': ['miel'],
-                    'dulces': ['dulce', 'mermelada', 'chocolate', 'caramelo'],
-                    'bebidas azucaradas': ['gaseosa', 'jugo envasado', 'bebida azucarada'],
-                    'harinas blancas': ['harina blanca', 'harina 000', 'harina 0000'],
-                    'harinas refinadas': ['harina blanca', 'pan blanco', 'galletas'],
-                    'alcohol': ['vino', 'cerveza', 'licor', 'alcohol'],
-                    'embutidos': ['salame', 'mortadela', 'bondiola', 'jamón crudo'],
-                    'sal de mesa': ['sal'],
-                    'quesos duros': ['queso parmesano', 'queso reggianito', 'queso sardo'],
-                    'lácteos no pasteurizados': ['leche cruda', 'queso artesanal'],
-                    'carnes crudas': ['carpaccio', 'steak tartar', 'carne cruda'],
-                    'huevos crudos': ['huevo crudo', 'mayonesa casera'],
-                    'pescados alto mercurio': ['pez espada', 'tiburón', 'caballa rey'],
-                    'gluten': ['harina', 'pan', 'fideos', 'pasta', 'galletas', 'cebada', 'centeno'],
-                    'trigo': ['harina de trigo', 'pan', 'pasta', 'galletas'],
-                    'soja en exceso': ['soja texturizada', 'leche de soja', 'tofu'],
-                    'frituras': ['frito', 'fritura'],
-                    'grasas trans': ['margarina', 'grasa vegetal hidrogenada'],
-                    'alimentos ultraprocesados': ['snacks', 'galletitas industriales'],
-                    'cafeína excesiva': ['café', 'té negro', 'mate', 'bebidas energizantes']
-                }
-                
-                # Verificar si algún ingrediente restringido está presente
-                if restriction_lower in restriction_ingredients:
-                    for ingredient in restriction_ingredients[restriction_lower]:
-                        if ingredient in ingredients_text:
-                            return False
-                elif restriction_lower in ingredients_text:
-                    # Si no hay mapeo específico, buscar la restricción directamente
-                    return False
-            
-            # Verificar tags de recetas a evitar
-            avoid_tags = get_recipe_tags_to_avoid(detected_pathologies)
-            recipe_tags = [tag.lower() for tag in recipe.get('tags', [])]
-            
-            for avoid_tag in avoid_tags:
-                if avoid_tag in recipe_tags:
-                    return False
-            
-            # Verificaciones especiales para embarazo
-            pregnancy_info = get_pregnancy_info(detected_pathologies)
-            if pregnancy_info:
-                # Lista expandida de alimentos no seguros en embarazo
-                unsafe_pregnancy = [
-                    'sushi', 'ceviche', 'ostras', 'almejas crudas',
-                    'paté', 'foie gras', 'queso azul', 'queso brie',
-                    'queso camembert', 'brotes crudos', 'germinados'
-                ]
-                if any(unsafe in ingredients_text for unsafe in unsafe_pregnancy):
-                    return False
-        
-        return True
+    ) -> RecipeFilter:
+        """Compile the patient's filters once per search"""
+        expensive = [item for items in self.expensive_ingredients.values() for item in items]
+        return compile_recipe_filter(restrictions, economic_level, patologias, expensive)
     
     def _sort_recipes_by_relevance(
         self,
@@ -505,17 +578,22 @@ class ChromaDBService:
         scored_recipes.sort(key=lambda x: x[0], reverse=True)
         return [recipe for score, recipe in scored_recipes]
     
-    def _format_recipes_for_prompt(self, recipes: List[Dict]) -> str:
+    def _format_recipes_for_prompt(self, recipes: List[Dict], meal_type: str = "general") -> str:
         """Format recipes for inclusion in prompt"""
-        formatted = []
+        fragments = self.recipe_manager.fragments
+        if settings.prompt_catalog_format == "compact":
+            return format_recipes_compact({meal_type: recipes}, settings.prompt_catalog_include_preparation, fragments)
         
-        for recipe in recipes:
-            ing_list = "\n  ".join([
-                f"- {ing['item']}: {ing['cantidad']}"
-                for ing in recipe.get('ingredientes', [])
-            ])
-            
-            formatted.append(f"""
+        return "\n".join(fragments.get("search_result", recipe) for recipe in recipes)
+    
+    @staticmethod
+    def _render_recipe(recipe: Dict) -> str:
+        ing_list = "\n  ".join([
+            f"- {ing['item']}: {ing['cantidad']}"
+            for ing in recipe.get('ingredientes', [])
+        ])
+        
+        return f"""
 RECETA: {recipe['nombre']}
 ID: {recipe['id']}
 Tipo: {', '.join(recipe.get('tipo_comida', []))}
@@ -525,6 +603,4 @@ Preparación: {recipe.get('preparacion', '')}
 Nutrición: {recipe.get('calorias_aprox', 0)} kcal | P: {recipe.get('proteinas_aprox', 0)}g | C: {recipe.get('carbohidratos_aprox', 0)}g | G: {recipe.get('grasas_aprox', 0)}g
 Apto para: {', '.join(recipe.get('apto_para', []))}
 Tags: {', '.join(recipe.get('tags', []))}
-""")
-        
-        return "\n".join(formatted)
\ No newline at end of file
+"""
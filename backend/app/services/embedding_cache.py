@@ -0,0 +1,240 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Keys per "IN (...)" lookup, below SQLite's bound-parameter limit
+SQLITE_BATCH_SIZE = 500
+
+
+class EmbeddingStore:
+    """On-disk float32 embedding store shared by every worker on the host.
+
+    Vectors are appended to a flat float32 file and read back through a
+    read-only memory map; a SQLite table maps each key to its row in the
+    file. Appends happen inside a SQLite write transaction, which is the
+    cross-process lock, and the vector is flushed before the row becomes
+    visible, so readers never see a key without its vector.
+    """
+
+    def __init__(self, directory: str, name: str, max_entries: int = 100000):
+        os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self.vectors_path = os.path.join(directory, f"{name}.f32")
+        self.dimensions: Optional[int] = None
+
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.memmap] = None
+        self._full_logged = False
+        self._conn = sqlite3.connect(
+            os.path.join(directory, f"{name}.sqlite3"),
+            check_same_thread=False,
+            timeout=30,
+            isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Stored vectors for the keys that are present"""
+        if not keys:
+            return {}
+        with self._lock:
+            if self.dimensions is None:
+                # Set by the first worker that stores a vector
+                row = self._conn.execute("SELECT value FROM meta WHERE name = 'dimensions'").fetchone()
+                if row is None:
+                    return {}
+                self.dimensions = row[0]
+            rows = dict(self._select("SELECT key, row FROM embeddings WHERE key IN ({})", keys))
+            if not rows:
+                return {}
+            vectors = self._mapped(max(rows.values()) + 1)
+            return {key: np.array(vectors[row]) for key, row in rows.items()}
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        """Append vectors for keys not stored yet"""
+        if not items:
+            return
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._append(items)
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            except (OSError, sqlite3.Error, ValueError) as e:
+                logger.warning(f"Could not write embeddings to {self.vectors_path}: {e}")
+
+    def close(self):
+        with self._lock:
+            self._vectors = None
+            self._conn.close()
+
+    def _append(self, items: Dict[str, np.ndarray]):
+        # Caller holds the SQLite write lock
+        dimensions = self._stored_dimensions(len(next(iter(items.values()))))
+        existing = {key for (key,) in self._select("SELECT key FROM embeddings WHERE key IN ({})", list(items))}
+        new_items = [(key, vector) for key, vector in items.items() if key not in existing]
+
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        room = self.max_entries - count
+        if room < len(new_items):
+            if not self._full_logged:
+                logger.warning(f"Embedding store {self.vectors_path} is full ({self.max_entries} entries)")
+                self._full_logged = True
+            new_items = new_items[:max(room, 0)]
+        if not new_items:
+            return
+
+        # Rows follow the committed count; anything past it is a torn write to overwrite
+        block = np.stack([np.asarray(vector, dtype=np.float32) for _, vector in new_items])
+        if block.shape[1] != dimensions:
+            raise ValueError(f"expected {dimensions} dimensions, got {block.shape[1]}")
+        with open(self.vectors_path, "r+b" if os.path.exists(self.vectors_path) else "w+b") as f:
+            f.seek(count * dimensions * 4)
+            f.write(block.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self._conn.executemany(
+            "INSERT INTO embeddings (key, row) VALUES (?, ?)",
+            [(key, count + offset) for offset, (key, _) in enumerate(new_items)]
+        )
+
+    def _select(self, query: str, keys: Sequence[str]) -> List[tuple]:
+        results = []
+        for start in range(0, len(keys), SQLITE_BATCH_SIZE):
+            batch = list(keys[start:start + SQLITE_BATCH_SIZE])
+            results.extend(self._conn.execute(query.format(",".join("?" * len(batch))), batch).fetchall())
+        return results
+
+    def _stored_dimensions(self, dimensions: int) -> int:
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'dimensions'").fetchone()
+        if row is None:
+            self._conn.execute("INSERT INTO meta (name, value) VALUES ('dimensions', ?)", (dimensions,))
+            row = (dimensions,)
+        self.dimensions = row[0]
+        return self.dimensions
+
+    def _mapped(self, rows: int) -> np.memmap:
+        # Caller holds the lock; remap when another worker has grown the file
+        if self._vectors is None or len(self._vectors) < rows:
+            total = os.path.getsize(self.vectors_path) // (self.dimensions * 4)
+            self._vectors = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r", shape=(total, self.dimensions)
+            )
+        return self._vectors
+
+
+class CachedEmbeddingFunction:
+    """Chroma embedding function that caches another one's results.
+
+    Texts are keyed by model and content. A bounded in-memory LRU sits in
+    front of an optional EmbeddingStore, and only the texts missing from both
+    are sent to the wrapped function, in a single call.
+    """
+
+    def __init__(
+        self,
+        embedding_function: Callable[[List[str]], List[Sequence[float]]],
+        model_name: str,
+        max_entries: int = 2048,
+        disk_dir: Optional[str] = None,
+        max_disk_entries: int = 100000
+    ):
+        self.embedding_function = embedding_function
+        self.model_name = model_name
+        self.max_entries = max_entries
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0
+        }
+
+        self.store: Optional[EmbeddingStore] = None
+        if disk_dir:
+            store_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+            self.store = EmbeddingStore(disk_dir, store_name, max_entries=max_disk_entries)
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        keys = [self.make_key(self.model_name, text) for text in input]
+        found: Dict[str, np.ndarray] = {}
+
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+            self._stats["memory_hits"] += len(found)
+
+        pending = [key for key in dict.fromkeys(keys) if key not in found]
+        if pending and self.store is not None:
+            from_disk = self.store.get_many(pending)
+            with self._lock:
+                for key, vector in from_disk.items():
+                    self._store_memory(key, vector)
+                self._stats["disk_hits"] += len(from_disk)
+            found.update(from_disk)
+
+        missing = {key: text for key, text in zip(keys, input) if key not in found}
+        if missing:
+            embeddings = self.embedding_function(list(missing.values()))
+            computed = {
+                key: np.asarray(embedding, dtype=np.float32)
+                for key, embedding in zip(missing, embeddings)
+            }
+            with self._lock:
+                for key, vector in computed.items():
+                    self._store_memory(key, vector)
+                self._stats["misses"] += len(computed)
+            if self.store is not None:
+                self.store.put_many(computed)
+            found.update(computed)
+
+        return [found[key].tolist() for key in keys]
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        return hashlib.sha256(f"{model_name}\n{text}".encode("utf-8")).hexdigest()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+            lookups = hits + self._stats["misses"]
+            stats = {
+                **self._stats,
+                "hits": hits,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_enabled": self.store is not None
+            }
+        if self.store is not None:
+            stats["disk_entries"] = len(self.store)
+        return stats
+
+    def _store_memory(self, key: str, vector: np.ndarray):
+        # Caller must hold the lock
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
@@ -0,0 +1,132 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _StageStats:
+    """Counters for a single executor stage"""
+
+    def __init__(self, workers: int, mode: str):
+        self.workers = workers
+        self.mode = mode
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.active = 0
+        self.max_queue_depth = 0
+
+    @property
+    def active_workers(self) -> int:
+        # Process workers can't report back when they start, so assume the
+        # pool is saturated before anything waits in its queue
+        if self.mode == "process":
+            return min(self.in_flight, self.workers)
+        return self.active
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self.in_flight - self.active_workers)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "in_flight": self.in_flight,
+            "active": self.active_workers,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth
+        }
+
+
+class StageExecutor:
+    """Runs blocking pipeline stages on bounded worker pools, off the event loop.
+
+    Each stage (ChromaDB search, CPU-bound recipe/prompt work, PDF building)
+    gets its own pool so a burst of PDF builds cannot starve recipe searches.
+    """
+
+    def __init__(
+        self,
+        pool_sizes: Dict[str, int],
+        process_stages: Optional[Iterable[str]] = None
+    ):
+        process_stages = set(process_stages or [])
+        self._lock = threading.Lock()
+        self._pools: Dict[str, Executor] = {}
+        self._stats: Dict[str, _StageStats] = {}
+
+        for stage, workers in pool_sizes.items():
+            workers = max(1, int(workers))
+            if stage in process_stages:
+                self._pools[stage] = ProcessPoolExecutor(max_workers=workers)
+                mode = "process"
+            else:
+                self._pools[stage] = ThreadPoolExecutor(
+                    max_workers=workers,
+                    thread_name_prefix=f"stage-{stage}"
+                )
+                mode = "thread"
+            self._stats[stage] = _StageStats(workers, mode)
+
+    async def run(self, stage: str, func: Callable, *args, **kwargs) -> Any:
+        """Run func(*args, **kwargs) on the pool for the given stage"""
+        if stage not in self._pools:
+            raise ValueError(f"Unknown executor stage: {stage}")
+
+        stats = self._stats[stage]
+        call = functools.partial(func, *args, **kwargs)
+
+        if stats.mode == "thread":
+            # Threads see the caller's context vars (e.g. the request timings);
+            # a context can't be pickled, so process stages run without it
+            call = functools.partial(contextvars.copy_context().run, self._run_tracked, stats, call)
+
+        with self._lock:
+            stats.submitted += 1
+            stats.in_flight += 1
+            stats.max_queue_depth = max(stats.max_queue_depth, stats.queue_depth)
+
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self._pools[stage], call)
+        except BaseException:
+            with self._lock:
+                stats.in_flight -= 1
+                stats.failed += 1
+            raise
+
+        with self._lock:
+            stats.in_flight -= 1
+            stats.completed += 1
+        return result
+
+    def _run_tracked(self, stats: _StageStats, call: Callable) -> Any:
+        """Wrapper executed inside worker threads to track active workers"""
+        with self._lock:
+            stats.active += 1
+        try:
+            return call()
+        finally:
+            with self._lock:
+                stats.active -= 1
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get a snapshot of per-stage pool sizes and queue depths"""
+        with self._lock:
+            return {stage: stats.as_dict() for stage, stats in self._stats.items()}
+
+    def shutdown(self, wait: bool = True):
+        """Shut down all worker pools"""
+        for stage, pool in self._pools.items():
+            logger.info(f"Shutting down executor stage '{stage}'")
+            pool.shutdown(wait=wait)
@@ -0,0 +1,121 @@
+import logging
+import threading
+from typing import Dict, List, Optional
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Timeout of each kind of call, in seconds: a whole plan takes minutes to
+# generate, an embedding or a ChromaDB query should take well under a minute
+CALL_TYPES = ("chat", "vision", "embeddings", "chromadb")
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """requests adapter with a default timeout (requests has none per session)"""
+
+    def __init__(self, timeout: httpx.Timeout, **kwargs):
+        self.timeout = (timeout.connect, timeout.read)
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+class HTTPClients:
+    """Pooled HTTP clients shared by every service that calls OpenAI or ChromaDB.
+
+    One httpx.AsyncClient serves all chat and vision requests and one
+    httpx.Client the (threaded) embedding calls, so connections and their
+    TLS sessions are kept alive and reused instead of each service opening
+    its own pool. HTTP/2 is used when the h2 package is installed. The
+    ChromaDB client is requests-based; its session gets the same pool size
+    and a default timeout. Everything is closed by aclose() at shutdown.
+    """
+
+    def __init__(
+        self,
+        timeouts: Dict[str, float],
+        connect_timeout: float = 5.0,
+        max_connections: int = 50,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = True
+    ):
+        unknown = set(timeouts) - set(CALL_TYPES)
+        if unknown:
+            raise ValueError(f"Unknown HTTP call types: {', '.join(sorted(unknown))}")
+        self.timeouts = {
+            call_type: httpx.Timeout(seconds, connect=connect_timeout)
+            for call_type, seconds in timeouts.items()
+        }
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        if http2 and not HTTP2_AVAILABLE:
+            logger.info("HTTP/2 requested but the h2 package is not installed, using HTTP/1.1")
+        self.http2 = http2 and HTTP2_AVAILABLE
+
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._sync_client: Optional[httpx.Client] = None
+        self._sessions: List[requests.Session] = []
+        self._lock = threading.Lock()
+
+    def timeout(self, call_type: str) -> httpx.Timeout:
+        return self.timeouts[call_type]
+
+    def async_client(self) -> httpx.AsyncClient:
+        """Shared client for OpenAI chat and vision requests"""
+        with self._lock:
+            if self._async_client is None or self._async_client.is_closed:
+                self._async_client = httpx.AsyncClient(
+                    limits=self.limits,
+                    timeout=self.timeouts.get("chat"),
+                    http2=self.http2
+                )
+            return self._async_client
+
+    def sync_client(self) -> httpx.Client:
+        """Shared client for OpenAI embeddings, called from worker threads"""
+        with self._lock:
+            if self._sync_client is None or self._sync_client.is_closed:
+                self._sync_client = httpx.Client(
+                    limits=self.limits,
+                    timeout=self.timeouts.get("embeddings"),
+                    http2=self.http2
+                )
+            return self._sync_client
+
+    def configure_session(self, session: requests.Session, call_type: str = "chromadb"):
+        """Pool and time out a requests session (ChromaDB's HTTP client)"""
+        pool_size = self.limits.max_keepalive_connections
+        adapter = TimeoutHTTPAdapter(self.timeouts[call_type], pool_connections=1, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        with self._lock:
+            self._sessions.append(session)
+
+    async def aclose(self):
+        """Close every pooled connection"""
+        with self._lock:
+            async_client, self._async_client = self._async_client, None
+            sync_client, self._sync_client = self._sync_client, None
+            sessions, self._sessions = self._sessions, []
+        if async_client is not None:
+            await async_client.aclose()
+        if sync_client is not None:
+            sync_client.close()
+        for session in sessions:
+            session.close()
+        logger.info("HTTP clients closed")
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+from ..schemas.jobs import JobRecord, JobStatus, JobType
+from .job_store import JobStore
+from .meal_plan_pipeline import MealPlanPipeline
+from .tracing import StageTimings
+
+logger = logging.getLogger(__name__)
+
+QUEUE_FULL_MESSAGE = "La cola de generación está llena, intentá nuevamente en unos minutos"
+
+
+class JobQueueFullError(Exception):
+    """Raised when the job queue has no room for another job"""
+
+
+class JobManager:
+    """Queues meal-plan generation jobs and runs them on a pool of async workers"""
+
+    def __init__(
+        self,
+        store: JobStore,
+        pipeline: MealPlanPipeline,
+        workers: int = 4,
+        queue_size: int = 100,
+        ttl_seconds: int = 86400
+    ):
+        self.store = store
+        self.pipeline = pipeline
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.ttl_seconds = ttl_seconds
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+
+    async def start(self):
+        """Start worker tasks on the running event loop"""
+        if self._tasks:
+            return
+        await asyncio.to_thread(self._fail_interrupted_jobs)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Started {self.workers} job workers")
+
+    def _fail_interrupted_jobs(self):
+        """Mark failed the jobs a stopped process left pending or running
+
+        Requests only live in the in-process queue, so these jobs can never
+        run; without this they would be reported as pending forever. Jobs of
+        other workers still running on the same store are left alone.
+        """
+        interrupted = self.store.list_interrupted()
+        for job in interrupted:
+            job.status = JobStatus.failed
+            job.finished_at = time.time()
+            job.error = "El servidor se reinició antes de terminar el job, enviá la solicitud nuevamente"
+            self.store.save(job)
+        if interrupted:
+            logger.warning(f"Marked {len(interrupted)} interrupted jobs as failed")
+
+    async def stop(self):
+        """Cancel worker tasks"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, job_type: JobType, request: BaseModel) -> JobRecord:
+        """Queue a generation job and return its initial record"""
+        if self._queue is None:
+            raise RuntimeError("JobManager has not been started")
+
+        # Store calls may wait on the SQLite lock, so they run in a thread
+        await asyncio.to_thread(self.store.purge_finished, time.time() - self.ttl_seconds)
+
+        if self._queue.full():
+            raise JobQueueFullError(QUEUE_FULL_MESSAGE)
+
+        job = JobRecord(
+            job_id=uuid.uuid4().hex,
+            job_type=job_type,
+            created_at=time.time()
+        )
+        # Saved before queueing, so a worker's "running" can't be overwritten by "pending"
+        record = job.model_copy()
+        await asyncio.to_thread(self.store.save, record)
+
+        try:
+            self._queue.put_nowait((job, request))
+        except asyncio.QueueFull:
+            # Filled up while the job was being saved
+            job.status = JobStatus.failed
+            job.finished_at = time.time()
+            job.error = QUEUE_FULL_MESSAGE
+            await asyncio.to_thread(self.store.save, job)
+            raise JobQueueFullError(QUEUE_FULL_MESSAGE)
+
+        return record
+
+    async def get(self, job_id: str) -> Optional[JobRecord]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "queue_size": self.queue_size,
+            "running": self._running,
+            "completed": self._completed,
+            "failed": self._failed
+        }
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job, request = await self._queue.get()
+            try:
+                await self._run_job(job, request)
+            except Exception as e:
+                logger.error(f"Job worker {worker_id} failed to record job {job.job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job: JobRecord, request: BaseModel):
+        timings = StageTimings()
+        job.status = JobStatus.running
+        job.started_at = time.time()
+        await asyncio.to_thread(self.store.save, job)
+        self._running += 1
+
+        try:
+            job.result = await self._dispatch(job.job_type, request, timings)
+            job.status = JobStatus.completed
+            self._completed += 1
+        except Exception as e:
+            logger.error(f"Job {job.job_id} ({job.job_type.value}) failed: {e}")
+            job.status = JobStatus.failed
+            job.error = str(e)
+            self._failed += 1
+        finally:
+            self._running -= 1
+            job.finished_at = time.time()
+            job.stage_timings = timings.as_dict()
+            await asyncio.to_thread(self.store.save, job)
+
+    async def _dispatch(self, job_type: JobType, request: BaseModel, timings: StageTimings):
+        if job_type == JobType.new_patient:
+            return await self.pipeline.generate_new_patient_plan(request, timings)
+        if job_type == JobType.control:
+            return await self.pipeline.generate_control_plan(request, timings)
+        if job_type == JobType.replace_meal:
+            return await self.pipeline.replace_meal(request, timings)
+        raise ValueError(f"Unknown job type: {job_type}")
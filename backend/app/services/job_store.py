@@ -0,0 +1,174 @@
+import os
+import sqlite3
+import threading
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+from ..schemas.jobs import JobRecord, JobStatus
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = (JobStatus.completed, JobStatus.failed)
+
+
+class JobStore(ABC):
+    """Persistence interface for meal-plan generation jobs"""
+
+    @abstractmethod
+    def save(self, job: JobRecord):
+        ...
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        ...
+
+    @abstractmethod
+    def list_unfinished(self) -> List[JobRecord]:
+        """Jobs still pending or running"""
+
+    @abstractmethod
+    def list_interrupted(self) -> List[JobRecord]:
+        """Unfinished jobs whose process is no longer running"""
+
+    @abstractmethod
+    def purge_finished(self, older_than: float) -> int:
+        """Delete finished jobs whose finished_at is before the given epoch time"""
+
+
+class InMemoryJobStore(JobStore):
+    """Job store local to the current process"""
+
+    def __init__(self):
+        self._jobs: Dict[str, JobRecord] = {}
+        self._lock = threading.Lock()
+
+    def save(self, job: JobRecord):
+        with self._lock:
+            self._jobs[job.job_id] = job.model_copy(deep=True)
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.model_copy(deep=True) if job else None
+
+    def list_unfinished(self) -> List[JobRecord]:
+        with self._lock:
+            return [
+                job.model_copy(deep=True) for job in self._jobs.values()
+                if job.status not in FINISHED_STATUSES
+            ]
+
+    def list_interrupted(self) -> List[JobRecord]:
+        # Jobs in this store can only belong to the current process
+        return []
+
+    def purge_finished(self, older_than: float) -> int:
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.status in FINISHED_STATUSES and (job.finished_at or 0) < older_than
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return len(expired)
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SQLiteJobStore(JobStore):
+    """Job store backed by a SQLite file, shared by every worker on the host
+
+    Each job records the PID of the worker process that queued it, so a
+    starting worker only fails the jobs of processes that are gone.
+    Calls block on the file lock (up to 30 s); async code runs them in a thread.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                finished_at REAL,
+                data TEXT NOT NULL,
+                owner_pid INTEGER
+            )
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "owner_pid" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner_pid INTEGER")
+        self._conn.commit()
+
+    def save(self, job: JobRecord):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, status, finished_at, data, owner_pid) VALUES (?, ?, ?, ?, ?)",
+                (job.job_id, job.status.value, job.finished_at, job.model_dump_json(), os.getpid())
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return JobRecord.model_validate_json(row[0]) if row else None
+
+    def list_unfinished(self) -> List[JobRecord]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM jobs WHERE status NOT IN (?, ?)",
+                (JobStatus.completed.value, JobStatus.failed.value)
+            ).fetchall()
+        return [JobRecord.model_validate_json(row[0]) for row in rows]
+
+    def list_interrupted(self) -> List[JobRecord]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data, owner_pid FROM jobs WHERE status NOT IN (?, ?)",
+                (JobStatus.completed.value, JobStatus.failed.value)
+            ).fetchall()
+        # Jobs saved before owners were recorded have no PID
+        return [
+            JobRecord.model_validate_json(data) for data, owner_pid in rows
+            if owner_pid is None or (owner_pid != os.getpid() and not _process_alive(owner_pid))
+        ]
+
+    def purge_finished(self, older_than: float) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (JobStatus.completed.value, JobStatus.failed.value, older_than)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_job_store(backend: str, path: Optional[str] = None) -> JobStore:
+    """Build the job store selected in settings ("memory" or "sqlite")"""
+    if backend == "sqlite":
+        logger.info(f"Using SQLite job store at {path}")
+        return SQLiteJobStore(path or "./data/jobs.sqlite3")
+    if backend != "memory":
+        logger.warning(f"Unknown job store '{backend}', using in-memory store")
+    return InMemoryJobStore()
@@ -0,0 +1,248 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """Content-addressed cache for chat completion responses.
+
+    Entries are keyed by a hash of everything that determines the completion
+    (model, system message, prompt, temperature). A bounded in-memory LRU sits
+    in front of an optional on-disk tier that survives restarts and is shared
+    by every worker pointing at the same directory.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl_seconds: int = 604800,
+        disk_dir: Optional[str] = None,
+        max_disk_bytes: int = 200 * 1024 * 1024
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expired": 0
+        }
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._scan_disk())
+
+    @staticmethod
+    def make_key(model: str, system_message: str, prompt: str, temperature: float) -> str:
+        """Hash the request parameters that determine the completion"""
+        payload = json.dumps(
+            {
+                "model": model,
+                "system": system_message,
+                "prompt": prompt,
+                "temperature": temperature
+            },
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None on a miss"""
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is None:
+            value = self._get_disk(key, now)
+        if value is None:
+            self._count_miss()
+        return value
+
+    async def aget(self, key: str) -> Optional[str]:
+        """get() for the event loop: the disk tier is read in a worker thread"""
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is None and self.disk_dir:
+            value = await asyncio.to_thread(self._get_disk, key, now)
+        if value is None:
+            self._count_miss()
+        return value
+
+    def set(self, key: str, value: str):
+        """Store a response in both tiers"""
+        created_at = self._set_memory(key, value)
+        if self.disk_dir:
+            self._write_disk(key, created_at, value)
+
+    async def aset(self, key: str, value: str):
+        """set() for the event loop: the disk tier is written in a worker thread"""
+        created_at = self._set_memory(key, value)
+        if self.disk_dir:
+            await asyncio.to_thread(self._write_disk, key, created_at, value)
+
+    def _get_memory(self, key: str, now: float) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            created_at, value = entry
+            if now - created_at <= self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return value
+            del self._memory[key]
+            self._stats["expired"] += 1
+            return None
+
+    def _get_disk(self, key: str, now: float) -> Optional[str]:
+        entry = self._read_disk(key)
+        if entry is None:
+            return None
+        created_at, value = entry
+        if now - created_at <= self.ttl_seconds:
+            with self._lock:
+                self._store_memory(key, created_at, value)
+                self._stats["disk_hits"] += 1
+            return value
+        self._delete_disk(key)
+        with self._lock:
+            self._stats["expired"] += 1
+        return None
+
+    def _set_memory(self, key: str, value: str) -> float:
+        created_at = time.time()
+        with self._lock:
+            self._store_memory(key, created_at, value)
+            self._stats["stores"] += 1
+        return created_at
+
+    def _count_miss(self):
+        with self._lock:
+            self._stats["misses"] += 1
+
+    def clear(self):
+        """Drop every cached response"""
+        with self._lock:
+            self._memory.clear()
+        for path, _, _ in self._scan_disk():
+            self._remove_file(path)
+        with self._lock:
+            self._disk_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+            lookups = hits + self._stats["misses"]
+            return {
+                **self._stats,
+                "hits": hits,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_enabled": bool(self.disk_dir),
+                "disk_bytes": self._disk_bytes
+            }
+
+    def _store_memory(self, key: str, created_at: float, value: str):
+        # Caller must hold the lock
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _path_for(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, str]]:
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._path_for(key), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data["created_at"], data["response"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Discarding unreadable LLM cache entry {key}: {e}")
+            self._delete_disk(key)
+            return None
+
+    def _write_disk(self, key: str, created_at: float, value: str):
+        path = self._path_for(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"created_at": created_at, "response": value}, f, ensure_ascii=False)
+            previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._disk_bytes += os.path.getsize(path) - previous_size
+        except OSError as e:
+            logger.warning(f"Could not write LLM cache entry {key}: {e}")
+            return
+
+        if self._disk_bytes > self.max_disk_bytes:
+            self._evict_disk()
+
+    def _delete_disk(self, key: str):
+        if self.disk_dir:
+            self._remove_file(self._path_for(key))
+
+    def _remove_file(self, path: str):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            with self._lock:
+                self._disk_bytes = max(0, self._disk_bytes - size)
+        except OSError:
+            pass
+
+    def _scan_disk(self):
+        """Yield (path, size, mtime) for every entry in the disk tier"""
+        if not self.disk_dir or not os.path.isdir(self.disk_dir):
+            return
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _evict_disk(self):
+        """Remove expired entries, then the oldest ones, until under the size limit"""
+        entries = sorted(self._scan_disk(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        cutoff = time.time() - self.ttl_seconds
+        # Leave some headroom so we don't rescan on every write
+        target = int(self.max_disk_bytes * 0.9)
+
+        for path, size, mtime in entries:
+            if total <= target and mtime >= cutoff:
+                break
+            self._remove_file(path)
+            total -= size
+            with self._lock:
+                self._stats["evictions"] += 1
+
+        with self._lock:
+            self._disk_bytes = total
@@ -0,0 +1,187 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_FILE = "recipe_embeddings.npy"
+METADATA_FILE = "recipe_embeddings.json"
+
+
+def save_local_index(
+    directory: str,
+    ids: List[str],
+    documents: List[str],
+    metadatas: List[Dict[str, Any]],
+    embeddings: Sequence[Sequence[float]],
+    model_name: str
+):
+    """Write an index that LocalCollection can open
+
+    Embeddings are stored L2-normalized as float32, so cosine similarity is a
+    plain dot product at query time.
+    """
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, EMBEDDINGS_FILE), matrix)
+    with open(os.path.join(directory, METADATA_FILE), "w", encoding="utf-8") as f:
+        json.dump(
+            {"model": model_name, "ids": ids, "documents": documents, "metadatas": metadatas},
+            f,
+            ensure_ascii=False
+        )
+
+
+class LocalCollection:
+    """In-process, read-only stand-in for a Chroma collection.
+
+    Loads an index written by save_local_index: the embedding matrix is
+    memory-mapped from a .npy file and searched by brute-force cosine
+    similarity, which for a recipe catalog takes microseconds. Supports the
+    parts of the Chroma API the app uses: count, get, and query with
+    query_texts or query_embeddings, n_results, include and metadata where
+    filters ($eq, $ne, $in, $nin, $gt, $gte, $lt, $lte, $contains, $and, $or).
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        embedding_function: Optional[Callable[[List[str]], List[Sequence[float]]]] = None,
+        model_name: Optional[str] = None
+    ):
+        with open(os.path.join(directory, METADATA_FILE), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if model_name and data["model"] != model_name:
+            raise ValueError(
+                f"Local vector index was built with {data['model']}, queries use {model_name}"
+            )
+
+        self.embedding_function = embedding_function
+        self.ids: List[str] = data["ids"]
+        self.documents: List[str] = data["documents"]
+        self.metadatas: List[Dict[str, Any]] = data["metadatas"]
+        self.embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r")
+        if len(self.embeddings) != len(self.ids):
+            raise ValueError(
+                f"Local vector index is inconsistent: {len(self.embeddings)} embeddings for {len(self.ids)} ids"
+            )
+
+        self._masks: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def get(self, include: Sequence[str] = ("metadatas", "documents")) -> Dict[str, Any]:
+        return {
+            "ids": list(self.ids),
+            "metadatas": list(self.metadatas) if "metadatas" in include else None,
+            "documents": list(self.documents) if "documents" in include else None
+        }
+
+    def query(
+        self,
+        query_embeddings: Optional[Sequence] = None,
+        query_texts: Optional[Union[str, List[str]]] = None,
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        include: Sequence[str] = ("metadatas", "documents", "distances")
+    ) -> Dict[str, Any]:
+        """Top n_results rows by cosine similarity for every query"""
+        if query_embeddings is None:
+            if query_texts is None or self.embedding_function is None:
+                raise ValueError("query needs query_embeddings, or query_texts and an embedding function")
+            if isinstance(query_texts, str):
+                query_texts = [query_texts]
+            query_embeddings = self.embedding_function(list(query_texts))
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        rows = np.arange(len(self.ids)) if where is None else np.flatnonzero(self._where_mask(where))
+        k = min(n_results, len(rows))
+
+        result: Dict[str, Any] = {"ids": [], "metadatas": [], "documents": [], "distances": []}
+        similarities = queries @ self.embeddings[rows].T  # (queries, rows)
+        for scores in similarities:
+            top = np.argpartition(-scores, k - 1)[:k] if 0 < k < len(rows) else np.arange(k)
+            top = top[np.argsort(-scores[top], kind="stable")]
+            result["ids"].append([self.ids[rows[i]] for i in top])
+            result["metadatas"].append([self.metadatas[rows[i]] for i in top])
+            result["documents"].append([self.documents[rows[i]] for i in top])
+            result["distances"].append([float(1 - scores[i]) for i in top])
+
+        for field in ("metadatas", "documents", "distances"):
+            if field not in include:
+                result[field] = None
+        return result
+
+    def _where_mask(self, where: Dict[str, Any]) -> np.ndarray:
+        """Rows whose metadata match a Chroma where filter, cached per filter"""
+        cache_key = json.dumps(where, sort_keys=True, ensure_ascii=False)
+        with self._lock:
+            mask = self._masks.get(cache_key)
+            if mask is not None:
+                self._masks.move_to_end(cache_key)
+                return mask
+
+        mask = self._evaluate(where)
+        with self._lock:
+            self._masks[cache_key] = mask
+            while len(self._masks) > 256:
+                self._masks.popitem(last=False)
+        return mask
+
+    def _evaluate(self, where: Dict[str, Any]) -> np.ndarray:
+        mask = np.ones(len(self.ids), dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._evaluate(clause)
+            elif key == "$or":
+                any_clause = np.zeros(len(self.ids), dtype=bool)
+                for clause in condition:
+                    any_clause |= self._evaluate(clause)
+                mask &= any_clause
+            else:
+                if not isinstance(condition, dict):
+                    condition = {"$eq": condition}
+                for operator, value in condition.items():
+                    mask &= np.array(
+                        [_matches(operator, metadata.get(key), value) for metadata in self.metadatas],
+                        dtype=bool
+                    )
+        return mask
+
+
+def _matches(operator: str, actual: Any, expected: Any) -> bool:
+    if operator == "$eq":
+        return actual == expected
+    if operator == "$ne":
+        return actual != expected
+    if operator == "$in":
+        return actual in expected
+    if operator == "$nin":
+        return actual not in expected
+    if operator == "$contains":
+        # List-valued fields are stored comma-joined, e.g. tipo_comida="desayuno,merienda"
+        return actual is not None and expected in str(actual).split(",")
+    if actual is None:
+        return False
+    if operator == "$gt":
+        return actual > expected
+    if operator == "$gte":
+        return actual >= expected
+    if operator == "$lt":
+        return actual < expected
+    if operator == "$lte":
+        return actual <= expected
+    raise ValueError(f"Unsupported where operator '{operator}'")
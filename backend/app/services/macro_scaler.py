@@ -0,0 +1,287 @@
+import logging
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from ..schemas.meal_plan import PlanIngredient, PlanMacros, PlanOption, StructuredMealPlan
+from .recipe_manager import RecipeManager
+from .stream_validator import BLOCK_HEADER_PATTERN, MACROS_PATTERN, RECIPE_ID_PATTERN
+
+logger = logging.getLogger(__name__)
+
+# Scaling outside this range produces portions nobody would serve
+MIN_SCALE_FACTOR = 0.5
+MAX_SCALE_FACTOR = 3.0
+
+OPTION_PATTERN = re.compile(r'^[#*\s-]*OPCI[OÓ]N\s*\d+\b', re.IGNORECASE)
+INGREDIENTS_HEADER_PATTERN = re.compile(r'ingredientes.*:\s*$', re.IGNORECASE)
+SUB_BULLET_PATTERN = re.compile(r'^(\s+)([*•-])\s')
+QUANTITY_PATTERN = re.compile(r'^\s*(\d+/\d+|\d+(?:[.,]\d+)?)\s*(.*)$')
+
+# Units measured by weight or volume get rounded to whole grams/ml, the rest
+# are counted in halves (1.5 unidades, 2 cdas)
+CONTINUOUS_UNITS = {"g", "gr", "grs", "ml", "cc"}
+UNIT_PLURALS = {
+    "unidad": "unidades",
+    "cda": "cdas",
+    "cdita": "cditas",
+    "diente": "dientes",
+    "rebanada": "rebanadas",
+    "tapa": "tapas",
+    "disco": "discos",
+    "tallo": "tallos",
+    "pizca": "pizcas"
+}
+UNIT_SINGULARS = {plural: singular for singular, plural in UNIT_PLURALS.items()}
+# Pregnancy and pathology distributions use English meal names
+MEAL_KEY_ALIASES = {
+    "breakfast": "desayuno",
+    "mid_morning": "media_manana",
+    "lunch": "almuerzo",
+    "afternoon": "merienda",
+    "afternoon_snack": "merienda",
+    "dinner": "cena",
+    "evening": "colacion",
+    "evening_snack": "colacion",
+    "snacks": "colacion"
+}
+
+
+@dataclass
+class ScaledRecipe:
+    """A catalog recipe scaled to a calorie target"""
+    recipe_id: str
+    name: str
+    factor: float
+    ingredients: List[Tuple[str, str]] = field(default_factory=list)
+    protein: int = 0
+    carbs: int = 0
+    fat: int = 0
+    calories: int = 0
+
+    def format_macros(self) -> str:
+        return f"Macros: P: {self.protein}g | C: {self.carbs}g | G: {self.fat}g | Cal: {self.calories}"
+
+
+class MacroScaler:
+    """Computes scaled portions and macros for catalog recipes locally.
+
+    The LLM only has to pick recipes; the arithmetic it used to do (adjustment
+    factor, scaled ingredients, scaled macros) is redone here from the catalog
+    values, so options never come back with zero or inconsistent macros.
+    """
+
+    def __init__(self, recipe_manager: RecipeManager):
+        self.recipe_manager = recipe_manager
+
+    def scale_recipe(self, recipe_id: str, target_calories: float) -> Optional[ScaledRecipe]:
+        """Scale a recipe so it provides target_calories, or None if it is unknown"""
+        recipe = self.recipe_manager.get_recipe_by_id(recipe_id)
+        if not recipe:
+            return None
+
+        base_calories = recipe.get('calorias_aprox', 0)
+        factor = target_calories / base_calories if base_calories and target_calories > 0 else 1.0
+        clamped = min(max(factor, MIN_SCALE_FACTOR), MAX_SCALE_FACTOR)
+        if clamped != factor:
+            logger.info(f"{recipe_id}: scale factor {factor:.2f} clamped to {clamped}")
+
+        return ScaledRecipe(
+            recipe_id=recipe_id,
+            name=recipe.get('nombre', ''),
+            factor=round(clamped, 3),
+            ingredients=[
+                (ingredient['item'], self.scale_quantity(ingredient['cantidad'], clamped))
+                for ingredient in recipe.get('ingredientes', [])
+            ],
+            protein=round(recipe.get('proteinas_aprox', 0) * clamped),
+            carbs=round(recipe.get('carbohidratos_aprox', 0) * clamped),
+            fat=round(recipe.get('grasas_aprox', 0) * clamped),
+            calories=round(base_calories * clamped)
+        )
+
+    @staticmethod
+    def scale_quantity(quantity: str, factor: float) -> str:
+        """Scale a catalog quantity such as "30gr", "100ml" or "1/2 unidad"
+
+        Quantities without a leading number ("a gusto") are returned unchanged.
+        """
+        match = QUANTITY_PATTERN.match(str(quantity))
+        if not match:
+            return quantity
+
+        number, unit = match.groups()
+        if "/" in number:
+            numerator, denominator = number.split("/")
+            value = float(numerator) / float(denominator)
+        else:
+            value = float(number.replace(",", "."))
+
+        unit_words = unit.split()
+        unit_word = unit_words[0].lower() if unit_words else ""
+        scaled = value * factor
+
+        if unit_word in CONTINUOUS_UNITS:
+            # Nearest 5 for larger portions, nearest unit for small ones
+            scaled = round(scaled / 5) * 5 if scaled >= 50 else max(1, round(scaled))
+            return f"{scaled}{unit}"
+
+        scaled = max(0.25, round(scaled * 2) / 2) if value >= 0.5 else max(0.25, round(scaled * 4) / 4)
+        if unit_words:
+            singular = UNIT_SINGULARS.get(unit_word, unit_word)
+            unit_words[0] = UNIT_PLURALS.get(singular, singular) if scaled > 1 else singular
+        text = f"{scaled:g}"
+        return f"{text} {' '.join(unit_words)}".strip()
+
+    def rewrite_plan(self, meal_plan: str, meal_targets: Optional[Dict[str, float]] = None) -> str:
+        """Replace the ingredient quantities and Macros line of every option
+
+        Each option is scaled to the calorie target of its meal (keys as
+        returned by NutritionalCalculator.calculate_meal_distribution). Meals
+        without a target keep the calories the LLM wrote, falling back to the
+        recipe's own portion when those are zero. Options without a known
+        [REC_XXXX] are left untouched.
+        """
+        meal_targets = {
+            MEAL_KEY_ALIASES.get(meal, self._meal_key(meal)): calories
+            for meal, calories in (meal_targets or {}).items()
+        }
+        output: List[str] = []
+        option_lines: List[str] = []
+        meal_key = ""
+        rewritten = 0
+
+        def flush_option():
+            nonlocal rewritten
+            if option_lines:
+                lines, changed = self._rewrite_option(option_lines, self._meal_target(meal_targets, meal_key))
+                output.extend(lines)
+                rewritten += changed
+                option_lines.clear()
+
+        for line in meal_plan.split("\n"):
+            stripped = line.strip()
+            header = BLOCK_HEADER_PATTERN.match(stripped)
+            if header and not stripped.startswith(("-", "* ")):
+                flush_option()
+                meal_key = self._meal_key(header.group(1))
+                output.append(line)
+            elif OPTION_PATTERN.match(stripped):
+                flush_option()
+                option_lines.append(line)
+            elif option_lines:
+                option_lines.append(line)
+            else:
+                output.append(line)
+        flush_option()
+
+        logger.info(f"Rewrote portions and macros of {rewritten} meal options")
+        return "\n".join(output)
+
+    def scale_plan(
+        self,
+        plan: StructuredMealPlan,
+        meal_targets: Optional[Dict[str, float]] = None
+    ) -> StructuredMealPlan:
+        """rewrite_plan for a structured plan: same targets, no text parsing"""
+        meal_targets = {
+            MEAL_KEY_ALIASES.get(meal, self._meal_key(meal)): calories
+            for meal, calories in (meal_targets or {}).items()
+        }
+        meals = []
+        rewritten = 0
+        for meal in plan.comidas:
+            target = self._meal_target(meal_targets, self._meal_key(meal.comida))
+            options = []
+            for option in meal.opciones:
+                scaled = self._scale_option(option, target)
+                rewritten += scaled is not option
+                options.append(scaled)
+            meals.append(meal.model_copy(update={"opciones": options}))
+
+        logger.info(f"Rewrote portions and macros of {rewritten} meal options")
+        return plan.model_copy(update={"comidas": meals})
+
+    def _scale_option(self, option: PlanOption, target_calories: Optional[float]) -> PlanOption:
+        if not target_calories:
+            recipe = self.recipe_manager.get_recipe_by_id(option.receta_id) or {}
+            target_calories = option.macros.calorias or recipe.get('calorias_aprox', 0)
+
+        scaled = self.scale_recipe(option.receta_id, target_calories)
+        if not scaled:
+            return option
+
+        return option.model_copy(update={
+            "ingredientes": [PlanIngredient(item=item, cantidad=quantity) for item, quantity in scaled.ingredients],
+            "macros": PlanMacros(
+                proteinas=scaled.protein,
+                carbohidratos=scaled.carbs,
+                grasas=scaled.fat,
+                calorias=scaled.calories
+            )
+        })
+
+    def _rewrite_option(self, lines: List[str], target_calories: Optional[float]) -> Tuple[List[str], int]:
+        option_text = "\n".join(lines)
+        recipe_match = RECIPE_ID_PATTERN.search(option_text)
+        if not recipe_match:
+            return lines, 0
+
+        recipe_id = recipe_match.group(1)
+        macros_match = MACROS_PATTERN.search(option_text)
+        if not target_calories:
+            stated_calories = float(macros_match.group(4)) if macros_match else 0
+            recipe = self.recipe_manager.get_recipe_by_id(recipe_id) or {}
+            target_calories = stated_calories or recipe.get('calorias_aprox', 0)
+
+        scaled = self.scale_recipe(recipe_id, target_calories)
+        if not scaled:
+            return lines, 0
+
+        result: List[str] = []
+        in_ingredients = False
+        ingredients_written = False
+        for line in lines:
+            if in_ingredients:
+                bullet = SUB_BULLET_PATTERN.match(line)
+                if bullet:
+                    if not ingredients_written:
+                        indent, marker = bullet.groups()
+                        result.extend(f"{indent}{marker} {item}: {quantity}" for item, quantity in scaled.ingredients)
+                        ingredients_written = True
+                    continue
+                in_ingredients = False
+
+            if MACROS_PATTERN.search(line):
+                line = MACROS_PATTERN.sub(scaled.format_macros(), line, count=1)
+            elif not ingredients_written and INGREDIENTS_HEADER_PATTERN.search(line):
+                in_ingredients = True
+
+            result.append(line)
+
+        return result, 1
+
+    @staticmethod
+    def _meal_key(header: str) -> str:
+        """Normalize a block header ("MEDIA MAÑANA") to a distribution key ("media_manana")"""
+        normalized = unicodedata.normalize("NFKD", header.lower())
+        normalized = "".join(c for c in normalized if not unicodedata.combining(c))
+        # "COLACIÓN (media mañana)" is the mid-morning snack and "COLACIÓN
+        # (media tarde)" the afternoon one; any other colación is the evening one
+        if normalized.startswith("colacion"):
+            for qualifier, key in (("manana", "media_manana"), ("tarde", "media_tarde")):
+                if qualifier in normalized:
+                    return key
+            return "colacion"
+        # Dessert variants share one target
+        if normalized.startswith("postre"):
+            return "postre"
+        return "_".join(normalized.split())
+
+    @staticmethod
+    def _meal_target(meal_targets: Dict[str, float], meal_key: str) -> Optional[float]:
+        """Calorie target of a meal; snacks without their own fall back to the colación one"""
+        target = meal_targets.get(meal_key)
+        if target is None and meal_key in ("media_manana", "media_tarde"):
+            target = meal_targets.get("colacion")
+        return target
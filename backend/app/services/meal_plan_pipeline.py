@@ -0,0 +1,813 @@
+import asyncio
+import logging
+from contextlib import aclosing
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
+from ..schemas.meal_plan import (
+    DistributionType,
+    NewPatientRequest,
+    ControlPatientRequest,
+    MealReplacementRequest,
+    MealPlanResponse,
+    StructuredMealPlan
+)
+from ..utils.calculations import NutritionalCalculator
+from .catalog_builder import CatalogBuilder
+from .chromadb_service import ChromaDBService
+from .executor import StageExecutor
+from .macro_scaler import MacroScaler
+from .meal_plan_processor import MealPlanProcessor
+from .openai_scheduler import Priority
+from .openai_service import OpenAIService
+from .pdf_generator import PDFGenerator
+from .plan_solver import MAIN_MEALS, LocalPlanSolver, recipe_meal_type
+from .prompt_generator import PromptGenerator
+from .recipe_manager import RecipeManager
+from .stream_validator import IncrementalPlanValidator, StreamIssue
+from .structured_output import STRUCTURED_OUTPUT_INSTRUCTIONS, parse_structured_plan, render_plan_text
+from .tracing import StageTimings, traced
+
+logger = logging.getLogger(__name__)
+
+RECIPE_ID_REMINDER = "\n\nRECORDATORIO IMPORTANTE: Debes usar ÚNICAMENTE los IDs de recetas proporcionados [REC_XXXX]. NO inventes recetas nuevas."
+ZERO_MACROS_REMINDER = "\n\n⚠️ RECORDATORIO CRÍTICO SOBRE MACROS:\n- NUNCA dejes macros en cero\n- Si ajustás cantidades, recalculá los macros proporcionalmente\n- Cada opción debe tener valores nutricionales reales basados en la receta"
+JSON_FORMAT_REMINDER = "\n\n⚠️ RECORDATORIO: Tu respuesta anterior no respetaba la estructura JSON pedida. Respondé con un único objeto JSON con TODOS los campos obligatorios."
+# Corrective reminder appended to the prompt for each kind of validation issue
+ISSUE_REMINDERS = {
+    "unknown_recipe_id": RECIPE_ID_REMINDER,
+    "too_few_recipes": RECIPE_ID_REMINDER,
+    "zero_macros": ZERO_MACROS_REMINDER,
+    "invalid_json": JSON_FORMAT_REMINDER
+}
+MAX_CORRECTIVE_RETRIES = 2
+# Best-of-N prompts, cycled over the candidates: the plain prompt and the
+# prompt with the reminders a serial retry would add
+CANDIDATE_REMINDERS = (
+    "",
+    RECIPE_ID_REMINDER,
+    RECIPE_ID_REMINDER + ZERO_MACROS_REMINDER
+)
+# How Motor 1 builds plans: "llm", "local" (LocalPlanSolver only) or
+# "fallback" (LLM, and the local solver when the OpenAI call fails)
+SOLVER_MODES = ("llm", "local", "fallback")
+# LLM output: the free-text plan, or a JSON plan validated against
+# StructuredMealPlan (post-processing then works on typed objects)
+OUTPUT_FORMATS = ("text", "json")
+# The LLM catalog is kept short to save tokens; the local solver can afford
+# to search a wider pool for equivalent options
+PROMPT_RECIPES_PER_MEAL = 10
+SOLVER_RECIPES_PER_MEAL = 40
+# Candidate recipes offered to Motor 3 for a replacement
+REPLACEMENT_OPTIONS = 10
+
+
+class MealPlanPipeline:
+    """Motor 1/2/3 generation pipelines shared by the HTTP endpoints and job workers"""
+
+    def __init__(
+        self,
+        chromadb_service: ChromaDBService,
+        recipe_manager: RecipeManager,
+        prompt_generator: PromptGenerator,
+        openai_service: OpenAIService,
+        meal_plan_processor: MealPlanProcessor,
+        pdf_generator: PDFGenerator,
+        stage_executor: StageExecutor,
+        early_abort: bool = True,
+        macro_scaler: Optional[MacroScaler] = None,
+        local_solver: Optional[LocalPlanSolver] = None,
+        solver_mode: str = "llm",
+        catalog_builder: Optional[CatalogBuilder] = None,
+        candidates: int = 1,
+        output_format: str = "text"
+    ):
+        self.chromadb_service = chromadb_service
+        self.recipe_manager = recipe_manager
+        self.prompt_generator = prompt_generator
+        self.openai_service = openai_service
+        self.meal_plan_processor = meal_plan_processor
+        self.pdf_generator = pdf_generator
+        self.stage_executor = stage_executor
+        # Validate Motor 1 completions while they stream and abort bad ones early
+        self.early_abort = early_abort
+        # When set, portions and macros are recomputed locally, so zero-macro
+        # options no longer need a corrective generation
+        self.macro_scaler = macro_scaler
+        if solver_mode not in SOLVER_MODES:
+            raise ValueError(f"Unknown Motor 1 solver mode: {solver_mode}")
+        if solver_mode != "llm" and local_solver is None:
+            raise ValueError(f"Solver mode '{solver_mode}' needs a LocalPlanSolver")
+        self.local_solver = local_solver
+        self.solver_mode = solver_mode
+        # Concurrent Motor 1 generations per plan; 1 keeps the serial retries
+        if candidates < 1:
+            raise ValueError("candidates must be at least 1")
+        # More candidates would repeat a prompt, and with it its cached answer
+        if candidates > len(CANDIDATE_REMINDERS):
+            logger.warning(f"Capping Motor 1 candidates at {len(CANDIDATE_REMINDERS)} distinct prompts")
+            candidates = len(CANDIDATE_REMINDERS)
+        self.candidates = candidates
+        # Picks the Motor 2 recipe catalog within a prompt token budget
+        self.catalog_builder = catalog_builder or CatalogBuilder(recipe_manager, prompt_generator)
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown LLM output format: {output_format}")
+        self.output_format = output_format
+
+    @traced("motor1")
+    async def generate_new_patient_plan(
+        self,
+        request: NewPatientRequest,
+        timings: Optional[StageTimings] = None
+    ) -> MealPlanResponse:
+        """Generate meal plan for new patient (Motor 1)"""
+        if self.solver_mode == "local":
+            meal_plan, validation_errors = await self._solve_locally(request, timings)
+            if not validation_errors:
+                return await self._finalize(meal_plan, request.nombre, "nuevo", timings)
+            logger.warning(f"Local plan breaks {len(validation_errors)} rules, generating it with the LLM")
+
+        prompt, all_recipe_ids, meal_targets = await self._prepare_new_patient(request, timings)
+
+        try:
+            if self.output_format == "json":
+                meal_plan = await self._generate_structured(
+                    prompt, timings, all_recipe_ids, self._distribution_for_validation(request)
+                )
+            else:
+                meal_plan = await self._generate_new_patient_text(
+                    prompt, all_recipe_ids, timings, self._distribution_for_validation(request)
+                )
+        except Exception as e:
+            if self.solver_mode != "fallback":
+                raise
+            logger.warning(f"LLM generation failed, building the plan locally: {e}")
+            meal_plan, validation_errors = await self._solve_locally(request, timings)
+            return await self._finalize(
+                meal_plan, request.nombre, "nuevo", timings, validation_errors=validation_errors
+            )
+
+        return await self._finalize(meal_plan, request.nombre, "nuevo", timings, meal_targets)
+
+    async def _generate_new_patient_text(
+        self,
+        prompt: str,
+        all_recipe_ids: List[str],
+        timings: StageTimings,
+        distribution_type: str = "standard"
+    ) -> str:
+        """Run the Motor 1 prompt through OpenAI, with corrective retries"""
+        if self.candidates > 1:
+            with timings.measure("llm"):
+                return await self._generate_best_of(prompt, all_recipe_ids, distribution_type)
+
+        if self.early_abort:
+            meal_plan = ""
+            async for event, data in self._generate_validated(prompt, all_recipe_ids, timings):
+                if event == "plan":
+                    meal_plan = data["text"]
+            return meal_plan
+
+        # Generate plan with OpenAI
+        used_prompt = prompt
+        with timings.measure("llm"):
+            meal_plan = await self.openai_service.generate_meal_plan(used_prompt)
+
+        # Validate recipe usage
+        if not self.prompt_generator.validate_recipe_usage(meal_plan, all_recipe_ids):
+            # If validation fails, retry with stronger prompt
+            used_prompt = prompt + RECIPE_ID_REMINDER
+            with timings.measure("llm_retry_recipe_ids"):
+                meal_plan = await self.openai_service.generate_meal_plan(used_prompt)
+
+        # Check for zero macros (fixed locally when the macro scaler is enabled)
+        zero_macro_warnings = [] if self.macro_scaler else self.meal_plan_processor.check_for_zero_macros(meal_plan)
+        if zero_macro_warnings:
+            logger.warning(f"Found {len(zero_macro_warnings)} instances of zero macros")
+            for warning in zero_macro_warnings:
+                logger.warning(warning)
+
+            # Retry with enhanced prompt about macros
+            used_prompt = prompt + ZERO_MACROS_REMINDER
+            with timings.measure("llm_retry_zero_macros"):
+                meal_plan = await self.openai_service.generate_meal_plan(used_prompt)
+
+        recipes_ok, macros_ok, _ = await self.stage_executor.run(
+            "cpu", self._score_candidate, meal_plan, all_recipe_ids, distribution_type
+        )
+        if recipes_ok and macros_ok:
+            await self.openai_service.cache_response(used_prompt, meal_plan)
+        return meal_plan
+
+    async def _generate_structured(
+        self,
+        prompt: str,
+        timings: StageTimings,
+        valid_recipe_ids: Optional[List[str]] = None,
+        distribution_type: str = "standard",
+        priority: Priority = Priority.NEW_PATIENT
+    ) -> StructuredMealPlan:
+        """Generate a JSON plan and check it on the parsed objects
+
+        Schema violations, unknown recipe IDs and zero macros are found by
+        looking at the typed plan instead of re-parsing text; each kind is
+        retried once with its corrective reminder, as in the text path.
+        Recipe IDs are checked against valid_recipe_ids, or the whole catalog
+        when it is None (Motor 2 and 3).
+        """
+        reminders_used: List[str] = []
+        for attempt in range(1 + MAX_CORRECTIVE_RETRIES):
+            can_retry = attempt < MAX_CORRECTIVE_RETRIES
+            stage = "llm" if attempt == 0 else f"llm_retry_{attempt}"
+            with timings.measure(stage):
+                text = await self.openai_service.generate_structured_plan(
+                    prompt + STRUCTURED_OUTPUT_INSTRUCTIONS + "".join(reminders_used), priority=priority
+                )
+
+            plan = None
+            try:
+                plan = parse_structured_plan(text)
+            except ValueError as e:
+                issues = [StreamIssue("invalid_json", str(e))]
+            else:
+                issues = self._structured_issues(plan, valid_recipe_ids)
+
+            issue = self._next_correctable_issue(self._needs_regeneration(issues), reminders_used) if can_retry else None
+            if not issue:
+                if plan is None:
+                    raise ValueError(issues[0].message)
+                for remaining in issues:
+                    logger.warning(remaining.message)
+                if not self._needs_regeneration(issues):
+                    await self.openai_service.cache_response(
+                        prompt + STRUCTURED_OUTPUT_INSTRUCTIONS + "".join(reminders_used), text, structured=True
+                    )
+                structure_ok, report = await self.stage_executor.run(
+                    "cpu", self.meal_plan_processor.validate_meal_plan_structure, plan, distribution_type
+                )
+                if not structure_ok:
+                    logger.info(f"Structured plan failed the structure check:\n{report}")
+                return plan
+
+            logger.warning(f"Regenerating structured plan: {issue.message}")
+            reminders_used.append(ISSUE_REMINDERS[issue.kind])
+
+    def _structured_issues(
+        self,
+        plan: StructuredMealPlan,
+        valid_recipe_ids: Optional[List[str]]
+    ) -> List[StreamIssue]:
+        """Validation issues of a parsed plan, in the kinds used by the stream validator"""
+        issues = [
+            StreamIssue("unknown_recipe_id", f"Receta {recipe_id} no está en el catálogo")
+            for recipe_id in self.meal_plan_processor.check_plan_recipes(plan, valid_recipe_ids)
+        ]
+        issues.extend(
+            StreamIssue("zero_macros", warning)
+            for warning in self.meal_plan_processor.check_plan_zero_macros(plan)
+        )
+        return issues
+
+    async def _generate_best_of(
+        self,
+        prompt: str,
+        all_recipe_ids: List[str],
+        distribution_type: str
+    ) -> str:
+        """Generate several candidate plans at once and keep the first valid one
+
+        The candidates run the prompt with and without the corrective
+        reminders. Each finished candidate is checked locally; the first one
+        that passes every check is returned and the others are cancelled.
+        Otherwise the best scored candidate is used once all have finished,
+        so the latency is about that of one call instead of one per retry.
+        """
+        prompts = [
+            prompt + reminder for reminder in CANDIDATE_REMINDERS[:self.candidates]
+        ]
+        async def generate(candidate_prompt: str) -> Tuple[str, str]:
+            return candidate_prompt, await self.openai_service.generate_meal_plan(candidate_prompt)
+
+        tasks = [asyncio.create_task(generate(p)) for p in prompts]
+
+        best = None
+        errors = []
+        try:
+            for finished in asyncio.as_completed(tasks):
+                try:
+                    candidate_prompt, meal_plan = await finished
+                except Exception as e:
+                    logger.warning(f"Candidate generation failed: {e}")
+                    errors.append(e)
+                    continue
+
+                score = await self.stage_executor.run(
+                    "cpu", self._score_candidate, meal_plan, all_recipe_ids, distribution_type
+                )
+                if best is None or score > best[0]:
+                    best = (score, meal_plan, candidate_prompt)
+                if all(score):
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if best is None:
+            raise errors[0]
+        logger.info(
+            f"Best-of-{self.candidates} Motor 1 candidate: recipe IDs {'ok' if best[0][0] else 'invalid'}, "
+            f"macros {'ok' if best[0][1] else 'zero'}, structure {'ok' if best[0][2] else 'invalid'}"
+        )
+        if best[0][0] and best[0][1]:
+            await self.openai_service.cache_response(best[2], best[1])
+        return best[1]
+
+    def _score_candidate(
+        self,
+        meal_plan: str,
+        all_recipe_ids: List[str],
+        distribution_type: str
+    ) -> Tuple[bool, bool, bool]:
+        """Local checks of a candidate plan, most important first"""
+        recipes_ok = self.prompt_generator.validate_recipe_usage(meal_plan, all_recipe_ids)
+        # Zero macros are fixed locally when the macro scaler is enabled
+        macros_ok = bool(self.macro_scaler) or not self.meal_plan_processor.check_for_zero_macros(meal_plan)
+        structure_ok, _ = self.meal_plan_processor.validate_meal_plan_structure(meal_plan, distribution_type)
+        return recipes_ok, macros_ok, structure_ok
+
+    @staticmethod
+    def _distribution_for_validation(request: NewPatientRequest) -> str:
+        return "equitable" if request.distribution_type == DistributionType.equitable else "standard"
+
+    @traced("motor1")
+    async def stream_new_patient_plan(
+        self,
+        request: NewPatientRequest,
+        timings: Optional[StageTimings] = None
+    ) -> AsyncIterator[Tuple[str, Dict]]:
+        """Generate a Motor 1 plan, yielding (event, data) pairs as it streams.
+
+        Events: "status", "delta" (raw text), "block" (a finished meal block),
+        "warning" (a validation issue), "retry" (a corrective generation is
+        starting) and finally "done" with the MealPlanResponse.
+        """
+        yield "status", {"stage": "recipes"}
+        meal_plan = ""
+        meal_targets = None
+        validation_errors: List[str] = []
+        if self.solver_mode == "local":
+            meal_plan, validation_errors = await self._solve_locally(request, timings)
+            if validation_errors:
+                logger.warning(f"Local plan breaks {len(validation_errors)} rules, generating it with the LLM")
+                yield "retry", {"reason": "local_plan_invalid", "message": validation_errors[0]}
+                meal_plan, validation_errors = "", []
+            else:
+                yield "delta", {"text": meal_plan}
+        if not meal_plan:
+            prompt, all_recipe_ids, meal_targets = await self._prepare_new_patient(request, timings)
+            try:
+                if self.output_format == "json":
+                    # A JSON plan is only usable once complete: send it as whole blocks
+                    yield "status", {"stage": "generation", "attempt": 1}
+                    meal_plan = await self._generate_structured(
+                        prompt, timings, all_recipe_ids, self._distribution_for_validation(request)
+                    )
+                    yield "delta", {"text": render_plan_text(meal_plan)}
+                    for meal in meal_plan.comidas:
+                        yield "block", {
+                            "name": meal.comida.upper(),
+                            "text": render_plan_text(StructuredMealPlan(titulo="", comidas=[meal])).strip()
+                        }
+                else:
+                    async for event, data in self._generate_validated(prompt, all_recipe_ids, timings):
+                        if event == "plan":
+                            meal_plan = data["text"]
+                        else:
+                            yield event, data
+            except Exception as e:
+                if self.solver_mode != "fallback":
+                    raise
+                logger.warning(f"LLM generation failed, building the plan locally: {e}")
+                yield "retry", {"reason": "llm_unavailable", "message": "Generando el plan localmente"}
+                meal_plan, validation_errors = await self._solve_locally(request, timings)
+                meal_targets = None
+                yield "delta", {"text": meal_plan}
+                for error in validation_errors:
+                    yield "warning", {"kind": "local_plan_invalid", "message": error}
+
+        yield "status", {"stage": "pdf"}
+        response = await self._finalize(
+            meal_plan, request.nombre, "nuevo", timings, meal_targets, validation_errors=validation_errors
+        )
+        yield "done", {**response.model_dump(), "stage_timings": timings.as_dict()}
+
+    async def _generate_validated(
+        self,
+        prompt: str,
+        valid_recipe_ids: List[str],
+        timings: StageTimings
+    ) -> AsyncIterator[Tuple[str, Dict]]:
+        """Stream a Motor 1 completion through IncrementalPlanValidator.
+
+        As soon as a line fails a check that still has an unused corrective
+        reminder, the stream is cancelled and a new generation starts with the
+        reminder appended, instead of paying for the rest of a plan that would
+        be thrown away. Blocks already emitted for an aborted attempt are
+        superseded by the "retry" event. The accepted text is yielded last as
+        a "plan" event.
+        """
+        reminders_used: List[str] = []
+        for attempt in range(1 + MAX_CORRECTIVE_RETRIES):
+            can_retry = attempt < MAX_CORRECTIVE_RETRIES
+            yield "status", {"stage": "generation", "attempt": attempt + 1}
+
+            validator = IncrementalPlanValidator(valid_recipe_ids)
+            abort_issue = None
+            stage = "llm" if attempt == 0 else f"llm_retry_{attempt}"
+            with timings.measure(stage):
+                stream = self.openai_service.stream_meal_plan(prompt + "".join(reminders_used))
+                async with aclosing(stream):
+                    async for delta in stream:
+                        yield "delta", {"text": delta}
+                        issues = validator.feed(delta)
+                        for issue in issues:
+                            yield "warning", {"kind": issue.kind, "message": issue.message}
+                        for name, text in validator.pop_completed_blocks():
+                            yield "block", {"name": name, "text": text}
+
+                        if can_retry:
+                            abort_issue = self._next_correctable_issue(
+                                self._needs_regeneration(issues), reminders_used
+                            )
+                            if abort_issue:
+                                break
+
+            if abort_issue:
+                logger.warning(
+                    f"Aborted generation after {len(validator.text)} characters: {abort_issue.message}"
+                )
+            else:
+                for issue in validator.finish():
+                    yield "warning", {"kind": issue.kind, "message": issue.message}
+                for name, text in validator.pop_completed_blocks():
+                    yield "block", {"name": name, "text": text}
+                if can_retry:
+                    abort_issue = self._next_correctable_issue(
+                        self._needs_regeneration(validator.issues), reminders_used
+                    )
+
+            if not abort_issue:
+                if not self._needs_regeneration(validator.issues):
+                    await self.openai_service.cache_response(prompt + "".join(reminders_used), validator.text)
+                yield "plan", {"text": validator.text}
+                return
+
+            reminders_used.append(ISSUE_REMINDERS[abort_issue.kind])
+            yield "retry", {"reason": abort_issue.kind, "message": abort_issue.message}
+
+    def _needs_regeneration(self, issues: List[StreamIssue]) -> List[StreamIssue]:
+        """Drop issues that post-processing fixes without another LLM call"""
+        if self.macro_scaler:
+            return [issue for issue in issues if issue.kind != "zero_macros"]
+        return issues
+
+    @staticmethod
+    def _next_correctable_issue(issues: List[StreamIssue], reminders_used: List[str]) -> Optional[StreamIssue]:
+        """First issue whose corrective reminder has not been tried yet"""
+        for issue in issues:
+            if ISSUE_REMINDERS[issue.kind] not in reminders_used:
+                return issue
+        return None
+
+    async def _prepare_new_patient(
+        self,
+        request: NewPatientRequest,
+        timings: StageTimings
+    ) -> Tuple[str, List[str], Dict[str, float]]:
+        """Select candidate recipes, build the Motor 1 prompt and per-meal calorie targets"""
+        _, meal_targets = self._nutrition_targets(request)
+        recipes_by_meal = await self._select_recipes(request, timings, PROMPT_RECIPES_PER_MEAL, meal_targets)
+
+        with timings.measure("prompt"):
+            # Format recipes for prompt
+            recipes_formatted = await self.stage_executor.run(
+                "cpu", self.prompt_generator.format_recipe_catalog, recipes_by_meal
+            )
+
+            # Generate prompt with recipe IDs
+            prompt = await self.stage_executor.run(
+                "cpu",
+                self.prompt_generator.generate_motor1_prompt,
+                patient_data=request,
+                recipes_json=recipes_formatted
+            )
+
+        # Collect all recipe IDs for validation
+        all_recipe_ids = []
+        for recipes in recipes_by_meal.values():
+            all_recipe_ids.extend([r['id'] for r in recipes])
+
+        return prompt, all_recipe_ids, meal_targets
+
+    async def _solve_locally(
+        self,
+        request: NewPatientRequest,
+        timings: StageTimings
+    ) -> Tuple[str, List[str]]:
+        """Build the Motor 1 plan with LocalPlanSolver instead of the LLM
+
+        Returns the plan text and the rules it breaks (±5% equivalence, meals
+        without a recipe the patient can have). Options within a meal are
+        deliberately scaled to slightly different calories to even out their
+        macros, so the plan must be finalized without meal targets
+        (MacroScaler then keeps each option's calories).
+        """
+        macro_distribution, meal_targets = self._nutrition_targets(request)
+        recipes_by_meal = await self._select_recipes(request, timings, SOLVER_RECIPES_PER_MEAL, meal_targets)
+
+        with timings.measure("local_solver"):
+            solved = await self.stage_executor.run(
+                "cpu",
+                self.local_solver.solve,
+                recipes_by_meal,
+                meal_targets,
+                macro_distribution,
+                request.distribution_type.value == "equitable"
+            )
+            meal_plan = self.local_solver.render(solved, request.nombre)
+
+        return meal_plan, solved.validation_errors
+
+    @staticmethod
+    def _nutrition_targets(request: NewPatientRequest) -> Tuple[Dict[str, float], Dict[str, float]]:
+        """Macro distribution and per-meal calories the Motor 1 prompt asks for"""
+        pregnancy_requirements = NutritionalCalculator.calculate_pregnancy_adjusted_requirements(request)
+        if pregnancy_requirements:
+            daily_calories = pregnancy_requirements['adjusted_calories']
+            macro_distribution = {
+                "proteinas": pregnancy_requirements['macros']['protein_percentage'] / 100,
+                "carbohidratos": pregnancy_requirements['macros']['carbs_percentage'] / 100,
+                "grasas": pregnancy_requirements['macros']['fat_percentage'] / 100
+            }
+        else:
+            daily_calories = NutritionalCalculator.calculate_daily_calories(request)
+            macro_distribution = NutritionalCalculator.calculate_macro_distribution(request)
+
+        meal_targets = NutritionalCalculator.calculate_patient_meal_distribution(
+            request, daily_calories, pregnancy_requirements
+        )
+        return macro_distribution, meal_targets
+
+    async def _select_recipes(
+        self,
+        request: NewPatientRequest,
+        timings: StageTimings,
+        per_meal_limit: int,
+        meal_targets: Optional[Dict[str, float]] = None
+    ) -> Dict[str, List[Dict]]:
+        """Candidate recipes per meal type for the patient
+
+        Covers the main meals and the catalog type of every meal in
+        meal_targets (snacks such as "mid_morning" draw from "colacion"), so
+        no meal has to fall back to recipes that were not filtered.
+        """
+        meal_types = list(dict.fromkeys(
+            MAIN_MEALS + [recipe_meal_type(meal, self.recipe_manager) for meal in meal_targets or {}]
+        ))
+
+        # Calculate daily macros for recipe filtering
+        daily_calories = NutritionalCalculator.calculate_daily_calories(request)
+        macro_distribution = NutritionalCalculator.calculate_macro_distribution(request)
+
+        daily_macros = {
+            'protein': round((daily_calories * macro_distribution["proteinas"]) / 4),
+            'carbs': round((daily_calories * macro_distribution["carbohidratos"]) / 4),
+            'fats': round((daily_calories * macro_distribution["grasas"]) / 9)
+        }
+
+        # Option 1: Use ChromaDB if available for better semantic search
+        recipes_by_meal = None
+        if self.chromadb_service.collection:
+            with timings.measure("recipe_search"):
+                recipes_by_meal = await self.stage_executor.run(
+                    "search",
+                    self.chromadb_service.search_recipes_by_meal_type,
+                    meal_types=meal_types,
+                    patient_restrictions=request.no_consume,
+                    preferences=request.le_gusta,
+                    economic_level=request.nivel_economico.value,
+                    patologias=request.patologias,
+                    n_results_per_type=per_meal_limit
+                )
+
+        # Option 2: Use Recipe Manager as fallback or primary
+        if not recipes_by_meal or all(len(recipes) == 0 for recipes in recipes_by_meal.values()):
+            with timings.measure("recipe_filter"):
+                recipes_by_meal = await self.stage_executor.run(
+                    "cpu",
+                    self.recipe_manager.get_recipes_for_meal_plan,
+                    meal_types=meal_types,
+                    restrictions=request.no_consume,
+                    preferences=request.le_gusta,
+                    economic_level=request.nivel_economico.value,
+                    daily_macros=daily_macros,
+                    limit=per_meal_limit
+                )
+
+        return recipes_by_meal
+
+    @traced("motor2")
+    async def generate_control_plan(
+        self,
+        request: ControlPatientRequest,
+        timings: Optional[StageTimings] = None
+    ) -> MealPlanResponse:
+        """Generate meal plan for patient control (Motor 2)"""
+        # Best recipes per meal type for this control, within the token budget
+        with timings.measure("recipe_search"):
+            recipes_formatted = await self.stage_executor.run(
+                "cpu", self.catalog_builder.build, request
+            )
+
+        with timings.measure("prompt"):
+            # Generate prompt
+            prompt = await self.stage_executor.run(
+                "cpu",
+                self.prompt_generator.generate_motor2_prompt,
+                control_data=request,
+                previous_plan=request.plan_anterior,
+                recipes_json=recipes_formatted
+            )
+
+        # Generate plan with OpenAI
+        if self.output_format == "json":
+            meal_plan = await self._generate_structured(prompt, timings, priority=Priority.CONTROL)
+        else:
+            with timings.measure("llm"):
+                meal_plan = await self.openai_service.generate_meal_plan(prompt, priority=Priority.CONTROL)
+            await self.openai_service.cache_response(prompt, meal_plan)
+
+        return await self._finalize(meal_plan, request.nombre, "control", timings)
+
+    @traced("motor3")
+    async def replace_meal(
+        self,
+        request: MealReplacementRequest,
+        timings: Optional[StageTimings] = None
+    ) -> MealPlanResponse:
+        """Replace specific meal maintaining macros (Motor 3)"""
+        # Search for replacement options
+        replacement_options = None
+
+        # Try ChromaDB first if available
+        if self.chromadb_service.collection:
+            with timings.measure("recipe_search"):
+                replacement_options = await self.stage_executor.run(
+                    "search",
+                    self.chromadb_service.search_similar_meals,
+                    meal_type=request.comida_reemplazar,
+                    new_meal_description=request.nueva_comida,
+                    target_macros={
+                        "proteinas": request.proteinas,
+                        "carbohidratos": request.carbohidratos,
+                        "grasas": request.grasas,
+                        "calorias": request.calorias
+                    }
+                )
+
+        # If ChromaDB is not available, use RecipeManager
+        if not replacement_options:
+            with timings.measure("recipe_filter"):
+                replacement_options = await self.stage_executor.run(
+                    "cpu", self._find_replacement_options, request
+                )
+
+        # Generate prompt
+        with timings.measure("prompt"):
+            prompt = await self.stage_executor.run(
+                "cpu",
+                self.prompt_generator.generate_motor3_prompt,
+                meal_data=request,
+                current_meal=request.comida_actual,
+                recipes_json=replacement_options
+            )
+
+        # Generate replacement with OpenAI
+        if self.output_format == "json":
+            meal_plan = await self._generate_structured(prompt, timings, priority=Priority.REPLACEMENT)
+        else:
+            with timings.measure("llm"):
+                meal_plan = await self.openai_service.generate_meal_plan(prompt, priority=Priority.REPLACEMENT)
+            await self.openai_service.cache_response(prompt, meal_plan)
+
+        return await self._finalize(
+            meal_plan, request.paciente, "reemplazo", timings,
+            meal_targets={request.comida_reemplazar: request.calorias}
+        )
+
+    async def _finalize(
+        self,
+        meal_plan: Union[str, StructuredMealPlan],
+        patient_name: str,
+        plan_type: str,
+        timings: StageTimings,
+        meal_targets: Optional[Dict[str, float]] = None,
+        validation_errors: Optional[List[str]] = None
+    ) -> MealPlanResponse:
+        """Post-process the generated plan (text or structured) and render its PDF"""
+        if isinstance(meal_plan, StructuredMealPlan):
+            return await self._finalize_structured(
+                meal_plan, patient_name, plan_type, timings, meal_targets, validation_errors
+            )
+
+        if self.macro_scaler:
+            with timings.measure("macro_scaling"):
+                meal_plan = await self.stage_executor.run(
+                    "cpu", self.macro_scaler.rewrite_plan, meal_plan, meal_targets
+                )
+
+        # Post-process meal plan to ensure recipe details are complete
+        # and add recipe appendix with full details
+        with timings.measure("post_process"):
+            processed_meal_plan = await self.stage_executor.run(
+                "cpu", self._post_process_meal_plan, meal_plan
+            )
+
+        # Generate PDF
+        with timings.measure("pdf"):
+            pdf_path = await self.stage_executor.run(
+                "pdf",
+                self.pdf_generator.generate_pdf,
+                meal_plan=processed_meal_plan,
+                patient_name=patient_name,
+                plan_type=plan_type
+            )
+
+        return MealPlanResponse(
+            meal_plan=processed_meal_plan,
+            pdf_path=pdf_path,
+            validation_errors=validation_errors or []
+        )
+
+    async def _finalize_structured(
+        self,
+        plan: StructuredMealPlan,
+        patient_name: str,
+        plan_type: str,
+        timings: StageTimings,
+        meal_targets: Optional[Dict[str, float]] = None,
+        validation_errors: Optional[List[str]] = None
+    ) -> MealPlanResponse:
+        """_finalize for a structured plan: every step reads the typed options"""
+        if self.macro_scaler:
+            with timings.measure("macro_scaling"):
+                plan = await self.stage_executor.run(
+                    "cpu", self.macro_scaler.scale_plan, plan, meal_targets
+                )
+
+        with timings.measure("post_process"):
+            appendix = await self.stage_executor.run(
+                "cpu", self.meal_plan_processor.build_recipe_appendix, plan.recipe_ids()
+            )
+
+        with timings.measure("pdf"):
+            pdf_path = await self.stage_executor.run(
+                "pdf",
+                self.pdf_generator.generate_plan_pdf,
+                plan=plan,
+                patient_name=patient_name,
+                plan_type=plan_type,
+                appendix=appendix
+            )
+
+        return MealPlanResponse(
+            meal_plan=render_plan_text(plan) + appendix,
+            plan=plan,
+            pdf_path=pdf_path,
+            validation_errors=validation_errors or []
+        )
+
+    def _post_process_meal_plan(self, meal_plan: str) -> str:
+        """Complete recipe details and append the recipe appendix"""
+        processed_meal_plan = self.meal_plan_processor.process_meal_plan(meal_plan)
+        return self.meal_plan_processor.add_recipe_appendix(processed_meal_plan)
+
+    def _find_replacement_options(self, request: MealReplacementRequest) -> str:
+        """Find replacement recipes with similar macros using RecipeManager"""
+        # Rank the meal type's recipes within 20% of the target macros, closest first
+        index = self.recipe_manager.index
+        rows = index.rank_by_macros(
+            {
+                "calorias": request.calorias,
+                "proteinas": request.proteinas,
+                "carbohidratos": request.carbohidratos,
+                "grasas": request.grasas
+            },
+            k=REPLACEMENT_OPTIONS,
+            meal_type=request.comida_reemplazar,
+            tolerance=0.2
+        )
+        filtered_recipes = [index.recipes[row] for row in rows]
+
+        # Format for prompt
+        return self.prompt_generator.format_recipe_catalog({
+            request.comida_reemplazar: filtered_recipes
+        })
@@ -1,7 +1,9 @@
 import re
 import logging
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from ..schemas.meal_plan import StructuredMealPlan
 from .recipe_manager import RecipeManager
+from .structured_output import plan_meal_structure
 from ..utils.meal_plan_validator import MealPlanValidator
 
 logger = logging.getLogger(__name__)
@@ -10,6 +12,7 @@ class MealPlanProcessor:
     def __init__(self, recipe_manager: RecipeManager):
         self.recipe_manager = recipe_manager
         self.validator = MealPlanValidator()
+        self.recipe_manager.fragments.register("appendix", self._render_full_recipe)
     
     def process_meal_plan(self, meal_plan_text: str) -> str:
         """Process a meal plan to ensure recipe details are complete"""
@@ -57,8 +60,13 @@ class MealPlanProcessor:
         recipe_ids = re.findall(recipe_id_pattern, meal_plan_text)
         unique_ids = list(set([id.strip('[]') for id in recipe_ids]))
         
+        return meal_plan_text + self.build_recipe_appendix(unique_ids)
+    
+    def build_recipe_appendix(self, recipe_ids: Iterable[str]) -> str:
+        """Appendix with the full details of the given recipes (empty if there are none)"""
+        unique_ids = set(recipe_ids)
         if not unique_ids:
-            return meal_plan_text
+            return ""
         
         # Create appendix
         appendix = ["\n\n=== DETALLES DE RECETAS UTILIZADAS ===\n"]
@@ -68,10 +76,14 @@ class MealPlanProcessor:
             if recipe:
                 appendix.append(self._format_full_recipe(recipe))
         
-        return meal_plan_text + "\n".join(appendix)
+        return "\n".join(appendix)
     
     def _format_full_recipe(self, recipe: Dict) -> str:
         """Format a complete recipe for the appendix"""
+        return self.recipe_manager.fragments.get("appendix", recipe)
+    
+    @staticmethod
+    def _render_full_recipe(recipe: Dict) -> str:
         ingredients = "\n  ".join([
             f"• {ing['item']}: {ing['cantidad']}"
             for ing in recipe.get('ingredientes', [])
@@ -123,21 +135,24 @@ Tags: {', '.join(recipe.get('tags', []))}
     
     def validate_meal_plan_structure(
         self, 
-        meal_plan_text: str, 
+        meal_plan_text: Union[str, StructuredMealPlan], 
         distribution_type: str = "standard"
     ) -> Tuple[bool, str]:
         """
         Valida la estructura del plan según las reglas del sistema
         
         Args:
-            meal_plan_text: Texto del plan generado
+            meal_plan_text: Texto del plan generado, o el plan estructurado
             distribution_type: "equitable" o "standard"
             
         Returns:
             (is_valid, validation_report)
         """
-        # Extraer las opciones y macros del plan
-        meal_structure = self._extract_meal_structure(meal_plan_text)
+        # Extraer las opciones y macros del plan (el plan estructurado ya las tiene)
+        if isinstance(meal_plan_text, StructuredMealPlan):
+            meal_structure = plan_meal_structure(meal_plan_text)
+        else:
+            meal_structure = self._extract_meal_structure(meal_plan_text)
         
         if not meal_structure:
             return False, "❌ No se pudo extraer la estructura del plan para validación"
@@ -255,4 +270,27 @@ Tags: {', '.join(recipe.get('tags', []))}
                 
                 warnings.append(f"\u26a0️ ADVERTENCIA: {meal_name} - {option_name} tiene todos los macros en cero")
         
-        return warnings
\ No newline at end of file
+        return warnings
+    
+    def check_plan_recipes(
+        self,
+        plan: StructuredMealPlan,
+        valid_recipe_ids: Optional[Iterable[str]] = None
+    ) -> List[str]:
+        """Recipe IDs of a structured plan that are not allowed (or not in the catalog)"""
+        if valid_recipe_ids is not None:
+            allowed = set(valid_recipe_ids)
+            return [recipe_id for recipe_id in plan.recipe_ids() if recipe_id not in allowed]
+        return [
+            recipe_id for recipe_id in plan.recipe_ids()
+            if self.recipe_manager.get_recipe_by_id(recipe_id) is None
+        ]
+    
+    def check_plan_zero_macros(self, plan: StructuredMealPlan) -> List[str]:
+        """Same warnings as check_for_zero_macros, for a structured plan"""
+        return [
+            f"\u26a0️ ADVERTENCIA: {meal.comida} - OPCIÓN {number} tiene todos los macros en cero"
+            for meal in plan.comidas
+            for number, option in enumerate(meal.opciones, 1)
+            if option.macros.all_zero
+        ]
@@ -0,0 +1,318 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import re
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Longest single sleep while waiting for rate-limit budget, so a request that
+# arrives with a higher priority is noticed soon
+MAX_BUDGET_WAIT = 2.0
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+class Priority(IntEnum):
+    """Queue order for OpenAI requests, lowest first"""
+    REPLACEMENT = 0  # Motor 3: a single meal, the user is waiting on it
+    NEW_PATIENT = 1  # Motor 1
+    IMAGE = 2        # Plan image analysis
+    CONTROL = 3      # Motor 2: whole-plan rewrites, the bulk of the tokens
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds in an OpenAI reset header such as "1s", "6m0s" or "20ms\""""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_SECONDS[unit] for amount, unit in parts)
+
+
+def retry_after_seconds(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Seconds a 429 response asks to wait: retry-after, else the later of the budget resets"""
+    if not headers:
+        return None
+    retry_after = parse_duration(headers.get("retry-after"))
+    if retry_after is not None:
+        return retry_after
+    resets = [
+        parse_duration(headers.get(name))
+        for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+    ]
+    resets = [reset for reset in resets if reset is not None]
+    return max(resets) if resets else None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None, base: float = 1.0, cap: float = 30.0) -> float:
+    """Jittered exponential backoff; honours the server's retry-after when given"""
+    if retry_after is not None:
+        return retry_after + random.uniform(0, base)
+    delay = min(cap, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class RateLimitLedger:
+    """Requests- and tokens-per-minute budgets shared by every worker.
+
+    One token bucket per model, refilled continuously at the account's RPM and
+    TPM. The buckets live in SQLite, so uvicorn workers on the same host draw
+    from the same budget; each reservation is a short write transaction. The
+    limits start from the configured defaults and follow the x-ratelimit-*
+    headers of every response. Without a path the ledger is per process.
+    """
+
+    def __init__(self, path: Optional[str] = None, rpm_limit: float = 500, tpm_limit: float = 30000):
+        self.default_rpm = rpm_limit
+        self.default_tpm = tpm_limit
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path or ":memory:", check_same_thread=False, timeout=30, isolation_level=None)
+        if path:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "model TEXT PRIMARY KEY, rpm REAL NOT NULL, tpm REAL NOT NULL, requests REAL NOT NULL, "
+            "tokens REAL NOT NULL, updated REAL NOT NULL, blocked_until REAL NOT NULL)"
+        )
+
+    def reserve(self, model: str, tokens: int) -> float:
+        """Take one request and `tokens` from the budget, or return the seconds to wait"""
+        def update(bucket, now):
+            if now < bucket["blocked_until"]:
+                return bucket["blocked_until"] - now
+            needed = min(tokens, bucket["tpm"])
+            if bucket["requests"] >= 1 and bucket["tokens"] >= needed:
+                bucket["requests"] -= 1
+                bucket["tokens"] -= needed
+                return 0.0
+            return max(
+                (1 - bucket["requests"]) * 60 / bucket["rpm"],
+                (needed - bucket["tokens"]) * 60 / bucket["tpm"],
+                0.001
+            )
+        return self._update(model, update)
+
+    def refund(self, model: str, tokens: int):
+        """Return tokens reserved but not used (the estimate was higher than the usage)"""
+        def update(bucket, now):
+            bucket["tokens"] = min(bucket["tpm"], bucket["tokens"] + max(tokens, 0))
+        self._update(model, update)
+
+    def observe(self, model: str, headers: Mapping[str, str]):
+        """Follow the limits and remaining budget reported by the API"""
+        def number(name):
+            try:
+                return float(headers[name])
+            except (KeyError, TypeError, ValueError):
+                return None
+
+        def update(bucket, now):
+            limit_requests = number("x-ratelimit-limit-requests")
+            limit_tokens = number("x-ratelimit-limit-tokens")
+            remaining_requests = number("x-ratelimit-remaining-requests")
+            remaining_tokens = number("x-ratelimit-remaining-tokens")
+            if limit_requests:
+                bucket["rpm"] = limit_requests
+            if limit_tokens:
+                bucket["tpm"] = limit_tokens
+            if remaining_requests is not None:
+                bucket["requests"] = min(bucket["requests"], remaining_requests)
+            if remaining_tokens is not None:
+                bucket["tokens"] = min(bucket["tokens"], remaining_tokens)
+        self._update(model, update)
+
+    def block(self, model: str, seconds: float):
+        """Stop every worker from sending requests for a while (after a 429)"""
+        def update(bucket, now):
+            bucket["blocked_until"] = max(bucket["blocked_until"], now + seconds)
+            bucket["requests"] = 0.0
+        self._update(model, update)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT model, rpm, tpm, requests, tokens, updated, blocked_until FROM buckets"
+            ).fetchall()
+        now = time.time()
+        return {
+            model: {
+                "rpm_limit": rpm,
+                "tpm_limit": tpm,
+                "requests_available": round(min(rpm, requests + rpm * (now - updated) / 60), 1),
+                "tokens_available": round(min(tpm, tokens + tpm * (now - updated) / 60)),
+                "blocked_seconds": round(max(blocked_until - now, 0.0), 1)
+            }
+            for model, rpm, tpm, requests, tokens, updated, blocked_until in rows
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _update(self, model: str, update) -> Any:
+        # Read, refill, change and write a bucket in one write transaction
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self._conn.execute(
+                    "SELECT rpm, tpm, requests, tokens, updated, blocked_until FROM buckets WHERE model = ?",
+                    (model,)
+                ).fetchone()
+                if row is None:
+                    row = (self.default_rpm, self.default_tpm, self.default_rpm, self.default_tpm, now, 0.0)
+                rpm, tpm, requests, tokens, updated, blocked_until = row
+                elapsed = max(now - updated, 0.0)
+                bucket = {
+                    "rpm": rpm,
+                    "tpm": tpm,
+                    "requests": min(rpm, requests + rpm * elapsed / 60),
+                    "tokens": min(tpm, tokens + tpm * elapsed / 60),
+                    "blocked_until": blocked_until
+                }
+                result = update(bucket, now)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO buckets (model, rpm, tpm, requests, tokens, updated, blocked_until) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (model, bucket["rpm"], bucket["tpm"], bucket["requests"], bucket["tokens"], now,
+                     bucket["blocked_until"])
+                )
+                self._conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+class OpenAIScheduler:
+    """Priority queue in front of the OpenAI API.
+
+    A request waits until it is the highest-priority one queued in this
+    process, a concurrency slot is free and the shared RateLimitLedger has
+    budget for it, so under load Motor 3 replacements go out before bulk
+    Motor 2 rewrites and workers stop retrying into a 429 together.
+    """
+
+    def __init__(self, ledger: RateLimitLedger, max_concurrency: int = 8):
+        self.ledger = ledger
+        self.max_concurrency = max_concurrency
+        self._queue: List[Tuple[int, int]] = []
+        self._sequence = itertools.count()
+        self._active = 0
+        # Queue entry whose budget is being reserved in the ledger
+        self._reserving: Optional[Tuple[int, int]] = None
+        self._condition = asyncio.Condition()
+        self._stats = {
+            "requests": 0,
+            "budget_waits": 0,
+            "rate_limit_errors": 0,
+            "max_queue_depth": 0,
+            "wait_seconds": 0.0
+        }
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority, model: str, tokens: int):
+        """Hold a request slot for `tokens` (prompt plus max_tokens) of `model`"""
+        await self.acquire(priority, model, tokens)
+        try:
+            yield
+        finally:
+            await self.release()
+
+    async def acquire(self, priority: Priority, model: str, tokens: int):
+        entry = (int(priority), next(self._sequence))
+        start = time.perf_counter()
+        async with self._condition:
+            heapq.heappush(self._queue, entry)
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], len(self._queue))
+            self._condition.notify_all()
+            reserved = False
+            try:
+                while True:
+                    await self._condition.wait_for(
+                        lambda: self._queue[0] == entry
+                        and self._reserving is None
+                        and self._active < self.max_concurrency
+                    )
+                    if reserved:
+                        break
+                    # Only the head reserves, one at a time; the SQLite transaction
+                    # may wait on other workers' locks, so it runs without the condition
+                    self._reserving = entry
+                    try:
+                        wait = await self._unlocked(self.ledger.reserve, model, tokens)
+                    finally:
+                        self._reserving = None
+                        self._condition.notify_all()
+                    if wait <= 0:
+                        # A request queued meanwhile may have overtaken this one;
+                        # it keeps its budget and waits to be the head again
+                        reserved = True
+                        continue
+                    self._stats["budget_waits"] += 1
+                    # Let others queue (and overtake) while this one waits for budget
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout=min(wait, MAX_BUDGET_WAIT))
+                    except asyncio.TimeoutError:
+                        pass
+                self._active += 1
+            finally:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._condition.notify_all()
+
+        self._stats["requests"] += 1
+        self._stats["wait_seconds"] += time.perf_counter() - start
+
+    async def _unlocked(self, func: Callable, *args):
+        """Run a ledger call in a thread with the condition released"""
+        self._condition.release()
+        try:
+            return await asyncio.to_thread(func, *args)
+        finally:
+            await self._condition.acquire()
+
+    async def release(self):
+        async with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    async def observe(self, model: str, headers: Mapping[str, str]):
+        await asyncio.to_thread(self.ledger.observe, model, headers)
+
+    async def refund(self, model: str, tokens: int):
+        if tokens > 0:
+            await asyncio.to_thread(self.ledger.refund, model, tokens)
+
+    async def rate_limited(self, model: str, retry_after: Optional[float]):
+        """Record a 429 and hold every worker back until the API allows requests again"""
+        self._stats["rate_limit_errors"] += 1
+        await asyncio.to_thread(self.ledger.block, model, retry_after or backoff_delay(0))
+
+    async def get_stats(self) -> Dict[str, Any]:
+        queued_by_priority = {priority.name.lower(): 0 for priority in Priority}
+        for priority, _ in self._queue:
+            queued_by_priority[Priority(priority).name.lower()] += 1
+        requests = self._stats["requests"]
+        return {
+            **self._stats,
+            "wait_seconds": round(self._stats["wait_seconds"], 3),
+            "avg_wait_seconds": round(self._stats["wait_seconds"] / requests, 4) if requests else 0.0,
+            "queued": len(self._queue),
+            "queued_by_priority": queued_by_priority,
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "budgets": await asyncio.to_thread(self.ledger.snapshot)
+        }
@@ -1,22 +1,85 @@
 import openai
 from openai import AsyncOpenAI
-from typing import Optional, Dict, List
+from typing import AsyncIterator, Optional, Dict, List
 import asyncio
 import base64
 import json
 import logging
 from ..config import settings
+from .http_clients import HTTPClients
+from .llm_cache import LLMResponseCache
+from .openai_scheduler import OpenAIScheduler, Priority, RateLimitLedger, backoff_delay, retry_after_seconds
+from .prompt_generator import estimate_tokens
+from .tracing import record_llm_usage
 
 logger = logging.getLogger(__name__)
 
+MEAL_PLAN_SYSTEM_MESSAGE = """Sos un nutricionista experto en el método "Tres Días y Carga". 
+                            Tenés acceso a un catálogo completo de recetas con sus IDs, ingredientes y valores nutricionales.
+                            DEBERÁS usar Únicamente las recetas del catálogo proporcionado, identificadas por su ID [REC_XXXX].
+                            Adaptá las cantidades de los ingredientes para cumplir con los requerimientos nutricionales.
+                            Todas las cantidades deben estar en gramos crudos y el plan debe ser de 3 días idénticos."""
+
+# JSON output mode (response_format json_object); the API requires "JSON" in the messages
+STRUCTURED_PLAN_SYSTEM_MESSAGE = MEAL_PLAN_SYSTEM_MESSAGE + """
+                            Respondé únicamente con un objeto JSON válido que siga la estructura pedida."""
+
+# Tokens a high-detail plan photo costs (up to 4 tiles of 170 plus the base 85)
+IMAGE_TOKENS = 765
+
+
+def is_retryable(error: openai.APIError) -> bool:
+    """Connection problems, timeouts and server errors are worth another attempt"""
+    if isinstance(error, openai.APIConnectionError):  # includes APITimeoutError
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
 class OpenAIService:
-    def __init__(self):
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
+    def __init__(
+        self,
+        scheduler: Optional[OpenAIScheduler] = None,
+        http_clients: Optional[HTTPClients] = None
+    ):
+        # Pooled connections shared with the other services, and a timeout per call type
+        self.http_clients = http_clients
+        if http_clients:
+            self.client = AsyncOpenAI(
+                api_key=settings.openai_api_key,
+                http_client=http_clients.async_client(),
+                timeout=http_clients.timeout("chat")
+            )
+        else:
+            self.client = AsyncOpenAI(api_key=settings.openai_api_key)
         self.model = "gpt-4-turbo-preview"
         self.vision_model = "gpt-4-vision-preview"
         self.max_retries = 3
+        self.temperature = 0.7
+        self.max_tokens = 3000
+        # JSON plans repeat field names, so they need more room than text ones
+        self.structured_max_tokens = 4096
+        
+        # Cache for identical meal-plan prompts
+        self.response_cache = None
+        if settings.llm_cache_enabled:
+            self.response_cache = LLMResponseCache(
+                max_entries=settings.llm_cache_max_entries,
+                ttl_seconds=settings.llm_cache_ttl_seconds,
+                disk_dir=settings.llm_cache_dir,
+                max_disk_bytes=settings.llm_cache_max_disk_mb * 1024 * 1024
+            )
+        
+        # Priority queue and RPM/TPM budgets for every request to OpenAI
+        self.scheduler = scheduler or OpenAIScheduler(
+            RateLimitLedger(
+                settings.openai_scheduler_db,
+                rpm_limit=settings.openai_rpm_limit,
+                tpm_limit=settings.openai_tpm_limit
+            ),
+            max_concurrency=settings.openai_max_concurrency
+        )
         
-    async def generate_meal_plan(self, prompt: str) -> str:
+    async def generate_meal_plan(self, prompt: str, priority: Priority = Priority.NEW_PATIENT) -> str:
         """Generate meal plan using OpenAI GPT-4"""
         
         # Log prompt length and recipe count for debugging
@@ -27,59 +90,206 @@ class OpenAIService:
         # Log first 500 chars of prompt for debugging
         logger.debug(f"Prompt preview: {prompt[:500]}...")
         
+        # Return the accepted response of an identical request (see cache_response)
+        if self.response_cache:
+            cache_key = LLMResponseCache.make_key(
+                self.model, MEAL_PLAN_SYSTEM_MESSAGE, prompt, self.temperature
+            )
+            cached = await self.response_cache.aget(cache_key)
+            if cached is not None:
+                logger.info(f"GPT-4 response served from cache: {len(cached)} characters")
+                return cached
+        
+        response = await self._create_completion(
+            priority,
+            self.model,
+            self._meal_plan_tokens(prompt),
+            messages=self._meal_plan_messages(prompt),
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            **self._request_options("chat")
+        )
+        
+        try:
+            result = response.choices[0].message.content
+        except Exception as e:
+            raise Exception(f"Error generating meal plan: {str(e)}")
+        
+        # Log response info
+        logger.info(f"GPT-4 response received: {len(result)} characters")
+        
+        # Check if response contains recipe IDs
+        response_recipe_count = result.count('[REC_')
+        if response_recipe_count == 0:
+            logger.warning("GPT-4 response contains no recipe IDs!")
+        else:
+            logger.info(f"GPT-4 response contains {response_recipe_count} recipe references")
+        
+        return result
+    
+    async def generate_structured_plan(self, prompt: str, priority: Priority = Priority.NEW_PATIENT) -> str:
+        """Generate a meal plan as a JSON object (see parse_structured_plan)"""
+        
+        logger.info(f"Sending JSON prompt to GPT-4: {len(prompt)} characters, {prompt.count('[REC_')} recipe references")
+        
+        if self.response_cache:
+            cache_key = LLMResponseCache.make_key(
+                self.model, STRUCTURED_PLAN_SYSTEM_MESSAGE, prompt, self.temperature
+            )
+            cached = await self.response_cache.aget(cache_key)
+            if cached is not None:
+                logger.info(f"GPT-4 response served from cache: {len(cached)} characters")
+                return cached
+        
+        response = await self._create_completion(
+            priority,
+            self.model,
+            self._meal_plan_tokens(prompt, STRUCTURED_PLAN_SYSTEM_MESSAGE, self.structured_max_tokens),
+            messages=self._meal_plan_messages(prompt, STRUCTURED_PLAN_SYSTEM_MESSAGE),
+            temperature=self.temperature,
+            max_tokens=self.structured_max_tokens,
+            response_format={"type": "json_object"},
+            **self._request_options("chat")
+        )
+        
+        choice = response.choices[0]
+        result = choice.message.content or ""
+        logger.info(f"GPT-4 JSON response received: {len(result)} characters")
+        if choice.finish_reason == "length":
+            logger.warning("GPT-4 JSON response was cut off at max_tokens")
+        
+        return result
+    
+    async def stream_meal_plan(
+        self, prompt: str, priority: Priority = Priority.NEW_PATIENT
+    ) -> AsyncIterator[str]:
+        """Generate meal plan using OpenAI GPT-4, yielding text as it is produced"""
+        
+        logger.info(f"Streaming prompt to GPT-4: {len(prompt)} characters, {prompt.count('[REC_')} recipe references")
+        
+        if self.response_cache:
+            cache_key = LLMResponseCache.make_key(
+                self.model, MEAL_PLAN_SYSTEM_MESSAGE, prompt, self.temperature
+            )
+            cached = await self.response_cache.aget(cache_key)
+            if cached is not None:
+                logger.info(f"GPT-4 response served from cache: {len(cached)} characters")
+                yield cached
+                return
+        
+        # Retries are only possible before the first token has been sent; the
+        # scheduler slot is held until the stream is finished or closed
+        estimated_tokens = self._meal_plan_tokens(prompt)
+        stream = None
         for attempt in range(self.max_retries):
+            await self.scheduler.acquire(priority, self.model, estimated_tokens)
             try:
-                response = await self.client.chat.completions.create(
+                raw = await self.client.chat.completions.with_raw_response.create(
                     model=self.model,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": """Sos un nutricionista experto en el método "Tres Días y Carga". 
-                            Tenés acceso a un catálogo completo de recetas con sus IDs, ingredientes y valores nutricionales.
-                            DEBERÁS usar Únicamente las recetas del catálogo proporcionado, identificadas por su ID [REC_XXXX].
-                            Adaptá las cantidades de los ingredientes para cumplir con los requerimientos nutricionales.
-                            Todas las cantidades deben estar en gramos crudos y el plan debe ser de 3 días idénticos."""
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    temperature=0.7,
-                    max_tokens=3000
+                    messages=self._meal_plan_messages(prompt),
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                    stream=True,
+                    **self._request_options("chat")
                 )
+                await self.scheduler.observe(self.model, raw.headers)
+                stream = raw.parse()
+                break
                 
-                result = response.choices[0].message.content
-                
-                # Log response info
-                logger.info(f"GPT-4 response received: {len(result)} characters")
-                
-                # Check if response contains recipe IDs
-                response_recipe_count = result.count('[REC_')
-                if response_recipe_count == 0:
-                    logger.warning("GPT-4 response contains no recipe IDs!")
-                else:
-                    logger.info(f"GPT-4 response contains {response_recipe_count} recipe references")
-                
-                return result
-                
-            except openai.RateLimitError:
-                if attempt < self.max_retries - 1:
-                    wait_time = (attempt + 1) * 2
-                    await asyncio.sleep(wait_time)
-                else:
-                    raise Exception("OpenAI rate limit exceeded. Please try again later.")
+            except openai.RateLimitError as e:
+                await self.scheduler.release()
+                await self._rate_limit_backoff(self.model, attempt, e)
                     
             except openai.APIError as e:
-                if attempt < self.max_retries - 1:
-                    await asyncio.sleep(1)
-                else:
-                    raise Exception(f"OpenAI API error: {str(e)}")
+                await self.scheduler.release()
+                await self._api_error_backoff(attempt, e)
                     
             except Exception as e:
+                await self.scheduler.release()
                 raise Exception(f"Error generating meal plan: {str(e)}")
+
+            except BaseException:
+                # Cancelled while waiting for the response headers
+                await self.scheduler.release()
+                raise
+
+        if stream is None:
+            raise Exception("Failed to generate meal plan after multiple attempts")
+        
+        chunks = []
+        completed = False
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    chunks.append(delta)
+                    yield delta
+            completed = True
+        except openai.APIError as e:
+            raise Exception(f"OpenAI API error: {str(e)}")
+        finally:
+            if not completed:
+                # The consumer stopped early (e.g. a validation abort): drop the
+                # HTTP response so OpenAI stops generating tokens for it
+                logger.info(f"GPT-4 stream cancelled after {sum(len(c) for c in chunks)} characters")
+                try:
+                    await stream.close()
+                finally:
+                    await self.scheduler.release()
+            else:
+                await self.scheduler.release()
+            # Streamed responses carry no usage field: count estimated tokens,
+            # including those of a cancelled stream (they are billed too)
+            prompt_tokens = estimate_tokens(MEAL_PLAN_SYSTEM_MESSAGE + prompt)
+            completion_tokens = estimate_tokens("".join(chunks))
+            record_llm_usage(self.model, prompt_tokens, completion_tokens)
+            # Give back the completion budget a finished or aborted stream did not use
+            await self.scheduler.refund(self.model, estimated_tokens - prompt_tokens - completion_tokens)
+        
+        logger.info(f"GPT-4 stream finished: {sum(len(c) for c in chunks)} characters")
+    
+    async def cache_response(self, prompt: str, response: str, structured: bool = False):
+        """Cache a completion the pipeline accepted, for identical prompts
         
-        raise Exception("Failed to generate meal plan after multiple attempts")
+        Completions are not cached when they arrive: one that fails the
+        pipeline's checks would be replayed, and corrected again, on every
+        identical request.
+        """
+        if not self.response_cache or not response:
+            return
+        system_message = STRUCTURED_PLAN_SYSTEM_MESSAGE if structured else MEAL_PLAN_SYSTEM_MESSAGE
+        cache_key = LLMResponseCache.make_key(self.model, system_message, prompt, self.temperature)
+        await self.response_cache.aset(cache_key, response)
+    
+    def _meal_plan_messages(self, prompt: str, system_message: str = MEAL_PLAN_SYSTEM_MESSAGE) -> List[Dict]:
+        """Chat messages for a meal plan request"""
+        return [
+            {
+                "role": "system",
+                "content": system_message
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+    
+    def _meal_plan_tokens(
+        self,
+        prompt: str,
+        system_message: str = MEAL_PLAN_SYSTEM_MESSAGE,
+        max_tokens: Optional[int] = None
+    ) -> int:
+        """Tokens a meal plan request can use: prompt (estimated) plus the completion limit"""
+        return estimate_tokens(system_message + prompt) + (max_tokens or self.max_tokens)
+    
+    def get_cache_stats(self) -> Dict:
+        """Hit/miss counters of the meal-plan response cache"""
+        if not self.response_cache:
+            return {"enabled": False}
+        return {"enabled": True, **self.response_cache.get_stats()}
     
     async def analyze_meal_plan_image(self, image_bytes: bytes) -> Dict:
         """Analyze meal plan image using GPT-4 Vision"""
@@ -112,51 +322,96 @@ class OpenAIService:
         Asegúrate de extraer las cantidades en gramos cuando estén disponibles.
         """
         
-        for attempt in range(self.max_retries):
-            try:
-                response = await self.client.chat.completions.create(
-                    model=self.vision_model,
-                    messages=[
+        response = await self._create_completion(
+            Priority.IMAGE,
+            self.vision_model,
+            estimate_tokens(prompt) + IMAGE_TOKENS + 2000,
+            error_prefix="Error analyzing image",
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": prompt
+                        },
                         {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": prompt
-                                },
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": f"data:image/jpeg;base64,{base64_image}",
-                                        "detail": "high"
-                                    }
-                                }
-                            ]
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:image/jpeg;base64,{base64_image}",
+                                "detail": "high"
+                            }
                         }
-                    ],
-                    temperature=0.3,
-                    max_tokens=2000,
-                    response_format={ "type": "json_object" }
-                )
+                    ]
+                }
+            ],
+            temperature=0.3,
+            max_tokens=2000,
+            response_format={ "type": "json_object" },
+            **self._request_options("vision")
+        )
+        
+        # Parse JSON response
+        try:
+            result = response.choices[0].message.content
+            return json.loads(result)
+        except json.JSONDecodeError as e:
+            raise Exception(f"Error parsing GPT-4 Vision response: {str(e)}")
+        except Exception as e:
+            raise Exception(f"Error analyzing image: {str(e)}")
+    
+    async def _create_completion(
+        self,
+        priority: Priority,
+        model: str,
+        estimated_tokens: int,
+        error_prefix: str = "Error generating meal plan",
+        **kwargs
+    ):
+        """Chat completion sent through the scheduler, retrying rate limits and API errors"""
+        for attempt in range(self.max_retries):
+            try:
+                async with self.scheduler.slot(priority, model, estimated_tokens):
+                    raw = await self.client.chat.completions.with_raw_response.create(model=model, **kwargs)
+                    await self.scheduler.observe(model, raw.headers)
+                    response = raw.parse()
                 
-                # Parse JSON response
-                result = response.choices[0].message.content
-                return json.loads(result)
+                # Give back the part of the reservation the request did not use
+                if response.usage:
+                    await self.scheduler.refund(model, estimated_tokens - response.usage.total_tokens)
+                    record_llm_usage(model, response.usage.prompt_tokens, response.usage.completion_tokens)
+                return response
                 
-            except openai.RateLimitError:
-                if attempt < self.max_retries - 1:
-                    wait_time = (attempt + 1) * 2
-                    await asyncio.sleep(wait_time)
-                else:
-                    raise Exception("OpenAI rate limit exceeded. Please try again later.")
+            except openai.RateLimitError as e:
+                await self._rate_limit_backoff(model, attempt, e)
                     
-            except json.JSONDecodeError as e:
-                raise Exception(f"Error parsing GPT-4 Vision response: {str(e)}")
+            except openai.APIError as e:
+                await self._api_error_backoff(attempt, e)
                     
             except Exception as e:
-                if attempt < self.max_retries - 1:
-                    await asyncio.sleep(1)
-                else:
-                    raise Exception(f"Error analyzing image: {str(e)}")
+                raise Exception(f"{error_prefix}: {str(e)}")
         
-        raise Exception("Failed to analyze image after multiple attempts")
\ No newline at end of file
+        raise Exception(f"{error_prefix}: no response after {self.max_retries} attempts")
+    
+    async def _rate_limit_backoff(self, model: str, attempt: int, error: openai.RateLimitError):
+        """Hold back every worker after a 429, then wait (with jitter) before the next attempt"""
+        retry_after = retry_after_seconds(error.response.headers if error.response is not None else None)
+        logger.warning(f"OpenAI rate limit hit (attempt {attempt + 1}), retry after {retry_after}s")
+        await self.scheduler.rate_limited(model, retry_after)
+        if attempt >= self.max_retries - 1:
+            raise Exception("OpenAI rate limit exceeded. Please try again later.")
+        await asyncio.sleep(backoff_delay(attempt, retry_after))
+    
+    async def _api_error_backoff(self, attempt: int, error: openai.APIError):
+        """Wait before retrying a transient error; client errors (4xx) are raised at once"""
+        if not is_retryable(error) or attempt >= self.max_retries - 1:
+            raise Exception(f"OpenAI API error: {str(error)}")
+        await asyncio.sleep(backoff_delay(attempt))
+    
+    def _request_options(self, call_type: str) -> Dict:
+        """Per-request timeout for a kind of call (the client default without shared clients)"""
+        return {"timeout": self.http_clients.timeout(call_type)} if self.http_clients else {}
+    
+    async def get_scheduler_stats(self) -> Dict:
+        """Queue depth, waits and rate-limit budgets of the OpenAI request scheduler"""
+        return await self.scheduler.get_stats()
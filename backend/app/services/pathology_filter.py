@@ -0,0 +1,119 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Optional, Pattern, Tuple
+from ..schemas.meal_plan import NivelEconomico
+from ..data.pathologies import (
+    PathologyType,
+    detect_pathologies_from_text,
+    get_all_dietary_restrictions,
+    get_recipe_tags_to_avoid,
+    get_pregnancy_info
+)
+from .recipe_index import split_terms
+
+# Mapeo de restricciones dietéticas a ingredientes específicos; las
+# restricciones sin mapeo se buscan directamente en los ingredientes
+RESTRICTION_INGREDIENTS = {
+    'azúcar refinada': ('azúcar', 'azucar'),
+    'miel': ('miel',),
+    'dulces': ('dulce', 'mermelada', 'chocolate', 'caramelo'),
+    'bebidas azucaradas': ('gaseosa', 'jugo envasado', 'bebida azucarada'),
+    'harinas blancas': ('harina blanca', 'harina 000', 'harina 0000'),
+    'harinas refinadas': ('harina blanca', 'pan blanco', 'galletas'),
+    'alcohol': ('vino', 'cerveza', 'licor', 'alcohol'),
+    'embutidos': ('salame', 'mortadela', 'bondiola', 'jamón crudo'),
+    'sal de mesa': ('sal',),
+    'quesos duros': ('queso parmesano', 'queso reggianito', 'queso sardo'),
+    'lácteos no pasteurizados': ('leche cruda', 'queso artesanal'),
+    'carnes crudas': ('carpaccio', 'steak tartar', 'carne cruda'),
+    'huevos crudos': ('huevo crudo', 'mayonesa casera'),
+    'pescados alto mercurio': ('pez espada', 'tiburón', 'caballa rey'),
+    'gluten': ('harina', 'pan', 'fideos', 'pasta', 'galletas', 'cebada', 'centeno'),
+    'trigo': ('harina de trigo', 'pan', 'pasta', 'galletas'),
+    'soja en exceso': ('soja texturizada', 'leche de soja', 'tofu'),
+    'frituras': ('frito', 'fritura'),
+    'grasas trans': ('margarina', 'grasa vegetal hidrogenada'),
+    'alimentos ultraprocesados': ('snacks', 'galletitas industriales'),
+    'cafeína excesiva': ('café', 'té negro', 'mate', 'bebidas energizantes')
+}
+
+# Alimentos no seguros en embarazo
+UNSAFE_PREGNANCY_INGREDIENTS = (
+    'sushi', 'ceviche', 'ostras', 'almejas crudas',
+    'paté', 'foie gras', 'queso azul', 'queso brie',
+    'queso camembert', 'brotes crudos', 'germinados'
+)
+
+LIMITED_BUDGET_LEVELS = (NivelEconomico.bajo_recursos.value, NivelEconomico.limitado.value)
+
+
+@dataclass(frozen=True)
+class RecipeFilter:
+    """Compiled recipe filter for one patient
+
+    excluded_ingredients matches any forbidden term as a substring of the
+    recipe's ingredient names; excluded_tags are the recipe tags to avoid.
+    """
+    excluded_ingredients: Optional[Pattern] = None
+    excluded_tags: FrozenSet[str] = frozenset()
+
+    def passes(self, recipe: Dict) -> bool:
+        """Check if a recipe passes the filter"""
+        if self.excluded_tags and not self.excluded_tags.isdisjoint(
+            tag.lower() for tag in recipe.get('tags', [])
+        ):
+            return False
+        if self.excluded_ingredients is not None:
+            ingredients_text = " ".join(ing['item'].lower() for ing in recipe.get('ingredientes', []))
+            if self.excluded_ingredients.search(ingredients_text):
+                return False
+        return True
+
+
+@lru_cache(maxsize=256)
+def compile_pathology_rules(pathologies: FrozenSet[PathologyType]) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+    """Forbidden ingredient terms and recipe tags to avoid for a set of pathologies"""
+    terms = set()
+    for restriction in get_all_dietary_restrictions(list(pathologies)):
+        restriction_lower = restriction.lower()
+        terms.update(RESTRICTION_INGREDIENTS.get(restriction_lower, (restriction_lower,)))
+
+    if get_pregnancy_info(list(pathologies)):
+        terms.update(UNSAFE_PREGNANCY_INGREDIENTS)
+
+    return frozenset(terms), frozenset(get_recipe_tags_to_avoid(list(pathologies)))
+
+
+@lru_cache(maxsize=256)
+def _build_filter(terms: FrozenSet[str], tags: FrozenSet[str]) -> RecipeFilter:
+    pattern = None
+    if terms:
+        # Longest first so the alternation reads predictably; any match rejects
+        pattern = re.compile("|".join(re.escape(term) for term in sorted(terms, key=lambda t: (-len(t), t))))
+    return RecipeFilter(excluded_ingredients=pattern, excluded_tags=tags)
+
+
+def compile_recipe_filter(
+    restrictions: Optional[str],
+    economic_level: str,
+    patologias: Optional[str],
+    expensive_ingredients: Iterable[str] = ()
+) -> RecipeFilter:
+    """Build the filter for a patient's restrictions, budget and pathologies
+
+    Pathology rules are memoized by the set of detected pathologies, and the
+    compiled filter by its terms, so repeated patients cost a dict lookup.
+    """
+    terms = set()
+    if restrictions:
+        terms.update(split_terms(restrictions))
+    if economic_level in LIMITED_BUDGET_LEVELS:
+        terms.update(item.lower() for item in expensive_ingredients)
+
+    tags: FrozenSet[str] = frozenset()
+    if patologias:
+        pathology_terms, tags = compile_pathology_rules(frozenset(detect_pathologies_from_text(patologias)))
+        terms.update(pathology_terms)
+
+    return _build_filter(frozenset(terms), tags)
@@ -6,7 +6,10 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, Tabl
 from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
 import os
 from datetime import datetime
+from typing import Dict, List
+from xml.sax.saxutils import escape
 import re
+from ..schemas.meal_plan import StructuredMealPlan
 
 class PDFGenerator:
     def __init__(self):
@@ -16,77 +19,132 @@ class PDFGenerator:
     def generate_pdf(self, meal_plan: str, patient_name: str, plan_type: str) -> str:
         """Generate PDF from meal plan text"""
         
-        # Generate filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_name = re.sub(r'[^a-zA-Z0-9]', '_', patient_name)
-        filename = f"plan_{plan_type}_{safe_name}_{timestamp}.pdf"
-        filepath = os.path.join(self.output_dir, filename)
-        
-        # Create PDF
-        doc = SimpleDocTemplate(
-            filepath,
-            pagesize=A4,
-            rightMargin=2*cm,
-            leftMargin=2*cm,
-            topMargin=2*cm,
-            bottomMargin=2*cm
-        )
+        styles = self._styles()
         
         # Container for the 'Flowable' objects
-        story = []
-        
-        # Define styles
-        styles = getSampleStyleSheet()
-        
-        # Custom styles
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor('#1a5490'),
-            spaceAfter=30,
-            alignment=TA_CENTER
-        )
+        story = self._cover(styles, patient_name, plan_type)
         
-        subtitle_style = ParagraphStyle(
-            'CustomSubtitle',
-            parent=styles['Heading2'],
-            fontSize=16,
-            textColor=colors.HexColor('#2c3e50'),
-            spaceAfter=20,
-            alignment=TA_CENTER
-        )
+        # Process meal plan text
+        story.extend(self._text_flowables(meal_plan, styles))
+        
+        return self._build(story, styles, patient_name, plan_type)
+    
+    def generate_plan_pdf(
+        self,
+        plan: StructuredMealPlan,
+        patient_name: str,
+        plan_type: str,
+        appendix: str = ""
+    ) -> str:
+        """Generate PDF from a structured meal plan, with a table per option"""
+        
+        styles = self._styles()
+        story = self._cover(styles, patient_name, plan_type)
+        body_style = styles['body']
+        
+        for meal in plan.comidas:
+            heading = f"{meal.comida.upper()} ({meal.nota})" if meal.nota else meal.comida.upper()
+            story.append(Paragraph(escape(heading), styles['heading']))
+            
+            for number, option in enumerate(meal.opciones, 1):
+                story.append(Paragraph(
+                    f"<b>OPCIÓN {number}:</b> [{option.receta_id}] {escape(option.nombre)}", body_style
+                ))
+                rows = [["Ingrediente", "Cantidad"]] + [
+                    [Paragraph(escape(ingredient.item), body_style), escape(ingredient.cantidad)]
+                    for ingredient in option.ingredientes
+                ]
+                table = Table(rows, colWidths=[11*cm, 5*cm])
+                table.setStyle(TableStyle([
+                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#ecf0f1')),
+                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                    ('GRID', (0, 0), (-1, -1), 0.25, colors.HexColor('#bdc3c7')),
+                    ('VALIGN', (0, 0), (-1, -1), 'TOP')
+                ]))
+                story.append(table)
+                if option.preparacion:
+                    story.append(Paragraph(f"<b>Preparación:</b> {escape(option.preparacion)}", body_style))
+                macros = option.macros
+                story.append(Paragraph(
+                    f"<b>Macros:</b> P: {macros.proteinas:g}g | C: {macros.carbohidratos:g}g | "
+                    f"G: {macros.grasas:g}g | Cal: {macros.calorias:g}",
+                    body_style
+                ))
+                story.append(Spacer(1, 0.2*inch))
         
-        heading_style = ParagraphStyle(
-            'CustomHeading',
-            parent=styles['Heading3'],
-            fontSize=14,
-            textColor=colors.HexColor('#34495e'),
-            spaceAfter=12,
-            spaceBefore=20
-        )
+        for title, items in (
+            ("SUPLEMENTACIÓN", plan.suplementacion),
+            ("RECOMENDACIONES", plan.recomendaciones),
+            ("CAMBIOS IMPLEMENTADOS", plan.cambios)
+        ):
+            if items:
+                story.append(Paragraph(title, styles['subtitle']))
+                story.extend(Paragraph(f"• {escape(item)}", body_style) for item in items)
+        
+        story.extend(self._text_flowables(appendix, styles))
+        
+        return self._build(story, styles, patient_name, plan_type)
+    
+    def _styles(self) -> Dict[str, ParagraphStyle]:
+        """Paragraph styles shared by both layouts"""
+        styles = getSampleStyleSheet()
         
-        body_style = ParagraphStyle(
-            'CustomBody',
-            parent=styles['BodyText'],
-            fontSize=11,
-            alignment=TA_JUSTIFY,
-            spaceAfter=10
-        )
+        return {
+            'normal': styles['Normal'],
+            'title': ParagraphStyle(
+                'CustomTitle',
+                parent=styles['Heading1'],
+                fontSize=24,
+                textColor=colors.HexColor('#1a5490'),
+                spaceAfter=30,
+                alignment=TA_CENTER
+            ),
+            'subtitle': ParagraphStyle(
+                'CustomSubtitle',
+                parent=styles['Heading2'],
+                fontSize=16,
+                textColor=colors.HexColor('#2c3e50'),
+                spaceAfter=20,
+                alignment=TA_CENTER
+            ),
+            'heading': ParagraphStyle(
+                'CustomHeading',
+                parent=styles['Heading3'],
+                fontSize=14,
+                textColor=colors.HexColor('#34495e'),
+                spaceAfter=12,
+                spaceBefore=20
+            ),
+            'body': ParagraphStyle(
+                'CustomBody',
+                parent=styles['BodyText'],
+                fontSize=11,
+                alignment=TA_JUSTIFY,
+                spaceAfter=10
+            )
+        }
+    
+    def _cover(self, styles: Dict[str, ParagraphStyle], patient_name: str, plan_type: str) -> List:
+        """Title and patient info"""
+        story = []
         
         # Add title
-        story.append(Paragraph("PLAN NUTRICIONAL", title_style))
-        story.append(Paragraph("Método Tres Días y Carga", subtitle_style))
+        story.append(Paragraph("PLAN NUTRICIONAL", styles['title']))
+        story.append(Paragraph("Método Tres Días y Carga", styles['subtitle']))
         story.append(Spacer(1, 0.5*inch))
         
         # Add patient info
-        story.append(Paragraph(f"<b>Paciente:</b> {patient_name}", body_style))
-        story.append(Paragraph(f"<b>Fecha:</b> {datetime.now().strftime('%d/%m/%Y')}", body_style))
-        story.append(Paragraph(f"<b>Tipo de Plan:</b> {plan_type.capitalize()}", body_style))
+        story.append(Paragraph(f"<b>Paciente:</b> {patient_name}", styles['body']))
+        story.append(Paragraph(f"<b>Fecha:</b> {datetime.now().strftime('%d/%m/%Y')}", styles['body']))
+        story.append(Paragraph(f"<b>Tipo de Plan:</b> {plan_type.capitalize()}", styles['body']))
         story.append(Spacer(1, 0.5*inch))
         
-        # Process meal plan text
-        lines = meal_plan.split('\n')
+        return story
+    
+    def _text_flowables(self, text: str, styles: Dict[str, ParagraphStyle]) -> List:
+        """Flowables for free text, with headings detected line by line"""
+        story = []
+        lines = text.split('\n') if text else []
         
         for line in lines:
             line = line.strip()
@@ -97,18 +155,39 @@ class PDFGenerator:
             
             # Detect headings
             if any(keyword in line.upper() for keyword in ['DESAYUNO', 'ALMUERZO', 'MERIENDA', 'CENA', 'COLACIÓN']):
-                story.append(Paragraph(line, heading_style))
+                story.append(Paragraph(line, styles['heading']))
             elif 'RESUMEN NUTRICIONAL' in line.upper():
                 story.append(PageBreak())
-                story.append(Paragraph(line, title_style))
+                story.append(Paragraph(line, styles['title']))
             elif 'RECOMENDACIONES' in line.upper():
-                story.append(Paragraph(line, subtitle_style))
+                story.append(Paragraph(line, styles['subtitle']))
             elif line.startswith('-') or line.startswith('*'):
                 # Bullet points
-                story.append(Paragraph(f"• {line[1:].strip()}", body_style))
+                story.append(Paragraph(f"• {line[1:].strip()}", styles['body']))
             else:
                 # Regular text
-                story.append(Paragraph(line, body_style))
+                story.append(Paragraph(line, styles['body']))
+        
+        return story
+    
+    def _build(self, story: List, styles: Dict[str, ParagraphStyle], patient_name: str, plan_type: str) -> str:
+        """Add the footer and write the PDF, returning its filename"""
+        
+        # Generate filename
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        safe_name = re.sub(r'[^a-zA-Z0-9]', '_', patient_name)
+        filename = f"plan_{plan_type}_{safe_name}_{timestamp}.pdf"
+        filepath = os.path.join(self.output_dir, filename)
+        
+        # Create PDF
+        doc = SimpleDocTemplate(
+            filepath,
+            pagesize=A4,
+            rightMargin=2*cm,
+            leftMargin=2*cm,
+            topMargin=2*cm,
+            bottomMargin=2*cm
+        )
         
         # Add footer
         story.append(Spacer(1, inch))
@@ -116,7 +195,7 @@ class PDFGenerator:
             "Este plan nutricional es personalizado y no debe ser compartido con otras personas.",
             ParagraphStyle(
                 'Footer',
-                parent=styles['Normal'],
+                parent=styles['normal'],
                 fontSize=9,
                 textColor=colors.grey,
                 alignment=TA_CENTER
@@ -126,4 +205,4 @@ class PDFGenerator:
         # Build PDF
         doc.build(story)
         
-        return filename
\ No newline at end of file
+        return filename
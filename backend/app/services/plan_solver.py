@@ -0,0 +1,276 @@
+import itertools
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import numpy as np
+from ..utils.meal_plan_validator import MealPlanValidator
+from .macro_scaler import MAX_SCALE_FACTOR, MEAL_KEY_ALIASES, MIN_SCALE_FACTOR, MacroScaler, ScaledRecipe
+from .recipe_manager import RecipeManager
+
+logger = logging.getLogger(__name__)
+
+MAIN_MEALS = ["desayuno", "almuerzo", "merienda", "cena"]
+MEAL_DISPLAY_NAMES = {
+    "media_manana": "MEDIA MAÑANA",
+    "colacion": "COLACIÓN"
+}
+# Weight of the distance to the meal's macro target against option equivalence
+TARGET_FIT_WEIGHT = 0.5
+# Every point of deviation beyond the tolerance costs this much more
+TOLERANCE_PENALTY = 10.0
+
+
+def recipe_meal_type(meal: str, recipe_manager: RecipeManager) -> str:
+    """Catalog meal type whose recipes serve a meal of the distribution"""
+    meal_type = MEAL_KEY_ALIASES.get(meal, meal)
+    if meal_type in MAIN_MEALS or recipe_manager.get_recipes_by_meal_type(meal_type):
+        return meal_type
+    # Snacks such as "media_manana" are served from the colación recipes
+    return "colacion"
+
+
+@dataclass
+class SolvedMeal:
+    meal_type: str
+    target_calories: float
+    options: List[ScaledRecipe] = field(default_factory=list)
+    spread: float = 0.0  # Worst relative macro difference between options
+
+
+@dataclass
+class SolvedPlan:
+    meals: List[SolvedMeal] = field(default_factory=list)
+    validation_errors: List[str] = field(default_factory=list)
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.validation_errors
+
+
+class LocalPlanSolver:
+    """Builds a Motor 1 plan from catalog macros without calling the LLM.
+
+    For each meal every recipe is scaled to the meal's calories, then all
+    candidate triples are scored at once with NumPy: the worst macro
+    difference between the options (the ±5% equivalence rule) plus the
+    distance to the meal's protein/carb/fat target. With an equitable
+    distribution the first option of each meal is also kept within tolerance
+    of the first meal's.
+    """
+
+    def __init__(self, macro_scaler: MacroScaler, tolerance: float = 0.05, options_per_meal: int = 3):
+        self.macro_scaler = macro_scaler
+        self.recipe_manager = macro_scaler.recipe_manager
+        self.tolerance = tolerance
+        self.options_per_meal = options_per_meal
+        self.validator = MealPlanValidator(tolerance=tolerance)
+
+    def solve(
+        self,
+        recipes_by_meal: Dict[str, List[Dict]],
+        meal_targets: Dict[str, float],
+        macro_distribution: Dict[str, float],
+        equitable: bool = False
+    ) -> SolvedPlan:
+        """Pick and scale the options of every meal in meal_targets
+
+        Meals without a candidate recipe are left out of the plan and
+        reported in its validation_errors.
+
+        Args:
+            recipes_by_meal: Candidate recipes per meal type (already filtered
+                for the patient's restrictions), keyed by recipe_meal_type()
+                of every meal in meal_targets
+            meal_targets: Calories per meal, as returned by
+                NutritionalCalculator.calculate_patient_meal_distribution
+            macro_distribution: Fraction of calories from "proteinas",
+                "carbohidratos" and "grasas"
+            equitable: Whether main meals must also be equivalent to each other
+        """
+        # Grams of each macro per kcal, in the (P, C, G, Cal) order used below
+        grams_per_kcal = np.array([
+            macro_distribution.get("proteinas", 0) / 4,
+            macro_distribution.get("carbohidratos", 0) / 4,
+            macro_distribution.get("grasas", 0) / 9,
+            1.0
+        ])
+
+        plan = SolvedPlan()
+        used_ids = set()
+        anchor: Optional[np.ndarray] = None
+        missing: List[str] = []
+
+        for meal, target_calories in meal_targets.items():
+            meal_type = MEAL_KEY_ALIASES.get(meal, meal)
+            candidates = self._candidates(meal_type, recipes_by_meal, used_ids)
+            if not candidates:
+                logger.warning(f"No candidate recipes for {meal_type}, skipping it")
+                missing.append(f"{meal_type}: no hay recetas aptas para el paciente")
+                continue
+
+            is_main = meal_type in MAIN_MEALS
+            solved, reference = self._solve_meal(
+                meal_type,
+                candidates,
+                target_calories,
+                grams_per_kcal * target_calories,
+                anchor if equitable and is_main else None
+            )
+            if equitable and is_main and anchor is None:
+                anchor = reference
+
+            used_ids.update(option.recipe_id for option in solved.options)
+            plan.meals.append(solved)
+
+        _, plan.validation_errors = self.validator.validate_complete_meal_plan(
+            {
+                meal.meal_type: [
+                    {
+                        "calories": option.calories,
+                        "protein": option.protein,
+                        "carbs": option.carbs,
+                        "fat": option.fat
+                    }
+                    for option in meal.options
+                ]
+                for meal in plan.meals
+            },
+            "equitable" if equitable else "standard"
+        )
+        plan.validation_errors = missing + plan.validation_errors
+        for error in plan.validation_errors:
+            logger.warning(f"Local plan: {error}")
+
+        return plan
+
+    def render(self, plan: SolvedPlan, patient_name: str) -> str:
+        """Format a solved plan in the same text format the LLM is asked for"""
+        lines = [f"PLAN ALIMENTARIO - {patient_name}", ""]
+        totals = np.zeros(4)
+
+        for meal in plan.meals:
+            lines.append(MEAL_DISPLAY_NAMES.get(meal.meal_type, meal.meal_type.replace("_", " ").upper()))
+            for number, option in enumerate(meal.options, 1):
+                recipe = self.recipe_manager.get_recipe_by_id(option.recipe_id) or {}
+                lines.append(f"OPCIÓN {number}:")
+                lines.append(f"- Receta: [{option.recipe_id}] - {option.name}")
+                lines.append("- Ingredientes con cantidades ajustadas:")
+                lines.extend(f"  * {item}: {quantity}" for item, quantity in option.ingredients)
+                if recipe.get('preparacion'):
+                    lines.append(f"- Forma de preparación: {recipe['preparacion']}")
+                lines.append(f"- {option.format_macros()}")
+                lines.append("")
+
+            first = meal.options[0]
+            totals += [first.protein, first.carbs, first.fat, first.calories]
+
+        protein, carbs, fat, calories = (round(value) for value in totals)
+        lines.append("RESUMEN NUTRICIONAL")
+        lines.append(f"- Calorías diarias: {calories} kcal")
+        lines.append(f"- Proteínas: {protein}g | Carbohidratos: {carbs}g | Grasas: {fat}g")
+        return "\n".join(lines)
+
+    def _candidates(self, meal_type: str, recipes_by_meal: Dict[str, List[Dict]], used_ids: set) -> List[Dict]:
+        # Only recipes already filtered for the patient: never the raw catalog
+        candidates = recipes_by_meal.get(recipe_meal_type(meal_type, self.recipe_manager)) or []
+
+        # Resolve through the catalog so the solver scores the same recipe that
+        # MacroScaler and the PDF appendix will look up by ID; recipes outside
+        # the catalog (e.g. legacy ChromaDB copies) can't be scaled and are dropped
+        resolved: Dict[str, Dict] = {}
+        for recipe in candidates:
+            catalog_recipe = self.recipe_manager.get_recipe_by_id(recipe['id'])
+            if catalog_recipe and catalog_recipe.get('calorias_aprox', 0) > 0:
+                resolved.setdefault(recipe['id'], catalog_recipe)
+
+        candidates = list(resolved.values())
+        unused = [recipe for recipe in candidates if recipe['id'] not in used_ids]
+        # Only repeat recipes from earlier meals when there are not enough new ones
+        return unused if len(unused) >= self.options_per_meal else candidates
+
+    def _solve_meal(
+        self,
+        meal_type: str,
+        candidates: List[Dict],
+        target_calories: float,
+        target_macros: np.ndarray,
+        anchor: Optional[np.ndarray]
+    ):
+        base = np.array([
+            [
+                recipe.get('proteinas_aprox', 0),
+                recipe.get('carbohidratos_aprox', 0),
+                recipe.get('grasas_aprox', 0),
+                recipe['calorias_aprox']
+            ]
+            for recipe in candidates
+        ], dtype=float)
+        factors = target_calories / base[:, 3]
+        # Recipes that cannot reach the target within the scaling limits would
+        # end up far off once MacroScaler clamps them
+        in_range = (factors >= MIN_SCALE_FACTOR) & (factors <= MAX_SCALE_FACTOR)
+        if in_range.sum() >= self.options_per_meal:
+            candidates = [recipe for recipe, keep in zip(candidates, in_range) if keep]
+            base, factors = base[in_range], factors[in_range]
+        factors = np.clip(factors, MIN_SCALE_FACTOR, MAX_SCALE_FACTOR)
+        scaled = base * factors[:, None]
+
+        k = min(self.options_per_meal, len(candidates))
+        combos = np.array(list(itertools.combinations(range(len(candidates)), k)))
+        triples = scaled[combos]  # (combos, k, 4)
+
+        # Macros of every option relative to each possible reference option
+        # (the validator compares options to the first one)
+        references = triples[:, :, None, :]
+        options = triples[:, None, :, :]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratios = np.where((references == 0) & (options == 0), 1.0, options / references)
+        high = ratios.max(axis=3)  # (combos, reference, option)
+        low = ratios.min(axis=3)
+
+        # Rescaling an option by 2 / (high + low) evens out its largest excess
+        # and shortfall against the reference, which is the best a single
+        # factor can do; calories are one of the checked dimensions, so they
+        # stay within tolerance too
+        finite = np.isfinite(high)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            multipliers = np.where(finite, 2 / (high + low), 1.0)
+            deviations = np.where(finite, (high - low) / (high + low), np.inf)
+
+        worst_by_reference = deviations.max(axis=2)  # (combos, reference)
+        reference_index = worst_by_reference.argmin(axis=1)
+        spread = worst_by_reference.min(axis=1)
+
+        target_fit = (np.abs(triples - target_macros) / np.maximum(target_macros, 1.0)).mean(axis=(1, 2))
+
+        worst = spread
+        if anchor is not None:
+            reference_macros = triples[np.arange(len(combos)), reference_index]
+            anchor_deviation = (np.abs(reference_macros - anchor) / np.maximum(anchor, 1e-9)).max(axis=1)
+            worst = np.maximum(spread, anchor_deviation)
+
+        score = worst + TOLERANCE_PENALTY * np.maximum(worst - self.tolerance, 0) + TARGET_FIT_WEIGHT * target_fit
+        best = int(score.argmin())
+
+        # Put the reference option first so the plan reads as the validator checks it
+        reference = int(reference_index[best])
+        positions = list(range(k))
+        positions.insert(0, positions.pop(reference))
+
+        chosen = []
+        for position in positions:
+            index = combos[best][position]
+            calories = scaled[index, 3] * multipliers[best, reference, position]
+            chosen.append(self.macro_scaler.scale_recipe(candidates[index]['id'], calories))
+
+        logger.info(
+            f"{meal_type}: picked {[option.recipe_id for option in chosen]} out of "
+            f"{len(combos)} combinations (spread {spread[best]:.1%})"
+        )
+        solved = SolvedMeal(
+            meal_type=meal_type,
+            target_calories=target_calories,
+            options=chosen,
+            spread=round(float(spread[best]), 4)
+        )
+        return solved, scaled[combos[best][reference]]
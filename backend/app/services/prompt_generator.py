@@ -12,14 +12,181 @@ from ..data.pathologies import (
     get_pregnancy_info
 )
 from ..utils.pregnancy import PregnancyManager
+from .recipe_fragments import RecipeFragmentCache
+import functools
 import json
+import math
 import re
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Recipe catalog layouts: "full" (one detailed block per recipe and meal type)
+# or "compact" (each recipe once in a one-line table, meal types list IDs)
+CATALOG_FORMATS = ("full", "compact")
+# Rough GPT-4 tokenizer ratio for Spanish text; UTF-8 bytes rather than
+# characters so accents and emoji count extra and the estimate stays high
+BYTES_PER_TOKEN = 4
+
+# Motor 1 plan-building instructions: with macro scaling the model only
+# picks recipes and MacroScaler sets the portions; without it the model
+# adjusts quantities and computes the macros itself
+ADJUSTED_MACRO_STEPS = """
+✅ PASOS PARA GENERAR EL PLAN:
+1. Revisá el catálogo de recetas disponibles (más abajo)
+2. Seleccioná 3 recetas diferentes para cada comida
+3. Ajustá las cantidades para cumplir con los requerimientos
+4. Verificá que las 3 opciones sean equivalentes (±5%)
+5. Usá SIEMPRE el ID de la receta [REC_XXXX]
+
+📊 CÁLCULO DE MACROS AJUSTADOS:
+Cuando ajustés las cantidades de una receta, calculá los macros proporcionalmente:
+
+EJEMPLO PRÁCTICO:
+Receta base [REC_0071]: 220 kcal, P:12g, C:28g, G:8g
+Si necesitás 330 kcal para la merienda:
+- Factor de ajuste: 330/220 = 1.5
+- Proteínas ajustadas: 12g x 1.5 = 18g
+- Carbohidratos ajustados: 28g x 1.5 = 42g
+- Grasas ajustadas: 8g x 1.5 = 12g
+- Ajustá TODOS los ingredientes por el mismo factor
+
+⚠️ NUNCA dejes macros en cero - siempre calculá basado en la receta original
+
+"""
+SCALED_MACRO_STEPS = """
+✅ PASOS PARA GENERAR EL PLAN:
+1. Revisá el catálogo de recetas disponibles (más abajo)
+2. Seleccioná 3 recetas diferentes para cada comida, de calorías y macros parecidos
+3. Copiá los ingredientes y los macros de cada receta tal como figuran en el catálogo
+4. Usá SIEMPRE el ID de la receta [REC_XXXX]
+
+📊 PORCIONES Y MACROS:
+El sistema recalcula las cantidades y los macros de cada receta según las calorías
+objetivo de cada comida. NO calcules factores de ajuste ni cantidades nuevas:
+tu tarea es elegir recetas adecuadas y equivalentes entre sí.
+
+"""
+ADJUSTED_CATALOG_INSTRUCTIONS = """🔑 CÓMO USAR EL CATÁLOGO:
+1. Cada receta tiene un ID único [REC_XXXX] - usá este ID en el plan
+2. Podés ajustar las cantidades de los ingredientes proporcionalmente
+3. Mantené las proporciones originales entre ingredientes
+4. Seleccioná recetas que respeten las restricciones del paciente
+
+INSTRUCCIONES ESPECÍFICAS DE GENERACIÓN:
+1. 🔍 Primero LEE TODO el catálogo de recetas disponibles
+2. 🎯 Para cada comida, SELECCIONÁ 3 recetas del catálogo que:
+   - Sean del tipo de comida correcto (desayuno, almuerzo, etc.)
+   - Respeten las restricciones del paciente
+   - Se ajusten al nivel económico
+3. 📊 AJUSTÁ las cantidades de cada receta para lograr:
+   - Las calorías objetivo de cada comida
+   - Equivalencia entre las 3 opciones (±5%)
+4. 🆔 USÁ SIEMPRE el formato [REC_XXXX] para identificar cada receta
+5. ✅ Verificá que todas las recetas existan en el catálogo
+6. 🍴 INCLUÍ TODAS las comidas configuradas (principales Y adicionales)
+7. 📊 NUNCA dejes macros en cero - siempre calculá proporcionalmente
+8. 🎯 Asegurá que TODAS las opciones de cada comida tengan macros equivalentes (±5%)
+9. ✅ Verificá que los macros totales del día coincidan con los requerimientos"""
+SCALED_CATALOG_INSTRUCTIONS = """🔑 CÓMO USAR EL CATÁLOGO:
+1. Cada receta tiene un ID único [REC_XXXX] - usá este ID en el plan
+2. Las cantidades y los macros se ajustan automáticamente después de la generación
+3. Seleccioná recetas que respeten las restricciones del paciente
+
+INSTRUCCIONES ESPECÍFICAS DE GENERACIÓN:
+1. 🔍 Primero LEE TODO el catálogo de recetas disponibles
+2. 🎯 Para cada comida, SELECCIONÁ 3 recetas del catálogo que:
+   - Sean del tipo de comida correcto (desayuno, almuerzo, etc.)
+   - Respeten las restricciones del paciente
+   - Se ajusten al nivel económico
+   - Tengan un perfil de macros parecido entre sí
+3. 📋 COPIÁ los ingredientes y los macros de cada receta tal como figuran en el catálogo
+4. 🆔 USÁ SIEMPRE el formato [REC_XXXX] para identificar cada receta
+5. ✅ Verificá que todas las recetas existan en el catálogo
+6. 🍴 INCLUÍ TODAS las comidas configuradas (principales Y adicionales)"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate number of prompt tokens for a text"""
+    return math.ceil(len(text.encode("utf-8")) / BYTES_PER_TOKEN)
+
+
+def format_compact_recipe(recipe: Dict, include_preparation: bool = False) -> str:
+    """One table row of the compact catalog"""
+    ingredients = "; ".join(
+        f"{ing['item']} {ing['cantidad']}" for ing in recipe.get('ingredientes', [])
+    )
+    tags = ",".join(dict.fromkeys(recipe.get('tags', []) + recipe.get('apto_para', [])))
+    row = (
+        f"[{recipe['id']}] {recipe['nombre']} | "
+        f"{recipe.get('calorias_aprox', 0)} {recipe.get('proteinas_aprox', 0)}/"
+        f"{recipe.get('carbohidratos_aprox', 0)}/{recipe.get('grasas_aprox', 0)} | "
+        f"{recipe.get('tiempo_preparacion', '-')}' | {ingredients} | {tags}\n"
+    )
+    if include_preparation and recipe.get('preparacion'):
+        row += f"  Prep: {recipe['preparacion']}\n"
+    return row
+
+
+def register_compact_fragments(fragments: RecipeFragmentCache):
+    """Cache both compact catalog variants; done once at wiring, not from request threads"""
+    fragments.register("compact", format_compact_recipe)
+    fragments.register("compact_prep", functools.partial(format_compact_recipe, include_preparation=True))
+
+
+def format_recipes_compact(
+    recipes_dict: Dict[str, List[Dict]],
+    include_preparation: bool = False,
+    fragments: Optional[RecipeFragmentCache] = None
+) -> str:
+    """Catalog with every recipe once, and the recipe IDs offered for each meal type"""
+    render = functools.partial(format_compact_recipe, include_preparation=include_preparation)
+    variant = "compact_prep" if include_preparation else "compact"
+    if fragments is not None and variant in fragments:
+        render = functools.partial(fragments.get, variant)
+    
+    rows = {}
+    options = []
+    for meal_type, recipes in recipes_dict.items():
+        if not recipes:
+            continue
+        for recipe in recipes:
+            if recipe['id'] not in rows:
+                rows[recipe['id']] = render(recipe)
+        ids = ", ".join(dict.fromkeys(recipe['id'] for recipe in recipes))
+        options.append(f"{meal_type.upper()} ({len(recipes)}): {ids}")
+    
+    if not rows:
+        return ""
+    
+    return (
+        "=== RECETAS (formato: [ID] Nombre | kcal P/C/G en g | minutos | ingredientes y cantidades | etiquetas) ===\n"
+        + "".join(rows.values())
+        + "\n=== OPCIONES POR COMIDA (usá solo estos IDs en cada comida) ===\n"
+        + "\n".join(options)
+        + "\n"
+    )
+
+
 class PromptGenerator:
-    def __init__(self):
+    def __init__(
+        self,
+        catalog_format: str = "full",
+        include_preparation: bool = False,
+        fragments: Optional[RecipeFragmentCache] = None,
+        macro_scaling: bool = False
+    ):
+        if catalog_format not in CATALOG_FORMATS:
+            raise ValueError(f"Unknown recipe catalog format: {catalog_format}")
+        self.catalog_format = catalog_format
+        self.include_preparation = include_preparation
+        # Catalog recipes' entries are rendered once, by RecipeManager's cache
+        self.fragments = fragments
+        if fragments is not None:
+            fragments.register("prompt_entry", self._render_entry)
+        # Portions and macros are recomputed after generation (see MacroScaler)
+        self.macro_scaling = macro_scaling
+        self.catalog_instructions = SCALED_CATALOG_INSTRUCTIONS if macro_scaling else ADJUSTED_CATALOG_INSTRUCTIONS
         self.base_rules = """
 📋 SISTEMA DE RECETAS:
 ✅ Tenés acceso a un catálogo completo de recetas validadas
@@ -82,29 +249,7 @@ DETENER LA TAREA INMEDIATAMENTE. No entregar el plan y reportar el problema.
 - Debajo de cada receta debe figurar la forma de preparación
 """
         
-        self.recipe_format_rules = """
-✅ PASOS PARA GENERAR EL PLAN:
-1. Revisá el catálogo de recetas disponibles (más abajo)
-2. Seleccioná 3 recetas diferentes para cada comida
-3. Ajustá las cantidades para cumplir con los requerimientos
-4. Verificá que las 3 opciones sean equivalentes (±5%)
-5. Usá SIEMPRE el ID de la receta [REC_XXXX]
-
-📊 CÁLCULO DE MACROS AJUSTADOS:
-Cuando ajustés las cantidades de una receta, calculá los macros proporcionalmente:
-
-EJEMPLO PRÁCTICO:
-Receta base [REC_0071]: 220 kcal, P:12g, C:28g, G:8g
-Si necesitás 330 kcal para la merienda:
-- Factor de ajuste: 330/220 = 1.5
-- Proteínas ajustadas: 12g x 1.5 = 18g
-- Carbohidratos ajustados: 28g x 1.5 = 42g
-- Grasas ajustadas: 8g x 1.5 = 12g
-- Ajustá TODOS los ingredientes por el mismo factor
-
-⚠️ NUNCA dejes macros en cero - siempre calculá basado en la receta original
-
-FORMATO OBLIGATORIO PARA CADA COMIDA:
+        self.recipe_format_rules = (SCALED_MACRO_STEPS if macro_scaling else ADJUSTED_MACRO_STEPS) + """FORMATO OBLIGATORIO PARA CADA COMIDA:
 
 DESAYUNO [agregar "(2 hs post medicación)" si toma levotiroxina]
 OPCIÓN 1:
@@ -182,40 +327,21 @@ DOSIS GENERALES RECOMENDADAS:
             protein_g = pregnancy_requirements['macros']['protein_g']
             carbs_g = pregnancy_requirements['macros']['carbs_g']
             fat_g = pregnancy_requirements['macros']['fat_g']
-            
-            # Usar distribución de comidas especial para embarazo
-            meal_distribution = pregnancy_requirements.get('meal_distribution', {})
-            if meal_distribution:
-                # Convertir porcentajes a calorías
-                meal_distribution = {
-                    meal: round(daily_calories * (percentage / 100))
-                    for meal, percentage in meal_distribution.items()
-                }
-            else:
-                meal_distribution = NutritionalCalculator.calculate_meal_distribution(
-                    daily_calories,
-                    patient_data.comidas_principales,
-                    patient_data.distribution_type.value,
-                    False,
-                    patient_data.custom_meal_distribution
-                )
         else:
             # Cálculos normales si no hay embarazo
             daily_calories = NutritionalCalculator.calculate_daily_calories(patient_data)
             macro_distribution = NutritionalCalculator.calculate_macro_distribution(patient_data)
-            meal_distribution = NutritionalCalculator.calculate_meal_distribution(
-                daily_calories,
-                patient_data.comidas_principales,
-                patient_data.distribution_type.value,
-                False,
-                patient_data.custom_meal_distribution
-            )
             
             # Calcular gramos de macros
             protein_g = round((daily_calories * macro_distribution["proteinas"]) / 4)
             carbs_g = round((daily_calories * macro_distribution["carbohidratos"]) / 4)
             fat_g = round((daily_calories * macro_distribution["grasas"]) / 9)
         
+        # Usa la distribución especial de embarazo cuando corresponde
+        meal_distribution = NutritionalCalculator.calculate_patient_meal_distribution(
+            patient_data, daily_calories, pregnancy_requirements
+        )
+        
         # Verificar si el objetivo de proteína es alcanzable
         protein_warning_text = self._check_protein_feasibility(patient_data, protein_g)
         
@@ -336,27 +462,7 @@ Si dice "Postre cena" en las adicionales, DEBE aparecer en el plan final.
 
 {recipes_json}
 
-🔑 CÓMO USAR EL CATÁLOGO:
-1. Cada receta tiene un ID único [REC_XXXX] - usá este ID en el plan
-2. Podés ajustar las cantidades de los ingredientes proporcionalmente
-3. Mantené las proporciones originales entre ingredientes
-4. Seleccioná recetas que respeten las restricciones del paciente
-
-INSTRUCCIONES ESPECÍFICAS DE GENERACIÓN:
-1. 🔍 Primero LEE TODO el catálogo de recetas disponibles
-2. 🎯 Para cada comida, SELECCIONÁ 3 recetas del catálogo que:
-   - Sean del tipo de comida correcto (desayuno, almuerzo, etc.)
-   - Respeten las restricciones del paciente
-   - Se ajusten al nivel económico
-3. 📊 AJUSTÁ las cantidades de cada receta para lograr:
-   - Las calorías objetivo de cada comida
-   - Equivalencia entre las 3 opciones (±5%)
-4. 🆔 USÁ SIEMPRE el formato [REC_XXXX] para identificar cada receta
-5. ✅ Verificá que todas las recetas existan en el catálogo
-6. 🍴 INCLUÍ TODAS las comidas configuradas (principales Y adicionales)
-7. 📊 NUNCA dejes macros en cero - siempre calculá proporcionalmente
-8. 🎯 Asegurá que TODAS las opciones de cada comida tengan macros equivalentes (±5%)
-9. ✅ Verificá que los macros totales del día coincidan con los requerimientos
+{self.catalog_instructions}
 
 FORMATO DE SALIDA ESPERADO:
 
@@ -822,6 +928,20 @@ Calorías: XXX | XXX
         
         return "\n".join(formatted)
     
+    def format_recipe_catalog(self, recipes_dict: Dict[str, List[Dict]]) -> str:
+        """Format recipes organized by meal type in the configured catalog format"""
+        if self.catalog_format == "compact":
+            return format_recipes_compact(recipes_dict, self.include_preparation, self.fragments)
+        return self.format_recipes_by_meal_type(recipes_dict)
+    
+    def recipe_entry_tokens(self, recipe: Dict) -> int:
+        """Estimated prompt tokens one recipe adds to the configured catalog format"""
+        if self.catalog_format == "compact":
+            # Table row plus its ID in a meal type's list
+            return estimate_tokens(format_compact_recipe(recipe, self.include_preparation) + f"{recipe['id']}, ")
+        # Two-digit numbering, plus the newline joining entries
+        return estimate_tokens(self.format_recipe_entry(99, recipe) + "\n")
+    
     def format_recipes_by_meal_type(self, recipes_dict: Dict[str, List[Dict]]) -> str:
         """Format recipes organized by meal type for the prompt with full details"""
         formatted_sections = []
@@ -834,32 +954,42 @@ Calorías: XXX | XXX
             formatted_sections.append(f"Total de opciones disponibles: {len(recipes)} recetas\n")
             
             for i, recipe in enumerate(recipes, 1):
-                # Format ingredients list
-                ingredients = ", ".join([
-                    f"{ing['item']} ({ing['cantidad']})"
-                    for ing in recipe.get('ingredientes', [])
-                ])
-                
-                # Format with full details including ingredients
-                detail = (
-                    f"{i}. [{recipe['id']}] {recipe['nombre']}\n"
-                    f"   📊 Nutrición: {recipe.get('calorias_aprox', 0)} kcal | "
-                    f"P: {recipe.get('proteinas_aprox', 0)}g | "
-                    f"C: {recipe.get('carbohidratos_aprox', 0)}g | "
-                    f"G: {recipe.get('grasas_aprox', 0)}g\n"
-                    f"   🥘 Ingredientes: {ingredients}\n"
-                    f"   ⏱️ Tiempo: {recipe.get('tiempo_preparacion', 'No especificado')} min\n"
-                )
-                
-                # Add tags if relevant
-                if recipe.get('tags') or recipe.get('apto_para'):
-                    all_tags = recipe.get('tags', []) + recipe.get('apto_para', [])
-                    detail += f"   🏷️ Apto para: {', '.join(all_tags)}\n"
-                
-                formatted_sections.append(detail)
+                formatted_sections.append(self.format_recipe_entry(i, recipe))
         
         return "\n".join(formatted_sections)
     
+    def format_recipe_entry(self, number: int, recipe: Dict) -> str:
+        """Format one numbered recipe of a meal type section"""
+        if self.fragments is not None:
+            return f"{number}. " + self.fragments.get("prompt_entry", recipe)
+        return f"{number}. " + self._render_entry(recipe)
+    
+    @staticmethod
+    def _render_entry(recipe: Dict) -> str:
+        # Format ingredients list
+        ingredients = ", ".join([
+            f"{ing['item']} ({ing['cantidad']})"
+            for ing in recipe.get('ingredientes', [])
+        ])
+        
+        # Format with full details including ingredients
+        detail = (
+            f"[{recipe['id']}] {recipe['nombre']}\n"
+            f"   📊 Nutrición: {recipe.get('calorias_aprox', 0)} kcal | "
+            f"P: {recipe.get('proteinas_aprox', 0)}g | "
+            f"C: {recipe.get('carbohidratos_aprox', 0)}g | "
+            f"G: {recipe.get('grasas_aprox', 0)}g\n"
+            f"   🥘 Ingredientes: {ingredients}\n"
+            f"   ⏱️ Tiempo: {recipe.get('tiempo_preparacion', 'No especificado')} min\n"
+        )
+        
+        # Add tags if relevant
+        if recipe.get('tags') or recipe.get('apto_para'):
+            all_tags = recipe.get('tags', []) + recipe.get('apto_para', [])
+            detail += f"   🏷️ Apto para: {', '.join(all_tags)}\n"
+        
+        return detail
+    
     def format_recipe_details(self, recipes_list: List[Dict]) -> str:
         """Format full recipe details in a separate section"""
         formatted_details = ["\n=== DETALLES DE RECETAS ==="]
@@ -0,0 +1,67 @@
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+Renderer = Callable[[Dict], str]
+
+
+class RecipeFragmentCache:
+    """Rendered text of each catalog recipe, per format variant.
+
+    Formatters register a renderer for their variant ("summary", "appendix",
+    "compact", ...). Every registered variant is rendered for the whole
+    catalog up front, when the catalog is loaded or the variant registered,
+    so building a prompt or appendix only joins cached strings.
+
+    Entries are keyed by the recipe dict itself rather than its ID: the
+    catalog has distinct recipes sharing an ID, and recipes from elsewhere
+    (e.g. a legacy ChromaDB copy) are rendered on each call instead of cached.
+    """
+
+    def __init__(self):
+        self._renderers: Dict[str, Renderer] = {}
+        self._recipes: List[Dict] = []
+        self._fragments: Dict[Tuple[str, int], str] = {}
+        self._lock = threading.Lock()
+
+    def load(self, recipes: Iterable[Dict]):
+        """Replace the catalog, dropping every fragment rendered for the old one"""
+        recipes = list(recipes)
+        with self._lock:
+            renderers = dict(self._renderers)
+        fragments = {
+            (variant, id(recipe)): render(recipe)
+            for variant, render in renderers.items()
+            for recipe in recipes
+        }
+        with self._lock:
+            self._recipes = recipes
+            self._fragments = fragments
+        logger.debug(f"Rendered {len(fragments)} recipe fragments ({len(renderers)} variants)")
+
+    def register(self, variant: str, render: Renderer):
+        """Add a format variant and render it for the current catalog"""
+        with self._lock:
+            self._renderers[variant] = render
+            recipes = self._recipes
+        rendered = {(variant, id(recipe)): render(recipe) for recipe in recipes}
+        with self._lock:
+            if self._recipes is recipes:
+                self._fragments.update(rendered)
+
+    def get(self, variant: str, recipe: Dict) -> str:
+        """Cached text of a recipe in a variant, rendered now if not cached"""
+        fragment = self._fragments.get((variant, id(recipe)))
+        if fragment is None:
+            # Recipes outside the catalog; the catalog keeps its dicts alive,
+            # so an id() match always refers to the cached recipe
+            fragment = self._renderers[variant](recipe)
+        return fragment
+
+    def __contains__(self, variant: str) -> bool:
+        return variant in self._renderers
+
+    def __len__(self) -> int:
+        return len(self._fragments)
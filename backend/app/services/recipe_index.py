@@ -0,0 +1,239 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
+import numpy as np
+
+# Columns of RecipeIndex.macro_matrix, as keys of target_macros dicts
+# (the recipe fields are the same names with an "_aprox" suffix)
+MACRO_COLUMNS = ('calorias', 'proteinas', 'carbohidratos', 'grasas')
+# Macros compared by the similarity score and the tolerance check
+MACRO_KEYS = ('proteinas', 'carbohidratos', 'grasas')
+MACRO_METRICS = ('l1', 'relative', 'weighted')
+# Default weights of the "weighted" metric: kcal per gram, so every macro
+# counts by the energy it is off by
+DEFAULT_MACRO_WEIGHTS = {'calorias': 1.0, 'proteinas': 4.0, 'carbohidratos': 4.0, 'grasas': 9.0}
+
+# Ingredients that make a recipe unsuitable for limited budgets
+EXPENSIVE_INGREDIENTS = (
+    'salmón', 'atún rojo', 'lomo', 'bife de chorizo', 'langostinos',
+    'queso azul', 'queso brie', 'jamón crudo', 'frutos secos', 'quinoa'
+)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace, the form every lookup is done on"""
+    return " ".join(str(text).lower().split())
+
+
+def split_terms(text: Optional[str]) -> List[str]:
+    """Split a comma-separated patient field ("leche, huevo") into lookup terms"""
+    if not text:
+        return []
+    return [term for term in (normalize_text(part) for part in text.split(',')) if term]
+
+
+@dataclass
+class RecipeScores:
+    """Scores of one filtering request, aligned by position with recipes"""
+    recipes: List[Dict]
+    preference: np.ndarray
+    pathology: np.ndarray
+    macro: np.ndarray
+    total: np.ndarray
+
+    def ranked(self) -> List[Dict]:
+        """Recipes by descending total score, keeping input order on ties"""
+        order = np.argsort(-self.total, kind="stable")
+        return [self.recipes[i] for i in order]
+
+    def score_of(self, recipe: Dict, kind: str = "total") -> float:
+        """Score of a recipe returned by this request ("preference", "pathology", "macro" or "total")"""
+        for position, candidate in enumerate(self.recipes):
+            if candidate is recipe:
+                return float(getattr(self, kind)[position])
+        raise KeyError(recipe.get('id'))
+
+
+class RecipeIndex:
+    """Lookup structures precomputed from the recipe catalog at load time.
+
+    Recipes are addressed by row (their position in the catalog) rather than
+    by ID, since a few catalog IDs are duplicated. Ingredient lookups match a
+    term against the distinct ingredient names once, then reuse the resulting
+    row set for every later request with the same term.
+    """
+
+    def __init__(self, recipes: List[Dict]):
+        self.recipes = recipes
+        self.ids: List[str] = [recipe['id'] for recipe in recipes]
+        self.names: List[str] = [normalize_text(recipe.get('nombre', '')) for recipe in recipes]
+        self.ingredients: List[FrozenSet[str]] = [
+            frozenset(normalize_text(ing['item']) for ing in recipe.get('ingredientes', []))
+            for recipe in recipes
+        ]
+        self.tags: List[FrozenSet[str]] = [
+            frozenset(recipe.get('tags', []) + recipe.get('apto_para', []))
+            for recipe in recipes
+        ]
+
+        # One contiguous row of macros per recipe, so ranking is a single array operation
+        self.macro_matrix = np.ascontiguousarray(np.array(
+            [[recipe.get(f'{key}_aprox', 0) for key in MACRO_COLUMNS] for recipe in recipes],
+            dtype=np.float32
+        ).reshape(len(recipes), len(MACRO_COLUMNS)))
+        self.meal_type_masks: Dict[str, np.ndarray] = {}
+        for row, recipe in enumerate(recipes):
+            for meal_type in recipe.get('tipo_comida', []):
+                if meal_type not in self.meal_type_masks:
+                    self.meal_type_masks[meal_type] = np.zeros(len(recipes), dtype=bool)
+                self.meal_type_masks[meal_type][row] = True
+
+        # Inverted indexes: normalized ingredient name / tag -> rows that have it
+        self.rows_by_ingredient: Dict[str, Set[int]] = {}
+        for row, items in enumerate(self.ingredients):
+            for item in items:
+                self.rows_by_ingredient.setdefault(item, set()).add(row)
+        self.rows_by_tag: Dict[str, Set[int]] = {}
+        for row, tags in enumerate(self.tags):
+            for tag in tags:
+                self.rows_by_tag.setdefault(tag, set()).add(row)
+
+        self._row_by_object = {id(recipe): row for row, recipe in enumerate(recipes)}
+        # Later duplicates win, as in RecipeManager.recipes_by_id
+        self._row_by_id = {recipe_id: row for row, recipe_id in enumerate(self.ids)}
+        self._ingredient_rows = lru_cache(maxsize=4096)(self._match_ingredient)
+        self._name_rows = lru_cache(maxsize=4096)(self._match_name)
+        self.expensive_rows = self.rows_with_any_ingredient(EXPENSIVE_INGREDIENTS)
+        self.expensive_mask = self.row_mask(self.expensive_rows)
+
+    def __len__(self) -> int:
+        return len(self.recipes)
+
+    def row_of(self, recipe: Dict) -> Optional[int]:
+        """Row of a recipe dict loaded from the catalog, None for outside dicts"""
+        return self._row_by_object.get(id(recipe))
+
+    def row_of_id(self, recipe_id: str) -> Optional[int]:
+        """Row of the recipe RecipeManager.get_recipe_by_id returns for recipe_id"""
+        return self._row_by_id.get(recipe_id)
+
+    def rows_with_ingredient(self, term: str) -> FrozenSet[int]:
+        """Rows with an ingredient whose name contains term"""
+        return self._ingredient_rows(normalize_text(term))
+
+    def rows_with_any_ingredient(self, terms: Iterable[str]) -> FrozenSet[int]:
+        rows: Set[int] = set()
+        for term in terms:
+            rows |= self.rows_with_ingredient(term)
+        return frozenset(rows)
+
+    def rows_with_name(self, term: str) -> FrozenSet[int]:
+        """Rows whose recipe name contains term"""
+        return self._name_rows(normalize_text(term))
+
+    def rows_with_any_tag(self, tags: Iterable[str]) -> Set[int]:
+        """Rows tagged or marked apto_para with any of tags"""
+        rows: Set[int] = set()
+        for tag in tags:
+            rows |= self.rows_by_tag.get(tag, set())
+        return rows
+
+    def row_mask(self, rows: Iterable[int]) -> np.ndarray:
+        """Boolean array over all rows, True for the given ones"""
+        mask = np.zeros(len(self.recipes), dtype=bool)
+        mask[list(rows)] = True
+        return mask
+
+    def macro_similarity(self, target_macros: Dict[str, float]) -> np.ndarray:
+        """Similarity (0-100) of every row to target_macros, 100 minus the mean relative difference"""
+        differences = []
+        for macro, target_value in target_macros.items():
+            if target_value > 0:
+                values = (
+                    self.macro_matrix[:, MACRO_COLUMNS.index(macro)].astype(np.float64)
+                    if macro in MACRO_KEYS else np.zeros(len(self.recipes))
+                )
+                differences.append(np.abs(values - target_value) / target_value)
+        if not differences:
+            return np.full(len(self.recipes), 100.0)
+        return np.maximum(0, 100 - np.mean(differences, axis=0) * 100)
+
+    def macro_distances(
+        self,
+        target_macros: Dict[str, float],
+        metric: str = "relative",
+        weights: Optional[Dict[str, float]] = None
+    ) -> np.ndarray:
+        """Distance of every row to target_macros, summed over the macros it names
+
+        Metrics: "l1" (absolute difference), "relative" (difference over the
+        target) and "weighted" (difference times weights, kcal per gram by default).
+        """
+        if metric not in MACRO_METRICS:
+            raise ValueError(f"Unknown macro metric '{metric}', expected one of {MACRO_METRICS}")
+
+        keys = [key for key in MACRO_COLUMNS if key in target_macros]
+        if not keys:
+            return np.zeros(len(self.recipes), dtype=np.float32)
+        columns = [MACRO_COLUMNS.index(key) for key in keys]
+        target = np.array([target_macros[key] for key in keys], dtype=np.float32)
+
+        differences = np.abs(self.macro_matrix[:, columns] - target)
+        if metric == "relative":
+            differences /= np.maximum(target, 1.0)
+        elif metric == "weighted":
+            weights = weights or DEFAULT_MACRO_WEIGHTS
+            differences *= np.array([weights.get(key, 1.0) for key in keys], dtype=np.float32)
+        return differences.sum(axis=1)
+
+    def within_tolerance(self, target_macros: Dict[str, float], tolerance: float) -> np.ndarray:
+        """Rows whose protein, carbs and fat are all within tolerance (a fraction) of the target"""
+        mask = np.ones(len(self.recipes), dtype=bool)
+        for key in MACRO_KEYS:
+            if key in target_macros:
+                target = target_macros[key]
+                mask &= np.abs(self.macro_matrix[:, MACRO_COLUMNS.index(key)] - target) <= target * tolerance
+        return mask
+
+    def rank_by_macros(
+        self,
+        target_macros: Dict[str, float],
+        k: int = 10,
+        meal_type: Optional[str] = None,
+        metric: str = "relative",
+        tolerance: Optional[float] = None,
+        weights: Optional[Dict[str, float]] = None
+    ) -> np.ndarray:
+        """Rows of the k recipes closest to target_macros, closest first
+
+        Args:
+            meal_type: Only rank recipes listed for this meal type
+            tolerance: Only rank recipes passing within_tolerance
+        """
+        eligible = (
+            np.ones(len(self.recipes), dtype=bool) if meal_type is None
+            else self.meal_type_masks.get(meal_type, np.zeros(len(self.recipes), dtype=bool))
+        )
+        if tolerance is not None:
+            eligible = eligible & self.within_tolerance(target_macros, tolerance)
+        rows = np.flatnonzero(eligible)
+        if k <= 0 or len(rows) == 0:
+            return rows[:0]
+
+        distances = self.macro_distances(target_macros, metric, weights)[rows]
+        if len(rows) > k:
+            # Keep everything tied with the k-th distance so ties resolve by catalog order
+            kth = distances[np.argpartition(distances, k - 1)[k - 1]]
+            nearest = np.flatnonzero(distances <= kth)
+            rows, distances = rows[nearest], distances[nearest]
+        return rows[np.lexsort((rows, distances))[:k]]
+
+    def _match_ingredient(self, term: str) -> FrozenSet[int]:
+        rows: Set[int] = set()
+        for item, item_rows in self.rows_by_ingredient.items():
+            if term in item:
+                rows |= item_rows
+        return frozenset(rows)
+
+    def _match_name(self, term: str) -> FrozenSet[int]:
+        return frozenset(row for row, name in enumerate(self.names) if term in name)
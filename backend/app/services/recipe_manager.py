@@ -1,42 +1,63 @@
 import json
 import os
 import logging
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
 from ..schemas.meal_plan import NivelEconomico
+from .recipe_fragments import RecipeFragmentCache
+from .recipe_index import EXPENSIVE_INGREDIENTS, RecipeIndex, RecipeScores, normalize_text, split_terms
 
 logger = logging.getLogger(__name__)
 
 class RecipeManager:
     def __init__(self):
-        self.recipes_by_id: Dict[str, Dict] = {}
-        self.recipes_by_meal_type: Dict[str, List[Dict]] = {
+        # Rendered text of every recipe, per format variant, rebuilt on reload
+        self.fragments = RecipeFragmentCache()
+        self.fragments.register("summary", self._render_summary)
+        self.fragments.register("full", self._render_full)
+        self._load_recipes()
+    
+    def reload(self):
+        """Read the recipes file again, replacing the catalog and its cached fragments"""
+        self._load_recipes()
+    
+    def _load_recipes(self):
+        """Load recipes from JSON file into memory for quick access"""
+        recipes_by_id: Dict[str, Dict] = {}
+        recipes_by_meal_type: Dict[str, List[Dict]] = {
             "desayuno": [],
             "almuerzo": [],
             "merienda": [],
             "cena": [],
             "colacion": []
         }
-        self._load_recipes()
-    
-    def _load_recipes(self):
-        """Load recipes from JSON file into memory for quick access"""
+        recipes = []
+        
         json_path = os.path.join(os.path.dirname(__file__), "../../data/recipes_structured.json")
         
-        if not os.path.exists(json_path):
+        if os.path.exists(json_path):
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            recipes = data.get('recipes', [])
+        else:
             logger.warning(f"Recipes file not found at {json_path}")
-            return
-            
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
         
-        for recipe in data.get('recipes', []):
+        for recipe in recipes:
             # Store by ID for quick lookup
-            self.recipes_by_id[recipe['id']] = recipe
+            recipes_by_id[recipe['id']] = recipe
             
             # Store by meal type for filtering
             for meal_type in recipe.get('tipo_comida', []):
-                if meal_type in self.recipes_by_meal_type:
-                    self.recipes_by_meal_type[meal_type].append(recipe)
+                if meal_type in recipes_by_meal_type:
+                    recipes_by_meal_type[meal_type].append(recipe)
+        
+        # Precompute ingredient, name and tag lookups used by the filters,
+        # and the rendered text of each recipe, before swapping the catalog in
+        index = RecipeIndex(recipes)
+        self.fragments.load(recipes)
+        self.recipes_by_id = recipes_by_id
+        self.recipes_by_meal_type = recipes_by_meal_type
+        self.index = index
     
     def get_recipe_by_id(self, recipe_id: str) -> Optional[Dict]:
         """Get a specific recipe by its ID"""
@@ -60,33 +81,8 @@ class RecipeManager:
         tags_to_avoid: List[str]
     ) -> List[Dict]:
         """Filter recipes based on pathology tags (new format)"""
-        filtered = []
-        
-        for recipe in recipes:
-            recipe_tags = recipe.get('tags', [])
-            recipe_apto_para = recipe.get('apto_para', [])
-            
-            # Combine all tags for checking
-            all_recipe_tags = set(recipe_tags + recipe_apto_para)
-            
-            # Check if recipe has any tags to avoid
-            if tags_to_avoid and any(tag in all_recipe_tags for tag in tags_to_avoid):
-                continue
-            
-            # Calculate preference score based on preferred tags
-            preference_score = 0
-            if tags_to_prefer:
-                for tag in tags_to_prefer:
-                    if tag in all_recipe_tags:
-                        preference_score += 10
-            
-            recipe['pathology_score'] = preference_score
-            filtered.append(recipe)
-        
-        # Sort by pathology score
-        filtered.sort(key=lambda x: x.get('pathology_score', 0), reverse=True)
-        
-        return filtered
+        scores = self.score_recipes(recipes, tags_to_prefer=tags_to_prefer, tags_to_avoid=tags_to_avoid)
+        return scores.ranked()
 
     def filter_recipes_by_requirements(
         self,
@@ -98,98 +94,132 @@ class RecipeManager:
         tags_to_prefer: Optional[List[str]] = None,
         tags_to_avoid: Optional[List[str]] = None
     ) -> List[Dict]:
-        """Filter recipes based on patient requirements"""
-        filtered = []
+        """Filter recipes based on patient requirements, best scored first"""
+        scores = self.score_recipes(
+            recipes,
+            restrictions=restrictions,
+            preferences=preferences,
+            economic_level=economic_level,
+            target_macros=target_macros,
+            tags_to_prefer=tags_to_prefer,
+            tags_to_avoid=tags_to_avoid
+        )
+        return scores.ranked()
+    
+    def score_recipes(
+        self,
+        recipes: List[Dict],
+        restrictions: Optional[str] = None,
+        preferences: Optional[str] = None,
+        economic_level: str = "Medio",
+        target_macros: Optional[Dict[str, float]] = None,
+        tags_to_prefer: Optional[List[str]] = None,
+        tags_to_avoid: Optional[List[str]] = None
+    ) -> RecipeScores:
+        """Drop recipes the patient can't have and score the rest for this request
         
-        # Expensive ingredients to avoid for limited budgets
-        expensive_ingredients = [
-            'salmón', 'atún rojo', 'lomo', 'bife de chorizo', 'langostinos',
-            'queso azul', 'queso brie', 'jamón crudo', 'frutos secos', 'quinoa'
-        ]
+        Scores are returned as arrays aligned with the kept recipes; the recipe
+        dicts are shared by every request and are never modified.
+        """
+        index = self.index
+        limited_budget = economic_level in [NivelEconomico.bajo_recursos.value, NivelEconomico.limitado.value]
         
-        for recipe in recipes:
-            # Check restrictions
-            if restrictions and self._contains_restricted_ingredients(recipe, restrictions):
+        # Per-catalog-row results, computed with set lookups on the index
+        excluded = index.row_mask(index.rows_with_any_ingredient(split_terms(restrictions)))
+        if tags_to_avoid:
+            excluded |= index.row_mask(index.rows_with_any_tag(tags_to_avoid))
+        if limited_budget:
+            excluded |= index.expensive_mask
+        preference_by_row = self._preference_scores_by_row(split_terms(preferences))
+        pathology_by_row = np.zeros(len(index))
+        for tag in tags_to_prefer or []:
+            pathology_by_row += 10 * index.row_mask(index.rows_with_any_tag([tag]))
+        macro_by_row = index.macro_similarity(target_macros) if target_macros else np.zeros(len(index))
+        
+        # Gather them for the recipes of this request
+        row_of = [index.row_of(recipe) for recipe in recipes]
+        positions = np.array([i for i, row in enumerate(row_of) if row is not None], dtype=np.intp)
+        rows = np.array([row for row in row_of if row is not None], dtype=np.intp)
+        keep = np.zeros(len(recipes), dtype=bool)
+        preference = np.zeros(len(recipes))
+        pathology = np.zeros(len(recipes))
+        macro = np.zeros(len(recipes))
+        keep[positions] = ~excluded[rows]
+        preference[positions] = preference_by_row[rows]
+        pathology[positions] = pathology_by_row[rows]
+        macro[positions] = macro_by_row[rows]
+        
+        # Recipes that did not come from the catalog file are checked one by one
+        for position, row in enumerate(row_of):
+            if row is not None:
                 continue
-            
-            # Check pathology tags to avoid
-            if tags_to_avoid:
-                recipe_tags = recipe.get('tags', []) + recipe.get('apto_para', [])
-                if any(tag in recipe_tags for tag in tags_to_avoid):
-                    continue
-            
-            # Check economic level
-            if economic_level in [NivelEconomico.bajo_recursos.value, NivelEconomico.limitado.value]:
-                if self._contains_expensive_ingredients(recipe, expensive_ingredients):
-                    continue
-            
-            # Score by preferences
-            score = self._calculate_preference_score(recipe, preferences)
-            recipe['preference_score'] = score
-            
-            # Score by pathology tags
-            if tags_to_prefer:
-                pathology_score = 0
-                recipe_tags = recipe.get('tags', []) + recipe.get('apto_para', [])
-                for tag in tags_to_prefer:
-                    if tag in recipe_tags:
-                        pathology_score += 10
-                recipe['pathology_score'] = pathology_score
-                score += pathology_score
-            
-            # If target macros provided, calculate macro similarity
+            recipe = recipes[position]
+            recipe_tags = frozenset(recipe.get('tags', []) + recipe.get('apto_para', []))
+            if (
+                self._contains_restricted_ingredients(recipe, restrictions)
+                or not recipe_tags.isdisjoint(tags_to_avoid or [])
+                or (limited_budget and self._contains_expensive_ingredients(recipe, EXPENSIVE_INGREDIENTS))
+            ):
+                continue
+            keep[position] = True
+            preference[position] = self._calculate_preference_score(recipe, preferences)
+            pathology[position] = 10 * sum(1 for tag in tags_to_prefer or [] if tag in recipe_tags)
             if target_macros:
-                macro_score = self._calculate_macro_similarity(recipe, target_macros)
-                recipe['macro_score'] = macro_score
-            
-            recipe['total_score'] = score
-            filtered.append(recipe)
-        
-        # Sort by total score
-        filtered.sort(key=lambda x: x.get('total_score', 0), reverse=True)
+                macro[position] = self._calculate_macro_similarity(recipe, target_macros)
         
-        return filtered
+        kept = np.flatnonzero(keep)
+        return RecipeScores(
+            recipes=[recipes[position] for position in kept],
+            preference=preference[kept],
+            pathology=pathology[kept],
+            macro=macro[kept],
+            total=preference[kept] + pathology[kept]
+        )
+    
+    def _preference_scores_by_row(self, preference_terms: List[str]) -> np.ndarray:
+        """Preference score of every catalog row for the given terms"""
+        scores = np.zeros(len(self.index))
+        for term in preference_terms:
+            scores += 5.0 * self.index.row_mask(self.index.rows_with_name(term))
+            scores += 2.0 * self.index.row_mask(self.index.rows_with_ingredient(term))
+        return scores
     
-    def _contains_restricted_ingredients(self, recipe: Dict, restrictions: str) -> bool:
+    @staticmethod
+    def _ingredient_names(recipe: Dict) -> List[str]:
+        return [normalize_text(ing['item']) for ing in recipe.get('ingredientes', [])]
+    
+    def _contains_restricted_ingredients(self, recipe: Dict, restrictions: Optional[str]) -> bool:
         """Check if recipe contains restricted ingredients"""
-        if not restrictions:
+        restriction_list = split_terms(restrictions)
+        if not restriction_list:
             return False
-            
-        restriction_list = [r.strip().lower() for r in restrictions.split(',')]
-        ingredients_text = " ".join([
-            ing['item'].lower() for ing in recipe.get('ingredientes', [])
-        ])
         
-        return any(restriction in ingredients_text for restriction in restriction_list)
+        items = self._ingredient_names(recipe)
+        return any(restriction in item for restriction in restriction_list for item in items)
     
-    def _contains_expensive_ingredients(self, recipe: Dict, expensive_list: List[str]) -> bool:
+    def _contains_expensive_ingredients(self, recipe: Dict, expensive_list: Iterable[str]) -> bool:
         """Check if recipe contains expensive ingredients"""
-        ingredients_text = " ".join([
-            ing['item'].lower() for ing in recipe.get('ingredientes', [])
-        ])
-        
-        return any(expensive in ingredients_text for expensive in expensive_list)
+        items = self._ingredient_names(recipe)
+        return any(expensive in item for expensive in expensive_list for item in items)
     
     def _calculate_preference_score(self, recipe: Dict, preferences: Optional[str]) -> float:
         """Calculate how well a recipe matches preferences"""
-        if not preferences:
+        pref_list = split_terms(preferences)
+        if not pref_list:
             return 0.0
             
         score = 0.0
-        pref_list = [p.strip().lower() for p in preferences.split(',')]
         
         # Check recipe name
-        recipe_name_lower = recipe['nombre'].lower()
+        recipe_name = normalize_text(recipe['nombre'])
         for pref in pref_list:
-            if pref in recipe_name_lower:
+            if pref in recipe_name:
                 score += 5.0
         
         # Check ingredients
-        ingredients_text = " ".join([
-            ing['item'].lower() for ing in recipe.get('ingredientes', [])
-        ])
+        items = self._ingredient_names(recipe)
         for pref in pref_list:
-            if pref in ingredients_text:
+            if any(pref in item for item in items):
                 score += 2.0
         
         return score
@@ -222,6 +252,18 @@ class RecipeManager:
         if not recipe:
             return f"Recipe {recipe_id} not found"
         
+        return self.fragments.get("summary", recipe)
+    
+    def format_recipe_full(self, recipe_id: str) -> str:
+        """Format full recipe details"""
+        recipe = self.get_recipe_by_id(recipe_id)
+        if not recipe:
+            return f"Recipe {recipe_id} not found"
+        
+        return self.fragments.get("full", recipe)
+    
+    @staticmethod
+    def _render_summary(recipe: Dict) -> str:
         return (
             f"ID: {recipe['id']} | {recipe['nombre']} | "
             f"Cal: {recipe.get('calorias_aprox', 0)} | "
@@ -230,12 +272,8 @@ class RecipeManager:
             f"G: {recipe.get('grasas_aprox', 0)}g"
         )
     
-    def format_recipe_full(self, recipe_id: str) -> str:
-        """Format full recipe details"""
-        recipe = self.get_recipe_by_id(recipe_id)
-        if not recipe:
-            return f"Recipe {recipe_id} not found"
-        
+    @staticmethod
+    def _render_full(recipe: Dict) -> str:
         ingredients = "\n  ".join([
             f"- {ing['item']}: {ing['cantidad']}"
             for ing in recipe.get('ingredientes', [])
@@ -255,9 +293,10 @@ Nutrición: {recipe.get('calorias_aprox', 0)} kcal | P: {recipe.get('proteinas_a
         restrictions: Optional[str] = None,
         preferences: Optional[str] = None,
         economic_level: str = "Medio",
-        daily_macros: Optional[Dict[str, float]] = None
+        daily_macros: Optional[Dict[str, float]] = None,
+        limit: Optional[int] = 10
     ) -> Dict[str, List[Dict]]:
-        """Get filtered recipes organized by meal type for meal planning"""
+        """Get filtered recipes organized by meal type for meal planning (top `limit` per type)"""
         result = {}
         
         # Calculate target macros per meal if daily macros provided
@@ -282,7 +321,7 @@ Nutrición: {recipe.get('calorias_aprox', 0)} kcal | P: {recipe.get('proteinas_a
                 target_macros=meal_target_macros
             )
             
-            # Take top 10 recipes for each meal type
-            result[meal_type] = filtered[:10]
+            # Take the top recipes for each meal type
+            result[meal_type] = filtered[:limit]
         
         return result
\ No newline at end of file
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_RETRIES = 3
+# Share of the stored recipes a sync may delete without prune=True
+MAX_REMOVED_SHARE = 0.5
+
+
+def content_hash(document: str, metadata: Dict[str, Any]) -> str:
+    """Hash of everything stored for a recipe, so any change triggers an upsert"""
+    payload = document + "\n" + json.dumps(metadata, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RateLimiter:
+    """Spaces out calls shared by several threads to a maximum rate"""
+
+    def __init__(self, requests_per_minute: Optional[float] = None):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+@dataclass
+class SyncReport:
+    """What a sync changed in the collection"""
+    added: List[str] = field(default_factory=list)
+    updated: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: int = 0
+    failed: List[str] = field(default_factory=list)
+    kept: List[str] = field(default_factory=list)
+    embedding_calls: int = 0
+    seconds: float = 0.0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.updated or self.removed)
+
+    def summary(self) -> str:
+        lines = [
+            f"Added: {len(self.added)}, updated: {len(self.updated)}, removed: {len(self.removed)}, "
+            f"unchanged: {self.unchanged}, failed: {len(self.failed)}, kept: {len(self.kept)} "
+            f"({self.embedding_calls} embedding calls, {self.seconds:.1f}s)"
+        ]
+        for label, ids in (("+", self.added), ("~", self.updated), ("-", self.removed), ("!", self.failed), ("=", self.kept)):
+            if ids:
+                lines.append(f"  {label} {', '.join(sorted(ids))}")
+        return "\n".join(lines)
+
+
+def sync_recipes(
+    collection,
+    recipes: Iterable[Dict],
+    build_document: Callable[[Dict], str],
+    build_metadata: Callable[[Dict], Dict[str, Any]],
+    embedding_function: Callable[[List[str]], List[Sequence[float]]],
+    batch_size: int = 50,
+    max_concurrency: int = 4,
+    requests_per_minute: Optional[float] = None,
+    retries: int = EMBEDDING_RETRIES,
+    dry_run: bool = False,
+    prune: bool = False
+) -> SyncReport:
+    """Bring a Chroma collection in line with the recipe catalog
+
+    Each recipe's stored content hash is compared with the catalog's: only new
+    or changed recipes are embedded and upserted, and IDs no longer in the
+    catalog are deleted. Batches are embedded concurrently, at most
+    max_concurrency at a time and requests_per_minute overall, and each batch
+    is upserted as soon as its embeddings arrive, so an interrupted sync
+    keeps its progress and the next run resumes where it stopped.
+
+    An empty catalog, or one missing more than MAX_REMOVED_SHARE of the
+    stored recipes, is more likely a broken load than real removals: those
+    deletions are skipped and reported as kept unless prune is set.
+    """
+    start = time.perf_counter()
+    report = SyncReport()
+
+    # Later entries win for repeated IDs, as in RecipeManager.recipes_by_id
+    catalog = {recipe['id']: recipe for recipe in recipes}
+
+    existing = collection.get(include=["metadatas"])
+    stored = {
+        recipe_id: metadata or {}
+        for recipe_id, metadata in zip(existing["ids"], existing["metadatas"])
+    }
+
+    pending = []
+    # Upserts merge metadata, so records with keys no longer written
+    # (e.g. a legacy recipe_json) are deleted and inserted again
+    stale = set()
+    for recipe_id, recipe in catalog.items():
+        document = build_document(recipe)
+        metadata = build_metadata(recipe)
+        metadata["content_hash"] = content_hash(document, metadata)
+        if recipe_id not in stored:
+            report.added.append(recipe_id)
+        elif stored[recipe_id].get("content_hash") != metadata["content_hash"]:
+            report.updated.append(recipe_id)
+            if set(stored[recipe_id]) - set(metadata):
+                stale.add(recipe_id)
+        else:
+            report.unchanged += 1
+            continue
+        pending.append((recipe_id, document, metadata))
+
+    removed = [recipe_id for recipe_id in stored if recipe_id not in catalog]
+    if removed and not prune and (not catalog or len(removed) > MAX_REMOVED_SHARE * len(stored)):
+        logger.warning(
+            f"Catalog is missing {len(removed)} of {len(stored)} stored recipes; "
+            "not deleting them without prune"
+        )
+        report.kept = removed
+    else:
+        report.removed = removed
+
+    if dry_run:
+        report.seconds = time.perf_counter() - start
+        return report
+
+    if report.removed:
+        collection.delete(ids=report.removed)
+
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    limiter = RateLimiter(requests_per_minute)
+
+    def embed(batch):
+        documents = [document for _, document, _ in batch]
+        for attempt in range(retries):
+            limiter.wait()
+            try:
+                return embedding_function(documents)
+            except Exception as e:
+                if attempt == retries - 1:
+                    raise
+                logger.warning(f"Embedding batch failed, retrying: {e}")
+                time.sleep(2 ** attempt)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+        futures = {pool.submit(embed, batch): batch for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            ids = [recipe_id for recipe_id, _, _ in batch]
+            try:
+                embeddings = future.result()
+                report.embedding_calls += 1
+                stale_ids = [recipe_id for recipe_id in ids if recipe_id in stale]
+                if stale_ids:
+                    collection.delete(ids=stale_ids)
+                collection.upsert(
+                    ids=ids,
+                    documents=[document for _, document, _ in batch],
+                    metadatas=[metadata for _, _, metadata in batch],
+                    embeddings=[list(map(float, embedding)) for embedding in embeddings]
+                )
+            except Exception as e:
+                logger.error(f"Could not sync recipes {ids[0]}..{ids[-1]}: {e}")
+                report.failed.extend(ids)
+
+    failed = set(report.failed)
+    report.added = [recipe_id for recipe_id in report.added if recipe_id not in failed]
+    report.updated = [recipe_id for recipe_id in report.updated if recipe_id not in failed]
+    report.seconds = time.perf_counter() - start
+    return report
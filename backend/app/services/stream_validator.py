@@ -0,0 +1,124 @@
+import re
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+RECIPE_ID_PATTERN = re.compile(r'\[(REC_\d{4})\]')
+MACROS_PATTERN = re.compile(
+    r'Macros:\s*P:\s*(\d+(?:\.\d+)?)g?\s*\|\s*C:\s*(\d+(?:\.\d+)?)g?\s*\|\s*G:\s*(\d+(?:\.\d+)?)g?\s*\|\s*Cal:\s*(\d+(?:\.\d+)?)'
+)
+# Lines that open a new section of the plan (meal blocks and closing sections)
+BLOCK_HEADER_PATTERN = re.compile(
+    r'^[#*\s]*(DESAYUNO|ALMUERZO|MERIENDA|CENA|BRUNCH|DRUNCH|COLACI[OÓ]N[^:]*|MEDIA MA[NÑ]ANA|MEDIA TARDE|POSTRE[^:]*|'
+    r'SUPLEMENTACI[OÓ]N|RESUMEN NUTRICIONAL|RECOMENDACIONES)'
+)
+
+
+@dataclass
+class StreamIssue:
+    """A problem detected while the plan was still being generated"""
+    kind: str  # "unknown_recipe_id", "zero_macros" or "too_few_recipes"
+    message: str
+    line: str = ""
+
+
+class IncrementalPlanValidator:
+    """Validates a meal plan line by line as completion tokens arrive.
+
+    Runs the same checks as PromptGenerator.validate_recipe_usage and
+    MealPlanProcessor.check_for_zero_macros, but on each completed line, and
+    splits the text into meal blocks so they can be shown as soon as they end.
+    """
+
+    def __init__(self, valid_recipe_ids: Iterable[str], min_recipes: int = 3):
+        self.valid_recipe_ids = set(valid_recipe_ids)
+        self.min_recipes = min_recipes
+        self.issues: List[StreamIssue] = []
+        self.recipe_ids_used: List[str] = []
+
+        self._chunks: List[str] = []
+        self._pending_line = ""
+        self._block_name: Optional[str] = None
+        self._block_lines: List[str] = []
+        self._option_name = ""
+        self._completed_blocks: List[Tuple[str, str]] = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+    def feed(self, delta: str) -> List[StreamIssue]:
+        """Consume a text delta and return issues found in the lines it completed"""
+        self._chunks.append(delta)
+        self._pending_line += delta
+
+        new_issues: List[StreamIssue] = []
+        while "\n" in self._pending_line:
+            line, self._pending_line = self._pending_line.split("\n", 1)
+            new_issues.extend(self._process_line(line))
+
+        return new_issues
+
+    def finish(self) -> List[StreamIssue]:
+        """Process the trailing partial line and run whole-plan checks"""
+        new_issues: List[StreamIssue] = []
+        if self._pending_line:
+            new_issues.extend(self._process_line(self._pending_line))
+            self._pending_line = ""
+        self._close_block()
+
+        if len(self.recipe_ids_used) < self.min_recipes:
+            issue = StreamIssue(
+                kind="too_few_recipes",
+                message=f"El plan usa solo {len(self.recipe_ids_used)} recetas del catálogo"
+            )
+            self.issues.append(issue)
+            new_issues.append(issue)
+
+        return new_issues
+
+    def pop_completed_blocks(self) -> List[Tuple[str, str]]:
+        """Return (block name, block text) for blocks finished since the last call"""
+        blocks = self._completed_blocks
+        self._completed_blocks = []
+        return blocks
+
+    def _process_line(self, line: str) -> List[StreamIssue]:
+        stripped = line.strip()
+        header = BLOCK_HEADER_PATTERN.match(stripped)
+        # Bullet lines ("- ...", "* ...") mention meals but never open a block
+        if header and not stripped.startswith(("-", "* ")):
+            self._close_block()
+            self._block_name = stripped
+            self._option_name = ""
+        elif "OPCIÓN" in stripped.upper():
+            self._option_name = stripped
+
+        self._block_lines.append(line)
+
+        new_issues: List[StreamIssue] = []
+
+        for recipe_id in RECIPE_ID_PATTERN.findall(line):
+            self.recipe_ids_used.append(recipe_id)
+            if recipe_id not in self.valid_recipe_ids:
+                new_issues.append(StreamIssue(
+                    kind="unknown_recipe_id",
+                    message=f"La receta {recipe_id} no existe en el catálogo enviado",
+                    line=stripped
+                ))
+
+        for match in MACROS_PATTERN.finditer(line):
+            if all(float(value) == 0 for value in match.groups()):
+                new_issues.append(StreamIssue(
+                    kind="zero_macros",
+                    message=f"{self._block_name or 'Comida desconocida'} - {self._option_name or 'Opción desconocida'} tiene todos los macros en cero",
+                    line=stripped
+                ))
+
+        self.issues.extend(new_issues)
+        return new_issues
+
+    def _close_block(self):
+        if self._block_name and self._block_lines:
+            self._completed_blocks.append((self._block_name, "\n".join(self._block_lines).strip()))
+        self._block_name = None
+        self._block_lines = []
@@ -0,0 +1,105 @@
+import json
+from typing import Dict, List
+from pydantic import ValidationError
+from ..schemas.meal_plan import StructuredMealPlan
+
+# Schema errors quoted in the error message (and the regeneration log)
+MAX_REPORTED_ERRORS = 5
+
+_EXAMPLE_PLAN = {
+    "titulo": "PLAN ALIMENTARIO - 3 DÍAS IGUALES",
+    "comidas": [
+        {
+            "comida": "DESAYUNO",
+            "nota": None,
+            "opciones": [
+                {
+                    "receta_id": "REC_XXXX",
+                    "nombre": "Nombre de la receta",
+                    "ingredientes": [{"item": "Ingrediente 1", "cantidad": "XXg"}],
+                    "preparacion": "Método de cocción",
+                    "macros": {"proteinas": 0, "carbohidratos": 0, "grasas": 0, "calorias": 0}
+                }
+            ]
+        }
+    ],
+    "suplementacion": [],
+    "recomendaciones": [],
+    "cambios": []
+}
+
+STRUCTURED_OUTPUT_INSTRUCTIONS = f"""
+
+FORMATO DE RESPUESTA (JSON):
+Ignorá el formato de texto indicado arriba y respondé ÚNICAMENTE con un objeto JSON válido con esta estructura:
+{json.dumps(_EXAMPLE_PLAN, ensure_ascii=False, indent=2)}
+
+- Una entrada en "comidas" por cada comida del plan, con TODAS sus opciones
+- "receta_id": ID del catálogo sin corchetes (REC_XXXX)
+- "ingredientes": cantidades ya ajustadas; "macros": valores numéricos de la porción ajustada, nunca en cero
+- "suplementacion", "recomendaciones" y "cambios" (solo controles): listas de textos, vacías si no aplican
+"""
+
+
+def parse_structured_plan(text: str) -> StructuredMealPlan:
+    """Validate an LLM JSON response against StructuredMealPlan
+
+    Raises ValueError listing the first schema errors, with the path of
+    each offending field.
+    """
+    try:
+        return StructuredMealPlan.model_validate_json(text)
+    except ValidationError as e:
+        errors = [
+            f"{'.'.join(str(part) for part in error['loc']) or 'raíz'}: {error['msg']}"
+            for error in e.errors()[:MAX_REPORTED_ERRORS]
+        ]
+        raise ValueError(f"Plan JSON inválido ({e.error_count()} errores): " + "; ".join(errors))
+
+
+def render_plan_text(plan: StructuredMealPlan) -> str:
+    """Render a structured plan in the text layout of the Motor 1 prompt"""
+    lines = [plan.titulo, ""]
+    for meal in plan.comidas:
+        lines.append(f"{meal.comida.upper()} ({meal.nota})" if meal.nota else meal.comida.upper())
+        for number, option in enumerate(meal.opciones, 1):
+            macros = option.macros
+            lines.append(f"OPCIÓN {number}:")
+            lines.append(f"- Receta: [{option.receta_id}] - {option.nombre}")
+            lines.append("- Ingredientes con cantidades ajustadas:")
+            lines.extend(f"  * {ingredient.item}: {ingredient.cantidad}" for ingredient in option.ingredientes)
+            if option.preparacion:
+                lines.append(f"- Forma de preparación: {option.preparacion}")
+            lines.append(
+                f"- Macros: P: {macros.proteinas:g}g | C: {macros.carbohidratos:g}g | "
+                f"G: {macros.grasas:g}g | Cal: {macros.calorias:g}"
+            )
+            lines.append("")
+
+    for title, items in (
+        ("SUPLEMENTACIÓN", plan.suplementacion),
+        ("RECOMENDACIONES", plan.recomendaciones),
+        ("CAMBIOS IMPLEMENTADOS", plan.cambios)
+    ):
+        if items:
+            lines.append(f"{title}:")
+            lines.extend(f"- {item}" for item in items)
+            lines.append("")
+
+    return "\n".join(lines).rstrip() + "\n"
+
+
+def plan_meal_structure(plan: StructuredMealPlan) -> Dict[str, List[Dict[str, float]]]:
+    """Option macros per meal, as MealPlanValidator expects them"""
+    return {
+        meal.comida.lower(): [
+            {
+                'protein': option.macros.proteinas,
+                'carbs': option.macros.carbohidratos,
+                'fat': option.macros.grasas,
+                'calories': option.macros.calorias
+            }
+            for option in meal.opciones
+        ]
+        for meal in plan.comidas
+    }
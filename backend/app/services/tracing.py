@@ -0,0 +1,284 @@
+import functools
+import inspect
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets: stages range from
+# milliseconds (prompt assembly) to minutes (a GPT-4 plan)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# USD per 1K tokens (prompt, completion) of the models the app calls
+MODEL_PRICES = {
+    "gpt-4-turbo-preview": (0.01, 0.03),
+    "gpt-4-vision-preview": (0.01, 0.03),
+    "text-embedding-ada-002": (0.0001, 0.0),
+}
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0.0)
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(list(zip(self.labelnames, key)))} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels"""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: observations per bucket (the last one is +Inf), sum
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(str(labels[name]) for name in self.labelnames))
+        return sum(series[0]) if series else 0
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        for key, (counts, total) in series:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Latency, token and cost metrics of the pipeline, in the Prometheus text format"""
+
+    def __init__(self):
+        self.stage_seconds = Histogram(
+            "mealplan_stage_duration_seconds",
+            "Duration of each pipeline stage",
+            ("motor", "stage")
+        )
+        self.request_seconds = Histogram(
+            "mealplan_request_duration_seconds",
+            "Duration of a whole Motor 1/2/3 generation",
+            ("motor", "status")
+        )
+        self.llm_requests = Counter(
+            "mealplan_llm_requests_total",
+            "OpenAI requests that returned a response",
+            ("model",)
+        )
+        self.llm_tokens = Counter(
+            "mealplan_llm_tokens_total",
+            "OpenAI tokens used, from the usage field of each response",
+            ("model", "kind")
+        )
+        self.llm_cost = Counter(
+            "mealplan_llm_cost_usd_total",
+            "Estimated OpenAI cost in USD, from the token usage and MODEL_PRICES",
+            ("model",)
+        )
+
+    def render(self) -> str:
+        metrics = (self.stage_seconds, self.request_seconds, self.llm_requests, self.llm_tokens, self.llm_cost)
+        return "\n".join(line for metric in metrics for line in metric.collect()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def llm_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Cost in USD of a request (0 for models without a known price)"""
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+
+@dataclass
+class Span:
+    name: str
+    start: float
+    duration: float
+
+
+class StageTimings:
+    """Timeline of one request: a span per pipeline stage, and its LLM usage
+
+    Each measure() span is kept with its start offset and observed in the
+    stage histogram of the request's motor; as_dict() sums the durations
+    per stage. OpenAI usage recorded while the timings are active (see
+    activate()) is added to the request's token count and cost.
+    """
+
+    def __init__(self, motor: str = "", registry: Optional[MetricsRegistry] = None):
+        self.motor = motor
+        self.registry = registry or REGISTRY
+        self.started = time.perf_counter()
+        self.spans: List[Span] = []
+        self.durations: Dict[str, float] = {}
+        self.tokens = {"prompt": 0, "completion": 0}
+        self.cost = 0.0
+
+    @contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.durations[stage] = round(self.durations.get(stage, 0.0) + elapsed, 4)
+            self.spans.append(Span(stage, round(start - self.started, 4), round(elapsed, 4)))
+            self.registry.stage_seconds.observe(elapsed, motor=self.motor or "unknown", stage=stage)
+
+    @contextmanager
+    def request(self, motor: str):
+        """Span of a whole generation: labels its stages and records its duration"""
+        self.motor = motor
+        start = time.perf_counter()
+        status = "error"
+        try:
+            yield self
+            status = "ok"
+        finally:
+            elapsed = time.perf_counter() - start
+            self.registry.request_seconds.observe(elapsed, motor=motor, status=status)
+            stages = ", ".join(f"{span.name} {span.duration:.2f}s" for span in self.spans)
+            logger.info(
+                f"{motor} request {status} in {elapsed:.2f}s ({stages}); "
+                f"{self.tokens['prompt']}+{self.tokens['completion']} tokens, ${self.cost:.4f}"
+            )
+
+    def record_usage(self, prompt_tokens: int, completion_tokens: int, cost: float):
+        self.tokens["prompt"] += prompt_tokens
+        self.tokens["completion"] += completion_tokens
+        self.cost += cost
+
+    def as_dict(self) -> Dict[str, float]:
+        return dict(self.durations)
+
+    def timeline(self) -> List[Dict]:
+        """Spans in the order they finished, with start offsets in seconds"""
+        return [{"stage": span.name, "start": span.start, "duration": span.duration} for span in self.spans]
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        """Server-Timing header value (durations in milliseconds)"""
+        entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.durations.items()]
+        if total is not None:
+            entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current_timings: ContextVar[Optional[StageTimings]] = ContextVar("current_timings", default=None)
+
+
+def current_timings() -> Optional[StageTimings]:
+    return _current_timings.get()
+
+
+@contextmanager
+def activate(timings: StageTimings):
+    """Make timings the current request's (tasks started inside inherit it)"""
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+def record_llm_usage(model: str, prompt_tokens: int, completion_tokens: int):
+    """Count the tokens and cost of an OpenAI response, globally and for the current request"""
+    timings = current_timings()
+    registry = timings.registry if timings else REGISTRY
+    cost = llm_cost(model, prompt_tokens, completion_tokens)
+    registry.llm_requests.inc(model=model)
+    registry.llm_tokens.inc(prompt_tokens, model=model, kind="prompt")
+    registry.llm_tokens.inc(completion_tokens, model=model, kind="completion")
+    registry.llm_cost.inc(cost, model=model)
+    if timings:
+        timings.record_usage(prompt_tokens, completion_tokens, cost)
+
+
+def traced(motor: str):
+    """Run a pipeline entry point as one traced request of the given motor
+
+    The method receives the timings it was given, the current request's
+    (set by the HTTP middleware), or new ones.
+    """
+    def decorator(method):
+        if inspect.isasyncgenfunction(method):
+            @functools.wraps(method)
+            async def stream_wrapper(self, request, timings: Optional[StageTimings] = None):
+                timings = timings or current_timings() or StageTimings()
+                with timings.request(motor), activate(timings):
+                    async for item in method(self, request, timings):
+                        yield item
+            return stream_wrapper
+
+        @functools.wraps(method)
+        async def wrapper(self, request, timings: Optional[StageTimings] = None):
+            timings = timings or current_timings() or StageTimings()
+            with timings.request(motor), activate(timings):
+                return await method(self, request, timings)
+        return wrapper
+    return decorator
@@ -296,6 +296,32 @@ class NutritionalCalculator:
         # Redondear valores
         return {meal: round(calories) for meal, calories in distribution.items()}
     
+    @staticmethod
+    def calculate_patient_meal_distribution(
+        patient: NewPatientRequest,
+        daily_calories: float,
+        pregnancy_requirements: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, float]:
+        """
+        Calcula las calorías objetivo de cada comida del paciente, usando la
+        distribución especial de embarazo cuando corresponde
+        """
+        pregnancy_distribution = (pregnancy_requirements or {}).get('meal_distribution', {})
+        if pregnancy_distribution:
+            # Convertir porcentajes a calorías
+            return {
+                meal: round(daily_calories * (percentage / 100))
+                for meal, percentage in pregnancy_distribution.items()
+            }
+        
+        return NutritionalCalculator.calculate_meal_distribution(
+            daily_calories,
+            patient.comidas_principales,
+            patient.distribution_type.value,
+            False,
+            patient.custom_meal_distribution
+        )
+    
     @staticmethod
     def calculate_pregnancy_adjusted_requirements(patient: NewPatientRequest) -> Optional[Dict[str, Any]]:
         """
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark detect_pathologies_from_text
+Compares the Aho-Corasick keyword automaton (cold and memoized) with scanning the
+text once per keyword, which is what the function did before. A Motor 1
+request detects pathologies several times (calorie calculation, prompt
+sections, recipe search), so results are also shown per request.
+
+Usage: python scripts/benchmark_pathology_detection.py [--iterations 2000] [--calls-per-request 6]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.data.pathologies import (
+    CANCER_PHASE_KEYWORDS,
+    PATHOLOGY_KEYWORDS,
+    PREGNANCY_KEYWORDS,
+    PREGNANCY_TRIMESTER_KEYWORDS,
+    PathologyType,
+    _detect_lowercase,
+    detect_pathologies_from_text
+)
+
+PATIENT_TEXTS = [
+    "Diabetes tipo 2, hipertensión arterial",
+    "Embarazada, segundo trimestre. Antecedente de anemia ferropénica",
+    "Hipotiroidismo (Hashimoto), colesterol alto, reflujo",
+    "Paciente oncológico en radioterapia, pérdida de apetito",
+    "Sin patologías conocidas",
+]
+
+
+def detect_by_scan(text: str):
+    """One substring scan per keyword, as before the automaton was built"""
+    text_lower = text.lower()
+    detected = []
+    for keywords, pathology in PATHOLOGY_KEYWORDS:
+        if not any(keyword in text_lower for keyword in keywords):
+            continue
+        if pathology is not None:
+            detected.append(pathology)
+            continue
+        phases = PREGNANCY_TRIMESTER_KEYWORDS if keywords is PREGNANCY_KEYWORDS else CANCER_PHASE_KEYWORDS
+        default = (
+            PathologyType.EMBARAZO_SEGUNDO_TRIMESTRE if keywords is PREGNANCY_KEYWORDS
+            else PathologyType.CANCER_PREQUIMIO
+        )
+        detected.append(next(
+            (phase for phase_keywords, phase in phases if any(k in text_lower for k in phase_keywords)),
+            default
+        ))
+    return list(dict.fromkeys(detected))
+
+
+def time_per_call(detect, iterations: int) -> float:
+    """Mean microseconds per call over the sample patient texts"""
+    start = time.perf_counter()
+    for i in range(iterations):
+        detect(PATIENT_TEXTS[i % len(PATIENT_TEXTS)])
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000, help="Calls per measurement")
+    parser.add_argument("--calls-per-request", type=int, default=6, help="Detections per Motor 1 request")
+    args = parser.parse_args()
+
+    uncached = _detect_lowercase.__wrapped__
+    variants = [
+        ("keyword scan", detect_by_scan),
+        ("automaton", lambda text: uncached(text.lower())),
+        ("automaton+cache", detect_pathologies_from_text),
+    ]
+
+    print(f"{'variant':>15} {'us/call':>9} {'us/request':>11}")
+    for label, detect in variants:
+        per_call = time_per_call(detect, args.iterations)
+        print(f"{label:>15} {per_call:>9.2f} {per_call * args.calls_per_request:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Measure the prompt size of each recipe catalog format
+Builds the Motor 1 catalog (PROMPT_RECIPES_PER_MEAL recipes per meal type)
+and the Motor 2 catalog (every recipe), formats them as "full" and "compact"
+(with and without preparation text) and prints the estimated tokens of each.
+
+Usage: python scripts/benchmark_prompt_formats.py [--per-meal 10]
+"""
+
+import argparse
+import os
+import sys
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.meal_plan_pipeline import PROMPT_RECIPES_PER_MEAL
+from app.services.prompt_generator import PromptGenerator, estimate_tokens
+from app.services.recipe_manager import RecipeManager
+
+FORMATS = [
+    ("full", False),
+    ("compact", True),
+    ("compact", False),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--per-meal", type=int, default=PROMPT_RECIPES_PER_MEAL, help="Motor 1 recipes per meal type")
+    args = parser.parse_args()
+
+    recipe_manager = RecipeManager()
+    catalogs = {
+        "Motor 1": recipe_manager.get_recipes_for_meal_plan(
+            meal_types=["desayuno", "almuerzo", "merienda", "cena"],
+            daily_macros={"proteinas": 120, "carbohidratos": 200, "grasas": 60},
+            limit=args.per_meal
+        ),
+        "Motor 2": {
+            meal_type: recipes
+            for meal_type, recipes in recipe_manager.recipes_by_meal_type.items() if recipes
+        },
+    }
+
+    for name, recipes_by_meal in catalogs.items():
+        entries = sum(len(recipes) for recipes in recipes_by_meal.values())
+        unique = len({recipe['id'] for recipes in recipes_by_meal.values() for recipe in recipes})
+        print(f"\n{name}: {entries} catalog entries, {unique} distinct recipes")
+
+        baseline = None
+        for catalog_format, include_preparation in FORMATS:
+            generator = PromptGenerator(catalog_format=catalog_format, include_preparation=include_preparation)
+            tokens = estimate_tokens(generator.format_recipe_catalog(recipes_by_meal))
+            baseline = baseline or tokens
+            label = catalog_format + (" + preparación" if include_preparation else "")
+            print(f"  {label:<24} ~{tokens:>6} tokens  ({100 * (1 - tokens / baseline):4.0f}% fewer)")
+
+
+if __name__ == "__main__":
+    main()
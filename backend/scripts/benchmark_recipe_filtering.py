@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark RecipeManager.filter_recipes_by_requirements
+Compares the precomputed RecipeIndex path with the per-recipe text scan used
+for recipes that are not in the index, on the real catalog and on a catalog
+replicated to a larger size.
+
+Usage: python scripts/benchmark_recipe_filtering.py [--scale 100] [--requests 200]
+"""
+
+import argparse
+import copy
+import os
+import statistics
+import sys
+import time
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.recipe_index import RecipeIndex
+from app.services.recipe_manager import RecipeManager
+
+PATIENT_PROFILES = [
+    {"restrictions": "leche, huevo", "preferences": "pollo, arroz", "economic_level": "Medio"},
+    {"restrictions": "pescado", "preferences": "banana, avena", "economic_level": "Limitado"},
+    {"restrictions": "gluten, pan", "preferences": "tomate", "economic_level": "Bajo recursos"},
+    {"restrictions": None, "preferences": "queso, carne, nuez", "economic_level": "Alto"},
+]
+
+
+def time_filter(manager: RecipeManager, recipes, requests: int) -> float:
+    """Median milliseconds per filter call over the patient profiles"""
+    samples = []
+    for i in range(requests):
+        profile = PATIENT_PROFILES[i % len(PATIENT_PROFILES)]
+        start = time.perf_counter()
+        manager.filter_recipes_by_requirements(
+            recipes,
+            target_macros={"proteinas": 25, "carbohidratos": 50, "grasas": 15},
+            tags_to_prefer=["vegetariano", "rapido"],
+            tags_to_avoid=["alto_ig"],
+            **profile
+        )
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def replicate_catalog(recipes, scale: int):
+    """Copy the catalog scale times with distinct IDs"""
+    replicated = []
+    for copy_number in range(scale):
+        for recipe in recipes:
+            clone = copy.deepcopy(recipe)
+            clone['id'] = f"{recipe['id']}_{copy_number}"
+            replicated.append(clone)
+    return replicated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=100, help="Catalog copies for the large run")
+    parser.add_argument("--requests", type=int, default=200, help="Filter calls per measurement")
+    args = parser.parse_args()
+
+    manager = RecipeManager()
+    catalog = manager.index.recipes
+
+    print(f"{'catalog':>10} {'recipes':>8} {'indexed ms':>11} {'scan ms':>9} {'speedup':>8}")
+    for label, recipes in [("real", catalog), (f"x{args.scale}", replicate_catalog(catalog, args.scale))]:
+        start = time.perf_counter()
+        manager.index = RecipeIndex(recipes)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        indexed_ms = time_filter(manager, recipes, args.requests)
+        # Copies are not in the index, so the filter scans their text
+        unindexed = copy.deepcopy(recipes)
+        scan_ms = time_filter(manager, unindexed, max(1, args.requests // 10))
+
+        print(
+            f"{label:>10} {len(recipes):>8} {indexed_ms:>11.3f} {scan_ms:>9.3f} "
+            f"{scan_ms / indexed_ms:>7.1f}x  (index built in {build_ms:.1f} ms)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Build the in-process recipe vector index used when VECTOR_BACKEND is "local" or "auto"
+Embeds every catalog recipe with the same document text and model as the
+ChromaDB collection and writes the embeddings (.npy) and metadata (.json).
+
+Usage: python scripts/build_local_vector_index.py [--output ./data/vector_index] [--batch-size 100]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.services.chromadb_service import (
+    EMBEDDING_MODEL,
+    build_recipe_document,
+    build_recipe_metadata,
+    create_embedding_function
+)
+from app.services.local_vector_index import LocalCollection, save_local_index
+from app.services.recipe_manager import RecipeManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=settings.local_vector_index_dir, help="Index directory")
+    parser.add_argument("--batch-size", type=int, default=100, help="Recipes per embedding request")
+    args = parser.parse_args()
+
+    # One entry per recipe ID, the same recipe RecipeManager resolves
+    recipes = list(RecipeManager().recipes_by_id.values())
+    if not recipes:
+        print("Error: no recipes found in data/recipes_structured.json")
+        sys.exit(1)
+
+    ids = [recipe['id'] for recipe in recipes]
+    documents = [build_recipe_document(recipe) for recipe in recipes]
+    metadatas = [build_recipe_metadata(recipe) for recipe in recipes]
+
+    embedding_function = create_embedding_function()
+    embeddings = []
+    start = time.perf_counter()
+    for offset in range(0, len(documents), args.batch_size):
+        embeddings.extend(embedding_function(documents[offset:offset + args.batch_size]))
+        print(f"Embedded {len(embeddings)}/{len(documents)} recipes")
+
+    save_local_index(args.output, ids, documents, metadatas, embeddings, EMBEDDING_MODEL)
+    collection = LocalCollection(args.output)
+    print(
+        f"✅ Wrote {collection.count()} recipes ({collection.embeddings.shape[1]} dimensions) "
+        f"to {args.output} in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Test script for concurrent best-of-N Motor 1 generation"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.executor import StageExecutor
+from app.services.meal_plan_pipeline import MealPlanPipeline, RECIPE_ID_REMINDER, ZERO_MACROS_REMINDER
+from app.services.meal_plan_processor import MealPlanProcessor
+from app.services.prompt_generator import PromptGenerator
+from app.services.recipe_manager import RecipeManager
+
+VALID_IDS = ["REC_0001", "REC_0003", "REC_0011"]
+
+class FakeOpenAI:
+    """Answers after a delay chosen by the prompt variant"""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.started = []
+        self.cancelled = []
+        self.cached = []
+
+    async def generate_meal_plan(self, prompt):
+        reminder = prompt[len("PROMPT"):]
+        self.started.append(reminder)
+        delay, text = self.answers[reminder]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(reminder)
+            raise
+        if isinstance(text, Exception):
+            raise text
+        return text
+
+    async def cache_response(self, prompt, response, structured=False):
+        self.cached.append((prompt, response))
+
+class ScoredPipeline(MealPlanPipeline):
+    """Scores candidates by their text, so structure checks need no full plan"""
+
+    def _score_candidate(self, meal_plan, all_recipe_ids, distribution_type):
+        return tuple(flag == "1" for flag in meal_plan.split(":")[0])
+
+def _pipeline(openai_service, candidates=3, pipeline_class=MealPlanPipeline):
+    recipe_manager = RecipeManager()
+    return pipeline_class(
+        chromadb_service=None,
+        recipe_manager=recipe_manager,
+        prompt_generator=PromptGenerator(),
+        openai_service=openai_service,
+        meal_plan_processor=MealPlanProcessor(recipe_manager),
+        pdf_generator=None,
+        stage_executor=StageExecutor({"search": 1, "cpu": 1, "pdf": 1}),
+        candidates=candidates
+    )
+
+def test_first_valid_candidate_wins():
+    """A fully valid candidate is returned at once and slower ones are cancelled"""
+    fake = FakeOpenAI({
+        "": (0.05, "110:sin estructura"),
+        RECIPE_ID_REMINDER: (0.1, "111:valido"),
+        RECIPE_ID_REMINDER + ZERO_MACROS_REMINDER: (5, "111:lento"),
+    })
+    pipeline = _pipeline(fake, pipeline_class=ScoredPipeline)
+
+    async def run():
+        start = asyncio.get_running_loop().time()
+        plan = await pipeline._generate_best_of("PROMPT", VALID_IDS, "standard")
+        return plan, asyncio.get_running_loop().time() - start
+
+    plan, elapsed = asyncio.run(run())
+    print(f"Chosen: {plan} after {elapsed:.2f}s, cancelled: {len(fake.cancelled)}")
+    assert plan == "111:valido"
+    assert elapsed < 1
+    assert len(fake.cancelled) == 1
+    # Only the accepted candidate is cached, under its own prompt
+    assert fake.cached == [("PROMPT" + RECIPE_ID_REMINDER, "111:valido")]
+
+def test_best_candidate_when_none_is_valid():
+    """Without a fully valid candidate, the best scored one is used"""
+    fake = FakeOpenAI({
+        "": (0.01, "There is [REC_9999] here"),
+        RECIPE_ID_REMINDER: (0.02, "[REC_0001] [REC_0003] [REC_0011]"),
+    })
+    pipeline = _pipeline(fake, candidates=2)
+    plan = asyncio.run(pipeline._generate_best_of("PROMPT", VALID_IDS, "standard"))
+    assert plan == "[REC_0001] [REC_0003] [REC_0011]"
+
+def test_all_candidates_failing_raises():
+    fake = FakeOpenAI({"": (0, RuntimeError("rate limited")), RECIPE_ID_REMINDER: (0, RuntimeError("down"))})
+    pipeline = _pipeline(fake, candidates=2)
+    try:
+        asyncio.run(pipeline._generate_best_of("PROMPT", VALID_IDS, "standard"))
+        assert False, "expected an exception"
+    except RuntimeError as e:
+        print(f"Raised: {e}")
+
+def test_candidates_are_distinct_prompts():
+    """Candidates are capped at the distinct prompts, which never share a cache entry"""
+    fake = FakeOpenAI({
+        "": (0.01, "no"),
+        RECIPE_ID_REMINDER: (0.01, "no"),
+        RECIPE_ID_REMINDER + ZERO_MACROS_REMINDER: (0.01, "no"),
+    })
+    pipeline = _pipeline(fake, candidates=5)
+    assert pipeline.candidates == 3
+    asyncio.run(pipeline._generate_best_of("PROMPT", VALID_IDS, "standard"))
+    assert len(fake.started) == len(set(fake.started)) == 3
+
+def main():
+    """Run all tests"""
+    print("Testing Best-of-N Generation\n" + "="*50)
+
+    test_first_valid_candidate_wins()
+    test_best_candidate_when_none_is_valid()
+    test_all_candidates_failing_raises()
+    test_candidates_are_distinct_prompts()
+
+    print("\n\n✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
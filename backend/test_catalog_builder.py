@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Test script for the token-budgeted Motor 2 recipe catalog"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.schemas.meal_plan import ControlPatientRequest
+from app.services.catalog_builder import CatalogBuilder, estimate_tokens
+from app.services.prompt_generator import PromptGenerator
+from app.services.recipe_manager import RecipeManager
+
+def _request(**overrides):
+    data = dict(
+        nombre="Paciente Control",
+        fecha_control="2024-01-15",
+        peso_anterior=80,
+        peso_actual=78,
+        objetivo_actualizado="bajar de peso",
+        tipo_actividad_actual="caminata",
+        frecuencia_actual=3,
+        duracion_actual=45,
+        agregar="avena",
+        sacar="",
+        dejar="",
+        plan_anterior="Desayuno: Opción 1 [REC_0003]"
+    )
+    data.update(overrides)
+    return ControlPatientRequest(**data)
+
+def test_catalog_fits_budget():
+    """The catalog stays within budget and keeps every meal type"""
+    builder = CatalogBuilder(RecipeManager(), PromptGenerator(), token_budget=1500)
+    catalog = builder.build(_request())
+    print(f"Catalog: {catalog.count('[REC_')} recipes, ~{estimate_tokens(catalog)} tokens")
+
+    assert estimate_tokens(catalog) <= 1500
+    for meal_type in ("DESAYUNO", "ALMUERZO", "MERIENDA", "CENA"):
+        assert f"RECETAS PARA {meal_type}" in catalog
+
+def test_ranking_follows_control_request():
+    """Previous plan recipes come first and SACAR ingredients are dropped"""
+    builder = CatalogBuilder(RecipeManager(), PromptGenerator())
+    ranked = builder.rank_recipes(_request(sacar="huevo"))
+    assert all(
+        "huevo" not in ing['item'].lower()
+        for recipes in ranked.values() for recipe in recipes for ing in recipe.get('ingredientes', [])
+    )
+
+    ranked = builder.rank_recipes(_request())
+    assert ranked["desayuno"][0]['id'] == "REC_0003"
+
+def main():
+    """Run all tests"""
+    print("Testing Catalog Builder\n" + "="*50)
+
+    test_catalog_fits_budget()
+    test_ranking_follows_control_request()
+
+    print("\n\n✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Test script for the compact recipe catalog format"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.prompt_generator import PromptGenerator, estimate_tokens
+from app.services.recipe_manager import RecipeManager
+
+def _catalog():
+    return RecipeManager().get_recipes_for_meal_plan(
+        meal_types=["desayuno", "almuerzo", "merienda", "cena"],
+        limit=10
+    )
+
+def test_each_recipe_listed_once():
+    """Recipes shared by several meal types get one row and are referenced by ID"""
+    recipes_by_meal = _catalog()
+    catalog = PromptGenerator(catalog_format="compact").format_recipe_catalog(recipes_by_meal)
+
+    unique_ids = {recipe['id'] for recipes in recipes_by_meal.values() for recipe in recipes}
+    assert catalog.count("[REC_") == len(unique_ids)
+    for meal_type, recipes in recipes_by_meal.items():
+        line = next(line for line in catalog.splitlines() if line.startswith(meal_type.upper()))
+        assert all(recipe['id'] in line for recipe in recipes)
+    assert "Prep:" not in catalog
+
+    with_preparation = PromptGenerator(catalog_format="compact", include_preparation=True)
+    assert "Prep:" in with_preparation.format_recipe_catalog(recipes_by_meal)
+
+def test_compact_saves_tokens():
+    """The compact catalog needs well under two thirds of the full one's tokens"""
+    recipes_by_meal = _catalog()
+    full = estimate_tokens(PromptGenerator(catalog_format="full").format_recipe_catalog(recipes_by_meal))
+    compact = estimate_tokens(PromptGenerator(catalog_format="compact").format_recipe_catalog(recipes_by_meal))
+    print(f"Full: ~{full} tokens, compact: ~{compact} tokens")
+    assert compact < 0.6 * full
+
+def test_unknown_format_rejected():
+    try:
+        PromptGenerator(catalog_format="tabla")
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+
+def main():
+    """Run all tests"""
+    print("Testing Compact Recipe Catalog\n" + "="*50)
+
+    test_each_recipe_listed_once()
+    test_compact_saves_tokens()
+    test_unknown_format_rejected()
+
+    print("\n\n✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Test script for aborting and regenerating invalid Motor 1 streams"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.executor import StageExecutor
+from app.services.meal_plan_pipeline import (
+    MealPlanPipeline, MAX_CORRECTIVE_RETRIES, RECIPE_ID_REMINDER, ZERO_MACROS_REMINDER
+)
+from app.services.meal_plan_processor import MealPlanProcessor
+from app.services.prompt_generator import PromptGenerator
+from app.services.recipe_manager import RecipeManager
+from app.services.tracing import StageTimings
+
+VALID_IDS = ["REC_0001", "REC_0003", "REC_0011"]
+GOOD_MACROS = "- Macros: P: 20g | C: 30g | G: 10g | Cal: 290\n"
+
+def _plan(first_id="REC_0001", macros=GOOD_MACROS):
+    return (
+        f"DESAYUNO\nOPCIÓN 1:\n- Receta: [{first_id}] - Uno\n{macros}"
+        f"OPCIÓN 2:\n- Receta: [REC_0003] - Dos\n{GOOD_MACROS}\n"
+        f"ALMUERZO\nOPCIÓN 1:\n- Receta: [REC_0011] - Tres\n{GOOD_MACROS}"
+    )
+
+BAD_ID_PLAN = _plan("REC_9999")
+ZERO_PLAN = _plan(macros="- Macros: P: 0g | C: 0g | G: 0g | Cal: 0\n")
+
+class FakeStreamingOpenAI:
+    """Streams the queued plans line by line, recording how much of each was read"""
+
+    def __init__(self, plans):
+        self.plans = list(plans)
+        self.prompts = []
+        self.lines_sent = []
+        self.closed_early = []
+        self.cached = []
+
+    async def stream_meal_plan(self, prompt, priority=None):
+        self.prompts.append(prompt)
+        lines = self.plans.pop(0).splitlines(keepends=True)
+        self.lines_sent.append(0)
+        finished = False
+        try:
+            for line in lines:
+                self.lines_sent[-1] += 1
+                yield line
+            finished = True
+        finally:
+            self.closed_early.append(not finished)
+
+    async def cache_response(self, prompt, response, structured=False):
+        self.cached.append(prompt)
+
+def _run(plans):
+    fake = FakeStreamingOpenAI(plans)
+    recipe_manager = RecipeManager()
+    pipeline = MealPlanPipeline(
+        chromadb_service=None,
+        recipe_manager=recipe_manager,
+        prompt_generator=PromptGenerator(),
+        openai_service=fake,
+        meal_plan_processor=MealPlanProcessor(recipe_manager),
+        pdf_generator=None,
+        stage_executor=StageExecutor({"search": 1, "cpu": 1, "pdf": 1})
+    )
+    timings = StageTimings()
+
+    async def collect():
+        return [event async for event in pipeline._generate_validated("PROMPT", VALID_IDS, timings)]
+
+    return fake, asyncio.run(collect()), timings
+
+def test_abort_and_retry_with_reminder():
+    """A bad recipe ID stops the stream at its line; the retry adds the reminder"""
+    fake, events, timings = _run([BAD_ID_PLAN, _plan()])
+    kinds = [event for event, _ in events]
+    print(f"Events: {kinds}")
+
+    assert fake.closed_early == [True, False]
+    assert fake.lines_sent[0] == 3  # DESAYUNO, OPCIÓN 1, the bad recipe line
+    assert fake.prompts == ["PROMPT", "PROMPT" + RECIPE_ID_REMINDER]
+    assert ("retry", {"reason": "unknown_recipe_id", "message": "La receta REC_9999 no existe en el catálogo enviado"}) in events
+    assert kinds[-1] == "plan" and events[-1][1]["text"] == _plan()
+    assert set(timings.as_dict()) == {"llm", "llm_retry_1"}
+    assert fake.cached == ["PROMPT" + RECIPE_ID_REMINDER]
+
+def test_each_reminder_used_once_up_to_max_retries():
+    """Different issues each get their reminder; the last attempt is not aborted"""
+    fake, events, _ = _run([BAD_ID_PLAN, ZERO_PLAN, BAD_ID_PLAN])
+
+    assert len(fake.prompts) == 1 + MAX_CORRECTIVE_RETRIES
+    assert fake.prompts[1] == "PROMPT" + RECIPE_ID_REMINDER
+    assert fake.prompts[2] == "PROMPT" + RECIPE_ID_REMINDER + ZERO_MACROS_REMINDER
+    assert fake.closed_early == [True, True, False]
+    assert [data["reason"] for event, data in events if event == "retry"] == ["unknown_recipe_id", "zero_macros"]
+    # The last plan still has the bad ID: it is returned with a warning, but not cached
+    assert events[-1] == ("plan", {"text": BAD_ID_PLAN})
+    assert fake.cached == []
+
+def test_repeated_issue_is_not_retried_again():
+    """An issue whose reminder was already sent doesn't trigger another generation"""
+    fake, events, _ = _run([BAD_ID_PLAN, BAD_ID_PLAN])
+    assert len(fake.prompts) == 2
+    assert fake.closed_early == [True, False]
+    assert events[-1] == ("plan", {"text": BAD_ID_PLAN})
+
+def main():
+    """Run all tests"""
+    print("Testing Early Abort\n" + "="*50)
+
+    test_abort_and_retry_with_reminder()
+    test_each_reminder_used_once_up_to_max_retries()
+    test_repeated_issue_is_not_retried_again()
+
+    print("\n\n✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
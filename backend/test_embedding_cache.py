@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Test script for the query-embedding cache"""
+
+import sys
+import os
+import tempfile
+from multiprocessing import Pool
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.embedding_cache import CachedEmbeddingFunction
+
+class CountingEmbeddings:
+    """Deterministic stand-in for the OpenAI embedding function"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, input):
+        self.calls.append(list(input))
+        return [[float(len(text)), float(sum(map(ord, text)) % 997), 0.5] for text in input]
+
+def _embed_in_worker(args):
+    disk_dir, texts = args
+    return CachedEmbeddingFunction(CountingEmbeddings(), "test-model", disk_dir=disk_dir)(texts)
+
+def test_only_missing_texts_are_embedded():
+    """Cached texts are served locally and the rest go in a single call"""
+    inner = CountingEmbeddings()
+    embed = CachedEmbeddingFunction(inner, "test-model")
+
+    first = embed(["Recetas para desayuno", "Recetas para cena"])
+    second = embed(["Recetas para cena", "Recetas para almuerzo", "Recetas para desayuno"])
+
+    assert inner.calls == [["Recetas para desayuno", "Recetas para cena"], ["Recetas para almuerzo"]]
+    assert second[0] == first[1] and second[2] == first[0]
+
+    stats = embed.get_stats()
+    print(f"Memory stats: {stats}")
+    assert stats["memory_hits"] == 2
+    assert stats["misses"] == 3
+    assert stats["hit_rate"] == 0.4
+
+def test_key_depends_on_model():
+    assert CachedEmbeddingFunction.make_key("a", "texto") != CachedEmbeddingFunction.make_key("b", "texto")
+
+def test_disk_store_shared_between_processes():
+    """Vectors written by several workers are read back by a new instance"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        batches = [(tmp_dir, [f"consulta {worker} {i}" for i in range(20)]) for worker in range(4)]
+        with Pool(4) as pool:
+            expected = pool.map(_embed_in_worker, batches)
+
+        inner = CountingEmbeddings()
+        embed = CachedEmbeddingFunction(inner, "test-model", disk_dir=tmp_dir)
+        for (_, texts), vectors in zip(batches, expected):
+            assert embed(texts) == vectors
+
+        stats = embed.get_stats()
+        print(f"Disk stats: {stats}")
+        assert inner.calls == []
+        assert stats["disk_hits"] == 80
+        assert stats["disk_entries"] == 80
+
+def test_disk_store_limit():
+    """The disk tier stops growing at its entry limit"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        embed = CachedEmbeddingFunction(CountingEmbeddings(), "test-model", disk_dir=tmp_dir, max_disk_entries=5)
+        embed([f"texto {i}" for i in range(10)])
+        assert embed.get_stats()["disk_entries"] == 5
+
+def main():
+    """Run all tests"""
+    print("Testing Embedding Cache\n" + "="*50)
+
+    test_only_missing_texts_are_embedded()
+    test_key_depends_on_model()
+    test_disk_store_shared_between_processes()
+    test_disk_store_limit()
+
+    print("\n\n✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Test script for the per-stage worker pools"""
+
+import sys
+import os
+import asyncio
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.executor import StageExecutor
+from app.services.tracing import MetricsRegistry, StageTimings, activate, record_llm_usage
+
+def _fail():
+    raise RuntimeError("boom")
+
+def test_stats():
+    """Successful and failed calls are counted once each"""
+    executor = StageExecutor({"cpu": 2, "search": 1})
+
+    async def run():
+        assert await executor.run("cpu", sum, [1, 2, 3]) == 6
+        assert await executor.run("cpu", threading.current_thread) is not threading.current_thread()
+        try:
+            await executor.run("cpu", _fail)
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("The worker exception was not raised")
+
+    asyncio.run(run())
+    stats = executor.get_stats()
+    print(f"Stats: {stats['cpu']}")
+    assert stats["cpu"]["submitted"] == 3
+    assert stats["cpu"]["completed"] == 2
+    assert stats["cpu"]["failed"] == 1
+    assert stats["cpu"]["in_flight"] == 0 and stats["cpu"]["active"] == 0
+    assert stats["cpu"]["workers"] == 2 and stats["cpu"]["mode"] == "thread"
+    assert stats["search"]["submitted"] == 0
+    executor.shutdown()
+
+def test_queue_depth():
+    """Calls beyond the pool size wait in its queue"""
+    executor = StageExecutor({"pdf": 1})
+    release = threading.Event()
+
+    async def run():
+        calls = [asyncio.create_task(executor.run("pdf", release.wait)) for _ in range(3)]
+        await asyncio.sleep(0.1)
+        stats = executor.get_stats()["pdf"]
+        release.set()
+        await asyncio.gather(*calls)
+        return stats
+
+    during = asyncio.run(run())
+    print(f"While blocked: {during}")
+    assert during["in_flight"] == 3 and during["active"] == 1 and during["queue_depth"] == 2
+    assert executor.get_stats()["pdf"]["max_queue_depth"] == 2
+    executor.shutdown()
+
+def test_unknown_stage():
+    """Running on a stage without a pool is an error"""
+    executor = StageExecutor({"cpu": 1})
+    try:
+        asyncio.run(executor.run("gpu", sum, [1]))
+    except ValueError as e:
+        print(f"Rejected: {e}")
+    else:
+        raise AssertionError("Unknown stage accepted")
+    assert executor.get_stats()["cpu"]["submitted"] == 0
+    executor.shutdown()
+
+def test_threads_see_request_context():
+    """Usage recorded in a worker thread is attributed to the calling request"""
+    executor = StageExecutor({"cpu": 1})
+    timings = StageTimings(registry=MetricsRegistry())
+
+    async def run():
+        with activate(timings):
+            await executor.run("cpu", record_llm_usage, "gpt-4-turbo-preview", 100, 50)
+
+    asyncio.run(run())
+    assert timings.tokens == {"prompt": 100, "completion": 50}
+    executor.shutdown()
+
+def test_process_stats_are_read_only():
+    """Process pools report their busy workers without changing the counters"""
+    executor = StageExecutor({"pdf": 2}, process_stages=["pdf"])
+    stats = executor._stats["pdf"]
+    stats.in_flight = 3
+    reported = executor.get_stats()["pdf"]
+    assert reported["active"] == 2 and reported["queue_depth"] == 1
+    assert stats.active == 0 and stats.in_flight == 3
+    stats.in_flight = 0
+    assert executor.get_stats()["pdf"]["active"] == 0
+    executor.shutdown()
+
+def test_shutdown():
+    """After shutdown the pools accept no more work"""
+    executor = StageExecutor({"cpu": 1})
+    executor.shutdown()
+    try:
+        asyncio.run(executor.run("cpu", sum, [1]))
+    except RuntimeError as e:
+        print(f"Rejected after shutdown: {e}")
+    else:
+        raise AssertionError("Work accepted after shutdown")
+
+def main():
+    """Run all tests"""
+    print("Testing Stage Executor\n" + "="*50)
+
+    test_stats()
+    test_queue_depth()
+    test_unknown_stage()
+    test_threads_see_request_context()
+    test_process_stats_are_read_only()
+    test_shutdown()
+
+    print("\n\n✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Test script for the shared HTTP client pools"""
+
+import sys
+import os
+import asyncio
+import json
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+import openai
+import requests
+
+from app.services.chromadb_service import OpenAIEmbeddings
+from app.services.http_clients import HTTPClients, TimeoutHTTPAdapter
+from app.services.openai_service import OpenAIService
+
+def _clients():
+    return HTTPClients(
+        timeouts={"chat": 180, "vision": 120, "embeddings": 30, "chromadb": 10},
+        connect_timeout=3,
+        max_keepalive_connections=7
+    )
+
+def test_clients_are_shared():
+    """Every caller gets the same pooled client until it is closed"""
+    clients = _clients()
+    assert clients.async_client() is clients.async_client()
+    assert clients.sync_client() is clients.sync_client()
+    assert clients.timeout("vision").read == 120 and clients.timeout("vision").connect == 3
+
+    service = OpenAIService(http_clients=clients)
+    assert service.client._client is clients.async_client()
+    assert service._request_options("vision")["timeout"].read == 120
+
+    old = clients.async_client()
+    asyncio.run(clients.aclose())
+    assert old.is_closed
+    assert clients.async_client() is not old
+
+    try:
+        HTTPClients(timeouts={"chat": 1, "ftp": 1})
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Unknown call type accepted")
+
+def test_chromadb_session():
+    """The ChromaDB requests session gets a sized pool and a default timeout"""
+    clients = _clients()
+    session = requests.Session()
+    clients.configure_session(session)
+    adapter = session.get_adapter("http://chromadb:8000/api/v1")
+    assert isinstance(adapter, TimeoutHTTPAdapter)
+    assert adapter.timeout == (3, 10) and adapter._pool_maxsize == 7
+
+def test_embeddings_on_shared_client():
+    """Embeddings are requested on the given client and returned in input order"""
+    requests_seen = []
+
+    def handler(request):
+        body = json.loads(request.content)
+        requests_seen.append(body)
+        data = [
+            {"object": "embedding", "index": i, "embedding": [float(len(text))]}
+            for i, text in reversed(list(enumerate(body["input"])))
+        ]
+        return httpx.Response(200, json={
+            "object": "list", "data": data, "model": body["model"],
+            "usage": {"prompt_tokens": 1, "total_tokens": 1}
+        })
+
+    http_client = httpx.Client(transport=httpx.MockTransport(handler))
+    embeddings = OpenAIEmbeddings(openai.OpenAI(api_key="x", http_client=http_client, max_retries=0))
+    assert embeddings(["a", "bb\nc"]) == [[1.0], [4.0]]
+    assert requests_seen[0]["input"] == ["a", "bb c"]
+
+def main():
+    """Run all tests"""
+    print("Testing HTTP Clients\n" + "="*50)
+
+    test_clients_are_shared()
+    test_chromadb_session()
+    test_embeddings_on_shared_client()
+
+    print("\n\n✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""Test script for generation jobs: stores, JobManager and the /api/jobs endpoints"""
+
+import sys
+import os
+import asyncio
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+from app.schemas.jobs import JobRecord, JobStatus, JobType
+from app.schemas.meal_plan import MealPlanResponse, MealReplacementRequest
+from app.services.job_manager import JobManager, JobQueueFullError
+from app.services.job_store import InMemoryJobStore, JobStore, SQLiteJobStore
+
+REPLACEMENT = {
+    "paciente": "Ana Test",
+    "comida_reemplazar": "almuerzo",
+    "nueva_comida": "algo con pollo",
+    "comida_actual": "Milanesa con puré",
+    "proteinas": 30,
+    "carbohidratos": 40,
+    "grasas": 15,
+    "calorias": 415
+}
+
+class FakePipeline:
+    """Answers Motor 3 jobs, failing or waiting as the request asks"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.release.set()
+
+    async def replace_meal(self, request, timings=None):
+        while not self.release.is_set():
+            await asyncio.sleep(0.01)
+        if request.condiciones == "fallar":
+            raise ValueError("Sin recetas para reemplazar")
+        with timings.measure("llm"):
+            pass
+        return MealPlanResponse(meal_plan=f"Reemplazo para {request.paciente}", pdf_path="plan.pdf")
+
+async def _wait_finished(manager, job_id):
+    for _ in range(200):
+        job = await manager.get(job_id)
+        if job.status in (JobStatus.completed, JobStatus.failed):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+def test_store_interface():
+    """JobStore is abstract; both stores keep, list and purge jobs alike"""
+    try:
+        JobStore()
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("JobStore can be instantiated")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for store in (InMemoryJobStore(), SQLiteJobStore(os.path.join(directory, "jobs.sqlite3"))):
+            now = time.time()
+            store.save(JobRecord(job_id="a", job_type=JobType.control, created_at=now))
+            store.save(JobRecord(job_id="b", job_type=JobType.control, created_at=now,
+                                 status=JobStatus.completed, finished_at=now - 100))
+            store.save(JobRecord(job_id="c", job_type=JobType.control, created_at=now,
+                                 status=JobStatus.failed, finished_at=now))
+            assert store.get("b").status == JobStatus.completed and store.get("z") is None
+            assert [job.job_id for job in store.list_unfinished()] == ["a"]
+            # Unfinished jobs of a running process are not interrupted
+            assert store.list_interrupted() == []
+            assert store.purge_finished(now - 50) == 1
+            assert store.get("b") is None and store.get("c") is not None
+            print(f"{type(store).__name__}: ok")
+
+def test_submit_poll_and_failure():
+    """Jobs run in the background; failures are recorded with their error"""
+    async def run():
+        manager = JobManager(InMemoryJobStore(), FakePipeline(), workers=2)
+        await manager.start()
+        ok = await manager.submit(JobType.replace_meal, MealReplacementRequest(**REPLACEMENT))
+        bad = await manager.submit(JobType.replace_meal, MealReplacementRequest(**REPLACEMENT, condiciones="fallar"))
+        assert ok.status == JobStatus.pending
+        ok, bad = await _wait_finished(manager, ok.job_id), await _wait_finished(manager, bad.job_id)
+        stats = manager.get_stats()
+        await manager.stop()
+        return ok, bad, stats
+
+    ok, bad, stats = asyncio.run(run())
+    print(f"Stats: {stats}")
+    assert ok.status == JobStatus.completed and ok.result.meal_plan == "Reemplazo para Ana Test"
+    assert "llm" in ok.stage_timings and ok.started_at and ok.finished_at
+    assert bad.status == JobStatus.failed and bad.error == "Sin recetas para reemplazar"
+    assert stats["completed"] == 1 and stats["failed"] == 1 and stats["running"] == 0
+
+def test_ttl_expiry():
+    """Finished jobs older than the TTL are purged on the next submit"""
+    async def run():
+        manager = JobManager(InMemoryJobStore(), FakePipeline(), ttl_seconds=0)
+        await manager.start()
+        first = await manager.submit(JobType.replace_meal, MealReplacementRequest(**REPLACEMENT))
+        await _wait_finished(manager, first.job_id)
+        await asyncio.sleep(0.01)
+        await manager.submit(JobType.replace_meal, MealReplacementRequest(**REPLACEMENT))
+        expired = await manager.get(first.job_id)
+        await manager.stop()
+        return expired
+
+    assert asyncio.run(run()) is None
+
+def test_queue_full():
+    """Submitting beyond the queue size is refused"""
+    async def run():
+        pipeline = FakePipeline()
+        pipeline.release.clear()
+        manager = JobManager(InMemoryJobStore(), pipeline, workers=1, queue_size=1)
+        await manager.start()
+        request = MealReplacementRequest(**REPLACEMENT)
+        await manager.submit(JobType.replace_meal, request)
+        await asyncio.sleep(0.05)  # the worker takes the first job
+        await manager.submit(JobType.replace_meal, request)
+        try:
+            await manager.submit(JobType.replace_meal, request)
+        except JobQueueFullError as e:
+            print(f"Rejected: {e}")
+        else:
+            raise AssertionError("Queue accepted more jobs than its size")
+        finally:
+            pipeline.release.set()
+            await manager.stop()
+
+    asyncio.run(run())
+
+def test_restart_fails_interrupted_jobs():
+    """Jobs left pending or running by a stopped process are marked failed; a live one's are kept"""
+    stopped = subprocess.Popen([sys.executable, "-c", "pass"])
+    stopped.wait()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "jobs.sqlite3")
+        store = SQLiteJobStore(path)
+        store.save(JobRecord(job_id="old", job_type=JobType.control, created_at=time.time()))
+        store.save(JobRecord(job_id="busy", job_type=JobType.control, created_at=time.time(),
+                             status=JobStatus.running))
+        store.save(JobRecord(job_id="other", job_type=JobType.control, created_at=time.time(),
+                             status=JobStatus.running))
+        store.close()
+        with sqlite3.connect(path) as conn:
+            conn.execute("UPDATE jobs SET owner_pid = ? WHERE job_id IN ('old', 'busy')", (stopped.pid,))
+            conn.execute("UPDATE jobs SET owner_pid = ? WHERE job_id = 'other'", (os.getppid(),))
+
+        async def run():
+            manager = JobManager(SQLiteJobStore(path), FakePipeline())
+            await manager.start()
+            jobs = [await manager.get(job_id) for job_id in ("old", "busy", "other")]
+            await manager.stop()
+            manager.store.close()
+            return jobs
+
+        *interrupted, other = asyncio.run(run())
+        for job in interrupted:
+            assert job.status == JobStatus.failed and job.finished_at and job.error
+        print(f"Interrupted: {job.error}")
+        assert other.status == JobStatus.running
+
+def test_store_calls_leave_the_loop_free():
+    """A store waiting on its lock doesn't stall the event loop"""
+    class SlowStore(InMemoryJobStore):
+        def save(self, job):
+            time.sleep(0.1)
+            super().save(job)
+
+    async def run():
+        manager = JobManager(SlowStore(), FakePipeline(), workers=1)
+        await manager.start()
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        job = await manager.submit(JobType.replace_meal, MealReplacementRequest(**REPLACEMENT))
+        await _wait_finished(manager, job.job_id)
+        ticker.cancel()
+        await manager.stop()
+        return ticks
+
+    ticks = asyncio.run(run())
+    assert ticks >= 20, ticks
+
+def test_job_endpoints():
+    """Submit returns 202 and a status URL; polling, 404 and a full queue (503)"""
+    from app import main
+
+    pipeline = FakePipeline()
+    manager = main.job_manager
+    original = (manager.pipeline, manager.workers, manager.queue_size, main.app.router.on_shutdown)
+    manager.pipeline, manager.workers, manager.queue_size = pipeline, 1, 1
+    # Only stop the workers on exit: the shared pools and HTTP clients stay open for other tests
+    main.app.router.on_shutdown = [manager.stop]
+    try:
+        with TestClient(main.app) as client:
+            response = client.post("/api/jobs/replace-meal", json=REPLACEMENT)
+            assert response.status_code == 202, response.text
+            created = response.json()
+            assert created["status"] == "pending" and created["status_url"] == f"/api/jobs/{created['job_id']}"
+
+            for _ in range(200):
+                job = client.get(created["status_url"]).json()
+                if job["status"] == "completed":
+                    break
+                time.sleep(0.01)
+            assert job["result"]["meal_plan"] == "Reemplazo para Ana Test"
+            assert client.get("/api/jobs/no-existe").status_code == 404
+
+            pipeline.release.clear()
+            client.post("/api/jobs/replace-meal", json=REPLACEMENT)
+            time.sleep(0.05)
+            client.post("/api/jobs/replace-meal", json=REPLACEMENT)
+            response = client.post("/api/jobs/replace-meal", json=REPLACEMENT)
+            assert response.status_code == 503, response.text
+            pipeline.release.set()
+    finally:
+        manager.pipeline, manager.workers, manager.queue_size, main.app.router.on_shutdown = original
+
+def main():
+    """Run all tests"""
+    print("Testing Generation Jobs\n" + "="*50)
+
+    test_store_interface()
+    test_submit_poll_and_failure()
+    test_ttl_expiry()
+    test_queue_full()
+    test_restart_fails_interrupted_jobs()
+    test_store_calls_leave_the_loop_free()
+    test_job_endpoints()
+
+    print("\n\n✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
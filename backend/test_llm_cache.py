@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""Test script for the LLM response cache"""
+
+import sys
+import os
+import asyncio
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.executor import StageExecutor
+from app.services.llm_cache import LLMResponseCache
+from app.services.meal_plan_pipeline import MealPlanPipeline, RECIPE_ID_REMINDER
+from app.services.meal_plan_processor import MealPlanProcessor
+from app.services.openai_service import OpenAIService, MEAL_PLAN_SYSTEM_MESSAGE
+from app.services.prompt_generator import PromptGenerator
+from app.services.recipe_manager import RecipeManager
+from app.services.tracing import StageTimings
+
+def test_key_depends_on_all_parameters():
+    """Changing model, system message, prompt or temperature changes the key"""
+    base = LLMResponseCache.make_key("gpt-4", "sys", "prompt", 0.7)
+    assert base == LLMResponseCache.make_key("gpt-4", "sys", "prompt", 0.7)
+    assert base != LLMResponseCache.make_key("gpt-3.5", "sys", "prompt", 0.7)
+    assert base != LLMResponseCache.make_key("gpt-4", "otro", "prompt", 0.7)
+    assert base != LLMResponseCache.make_key("gpt-4", "sys", "prompt 2", 0.7)
+    assert base != LLMResponseCache.make_key("gpt-4", "sys", "prompt", 0.2)
+
+def test_memory_lru_eviction():
+    """The least recently used entry is evicted first"""
+    cache = LLMResponseCache(max_entries=2)
+    cache.set("a", "plan a")
+    cache.set("b", "plan b")
+    assert cache.get("a") == "plan a"
+    cache.set("c", "plan c")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "plan a"
+    assert cache.get("c") == "plan c"
+
+    stats = cache.get_stats()
+    print(f"Memory stats: {stats}")
+    assert stats["memory_hits"] == 3
+    assert stats["misses"] == 1
+    assert stats["evictions"] == 1
+
+def test_disk_tier_survives_new_instance():
+    """A second cache on the same directory serves entries from disk"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        LLMResponseCache(disk_dir=tmp_dir).set("key", "plan del disco")
+
+        cache = LLMResponseCache(disk_dir=tmp_dir)
+        assert cache.get("key") == "plan del disco"
+        assert cache.get("key") == "plan del disco"
+
+        stats = cache.get_stats()
+        assert stats["disk_hits"] == 1
+        assert stats["memory_hits"] == 1
+
+def test_ttl_expiry():
+    """Expired entries are treated as misses in both tiers"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = LLMResponseCache(ttl_seconds=1, disk_dir=tmp_dir)
+        cache.set("key", "plan")
+        time.sleep(1.1)
+
+        assert cache.get("key") is None
+        assert cache.get_stats()["expired"] >= 1
+
+def test_disk_size_eviction():
+    """The disk tier stays under its byte budget"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = LLMResponseCache(max_entries=1, disk_dir=tmp_dir, max_disk_bytes=3000)
+        for i in range(10):
+            cache.set(f"key{i}", "x" * 500)
+
+        stats = cache.get_stats()
+        print(f"Disk stats: {stats}")
+        assert stats["disk_bytes"] <= 3000
+        assert cache.get("key9") == "x" * 500
+
+class ThreadRecordingCache(LLMResponseCache):
+    """Records the thread of each disk access"""
+
+    def __init__(self, **kwargs):
+        self.disk_threads = []
+        super().__init__(**kwargs)
+
+    def _read_disk(self, key):
+        self.disk_threads.append(threading.get_ident())
+        return super()._read_disk(key)
+
+    def _write_disk(self, key, created_at, value):
+        self.disk_threads.append(threading.get_ident())
+        super()._write_disk(key, created_at, value)
+
+def test_async_access_keeps_disk_off_the_loop():
+    """aget/aset serve the same entries, reading and writing disk in worker threads"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = ThreadRecordingCache(disk_dir=tmp_dir)
+
+        async def run():
+            await cache.aset("key", "plan")
+            fresh = ThreadRecordingCache(disk_dir=tmp_dir)
+            value = await fresh.aget("key")
+            missing = await fresh.aget("otra")
+            return fresh, value, missing
+
+        fresh, value, missing = asyncio.run(run())
+        assert value == "plan" and missing is None
+        loop_thread = threading.get_ident()
+        assert cache.disk_threads and loop_thread not in cache.disk_threads + fresh.disk_threads
+        assert fresh.get_stats()["disk_hits"] == 1 and fresh.get_stats()["misses"] == 1
+
+class ScriptedOpenAI(OpenAIService):
+    """OpenAIService whose completions come from a list instead of the API"""
+
+    def __init__(self, answers):
+        super().__init__()
+        self.response_cache = LLMResponseCache()
+        self.answers = list(answers)
+        self.completions = []
+
+    async def _create_completion(self, priority, model, estimated_tokens, error_prefix="", **kwargs):
+        self.completions.append(kwargs["messages"][-1]["content"])
+        message = SimpleNamespace(content=self.answers.pop(0))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=None)
+
+def test_rejected_plans_are_not_cached():
+    """Only the plan the pipeline accepts is cached, under the prompt that produced it"""
+    valid_ids = ["REC_0001", "REC_0003", "REC_0011"]
+    invalid, valid = "Usar [REC_9999]", "[REC_0001] [REC_0003] [REC_0011]"
+    openai_service = ScriptedOpenAI([invalid, valid, invalid])
+    recipe_manager = RecipeManager()
+    pipeline = MealPlanPipeline(
+        chromadb_service=None,
+        recipe_manager=recipe_manager,
+        prompt_generator=PromptGenerator(),
+        openai_service=openai_service,
+        meal_plan_processor=MealPlanProcessor(recipe_manager),
+        pdf_generator=None,
+        stage_executor=StageExecutor({"search": 1, "cpu": 1, "pdf": 1}),
+        early_abort=False
+    )
+
+    async def run():
+        first = await pipeline._generate_new_patient_text("PROMPT", valid_ids, StageTimings())
+        second = await pipeline._generate_new_patient_text("PROMPT", valid_ids, StageTimings())
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second == valid
+    cache = openai_service.response_cache
+    key = lambda prompt: LLMResponseCache.make_key(
+        openai_service.model, MEAL_PLAN_SYSTEM_MESSAGE, prompt, openai_service.temperature
+    )
+    assert cache.get(key("PROMPT")) is None
+    assert cache.get(key("PROMPT" + RECIPE_ID_REMINDER)) == valid
+    # The rejected first answer is generated again; the corrected one is replayed
+    print(f"Completions: {len(openai_service.completions)}")
+    assert len(openai_service.completions) == 3
+
+def main():
+    """Run all tests"""
+    print("Testing LLM Response Cache\n" + "="*50)
+
+    test_key_depends_on_all_parameters()
+    test_memory_lru_eviction()
+    test_disk_tier_survives_new_instance()
+    test_ttl_expiry()
+    test_disk_size_eviction()
+    test_async_access_keeps_disk_off_the_loop()
+    test_rejected_plans_are_not_cached()
+
+    print("\n\n✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
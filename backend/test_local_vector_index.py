@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Test script for the in-process recipe vector index"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.local_vector_index import LocalCollection, save_local_index
+
+IDS = ["REC_A", "REC_B", "REC_C", "REC_D"]
+EMBEDDINGS = [[1, 0, 0], [0.9, 0.1, 0], [0, 1, 0], [0, 0, 1]]
+METADATAS = [
+    {"recipe_id": "REC_A", "tipo_comida": "desayuno,merienda", "calorias": 300},
+    {"recipe_id": "REC_B", "tipo_comida": "almuerzo,cena", "calorias": 600},
+    {"recipe_id": "REC_C", "tipo_comida": "cena", "calorias": 450},
+    {"recipe_id": "REC_D", "tipo_comida": "desayuno", "calorias": 250},
+]
+
+def _collection(tmp_dir):
+    save_local_index(tmp_dir, IDS, [f"doc {i}" for i in IDS], METADATAS, EMBEDDINGS, "test-model")
+    return LocalCollection(tmp_dir, embedding_function=lambda texts: [[1, -0.2, 0] for _ in texts])
+
+def test_cosine_top_k():
+    """Results come back closest first, one list per query"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        collection = _collection(tmp_dir)
+        results = collection.query(query_embeddings=[[2, 0, 0], [0, 0.3, 1]], n_results=2)
+        print(f"Results: {results['ids']} {results['distances']}")
+
+        assert results["ids"] == [["REC_A", "REC_B"], ["REC_D", "REC_C"]]
+        assert abs(results["distances"][0][0]) < 1e-6
+        assert collection.query(query_texts="desayuno", n_results=10)["ids"][0][0] == "REC_A"
+
+def test_where_filters():
+    """Metadata filters restrict the candidates before ranking"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        collection = _collection(tmp_dir)
+        query = [[1, 0, 0]]
+
+        cena = collection.query(query_embeddings=query, n_results=5, where={"tipo_comida": {"$contains": "cena"}})
+        assert cena["ids"] == [["REC_B", "REC_C"]]
+
+        light = collection.query(
+            query_embeddings=query,
+            n_results=5,
+            where={"$and": [{"tipo_comida": {"$contains": "desayuno"}}, {"calorias": {"$lt": 280}}]},
+            include=["metadatas"]
+        )
+        assert light["ids"] == [["REC_D"]]
+        assert light["documents"] is None
+
+def test_rejects_other_model():
+    """An index built with another embedding model is not used for queries"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        _collection(tmp_dir)
+        try:
+            LocalCollection(tmp_dir, model_name="text-embedding-ada-002")
+            assert False, "expected ValueError"
+        except ValueError as e:
+            print(f"Rejected: {e}")
+
+def main():
+    """Run all tests"""
+    print("Testing Local Vector Index\n" + "="*50)
+
+    test_cosine_top_k()
+    test_where_filters()
+    test_rejects_other_model()
+
+    print("\n\n✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
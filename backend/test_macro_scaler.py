@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Test script for the local macro-scaling engine"""
+
+import sys
+import os
+import re
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.recipe_manager import RecipeManager
+from app.services.macro_scaler import MacroScaler
+from app.services.prompt_generator import PromptGenerator
+from app.schemas.meal_plan import NewPatientRequest
+
+SAMPLE_PLAN = """DESAYUNO
+OPCIÓN 1:
+- Receta: [REC_0001] - Pancakes de banana, avena y miel
+- Ingredientes con cantidades ajustadas:
+  * banana: 1 unidad
+  * avena: 30gr
+- Forma de preparación: Cocinar en sartén
+- Macros: P: 0g | C: 0g | G: 0g | Cal: 0
+
+OPCIÓN 2:
+- Receta: Sin ID
+- Macros: P: 10g | C: 10g | G: 10g | Cal: 170
+
+RESUMEN NUTRICIONAL
+- Total: 2000 kcal"""
+
+def test_scale_quantity():
+    """Weights round to whole grams, units to halves, free text stays"""
+    assert MacroScaler.scale_quantity("30gr", 1.5) == "45gr"
+    assert MacroScaler.scale_quantity("100ml", 0.6) == "60ml"
+    assert MacroScaler.scale_quantity("1 unidad", 1.5) == "1.5 unidades"
+    assert MacroScaler.scale_quantity("2 unidades", 0.5) == "1 unidad"
+    assert MacroScaler.scale_quantity("1/2 unidad", 2) == "1 unidad"
+    assert MacroScaler.scale_quantity("a gusto", 2) == "a gusto"
+
+def test_scale_recipe():
+    """Macros scale by calorie target and the factor is clamped"""
+    scaler = MacroScaler(RecipeManager())
+    recipe = scaler.recipe_manager.get_recipe_by_id("REC_0001")
+    scaled = scaler.scale_recipe("REC_0001", recipe['calorias_aprox'] * 1.5)
+    print(f"Scaled: {scaled}")
+    assert scaled.factor == 1.5
+    assert scaled.calories == round(recipe['calorias_aprox'] * 1.5)
+    assert scaled.protein == round(recipe['proteinas_aprox'] * 1.5)
+
+    assert scaler.scale_recipe("REC_0001", 100000).factor == 3.0
+    assert scaler.scale_recipe("REC_9999", 500) is None
+
+def test_rewrite_plan():
+    """Zero macros are replaced and options without an ID are untouched"""
+    scaler = MacroScaler(RecipeManager())
+    recipe = scaler.recipe_manager.get_recipe_by_id("REC_0001")
+    target = recipe['calorias_aprox'] * 2
+    rewritten = scaler.rewrite_plan(SAMPLE_PLAN, {"desayuno": target})
+    print(rewritten)
+
+    assert "Macros: P: 0g" not in rewritten
+    assert f"Cal: {round(target)}" in rewritten
+    assert "Macros: P: 10g | C: 10g | G: 10g | Cal: 170" in rewritten
+    for ingredient in recipe['ingredientes']:
+        assert f"  * {ingredient['item']}: " in rewritten
+    assert rewritten.endswith("- Total: 2000 kcal")
+
+def test_option_headers_only():
+    """Lines that merely start with "Opciones" stay inside the option they belong to"""
+    scaler = MacroScaler(RecipeManager())
+    plan = SAMPLE_PLAN.replace(
+        "- Forma de preparación: Cocinar en sartén",
+        "Opciones de cocción: sartén u horno\n- Forma de preparación: Cocinar en sartén"
+    )
+    rewritten = scaler.rewrite_plan(plan, {"desayuno": 600})
+    assert "Opciones de cocción: sartén u horno" in rewritten
+    assert "Macros: P: 0g" not in rewritten and "Cal: 600" in rewritten
+
+def test_snacks_keep_their_own_targets():
+    """Mid-morning and evening colaciones are scaled to their own calorie targets"""
+    scaler = MacroScaler(RecipeManager())
+    calories = scaler.recipe_manager.get_recipe_by_id("REC_0001")['calorias_aprox']
+    option = "OPCIÓN 1:\n- Receta: [REC_0001] - Pancakes\n- Macros: P: 0g | C: 0g | G: 0g | Cal: 0\n"
+    plan = f"COLACIÓN (media mañana)\n{option}\nCOLACIÓN NOCTURNA\n{option}\nMEDIA TARDE\n{option}"
+    rewritten = scaler.rewrite_plan(plan, {"mid_morning": calories * 0.8, "evening_snack": calories * 1.6})
+
+    stated = [int(value) for value in re.findall(r"Cal: (\d+)", rewritten)]
+    assert stated == [round(calories * 0.8), round(calories * 1.6), round(calories * 1.6)], stated
+    # A snack without its own target uses the colación one
+    assert MacroScaler._meal_key("COLACIÓN (media tarde)") == "media_tarde"
+    assert MacroScaler._meal_key("Colación") == "colacion"
+
+def test_prompt_follows_scaling_setting():
+    """With scaling on, Motor 1 only picks recipes; the output format stays parseable"""
+    patient = NewPatientRequest(
+        nombre="Ana Test", edad=35, sexo="femenino", estatura=165, peso=68, objetivo="mantener",
+        tipo_actividad="caminata", frecuencia_semanal=3, duracion_sesion=45
+    )
+    catalog = "[REC_0001] Pancakes de banana, avena y miel"
+    adjusted = PromptGenerator().generate_motor1_prompt(patient, catalog)
+    scaled = PromptGenerator(macro_scaling=True).generate_motor1_prompt(patient, catalog)
+
+    assert "Factor de ajuste" in adjusted and "AJUSTÁ las cantidades" in adjusted
+    assert "Factor de ajuste" not in scaled and "AJUSTÁ las cantidades" not in scaled
+    assert "NO calcules factores de ajuste" in scaled
+    for line in ("- Receta: [REC_XXXX]", "- Ingredientes con cantidades ajustadas:", "- Macros: P: XXg | C: XXg"):
+        assert line in scaled
+
+def main():
+    """Run all tests"""
+    print("Testing Macro Scaler\n" + "="*50)
+
+    test_scale_quantity()
+    test_scale_recipe()
+    test_rewrite_plan()
+    test_option_headers_only()
+    test_snacks_keep_their_own_targets()
+    test_prompt_follows_scaling_setting()
+
+    print("\n\n✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""Test script for the OpenAI request scheduler and its shared rate-limit ledger"""
+
+import sys
+import os
+import asyncio
+import tempfile
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from types import SimpleNamespace
+
+import httpx
+import openai
+
+from app.services.openai_scheduler import (
+    OpenAIScheduler, Priority, RateLimitLedger, backoff_delay, parse_duration, retry_after_seconds
+)
+from app.services.openai_service import OpenAIService
+
+class FakeStream:
+    """Streamed chat completion: one delta per text"""
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.closed = False
+
+    async def __aiter__(self):
+        for text in self.texts:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+    async def close(self):
+        self.closed = True
+
+class FakeCompletions:
+    """Stands in for client.chat.completions.with_raw_response"""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return SimpleNamespace(headers={}, parse=lambda: outcome)
+
+def _service(outcomes, tpm_limit=60000):
+    service = OpenAIService(scheduler=OpenAIScheduler(RateLimitLedger(rpm_limit=1000, tpm_limit=tpm_limit)))
+    service.response_cache = None
+    completions = FakeCompletions(outcomes)
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(with_raw_response=completions)))
+    return service, completions
+
+def test_header_parsing():
+    """Reset durations and retry-after values from OpenAI headers"""
+    assert parse_duration("1s") == 1.0
+    assert parse_duration("6m0s") == 360.0
+    assert abs(parse_duration("20ms") - 0.02) < 1e-9
+    assert parse_duration("1h2m3.5s") == 3723.5
+    assert parse_duration("2") == 2.0
+    assert parse_duration("") is None and parse_duration("soon") is None
+
+    assert retry_after_seconds({"retry-after": "3"}) == 3.0
+    assert retry_after_seconds({"x-ratelimit-reset-requests": "1s", "x-ratelimit-reset-tokens": "6m0s"}) == 360.0
+    assert retry_after_seconds({}) is None
+
+    for attempt in range(6):
+        delay = backoff_delay(attempt, cap=8.0)
+        assert min(8.0, 2 ** attempt) / 2 <= delay <= min(8.0, 2 ** attempt)
+    assert 5.0 <= backoff_delay(0, retry_after=5.0) <= 6.0
+
+def test_ledger_budget():
+    """Reservations draw from the token bucket and the API headers tighten it"""
+    ledger = RateLimitLedger(rpm_limit=60, tpm_limit=1000)
+    assert ledger.reserve("gpt", 800) == 0
+    wait = ledger.reserve("gpt", 800)
+    # 600 more tokens at 1000/min
+    assert 30 <= wait <= 37, wait
+
+    ledger.refund("gpt", 700)
+    assert ledger.reserve("gpt", 800) == 0
+
+    ledger.observe("gpt", {
+        "x-ratelimit-limit-requests": "120",
+        "x-ratelimit-limit-tokens": "90000",
+        "x-ratelimit-remaining-requests": "0",
+        "x-ratelimit-remaining-tokens": "50"
+    })
+    budget = ledger.snapshot()["gpt"]
+    assert budget["rpm_limit"] == 120 and budget["tpm_limit"] == 90000
+    assert ledger.reserve("gpt", 10) > 0
+
+    ledger.block("other", 30)
+    assert ledger.reserve("other", 1) > 29
+
+def test_ledger_shared_between_workers():
+    """Two ledgers on the same file share one budget"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "openai.db")
+        first = RateLimitLedger(path, rpm_limit=2, tpm_limit=100000)
+        second = RateLimitLedger(path, rpm_limit=2, tpm_limit=100000)
+        assert first.reserve("gpt", 10) == 0
+        assert second.reserve("gpt", 10) == 0
+        assert first.reserve("gpt", 10) > 0
+        first.close()
+        second.close()
+
+def test_priority_order():
+    """Queued requests go out by priority, then in arrival order"""
+    async def run():
+        scheduler = OpenAIScheduler(RateLimitLedger(rpm_limit=1000, tpm_limit=10 ** 6), max_concurrency=1)
+        order = []
+
+        async def request(name, priority):
+            async with scheduler.slot(priority, "gpt", 100):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        # The first request takes the only slot; the rest queue behind it
+        first = asyncio.create_task(request("first", Priority.CONTROL))
+        while not order:
+            await asyncio.sleep(0.001)
+        tasks = [
+            asyncio.create_task(request("control", Priority.CONTROL)),
+            asyncio.create_task(request("new_patient", Priority.NEW_PATIENT)),
+            asyncio.create_task(request("replacement_1", Priority.REPLACEMENT)),
+            asyncio.create_task(request("replacement_2", Priority.REPLACEMENT)),
+        ]
+        await asyncio.sleep(0)
+        stats = await scheduler.get_stats()
+        assert stats["queued"] == 4 and stats["queued_by_priority"]["replacement"] == 2
+
+        await asyncio.gather(first, *tasks)
+        stats = await scheduler.get_stats()
+        print(f"Scheduler stats: {stats}")
+        assert stats["requests"] == 5 and stats["active"] == 0 and stats["queued"] == 0
+        return order
+
+    order = asyncio.run(run())
+    assert order == ["first", "replacement_1", "replacement_2", "new_patient", "control"], order
+
+def test_cancelled_request_leaves_queue():
+    """A request cancelled while queued does not block the ones behind it"""
+    async def run():
+        scheduler = OpenAIScheduler(RateLimitLedger(rpm_limit=1000, tpm_limit=10 ** 6), max_concurrency=1)
+        await scheduler.acquire(Priority.NEW_PATIENT, "gpt", 100)
+        queued = asyncio.create_task(scheduler.acquire(Priority.REPLACEMENT, "gpt", 100))
+        waiting = asyncio.create_task(scheduler.acquire(Priority.CONTROL, "gpt", 100))
+        await asyncio.sleep(0)
+        queued.cancel()
+        await scheduler.release()
+        await asyncio.wait_for(waiting, timeout=1)
+        stats = await scheduler.get_stats()
+        assert stats["queued"] == 0 and stats["active"] == 1
+
+    asyncio.run(run())
+
+def test_reservation_runs_off_the_event_loop():
+    """A ledger blocked on another worker's lock doesn't stall the event loop"""
+    class SlowLedger(RateLimitLedger):
+        def reserve(self, model, tokens):
+            time.sleep(0.2)
+            return super().reserve(model, tokens)
+
+    async def run():
+        scheduler = OpenAIScheduler(SlowLedger(rpm_limit=1000, tpm_limit=10 ** 6))
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        async with scheduler.slot(Priority.NEW_PATIENT, "gpt", 100):
+            pass
+        ticker.cancel()
+        return ticks
+
+    ticks = asyncio.run(run())
+    assert ticks >= 5, ticks
+
+def test_reservation_releases_the_queue():
+    """A ledger blocked on another worker doesn't hold up releases or new requests"""
+    class BlockingLedger(RateLimitLedger):
+        gate = threading.Event()
+        blocking = False
+
+        def reserve(self, model, tokens):
+            if self.blocking:
+                self.gate.wait(2)
+            return super().reserve(model, tokens)
+
+    async def run():
+        ledger = BlockingLedger(rpm_limit=1000, tpm_limit=10 ** 6)
+        scheduler = OpenAIScheduler(ledger, max_concurrency=2)
+        await scheduler.acquire(Priority.NEW_PATIENT, "gpt", 100)
+        ledger.blocking = True
+        acquired = []
+
+        async def request(name, priority):
+            await scheduler.acquire(priority, "gpt", 100)
+            acquired.append(name)
+
+        blocked = asyncio.create_task(request("control", Priority.CONTROL))
+        await asyncio.sleep(0.05)
+        await asyncio.wait_for(scheduler.release(), timeout=0.1)
+        urgent = asyncio.create_task(request("replacement", Priority.REPLACEMENT))
+        await asyncio.sleep(0.01)
+        assert (await scheduler.get_stats())["queued"] == 2
+
+        ledger.gate.set()
+        await asyncio.wait_for(asyncio.gather(blocked, urgent), timeout=1)
+        stats = await scheduler.get_stats()
+        assert stats["active"] == 2 and stats["queued"] == 0
+        return acquired
+
+    # The request that arrived during the reservation had priority; the first keeps its budget and waits
+    assert asyncio.run(run()) == ["replacement", "control"]
+
+def test_aborted_stream_refunds_unused_budget():
+    """A stream closed early gives back the completion tokens it never used"""
+    stream = FakeStream(["DESAYUNO\n", "Opción 1: ..."] * 50)
+    service, _ = _service([stream])
+
+    async def run():
+        plan = service.stream_meal_plan("PROMPT")
+        async for _ in plan:
+            break
+        await plan.aclose()
+        return (await service.scheduler.get_stats())["budgets"][service.model]["tokens_available"]
+
+    available = asyncio.run(run())
+    assert stream.closed
+    # Without the refund the whole max_tokens completion (3000) would stay reserved
+    assert available > 60000 - 1000, available
+
+def _status_error(error_class, status_code):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    return error_class("error", response=httpx.Response(status_code, request=request), body=None)
+
+def test_only_transient_errors_are_retried():
+    """Client errors fail at once; server errors are retried"""
+    for error_class, status_code in (
+        (openai.BadRequestError, 400),
+        (openai.AuthenticationError, 401),
+        (openai.NotFoundError, 404),
+    ):
+        service, completions = _service([_status_error(error_class, status_code), FakeStream(["plan"])])
+        try:
+            asyncio.run(service.generate_meal_plan("PROMPT"))
+            assert False, "expected an exception"
+        except Exception as e:
+            print(f"{status_code}: {e}")
+        assert completions.calls == 1, error_class
+
+    stream = FakeStream(["DESAYUNO"])
+    service, completions = _service([_status_error(openai.InternalServerError, 500), stream])
+
+    async def consume():
+        return "".join([text async for text in service.stream_meal_plan("PROMPT")])
+    assert asyncio.run(consume()) == "DESAYUNO" and completions.calls == 2
+
+def main():
+    """Run all tests"""
+    print("Testing OpenAI Scheduler\n" + "="*50)
+
+    test_header_parsing()
+    test_ledger_budget()
+    test_ledger_shared_between_workers()
+    test_priority_order()
+    test_cancelled_request_leaves_queue()
+    test_reservation_runs_off_the_event_loop()
+    test_reservation_releases_the_queue()
+    test_aborted_stream_refunds_unused_budget()
+    test_only_transient_errors_are_retried()
+
+    print("\n\n✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
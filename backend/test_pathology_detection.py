@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Test script for detecting pathologies in the patient's free text"""
+
+import sys
+import os
+import random
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.data.pathologies import (
+    PATHOLOGY_KEYWORDS,
+    PathologyType as P,
+    KeywordAutomaton,
+    detect_pathologies_from_text
+)
+
+def test_known_cases():
+    """Texts nutritionists write, with the pathologies they must map to"""
+    cases = {
+        "": [],
+        "Sin patologías conocidas": [],
+        "Diabetes tipo 2, hipertensión arterial": [P.DIABETES_TIPO_2, P.HIPERTENSION],
+        "Hipotiroidismo (Hashimoto), colesterol alto": [P.HIPOTIROIDISMO, P.COLESTEROL_ALTO],
+        "celíaco, HTA": [P.HIPERTENSION, P.CELIAQUIA],
+    }
+    for text, expected in cases.items():
+        assert detect_pathologies_from_text(text) == expected, (text, detect_pathologies_from_text(text))
+
+def test_accents():
+    """Accents are optional for whole words, and case never matters"""
+    for text in ("hipertensión", "Hipertension", "HIPERTENSIÓN", "paciente hipertension."):
+        assert detect_pathologies_from_text(text) == [P.HIPERTENSION], text
+    assert detect_pathologies_from_text("celiaquia") == detect_pathologies_from_text("Celiaquía") == [P.CELIAQUIA]
+    assert detect_pathologies_from_text("gestacion") == [P.EMBARAZO_SEGUNDO_TRIMESTRE]
+    # Without its accent a keyword doesn't match inside a longer word
+    assert detect_pathologies_from_text("diabetes gestacional") == [P.DIABETES_TIPO_2, P.DIABETES_GESTACIONAL]
+    assert detect_pathologies_from_text("gestacionales") == []
+    # Multi-word keywords match without accents too
+    for text in ("hipertension gestacional", "hipertensión gestacional"):
+        assert detect_pathologies_from_text(text) == [P.HIPERTENSION, P.HIPERTENSION_GESTACIONAL], text
+
+def test_overlapping_keywords():
+    """Keywords contained in others are all reported, in table order"""
+    assert detect_pathologies_from_text("diabetes tipo 1") == [P.DIABETES_TIPO_1, P.DIABETES_TIPO_2]
+    assert detect_pathologies_from_text("osteoporosis") == [P.OSTEOPOROSIS, P.DEFICIT_CALCIO]
+    assert detect_pathologies_from_text("reflujo gastroesofágico") == [P.ESOFAGITIS_REFLUJO]
+    assert detect_pathologies_from_text("anticáncer prequimio") == [P.CANCER_PREQUIMIO, P.ANTICANCER_PREQUIMIO]
+
+def test_phase_defaults():
+    """Pregnancy defaults to the second trimester and cancer to prequimio"""
+    assert detect_pathologies_from_text("Embarazada") == [P.EMBARAZO_SEGUNDO_TRIMESTRE]
+    assert detect_pathologies_from_text("embarazo, 1er trimestre") == [P.EMBARAZO_PRIMER_TRIMESTRE]
+    assert detect_pathologies_from_text("gestante 3° trimestre") == [P.EMBARAZO_TERCER_TRIMESTRE]
+    assert detect_pathologies_from_text("tumor") == [P.CANCER_PREQUIMIO]
+    assert detect_pathologies_from_text("oncológico posquimio") == [P.CANCER_POSQUIMIO]
+    assert detect_pathologies_from_text("cáncer, en radiación") == [P.CANCER_RADIOTERAPIA]
+
+def test_results_are_fresh_lists():
+    first = detect_pathologies_from_text("anemia")
+    first.append(P.GOTA)
+    assert detect_pathologies_from_text("anemia") == [P.ANEMIA]
+
+def test_whole_word_search():
+    automaton = KeywordAutomaton(["sop", "hta", "presion alta"])
+    assert automaton.find("sopa de verduras") == {"sop"}
+    assert automaton.find("sopa de verduras", whole_words=True) == set()
+    assert automaton.find("hta, presion alta", whole_words=True) == {"hta", "presion alta"}
+
+def _scan(text):
+    """Substring scan of the keyword table, as the detection worked with accents required"""
+    text_lower = text.lower()
+    found = [pathology for keywords, pathology in PATHOLOGY_KEYWORDS
+             if pathology and any(keyword in text_lower for keyword in keywords)]
+    return list(dict.fromkeys(found))
+
+def test_accented_texts_match_substring_scan():
+    """With keywords spelled as in the table, results are those of the plain substring scan"""
+    keywords = [keyword for group, pathology in PATHOLOGY_KEYWORDS if pathology for keyword in group]
+    fillers = ["y", "con", "paciente", "gestacional", "-", ",", "sopa", "antecedente de"]
+    plain = {pathology for _, pathology in PATHOLOGY_KEYWORDS if pathology}
+    random.seed(7)
+    for _ in range(3000):
+        parts = [random.choice(keywords if random.random() < 0.6 else fillers) for _ in range(random.randint(1, 4))]
+        text = " ".join(parts)
+        detected = [pathology for pathology in detect_pathologies_from_text(text) if pathology in plain]
+        # Accent-free keywords of the table may add whole-word matches of their accented siblings
+        assert set(_scan(text)) <= set(detected), text
+
+def main():
+    """Run all tests"""
+    print("Testing Pathology Detection\n" + "="*50)
+
+    test_known_cases()
+    test_accents()
+    test_overlapping_keywords()
+    test_phase_defaults()
+    test_results_are_fresh_lists()
+    test_whole_word_search()
+    test_accented_texts_match_substring_scan()
+
+    print("\n\n✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""Test script for the local Motor 1 plan solver"""
+
+import sys
+import os
+import asyncio
+import re
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.schemas.meal_plan import NewPatientRequest
+from app.services.executor import StageExecutor
+from app.services.recipe_manager import RecipeManager
+from app.services.macro_scaler import MacroScaler
+from app.services.meal_plan_pipeline import MealPlanPipeline
+from app.services.meal_plan_processor import MealPlanProcessor
+from app.services.plan_solver import LocalPlanSolver, recipe_meal_type
+from app.services.prompt_generator import PromptGenerator
+
+MEAL_TARGETS = {"desayuno": 512, "almuerzo": 716, "merienda": 307, "cena": 512}
+MACRO_DISTRIBUTION = {"proteinas": 0.25, "carbohidratos": 0.5, "grasas": 0.25}
+
+def _solve(equitable=False):
+    recipe_manager = RecipeManager()
+    solver = LocalPlanSolver(MacroScaler(recipe_manager))
+    recipes_by_meal = recipe_manager.get_recipes_for_meal_plan(list(MEAL_TARGETS), limit=40)
+    targets = {meal: 512 for meal in MEAL_TARGETS} if equitable else MEAL_TARGETS
+    return solver, solver.solve(recipes_by_meal, targets, MACRO_DISTRIBUTION, equitable)
+
+def test_three_distinct_options_per_meal():
+    """Every meal gets three different catalog recipes near its calorie target"""
+    _, plan = _solve()
+    assert [meal.meal_type for meal in plan.meals] == list(MEAL_TARGETS)
+
+    for meal in plan.meals:
+        ids = [option.recipe_id for option in meal.options]
+        print(f"{meal.meal_type}: {ids} spread={meal.spread}")
+        assert len(set(ids)) == 3
+        for option in meal.options:
+            assert option.calories > 0
+            assert abs(option.calories - meal.target_calories) <= meal.target_calories * 0.1
+
+def test_broken_rules_are_reported():
+    """Meals whose options break the ±5% rule come back in validation_errors"""
+    _, plan = _solve(equitable=True)
+    print(f"Validation errors: {plan.validation_errors}")
+    for meal in plan.meals:
+        if meal.spread > 0.1:
+            assert any(error.startswith(meal.meal_type) for error in plan.validation_errors), meal.meal_type
+    assert plan.is_valid == (not plan.validation_errors)
+
+def test_meals_without_filtered_recipes_are_not_filled():
+    """A snack with no filtered candidates is skipped and reported, not served from the raw catalog"""
+    recipe_manager = RecipeManager()
+    solver = LocalPlanSolver(MacroScaler(recipe_manager))
+    targets = {"breakfast": 400, "mid_morning": 150, "lunch": 600}
+    recipes_by_meal = recipe_manager.get_recipes_for_meal_plan(["desayuno", "almuerzo"], limit=40)
+    plan = solver.solve(recipes_by_meal, targets, MACRO_DISTRIBUTION)
+
+    assert [meal.meal_type for meal in plan.meals] == ["desayuno", "almuerzo"]
+    assert plan.validation_errors[0] == "media_manana: no hay recetas aptas para el paciente"
+    assert recipe_meal_type("mid_morning", recipe_manager) == "colacion"
+    assert recipe_meal_type("lunch", recipe_manager) == "almuerzo"
+
+class FakeOpenAI:
+    """Returns a fixed plan, or fails like an unreachable API"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = 0
+
+    async def generate_meal_plan(self, prompt, priority=None):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("OpenAI no disponible")
+        ids = re.findall(r'\[(REC_\d{4})\]', prompt)
+        return f"DESAYUNO\nOPCIÓN 1:\n- Receta: [{ids[0]}] - Uno\n- Macros: P: 20g | C: 30g | G: 10g | Cal: 290\n"
+
+    async def cache_response(self, prompt, response, structured=False):
+        pass
+
+class FakePDFGenerator:
+    def generate_pdf(self, meal_plan, patient_name, plan_type):
+        return "plan.pdf"
+
+def _pipeline(solver_mode, tolerance, openai_service):
+    recipe_manager = RecipeManager()
+    macro_scaler = MacroScaler(recipe_manager)
+    return MealPlanPipeline(
+        chromadb_service=SimpleNamespace(collection=None),
+        recipe_manager=recipe_manager,
+        prompt_generator=PromptGenerator(),
+        openai_service=openai_service,
+        meal_plan_processor=MealPlanProcessor(recipe_manager),
+        pdf_generator=FakePDFGenerator(),
+        stage_executor=StageExecutor({"search": 1, "cpu": 1, "pdf": 1}),
+        early_abort=False,
+        macro_scaler=macro_scaler,
+        local_solver=LocalPlanSolver(macro_scaler, tolerance=tolerance),
+        solver_mode=solver_mode
+    )
+
+def _patient(**fields):
+    return NewPatientRequest(
+        nombre="Ana Test", edad=35, sexo="femenino", estatura=165, peso=68, objetivo="mantener",
+        tipo_actividad="caminata", frecuencia_semanal=3, duracion_sesion=45, **fields
+    )
+
+def test_restricted_patient_snacks():
+    """Every meal of a pregnancy distribution, snacks included, avoids the patient's restrictions"""
+    pipeline = _pipeline("local", 1.0, FakeOpenAI())
+    response = asyncio.run(pipeline.generate_new_patient_plan(
+        _patient(no_consume="yogur", patologias="embarazo segundo trimestre")
+    ))
+    plan = response.meal_plan.split("RESUMEN NUTRICIONAL")[0]
+    ids = set(re.findall(r'\[(REC_\d{4})\]', plan))
+    print(f"Recipes used: {sorted(ids)}")
+
+    assert pipeline.openai_service.calls == 0 and response.validation_errors == []
+    assert "MEDIA MAÑANA" in plan and "COLACIÓN" in plan
+    for recipe_id in ids:
+        recipe = pipeline.recipe_manager.get_recipe_by_id(recipe_id)
+        assert not any("yogur" in ingredient['item'].lower() for ingredient in recipe['ingredientes']), recipe_id
+
+def test_invalid_local_plan_handling():
+    """In local mode a plan that breaks the rules goes to the LLM; in fallback mode its errors are returned"""
+    local = _pipeline("local", 0.0001, FakeOpenAI())
+    response = asyncio.run(local.generate_new_patient_plan(_patient()))
+    assert local.openai_service.calls >= 1 and response.validation_errors == []
+
+    fallback = _pipeline("fallback", 0.0001, FakeOpenAI(fail=True))
+    response = asyncio.run(fallback.generate_new_patient_plan(_patient()))
+    print(f"Fallback errors: {response.validation_errors[:2]}")
+    assert fallback.openai_service.calls >= 1 and response.validation_errors
+    assert "RESUMEN NUTRICIONAL" in response.meal_plan
+
+def test_render_uses_plan_format():
+    """The rendered plan follows the format the rest of the pipeline parses"""
+    solver, plan = _solve(equitable=True)
+    text = solver.render(plan, "Paciente")
+
+    for header in ["DESAYUNO", "ALMUERZO", "MERIENDA", "CENA", "RESUMEN NUTRICIONAL"]:
+        assert header in text
+    assert text.count("OPCIÓN") == 12
+    assert text.count("- Macros: P:") == 12
+    for meal in plan.meals:
+        for option in meal.options:
+            assert f"[{option.recipe_id}]" in text
+
+def test_recipes_outside_catalog_are_dropped():
+    """Candidates the catalog can't resolve are never picked, so every option can be scaled"""
+    recipe_manager = RecipeManager()
+    solver = LocalPlanSolver(MacroScaler(recipe_manager))
+    recipes_by_meal = recipe_manager.get_recipes_for_meal_plan(["desayuno"], limit=40)
+    legacy = {
+        "id": "REC_LEGACY",
+        "nombre": "Copia vieja",
+        "calorias_aprox": 400,
+        "proteinas_aprox": 25,
+        "carbohidratos_aprox": 50,
+        "grasas_aprox": 11
+    }
+    recipes_by_meal["desayuno"] = [legacy] + recipes_by_meal["desayuno"]
+    plan = solver.solve(recipes_by_meal, {"desayuno": 400}, MACRO_DISTRIBUTION)
+
+    ids = [option.recipe_id for option in plan.meals[0].options]
+    assert "REC_LEGACY" not in ids and len(ids) == 3
+    assert solver._candidates("desayuno", {"desayuno": [legacy]}, set()) == []
+
+def main():
+    """Run all tests"""
+    print("Testing Local Plan Solver\n" + "="*50)
+
+    test_three_distinct_options_per_meal()
+    test_broken_rules_are_reported()
+    test_meals_without_filtered_recipes_are_not_filled()
+    test_recipes_outside_catalog_are_dropped()
+    test_restricted_patient_snacks()
+    test_invalid_local_plan_handling()
+    test_render_uses_plan_format()
+
+    print("\n\n✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
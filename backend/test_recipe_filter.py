@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Test script checking the compiled recipe filter against the per-recipe checks it replaced"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.data.pathologies import (
+    detect_pathologies_from_text,
+    get_all_dietary_restrictions,
+    get_recipe_tags_to_avoid,
+    get_pregnancy_info
+)
+from app.services.chromadb_service import ChromaDBService
+from app.services.pathology_filter import (
+    RESTRICTION_INGREDIENTS,
+    UNSAFE_PREGNANCY_INGREDIENTS,
+    compile_recipe_filter
+)
+from app.services.recipe_manager import RecipeManager
+
+CASES = [
+    (None, "Medio", None),
+    ("nueces", "Medio", None),
+    ("Pollo, ATÚN , queso", "Medio", None),
+    ("atun", "Medio", None),
+    ("azúcar", "Medio", None),
+    ("Azúcar", "Medio", None),
+    ("azucar", "Medio", None),
+    (None, "Bajo recursos", None),
+    (None, "Limitado", None),
+    ("huevo", "Limitado", None),
+    (None, "Medio", "diabetes tipo 2"),
+    (None, "Medio", "Celiaquía"),
+    (None, "Medio", "celiaquia, hipertensión"),
+    (None, "Medio", "HIPERTENSION"),
+    (None, "Medio", "embarazo segundo trimestre"),
+    (None, "Medio", "diabetes gestacional"),
+    ("leche", "Bajo recursos", "celiaquía y diabetes"),
+    ("miel", "Medio", "obesidad, dislipemia"),
+]
+
+def _reference_passes(recipe, restrictions, economic_level, patologias, expensive):
+    """The check ChromaDBService ran for every recipe before filters were compiled"""
+    ingredients_text = " ".join(ing['item'].lower() for ing in recipe.get('ingredientes', []))
+
+    if restrictions:
+        for restriction in (r.strip().lower() for r in restrictions.split(',')):
+            if restriction in ingredients_text:
+                return False
+
+    if economic_level in ("Bajo recursos", "Limitado"):
+        if any(item.lower() in ingredients_text for item in expensive):
+            return False
+
+    if patologias:
+        detected = detect_pathologies_from_text(patologias)
+        for restriction in get_all_dietary_restrictions(detected):
+            restriction_lower = restriction.lower()
+            if restriction_lower in RESTRICTION_INGREDIENTS:
+                if any(ingredient in ingredients_text for ingredient in RESTRICTION_INGREDIENTS[restriction_lower]):
+                    return False
+            elif restriction_lower in ingredients_text:
+                return False
+
+        recipe_tags = [tag.lower() for tag in recipe.get('tags', [])]
+        if any(tag in recipe_tags for tag in get_recipe_tags_to_avoid(detected)):
+            return False
+
+        if get_pregnancy_info(detected):
+            if any(unsafe in ingredients_text for unsafe in UNSAFE_PREGNANCY_INGREDIENTS):
+                return False
+
+    return True
+
+def test_matches_reference_on_catalog():
+    """Every case keeps exactly the recipes the per-recipe checks kept"""
+    service = ChromaDBService(RecipeManager())
+    expensive = [item for items in service.expensive_ingredients.values() for item in items]
+    recipes = service.recipe_manager.get_all_recipes()
+
+    for restrictions, economic_level, patologias in CASES:
+        recipe_filter = service._compile_filter(restrictions, economic_level, patologias)
+        kept = [recipe['id'] for recipe in recipes if recipe_filter.passes(recipe)]
+        expected = [
+            recipe['id'] for recipe in recipes
+            if _reference_passes(recipe, restrictions, economic_level, patologias, expensive)
+        ]
+        print(f"{restrictions!r}, {economic_level}, {patologias!r}: {len(kept)}/{len(recipes)}")
+        assert kept == expected, (restrictions, economic_level, patologias)
+
+def test_cases_exclude_something():
+    """The cases above actually exercise each kind of rule"""
+    service = ChromaDBService(RecipeManager())
+    recipes = service.recipe_manager.get_all_recipes()
+
+    def kept(restrictions, economic_level, patologias):
+        recipe_filter = service._compile_filter(restrictions, economic_level, patologias)
+        return sum(recipe_filter.passes(recipe) for recipe in recipes)
+
+    everything = kept(None, "Medio", None)
+    assert everything == len(recipes)
+    assert kept(None, "Bajo recursos", None) < everything
+    assert kept(None, "Medio", "celiaquía") < everything
+    assert kept(None, "Medio", "diabetes tipo 2") < everything
+
+def test_restriction_case_and_accents():
+    """Restrictions ignore case and spaces; accents still have to match the ingredient"""
+    recipe = {"ingredientes": [{"item": "Azúcar mascabo"}, {"item": "Harina de avena"}], "tags": ["Dulce"]}
+    assert not compile_recipe_filter("AZÚCAR", "Medio", None).passes(recipe)
+    assert not compile_recipe_filter(" azúcar ,otra", "Medio", None).passes(recipe)
+    assert compile_recipe_filter("azucar", "Medio", None).passes(recipe)
+    # Pathology rules map restrictions to both spellings and check tags case-insensitively
+    assert not compile_recipe_filter(None, "Medio", "diabetes tipo 2").passes(
+        {"ingredientes": [{"item": "azucar"}], "tags": []}
+    )
+    assert not compile_recipe_filter(None, "Medio", "celiaquía").passes(
+        {"ingredientes": [{"item": "Pan de trigo"}], "tags": []}
+    )
+    assert not compile_recipe_filter(None, "Medio", "celiaquía").passes(
+        {"ingredientes": [{"item": "arroz"}], "tags": ["GLUTEN"]}
+    )
+
+def test_empty_restriction_terms_are_ignored():
+    """Trailing or repeated commas don't add an empty term that matches every recipe"""
+    recipe = {"ingredientes": [{"item": "Pollo"}, {"item": "Arroz"}], "tags": []}
+    for restrictions in ("lactosa,", "lactosa,,", ", lactosa", ","):
+        assert compile_recipe_filter(restrictions, "Medio", None).passes(recipe), restrictions
+    assert not compile_recipe_filter("lactosa,, pollo,", "Medio", None).passes(recipe)
+
+    service = ChromaDBService(RecipeManager())
+    recipes = service.recipe_manager.get_all_recipes()
+    kept = [sum(service._compile_filter(r, "Medio", None).passes(recipe) for recipe in recipes)
+            for r in ("huevo", "huevo,", " ,huevo, ")]
+    assert kept[0] == kept[1] == kept[2] > 0
+
+def test_expensive_only_on_limited_budget():
+    recipe = {"ingredientes": [{"item": "salmón rosado"}], "tags": []}
+    for level, passes in (("Medio", True), ("Bajo recursos", False), ("Limitado", False)):
+        assert compile_recipe_filter(None, level, None, ["Salmón"]).passes(recipe) == passes
+
+def main():
+    """Run all tests"""
+    print("Testing Recipe Filter\n" + "="*50)
+
+    test_matches_reference_on_catalog()
+    test_cases_exclude_something()
+    test_restriction_case_and_accents()
+    test_empty_restriction_terms_are_ignored()
+    test_expensive_only_on_limited_budget()
+
+    print("\n\n✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Test script for the cached recipe text fragments"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.meal_plan_processor import MealPlanProcessor
+from app.services.prompt_generator import PromptGenerator, register_compact_fragments
+from app.services.recipe_fragments import RecipeFragmentCache
+from app.services.recipe_manager import RecipeManager
+
+def test_cached_text_matches_rendering():
+    """Prompts and appendices built from fragments equal freshly rendered ones"""
+    rm = RecipeManager()
+    register_compact_fragments(rm.fragments)
+    recipes_by_meal = rm.get_recipes_for_meal_plan(["desayuno", "almuerzo", "cena"], limit=10)
+
+    for catalog_format in ("full", "compact"):
+        for include_preparation in (False, True):
+            cached = PromptGenerator(catalog_format, include_preparation, fragments=rm.fragments)
+            fresh = PromptGenerator(catalog_format, include_preparation)
+            assert cached.format_recipe_catalog(recipes_by_meal) == fresh.format_recipe_catalog(recipes_by_meal)
+
+    processor = MealPlanProcessor(rm)
+    recipe = rm.get_recipe_by_id("REC_0001")
+    assert processor._format_full_recipe(recipe) == processor._render_full_recipe(recipe)
+    print(f"Fragments cached: {len(rm.fragments)}")
+
+def test_formatting_does_not_register_variants():
+    """Compact variants are registered at wiring; formatting a prompt never adds one"""
+    rm = RecipeManager()
+    recipes_by_meal = rm.get_recipes_for_meal_plan(["desayuno"], limit=5)
+    generator = PromptGenerator("compact", True, fragments=rm.fragments)
+    before = len(rm.fragments)
+    generator.format_recipe_catalog(recipes_by_meal)
+    assert "compact_prep" not in rm.fragments and len(rm.fragments) == before
+
+def test_recipes_sharing_an_id_keep_their_text():
+    """Fragments are per recipe, not per ID"""
+    cache = RecipeFragmentCache()
+    cache.register("name", lambda recipe: recipe["nombre"])
+    first, second = {"id": "REC_0001", "nombre": "Primera"}, {"id": "REC_0001", "nombre": "Segunda"}
+    cache.load([first, second])
+
+    assert cache.get("name", first) == "Primera"
+    assert cache.get("name", second) == "Segunda"
+    assert cache.get("name", {"id": "REC_0001", "nombre": "Externa"}) == "Externa"
+    assert len(cache) == 2
+
+def test_reload_replaces_fragments():
+    cache = RecipeFragmentCache()
+    cache.register("name", lambda recipe: recipe["nombre"])
+    old = {"id": "REC_0001", "nombre": "Vieja"}
+    cache.load([old])
+    cache.load([{"id": "REC_0002", "nombre": "Nueva"}])
+    assert len(cache) == 1
+
+def main():
+    """Run all tests"""
+    print("Testing Recipe Fragments\n" + "="*50)
+
+    test_cached_text_matches_rendering()
+    test_formatting_does_not_register_variants()
+    test_recipes_sharing_an_id_keep_their_text()
+    test_reload_replaces_fragments()
+
+    print("\n\n✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
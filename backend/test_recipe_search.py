@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Test script for the per-meal-type recipe search on a fake Chroma collection"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.chromadb_service import ChromaDBService, build_recipe_metadata
+from app.services.recipe_manager import RecipeManager
+
+MEAL_TYPES = ["desayuno", "almuerzo", "merienda", "cena", "colacion"]
+
+class CountingEmbeddings:
+    """Deterministic stand-in for the OpenAI embedding function"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, input):
+        self.calls.append(list(input))
+        return [[float(len(text)), float(sum(map(ord, text)) % 997)] for text in input]
+
+class FakeCollection:
+    """Ranks every stored recipe the same way; supports recipe_id $in filters unless told to reject them"""
+
+    def __init__(self, recipes, reject_where=False):
+        # Main-meal recipes first, so an unfiltered top-k is mostly lunch and dinner
+        ordered = sorted(recipes, key=lambda recipe: ("almuerzo" not in recipe.get('tipo_comida', []), recipe['id']))
+        self.metadatas = [build_recipe_metadata(recipe) for recipe in ordered]
+        self.reject_where = reject_where
+        self.queries = []
+
+    def count(self):
+        return len(self.metadatas)
+
+    def query(self, query_embeddings, n_results, where=None, include=None):
+        self.queries.append({"embeddings": query_embeddings, "n_results": n_results, "where": where})
+        metadatas = self.metadatas
+        if where is not None:
+            if self.reject_where:
+                raise ValueError("where clause not supported")
+            allowed = set(where["recipe_id"]["$in"])
+            metadatas = [metadata for metadata in metadatas if metadata["recipe_id"] in allowed]
+        return {"metadatas": [metadatas[:n_results] for _ in query_embeddings]}
+
+def _service(reject_where=False):
+    recipe_manager = RecipeManager()
+    service = ChromaDBService(recipe_manager)
+    service.collection = FakeCollection(recipe_manager.get_all_recipes(), reject_where)
+    service.embedding_function = CountingEmbeddings()
+    return service
+
+def _check_results(service, result, n_results):
+    assert service.embedding_function.calls == [[f"Recetas para {meal_type}" for meal_type in MEAL_TYPES]]
+    for meal_type in MEAL_TYPES:
+        recipes = result[meal_type]
+        print(f"{meal_type}: {len(recipes)} recipes")
+        assert len(recipes) == n_results, meal_type
+        assert all(meal_type in recipe['tipo_comida'] for recipe in recipes)
+
+def test_each_type_gets_its_results():
+    """One embedding call; every meal type is queried within its own recipes"""
+    service = _service()
+    result = service.search_recipes_by_meal_type(MEAL_TYPES, n_results_per_type=5)
+    _check_results(service, result, 5)
+
+    queries = service.collection.queries
+    assert len(queries) == len(MEAL_TYPES)
+    for meal_type, query in zip(MEAL_TYPES, queries):
+        expected = {recipe['id'] for recipe in service.recipe_manager.get_recipes_by_meal_type(meal_type)}
+        assert set(query["where"]["recipe_id"]["$in"]) == expected
+        assert query["n_results"] == min(10, len(expected))
+
+def test_rejected_filter_reuses_embeddings():
+    """When the filter fails, the whole collection is searched with the same embedding"""
+    service = _service(reject_where=True)
+    result = service.search_recipes_by_meal_type(MEAL_TYPES, n_results_per_type=5)
+    _check_results(service, result, 5)
+
+    unfiltered = [query for query in service.collection.queries if query["where"] is None]
+    vectors = service.embedding_function(["Recetas para " + meal_type for meal_type in MEAL_TYPES])
+    assert [query["embeddings"] for query in unfiltered] == [[vector] for vector in vectors]
+    assert all(query["n_results"] == service.collection.count() for query in unfiltered)
+
+def test_unknown_meal_type_is_empty():
+    service = _service()
+    result = service.search_recipes_by_meal_type(["brunch", "cena"], n_results_per_type=3)
+    assert result["brunch"] == [] and len(result["cena"]) == 3
+    assert len(service.collection.queries) == 1
+
+def main():
+    """Run all tests"""
+    print("Testing Recipe Search\n" + "="*50)
+
+    test_each_type_gets_its_results()
+    test_rejected_filter_reuses_embeddings()
+    test_unknown_meal_type_is_empty()
+
+    print("\n\n✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Test script for the incremental ChromaDB recipe sync"""
+
+import sys
+import os
+import threading
+import uuid
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import chromadb
+from chromadb.config import Settings as ChromaSettings
+
+from app.services.chromadb_service import build_recipe_document, build_recipe_metadata
+from app.services.recipe_sync import sync_recipes
+
+class CountingEmbeddings:
+    """Deterministic stand-in for the OpenAI embedding function"""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, input):
+        with self._lock:
+            self.calls.append(list(input))
+        return [[float(len(text)), float(sum(map(ord, text)) % 997), 1.0] for text in input]
+
+def _recipe(recipe_id, nombre, calorias=300):
+    return {
+        "id": recipe_id,
+        "nombre": nombre,
+        "tipo_comida": ["almuerzo"],
+        "ingredientes": [{"item": "pollo", "cantidad": "150g"}],
+        "calorias_aprox": calorias
+    }
+
+def _sync(collection, recipes, embeddings, **kwargs):
+    return sync_recipes(
+        collection,
+        recipes,
+        build_document=build_recipe_document,
+        build_metadata=build_recipe_metadata,
+        embedding_function=embeddings,
+        batch_size=2,
+        max_concurrency=3,
+        **kwargs
+    )
+
+def _collection(embeddings):
+    client = chromadb.EphemeralClient(ChromaSettings(anonymized_telemetry=False))
+    return client.create_collection(name=f"recipes_{uuid.uuid4().hex[:8]}", embedding_function=embeddings)
+
+def test_only_changes_are_embedded():
+    """A second sync embeds nothing; edits, additions and removals are applied"""
+    embeddings = CountingEmbeddings()
+    collection = _collection(embeddings)
+    recipes = [_recipe(f"REC_{i:04d}", f"Receta {i}") for i in range(5)]
+
+    report = _sync(collection, recipes, embeddings)
+    print(report.summary())
+    assert len(report.added) == 5 and report.embedding_calls == 3
+    assert collection.count() == 5
+
+    report = _sync(collection, recipes, embeddings)
+    assert not report.changed and report.unchanged == 5 and report.embedding_calls == 0
+
+    recipes[1] = _recipe("REC_0001", "Receta 1", calorias=450)
+    recipes = recipes[:4] + [_recipe("REC_0009", "Receta nueva")]
+    report = _sync(collection, recipes, embeddings)
+    print(report.summary())
+    assert report.added == ["REC_0009"]
+    assert report.updated == ["REC_0001"]
+    assert report.removed == ["REC_0004"]
+    assert report.unchanged == 3
+    assert sorted(collection.get()["ids"]) == ["REC_0000", "REC_0001", "REC_0002", "REC_0003", "REC_0009"]
+    assert collection.get(ids=["REC_0001"])["metadatas"][0]["calorias"] == 450
+
+def test_duplicate_ids_and_dry_run():
+    """Repeated IDs keep the last entry and a dry run writes nothing"""
+    embeddings = CountingEmbeddings()
+    collection = _collection(embeddings)
+    recipes = [_recipe("REC_0001", "Primera"), _recipe("REC_0001", "Segunda")]
+
+    report = _sync(collection, recipes, embeddings, dry_run=True)
+    assert report.added == ["REC_0001"] and collection.count() == 0 and embeddings.calls == []
+
+    _sync(collection, recipes, embeddings)
+    assert collection.get()["metadatas"][0]["nombre"] == "Segunda"
+
+def test_legacy_metadata_is_replaced():
+    """Records loaded with a recipe_json copy lose it when synced"""
+    embeddings = CountingEmbeddings()
+    collection = _collection(embeddings)
+    recipe = _recipe("REC_0001", "Receta")
+    collection.add(
+        ids=["REC_0001"],
+        documents=[build_recipe_document(recipe)],
+        metadatas=[dict(build_recipe_metadata(recipe), recipe_json="{}")]
+    )
+
+    report = _sync(collection, [recipe], embeddings)
+    assert report.updated == ["REC_0001"]
+    assert "recipe_json" not in collection.get()["metadatas"][0]
+
+def test_failed_batches_are_reported():
+    """A batch whose embeddings fail is reported and retried by the next sync"""
+    def failing(input):
+        raise RuntimeError("rate limited")
+
+    embeddings = CountingEmbeddings()
+    collection = _collection(embeddings)
+    recipes = [_recipe(f"REC_{i:04d}", f"Receta {i}") for i in range(3)]
+
+    report = _sync(collection, recipes, failing, retries=1)
+    assert sorted(report.failed) == ["REC_0000", "REC_0001", "REC_0002"] and report.added == []
+
+    report = _sync(collection, recipes, embeddings)
+    assert len(report.added) == 3 and not report.failed
+
+def test_mass_deletions_need_prune():
+    """An empty or mostly missing catalog keeps the stored recipes unless pruning"""
+    embeddings = CountingEmbeddings()
+    collection = _collection(embeddings)
+    recipes = [_recipe(f"REC_{i:04d}", f"Receta {i}") for i in range(4)]
+    _sync(collection, recipes, embeddings)
+
+    report = _sync(collection, [], embeddings)
+    assert report.removed == [] and len(report.kept) == 4 and collection.count() == 4
+
+    report = _sync(collection, recipes[:1], embeddings)
+    assert report.removed == [] and len(report.kept) == 3 and collection.count() == 4
+
+    report = _sync(collection, recipes[:2], embeddings)
+    assert sorted(report.removed) == ["REC_0002", "REC_0003"] and collection.count() == 2
+
+    report = _sync(collection, [], embeddings, prune=True)
+    assert sorted(report.removed) == ["REC_0000", "REC_0001"] and collection.count() == 0
+
+def main():
+    """Run all tests"""
+    print("Testing Recipe Sync\n" + "="*50)
+
+    test_only_changes_are_embedded()
+    test_duplicate_ids_and_dry_run()
+    test_legacy_metadata_is_replaced()
+    test_failed_batches_are_reported()
+    test_mass_deletions_need_prune()
+
+    print("\n\n✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -29,16 +29,17 @@ def test_recipe_manager():
     print("\n\n=== Testing Recipe Filtering ===")
     
     breakfast_recipes = rm.get_recipes_by_meal_type("desayuno")
-    filtered = rm.filter_recipes_by_requirements(
+    scores = rm.score_recipes(
         breakfast_recipes,
         restrictions="lácteos",
         preferences="avena",
         economic_level="Medio"
     )
+    filtered = scores.ranked()
     
     print(f"\nFiltered breakfast recipes (no dairy, with oats): {len(filtered)}")
     for recipe in filtered[:3]:
-        print(f"  - {recipe['nombre']} (Score: {recipe.get('preference_score', 0)})")
+        print(f"  - {recipe['nombre']} (Score: {scores.score_of(recipe, 'preference')})")
     
     # Test 4: Get specific recipe
     print("\n\n=== Testing Recipe Lookup ===")
@@ -119,6 +120,37 @@ CENA
     used_recipes = pg.extract_used_recipes(sample_meal_plan)
     print(f"Recipes used in meal plan: {used_recipes}")
 
+def test_macro_ranking(rm=None):
+    """Test vectorized macro ranking for replacements"""
+    print("\n\n=== Testing Macro Ranking ===")
+    rm = rm or RecipeManager()
+    
+    target = {"calorias": 400, "proteinas": 25, "carbohidratos": 45, "grasas": 12}
+    rows = rm.index.rank_by_macros(target, k=5, meal_type="almuerzo", tolerance=0.2)
+    distances = rm.index.macro_distances(target)
+    
+    print(f"\nClosest lunches to {target}:")
+    for row in rows:
+        recipe = rm.index.recipes[row]
+        print(f"  - {recipe['nombre']} (distance: {distances[row]:.2f})")
+        assert "almuerzo" in recipe['tipo_comida']
+    assert len(rows) > 0
+    
+    # Same ranking as sorting every eligible lunch by distance, ties by catalog order
+    within = rm.index.within_tolerance(target, 0.2)
+    eligible = [
+        row for row, recipe in enumerate(rm.index.recipes)
+        if "almuerzo" in recipe['tipo_comida'] and within[row]
+    ]
+    expected = sorted(eligible, key=lambda row: (distances[row], row))[:5]
+    assert list(rows) == expected
+    
+    for metric in ["l1", "relative", "weighted"]:
+        ranked = rm.index.rank_by_macros(target, k=3, metric=metric)
+        print(f"  {metric}: {[rm.index.ids[row] for row in ranked]}")
+        metric_distances = rm.index.macro_distances(target, metric)
+        assert list(ranked) == sorted(range(len(rm.index.recipes)), key=lambda row: (metric_distances[row], row))[:3]
+
 def test_meal_plan_processor(rm):
     """Test the meal plan processor"""
     from app.services.meal_plan_processor import MealPlanProcessor
@@ -158,6 +190,9 @@ def main():
     # Test prompt generator
     test_prompt_generator(rm)
     
+    # Test macro ranking
+    test_macro_ranking(rm)
+    
     # Test meal plan processor
     test_meal_plan_processor(rm)
     
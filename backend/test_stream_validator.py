@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""Test script for incremental plan validation and the Motor 1 SSE endpoint"""
+
+import sys
+import os
+import json
+import re
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+from app.services.stream_validator import IncrementalPlanValidator
+
+VALID_IDS = ["REC_0001", "REC_0003", "REC_0011"]
+
+PLAN = """PLAN ALIMENTARIO - 3 DÍAS IGUALES
+
+DESAYUNO
+OPCIÓN 1:
+- Receta: [REC_0001] - Tostadas
+- Macros: P: 20g | C: 30g | G: 10g | Cal: 290
+OPCIÓN 2:
+- Receta: [REC_0003] - Yogur
+- Macros: P: 0g | C: 0g | G: 0g | Cal: 0
+
+ALMUERZO
+OPCIÓN 1:
+- Receta: [REC_9999] - Inventada
+- Macros: P: 30g | C: 40g | G: 15g | Cal: 415
+
+RECOMENDACIONES:
+- Tomar agua
+"""
+
+def _chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def test_lines_split_across_chunks():
+    """Issues are reported once their line is complete, however the text is chunked"""
+    for size in (1, 7, 50, len(PLAN)):
+        validator = IncrementalPlanValidator(VALID_IDS)
+        found = []
+        for chunk in _chunks(PLAN, size):
+            found.extend(issue.kind for issue in validator.feed(chunk))
+        found.extend(issue.kind for issue in validator.finish())
+        assert found == ["zero_macros", "unknown_recipe_id"], (size, found)
+        assert validator.text == PLAN
+        assert validator.recipe_ids_used == ["REC_0001", "REC_0003", "REC_9999"]
+
+def test_issue_reported_when_line_ends():
+    """A bad recipe ID is only reported when its line is finished"""
+    validator = IncrementalPlanValidator(VALID_IDS)
+    assert validator.feed("DESAYUNO\n- Receta: [REC_99") == []
+    assert validator.feed("99] - Inventada") == []
+    issues = validator.feed("\n")
+    assert [issue.kind for issue in issues] == ["unknown_recipe_id"]
+    assert "REC_9999" in issues[0].message and issues[0].line == "- Receta: [REC_9999] - Inventada"
+
+def test_zero_macros_names_meal_and_option():
+    validator = IncrementalPlanValidator(VALID_IDS)
+    issues = validator.feed(PLAN)
+    zero = [issue for issue in issues if issue.kind == "zero_macros"]
+    print(f"Zero macros: {zero[0].message}")
+    assert zero[0].message.startswith("DESAYUNO - OPCIÓN 2:")
+
+def test_blocks_and_too_few_recipes():
+    """Meal blocks close at the next header; a short plan is flagged at the end"""
+    validator = IncrementalPlanValidator(VALID_IDS)
+    split = PLAN.index("ALMUERZO") + len("ALMUERZO")
+    validator.feed(PLAN[:split])
+    assert validator.pop_completed_blocks() == []
+    validator.feed(PLAN[split:split + 1])
+    assert [name for name, _ in validator.pop_completed_blocks()] == ["DESAYUNO"]
+    validator.feed(PLAN[split + 1:])
+    validator.finish()
+    blocks = validator.pop_completed_blocks()
+    assert [name for name, _ in blocks] == ["ALMUERZO", "RECOMENDACIONES:"]
+    assert "Tomar agua" in blocks[-1][1]
+    assert validator.pop_completed_blocks() == []
+
+    short = IncrementalPlanValidator(VALID_IDS)
+    short.feed("DESAYUNO\n- Receta: [REC_0001] - Tostadas\n")
+    assert [issue.kind for issue in short.finish()] == ["too_few_recipes"]
+
+class FakeStreamingOpenAI:
+    """Streams a plan with an unknown recipe first, then a valid one, in small chunks"""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def stream_meal_plan(self, prompt, priority=None):
+        self.prompts.append(prompt)
+        ids = list(dict.fromkeys(re.findall(r'\[(REC_\d{4})\]', prompt)))[:3]
+        first = "REC_9999" if len(self.prompts) == 1 else ids[0]
+        plan = (
+            f"DESAYUNO\nOPCIÓN 1:\n- Receta: [{first}] - Uno\n- Macros: P: 20g | C: 30g | G: 10g | Cal: 290\n"
+            f"OPCIÓN 2:\n- Receta: [{ids[1]}] - Dos\n- Macros: P: 20g | C: 30g | G: 10g | Cal: 290\n\n"
+            f"ALMUERZO\nOPCIÓN 1:\n- Receta: [{ids[2]}] - Tres\n- Macros: P: 30g | C: 40g | G: 15g | Cal: 415\n"
+        )
+        for chunk in _chunks(plan, 9):
+            yield chunk
+
+    async def cache_response(self, prompt, response, structured=False):
+        pass
+
+def _parse_sse(body):
+    events = []
+    for raw in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in raw.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+def test_sse_endpoint():
+    """The endpoint streams deltas, the warning, the retry, blocks and the final plan"""
+    from app import main
+
+    fake = FakeStreamingOpenAI()
+    pdf_generator = main.meal_plan_pipeline.pdf_generator
+    original = main.meal_plan_pipeline.openai_service, pdf_generator.output_dir
+    main.meal_plan_pipeline.openai_service = fake
+    # Keep the rendered PDF out of the working tree
+    with tempfile.TemporaryDirectory() as directory:
+        pdf_generator.output_dir = directory
+        try:
+            client = TestClient(main.app)
+            response = client.post("/api/meal-plans/new-patient/stream", json={
+                "nombre": "Ana Test", "edad": 35, "sexo": "femenino", "estatura": 165, "peso": 68,
+                "objetivo": "mantener", "tipo_actividad": "caminata", "frecuencia_semanal": 3, "duracion_sesion": 45
+            })
+            pdf_files = os.listdir(directory)
+        finally:
+            main.meal_plan_pipeline.openai_service, pdf_generator.output_dir = original
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _parse_sse(response.text)
+    kinds = [event for event, _ in events]
+    print(f"Events: {sorted(set(kinds))}")
+
+    assert kinds[0] == "status" and kinds[-1] == "done"
+    warning = next(data for event, data in events if event == "warning")
+    assert warning["kind"] == "unknown_recipe_id" and "REC_9999" in warning["message"]
+    retry = next(data for event, data in events if event == "retry")
+    assert retry["reason"] == "unknown_recipe_id"
+    # The retried generation runs with the recipe ID reminder
+    assert len(fake.prompts) == 2 and fake.prompts[1].startswith(fake.prompts[0])
+    assert [data["name"] for event, data in events if event == "block"] == ["DESAYUNO", "ALMUERZO"]
+    assert kinds.index("retry") < kinds.index("block")
+
+    done = events[-1][1]
+    assert "REC_9999" not in done["meal_plan"] and done["pdf_path"] in pdf_files
+    assert {"recipe_filter", "prompt", "llm", "llm_retry_1", "pdf"} <= set(done["stage_timings"])
+
+def main():
+    """Run all tests"""
+    print("Testing Stream Validation\n" + "="*50)
+
+    test_lines_split_across_chunks()
+    test_issue_reported_when_line_ends()
+    test_zero_macros_names_meal_and_option()
+    test_blocks_and_too_few_recipes()
+    test_sse_endpoint()
+
+    print("\n\n✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""Test script for the structured (JSON) meal plan output mode"""
+
+import sys
+import os
+import asyncio
+import json
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.schemas.meal_plan import StructuredMealPlan
+from app.services.executor import StageExecutor
+from app.services.macro_scaler import MacroScaler
+from app.services.meal_plan_pipeline import MealPlanPipeline, JSON_FORMAT_REMINDER, RECIPE_ID_REMINDER, StageTimings
+from app.services.meal_plan_processor import MealPlanProcessor
+from app.services.pdf_generator import PDFGenerator
+from app.services.prompt_generator import PromptGenerator
+from app.services.recipe_manager import RecipeManager
+from app.services.structured_output import parse_structured_plan, plan_meal_structure, render_plan_text
+
+recipe_manager = RecipeManager()
+
+def _option(recipe_id, calories=300, zero=False):
+    recipe = recipe_manager.get_recipe_by_id(recipe_id) or {"nombre": "Inventada", "ingredientes": [{"item": "x", "cantidad": "10g"}]}
+    return {
+        "receta_id": recipe_id,
+        "nombre": recipe["nombre"],
+        "ingredientes": [{"item": i["item"], "cantidad": i["cantidad"]} for i in recipe["ingredientes"]],
+        "preparacion": "Cocinar",
+        "macros": {
+            "proteinas": 0 if zero else 20,
+            "carbohidratos": 0 if zero else 30,
+            "grasas": 0 if zero else 10,
+            "calorias": 0 if zero else calories
+        }
+    }
+
+def _plan_json(options_by_meal, **extra):
+    return json.dumps({
+        "comidas": [
+            {"comida": meal, "opciones": options}
+            for meal, options in options_by_meal.items()
+        ],
+        **extra
+    })
+
+RECIPE_IDS = list(recipe_manager.recipes_by_id)[:3]
+
+def test_parse_and_render():
+    """A valid plan parses; its text has the layout the text-mode parsers read"""
+    text = _plan_json(
+        {"DESAYUNO": [_option(RECIPE_IDS[0]), _option(RECIPE_IDS[1], zero=True)], "CENA": [_option(RECIPE_IDS[2])]},
+        recomendaciones=["Tomar agua"]
+    )
+    plan = parse_structured_plan(text)
+    assert plan.recipe_ids() == RECIPE_IDS
+
+    rendered = render_plan_text(plan)
+    print(rendered[:300])
+    processor = MealPlanProcessor(recipe_manager)
+    assert processor._extract_meal_structure(rendered) == plan_meal_structure(plan)
+    assert len(processor.check_for_zero_macros(rendered)) == len(processor.check_plan_zero_macros(plan)) == 1
+    assert processor.check_plan_recipes(plan) == []
+    assert processor.check_plan_recipes(plan, RECIPE_IDS[:2]) == [RECIPE_IDS[2]]
+    assert "RECOMENDACIONES:" in rendered
+
+def test_malformed_plans_are_rejected():
+    """Schema violations are reported without parsing any text"""
+    for text in (
+        "no es json",
+        json.dumps({"comidas": []}),
+        _plan_json({"DESAYUNO": [dict(_option(RECIPE_IDS[0]), receta_id="[REC_0001]")]}),
+        _plan_json({"DESAYUNO": [{k: v for k, v in _option(RECIPE_IDS[0]).items() if k != "macros"}]}),
+    ):
+        try:
+            parse_structured_plan(text)
+        except ValueError as e:
+            print(f"Rejected: {str(e)[:100]}")
+        else:
+            raise AssertionError(f"Accepted malformed plan: {text[:80]}")
+
+def test_scale_plan():
+    """MacroScaler recomputes ingredients and macros of each typed option"""
+    plan = parse_structured_plan(_plan_json({"ALMUERZO": [_option(RECIPE_IDS[0], zero=True)]}))
+    scaler = MacroScaler(recipe_manager)
+    scaled = scaler.scale_plan(plan, {"lunch": 600})
+    macros = scaled.comidas[0].opciones[0].macros
+    expected = scaler.scale_recipe(RECIPE_IDS[0], 600)
+    print(f"Scaled macros: {macros}")
+    assert macros.calorias == expected.calories and macros.proteinas == expected.protein
+    assert [(i.item, i.cantidad) for i in scaled.comidas[0].opciones[0].ingredientes] == expected.ingredients
+    assert not macros.all_zero
+    # The original plan is left untouched
+    assert plan.comidas[0].opciones[0].macros.all_zero
+
+class FakeOpenAI:
+    """Returns the queued JSON answers in order"""
+
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.prompts = []
+        self.cached = []
+
+    async def generate_structured_plan(self, prompt, priority=None):
+        self.prompts.append(prompt)
+        return self.answers.pop(0)
+
+    async def cache_response(self, prompt, response, structured=False):
+        self.cached.append((prompt, structured))
+
+def test_pipeline_json_mode():
+    """Malformed and unknown-ID plans are regenerated with their reminders"""
+    fake = FakeOpenAI([
+        "{\"comidas\": [",
+        _plan_json({"DESAYUNO": [_option("REC_9999")]}),
+        _plan_json({"DESAYUNO": [_option(RECIPE_IDS[0])], "CENA": [_option(RECIPE_IDS[1])]}),
+    ])
+    pipeline = MealPlanPipeline(
+        chromadb_service=None,
+        recipe_manager=recipe_manager,
+        prompt_generator=PromptGenerator(),
+        openai_service=fake,
+        meal_plan_processor=MealPlanProcessor(recipe_manager),
+        pdf_generator=None,
+        stage_executor=StageExecutor({"search": 1, "cpu": 1, "pdf": 1}),
+        output_format="json"
+    )
+    timings = StageTimings()
+    plan = asyncio.run(pipeline._generate_structured("PROMPT", timings, RECIPE_IDS))
+    assert isinstance(plan, StructuredMealPlan) and plan.recipe_ids() == RECIPE_IDS[:2]
+    assert len(fake.prompts) == 3
+    assert fake.prompts[1].endswith(JSON_FORMAT_REMINDER)
+    assert fake.prompts[2].endswith(JSON_FORMAT_REMINDER + RECIPE_ID_REMINDER)
+    assert set(timings.as_dict()) == {"llm", "llm_retry_1", "llm_retry_2"}
+    # Only the accepted answer is cached
+    assert fake.cached == [(fake.prompts[2], True)]
+    # The structure check runs on the CPU pool, not on the event loop
+    assert pipeline.stage_executor.get_stats()["cpu"]["submitted"] == 1
+
+class FakePDFGenerator:
+    def generate_plan_pdf(self, plan, patient_name, plan_type, appendix=""):
+        return "plan.pdf"
+
+def test_structured_validation_errors():
+    """Rules a structured plan breaks are returned, as in the text path"""
+    pipeline = MealPlanPipeline(
+        chromadb_service=None,
+        recipe_manager=recipe_manager,
+        prompt_generator=PromptGenerator(),
+        openai_service=None,
+        meal_plan_processor=MealPlanProcessor(recipe_manager),
+        pdf_generator=FakePDFGenerator(),
+        stage_executor=StageExecutor({"search": 1, "cpu": 1, "pdf": 1}),
+        output_format="json"
+    )
+    plan = parse_structured_plan(_plan_json({"DESAYUNO": [_option(RECIPE_IDS[0])]}))
+    response = asyncio.run(pipeline._finalize(
+        plan, "Ana Test", "nuevo", StageTimings(), validation_errors=["desayuno: opciones fuera del ±5%"]
+    ))
+    assert response.plan is not None and response.pdf_path == "plan.pdf"
+    assert response.validation_errors == ["desayuno: opciones fuera del ±5%"]
+
+def test_structured_pdf():
+    """The PDF is rendered from the typed plan"""
+    plan = parse_structured_plan(_plan_json({"DESAYUNO": [_option(RECIPE_IDS[0])]}, cambios=["Más fibra & agua"]))
+    generator = PDFGenerator()
+    with tempfile.TemporaryDirectory() as directory:
+        generator.output_dir = directory
+        filename = generator.generate_plan_pdf(plan, "Ana Test", "control", appendix="=== DETALLES ===")
+        assert os.path.getsize(os.path.join(directory, filename)) > 1000
+
+def main():
+    """Run all tests"""
+    print("Testing Structured Meal Plans\n" + "="*50)
+
+    test_parse_and_render()
+    test_malformed_plans_are_rejected()
+    test_scale_plan()
+    test_pipeline_json_mode()
+    test_structured_validation_errors()
+    test_structured_pdf()
+
+    print("\n\n✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()
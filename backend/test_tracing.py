@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Test script for per-stage tracing and the Prometheus metrics"""
+
+import sys
+import os
+import asyncio
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.tracing import MetricsRegistry, StageTimings, activate, llm_cost, record_llm_usage, traced
+
+def test_spans_and_histograms():
+    """Each span is kept in the timeline and observed under the request's motor"""
+    registry = MetricsRegistry()
+    timings = StageTimings(registry=registry)
+    with timings.request("motor2"):
+        with timings.measure("prompt"):
+            time.sleep(0.01)
+        with timings.measure("llm"):
+            time.sleep(0.02)
+        with timings.measure("llm"):
+            pass
+
+    timeline = timings.timeline()
+    print(f"Timeline: {timeline}")
+    assert [span["stage"] for span in timeline] == ["prompt", "llm", "llm"]
+    assert timeline[1]["start"] >= timeline[0]["start"] + timeline[0]["duration"]
+    assert set(timings.as_dict()) == {"prompt", "llm"} and timings.as_dict()["llm"] >= 0.02
+    assert registry.stage_seconds.count(motor="motor2", stage="llm") == 2
+    assert registry.request_seconds.count(motor="motor2", status="ok") == 1
+
+    header = timings.server_timing(0.5)
+    print(f"Server-Timing: {header}")
+    assert header.startswith("prompt;dur=") and header.endswith("total;dur=500.0")
+
+def test_failed_request_status():
+    """A request that raises is counted with status=error"""
+    registry = MetricsRegistry()
+    timings = StageTimings(registry=registry)
+    try:
+        with timings.request("motor3"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    assert registry.request_seconds.count(motor="motor3", status="error") == 1
+
+def test_usage_and_cost():
+    """Usage goes to the global counters and to the active request"""
+    registry = MetricsRegistry()
+    timings = StageTimings(registry=registry)
+    with activate(timings):
+        record_llm_usage("gpt-4-turbo-preview", 1000, 500)
+    record_llm_usage("gpt-4-turbo-preview", 10, 10)  # no active request: default registry
+
+    expected = llm_cost("gpt-4-turbo-preview", 1000, 500)
+    assert abs(expected - 0.025) < 1e-9
+    assert timings.tokens == {"prompt": 1000, "completion": 500}
+    assert abs(timings.cost - expected) < 1e-9
+    assert registry.llm_tokens.value(model="gpt-4-turbo-preview", kind="completion") == 500
+    assert registry.llm_requests.value(model="gpt-4-turbo-preview") == 1
+    assert llm_cost("unknown-model", 1000, 1000) == 0
+
+def test_prometheus_rendering():
+    """The exposition has cumulative buckets, +Inf, sum and count"""
+    registry = MetricsRegistry()
+    registry.stage_seconds.observe(0.2, motor="motor1", stage="pdf")
+    registry.stage_seconds.observe(3.0, motor="motor1", stage="pdf")
+    registry.llm_cost.inc(0.5, model='gpt"4')
+    text = registry.render()
+    print(text[:400])
+    assert "# TYPE mealplan_stage_duration_seconds histogram" in text
+    assert 'mealplan_stage_duration_seconds_bucket{motor="motor1",stage="pdf",le="0.25"} 1' in text
+    assert 'mealplan_stage_duration_seconds_bucket{motor="motor1",stage="pdf",le="+Inf"} 2' in text
+    assert 'mealplan_stage_duration_seconds_count{motor="motor1",stage="pdf"} 2' in text
+    assert 'mealplan_stage_duration_seconds_sum{motor="motor1",stage="pdf"} 3.2' in text
+    assert 'mealplan_llm_cost_usd_total{model="gpt\\"4"} 0.5' in text
+    assert text.endswith("\n")
+
+class FakePipeline:
+    """Entry points traced like MealPlanPipeline's"""
+
+    @traced("motor1")
+    async def generate(self, request, timings=None):
+        with timings.measure("llm"):
+            # Usage from tasks started by the request is attributed to it
+            await asyncio.create_task(self._call())
+        return timings
+
+    @traced("motor1")
+    async def stream(self, request, timings=None):
+        with timings.measure("llm"):
+            await self._call()
+            yield "delta", {"text": request}
+
+    async def _call(self):
+        record_llm_usage("gpt-4-turbo-preview", 100, 50)
+
+def test_traced_entry_points():
+    """Traced methods label their stages and see the request's timings"""
+    registry = MetricsRegistry()
+    pipeline = FakePipeline()
+    timings = asyncio.run(pipeline.generate(None, StageTimings(registry=registry)))
+    assert timings.motor == "motor1" and timings.tokens["prompt"] == 100
+    assert registry.stage_seconds.count(motor="motor1", stage="llm") == 1
+
+    async def consume():
+        streamed = StageTimings(registry=registry)
+        with activate(streamed):
+            events = [event async for event in pipeline.stream("hola")]
+        return events, streamed
+    events, streamed = asyncio.run(consume())
+    assert events == [("delta", {"text": "hola"})] and "llm" in streamed.as_dict()
+    assert registry.request_seconds.count(motor="motor1", status="ok") == 2
+
+def test_traced_stream_activates_timings():
+    """Usage inside a traced stream goes to the timings it was given"""
+    registry = MetricsRegistry()
+    streamed = StageTimings(registry=registry)
+
+    async def consume():
+        return [event async for event in FakePipeline().stream("hola", streamed)]
+    asyncio.run(consume())
+    assert streamed.tokens["prompt"] == 100 and registry.llm_requests.value(model="gpt-4-turbo-preview") == 1
+
+def main():
+    """Run all tests"""
+    print("Testing Tracing and Metrics\n" + "="*50)
+
+    test_spans_and_histograms()
+    test_failed_request_status()
+    test_usage_and_cost()
+    test_prometheus_rendering()
+    test_traced_entry_points()
+    test_traced_stream_activates_timings()
+
+    print("\n\n✅ All tests completed!")
+
+if __name__ == "__main__":
+    main()